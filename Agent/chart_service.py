@@ -3,11 +3,12 @@
 
 ## [HEADER]
 **文件名**: chart_service.py
-**职责**: 本地图表生成服务 - 使用 PyEcharts 模拟 MCP ECharts 服务，支持多种图表类型（柱状图、折线图、饼图、散点图、漏斗图）的生成，导出为 PNG/HTML 文件
+**职责**: 本地图表生成服务 - 模拟 MCP ECharts 服务，支持多种图表类型（柱状图、折线图、饼图、散点图、漏斗图）的生成，PNG 经 AgentV2/tools/chart_renderer 渲染，HTML 由 PyEcharts 生成
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 本地图表生成服务
+- v1.1.0 (2026-10-16): generate_chart 改用 AgentV2 的 chart_renderer（常驻浏览器池 + 内容哈希缓存），不再每张图启动一次 Selenium；AgentV2 不可导入时退回 make_snapshot；新增 load_chart_renderer 供 sql_agent 复用常驻 MCP 会话
 
 ## [INPUT]
 ### generate_chart() 函数参数
@@ -51,13 +52,19 @@
   - success=True 时包含 image_path
   - success=False 时包含 error
 
+### load_chart_renderer() 返回值
+- **module** - AgentV2.tools.chart_renderer 模块（get_chart_renderer, get_mcp_chart_client）
+- **Raises**: ImportError - AgentV2 不可导入
+
 ### generate_chart_simple() 返回值
 - **ChartResponse** - 图表生成响应对象（仅生成HTML，无需selenium）
 
 ## [LINK]
 **上游依赖** (已读取源码):
 - [pyecharts](https://github.com/pyecharts/pyecharts) - Python ECharts 库（Bar, Line, Pie, Scatter, Funnel）
-- [snapshot-selenium](https://github.com/pyecharts/snapshot-selenium) - Selenium 快照库（make_snapshot, snapshot）
+- [../AgentV2/tools/chart_renderer.py](../AgentV2/tools/chart_renderer.py) - 图表 PNG 渲染服务（get_chart_renderer, get_mcp_chart_client）
+- [../AgentV2/chart_service.py](../AgentV2/chart_service.py) - ChartRequest → ECharts option（chart_request_to_option）
+- [snapshot-selenium](https://github.com/pyecharts/snapshot-selenium) - Selenium 快照库（make_snapshot, snapshot；AgentV2 不可导入时使用）
 - [python-os](https://docs.python.org/3/library/os.html) - 文件系统操作（os.makedirs, os.path）
 - [python-dataclasses](https://docs.python.org/3/library/dataclasses.html) - 数据类装饰器（@dataclass）
 
@@ -66,14 +73,16 @@
 - [./data_transformer.py](./data_transformer.py) - 数据转换模块（准备 ChartRequest）
 
 **调用方**:
-- **sql_agent.py**: 在生成图表时调用 generate_chart() 或 generate_chart_simple()
+- **sql_agent.py**: 在生成图表时调用 generate_chart() 或 generate_chart_simple()；call_mcp_chart_tool 通过 load_chart_renderer() 使用常驻 MCP 会话
 
 ## [POS]
 **路径**: Agent/chart_service.py
 **模块层级**: Level 1（Agent根目录）
-**依赖深度**: 直接依赖 2 层（pyecharts, snapshot-selenium）
+**依赖深度**: 直接依赖 2 层（pyecharts, AgentV2/tools/chart_renderer）
 """
 import os
+import sys
+from pathlib import Path
 from typing import List, Tuple, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
@@ -108,13 +117,49 @@ class ChartResponse:
     error: Optional[str] = None
 
 
+def load_chart_renderer():
+    """
+    导入 AgentV2 图表渲染模块（常驻浏览器池 / 常驻 MCP 会话 / 图片缓存）
+
+    容器内 / 已在 PYTHONPATH 中；单独运行 Agent 时把仓库根目录加入 sys.path。
+
+    Raises:
+        ImportError: AgentV2 不可导入
+    """
+    repo_root = Path(__file__).resolve().parent.parent
+    if (repo_root / "AgentV2").is_dir() and str(repo_root) not in sys.path:
+        sys.path.insert(0, str(repo_root))
+
+    from AgentV2.tools import chart_renderer
+    return chart_renderer
+
+
 def generate_chart(request: ChartRequest, output_dir: str = "./charts") -> ChartResponse:
     """
     生成图表并保存为 PNG
-    
-    这个函数模拟了 mcp-echarts 的 get-chart 工具
-    后续可以替换为真正的 MCP 调用
+
+    这个函数模拟了 mcp-echarts 的 get-chart 工具。
+    通过 AgentV2 的常驻浏览器池渲染，相同图表直接命中缓存；AgentV2 不可导入时退回 make_snapshot
     """
+    try:
+        renderer = load_chart_renderer().get_chart_renderer()
+        from AgentV2.chart_service import chart_request_to_option
+    except ImportError:
+        return _generate_chart_snapshot(request, output_dir)
+
+    try:
+        option = chart_request_to_option(request)
+    except (ValueError, IndexError, TypeError) as e:
+        return ChartResponse(success=False, error=f"图表数据无效: {e}")
+
+    result = renderer.render_many([option])[0]
+    if not result.ok:
+        return ChartResponse(success=False, error=result.error)
+    return ChartResponse(success=True, image_path=result.save(output_dir))
+
+
+def _generate_chart_snapshot(request: ChartRequest, output_dir: str) -> ChartResponse:
+    """每张图启动一次 Selenium 的 make_snapshot 渲染（AgentV2 不可用时的回退）"""
     try:
         # 延迟导入，避免未安装时报错
         from pyecharts.charts import Bar, Line, Pie, Scatter, Funnel
@@ -5,8 +5,9 @@
 **文件名**: sql_agent.py
 **职责**: 实现基于LangGraph和MCP的SQL智能查询代理 - 自然语言理解、Schema发现、SQL生成、图表可视化、多轮对话
 **作者**: Data Agent Team
-**版本**: 1.2.0
+**版本**: 1.3.0
 **变更记录**:
+- v1.3.0 (2026-10-16): call_mcp_chart_tool 复用 AgentV2 chart_renderer 的常驻 MCP 会话与结果缓存，不再每张图新建一次 SSE 会话
 - v1.2.0 (2026-01-06): 稳定性增强 - 动态时间上下文注入、JSON解析容错处理
 - v1.1.0 (2026-01-06): 安全增强 - 集成 SQLValidator 模块，增强 should_continue 错误重试逻辑
 - v1.0.1 (2026-01-02): 修复MCP echarts服务器URL配置（本地开发使用localhost）
@@ -50,7 +51,7 @@
 - [./sql_validator.py](./sql_validator.py) - SQL安全校验（SQLValidator, SQLValidationError）
 - [./terminal_viz.py](./terminal_viz.py) - 终端可视化（render_response）
 - [./data_transformer.py](./data_transformer.py) - 数据转换（sql_result_to_echarts_data, sql_result_to_mcp_echarts_data）
-- [./chart_service.py](./chart_service.py) - 图表服务（ChartRequest, generate_chart_simple, ChartResponse）
+- [./chart_service.py](./chart_service.py) - 图表服务（ChartRequest, generate_chart_simple, ChartResponse, load_chart_renderer）
 - [backend/src/app/services/agent/tools.py](../../backend/src/app/services/agent/tools.py) - 文件数据源工具（inspect_file, analyze_dataframe）
 
 **外部依赖**:
@@ -89,7 +90,7 @@ from config import config
 from models import VisualizationResponse, QueryResult, ChartConfig, ChartType
 from terminal_viz import render_response
 from data_transformer import sql_result_to_echarts_data, sql_result_to_mcp_echarts_data
-from chart_service import ChartRequest, generate_chart_simple, ChartResponse
+from chart_service import ChartRequest, generate_chart_simple, ChartResponse, load_chart_renderer
 
 # 🔍 错误追踪模块（质量保证）
 try:
@@ -1073,6 +1074,29 @@ async def call_mcp_chart_tool(tool_name: str, args: Dict[str, Any], output_dir:
     Returns:
         保存的图片路径，失败返回 None
     """
+    try:
+        client = load_chart_renderer().get_mcp_chart_client()
+    except ImportError:
+        return await _call_mcp_chart_tool_once(tool_name, args, output_dir)
+
+    # 常驻 SSE 会话 + 按工具参数缓存，不再每张图新建一次 MCP 会话
+    try:
+        payload = await client.call_tool(tool_name, args)
+    except Exception as e:
+        print(f"[MCP] Chart tool call failed: {e}")
+        return None
+
+    if payload is None:
+        return None
+    kind, value = payload
+    if kind == "url":
+        return value
+    # 保存 Base64 图片
+    return _save_base64_image(value, output_dir, "png")
+
+
+async def _call_mcp_chart_tool_once(tool_name: str, args: Dict[str, Any], output_dir: str) -> Optional[str]:
+    """单次 SSE 会话调用图表工具（AgentV2 不可导入时的回退）"""
     from mcp import ClientSession
     from mcp.client.sse import sse_client
 
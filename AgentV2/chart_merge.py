@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+ChartMerge - 本地图表合并引擎
+============================
+
+把多个已生成的 ECharts option 合并为一个多系列（必要时双Y轴）图表，
+替代把全部 option 序列化进提示词、再由 LLM 合并的做法，毫秒级返回且结果确定。
+
+核心功能:
+    - 系列提取: 支持 line / bar 系列，数据可以是 xAxis.data 对应的数值列表、
+      {"value": ...} 对象或 [x, y] 数值对（类别轴上数字 x 按类别下标解析，与 ECharts 一致）
+    - X轴对齐: 各图表X轴取有序并集，保持各图表自身的先后顺序；
+      先后无约束的类别按数值 / 自然顺序（"2月" < "10月"）排序，无法排序时按首次出现顺序；
+      某图表在并集中缺少的点填 null
+    - Y轴分配: 单位（轴名 / 系列名中的 "(元)"、formatter 中的 "{value}%"）恰好两种时按单位分轴；
+      否则量级差异超过阈值（should_use_dual_axis）时按量级分轴，
+      determine_y_axis_allocation 的关键词结果与量级一致时优先采用
+    - 系列类型: 双轴时左轴折线、右轴柱状（原图表已按轴区分类型时保留原类型），单轴时保留原类型
+    - 无法处理的结构（饼图、散点、横向柱状图、非数值数据、X轴完全不重合等）抛出 ChartMergeError，
+      调用方回退到 LLM 合并
+
+版本: 1.0.1
+作者: BMad Master
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .data_transformer import (
+    build_multi_series_echarts_config,
+    determine_y_axis_allocation,
+    should_use_dual_axis,
+)
+
+SUPPORTED_SERIES_TYPES = ("line", "bar")
+DUAL_AXIS_RATIO = 10.0
+
+_X_KEY = "__x__"
+_UNIT_IN_TEXT_RE = re.compile(r"[（(]\s*([^（()）]{1,10}?)\s*[)）]\s*$")
+_NUMBER_RE = re.compile(r"^[+-]?\d+(\.\d+)?$")
+_DIGITS_RE = re.compile(r"(\d+)")
+
+
+class ChartMergeError(Exception):
+    """图表结构无法在本地合并（调用方应回退到 LLM 合并）"""
+
+
+@dataclass
+class _Series:
+    """从源图表中提取出的单个系列"""
+    name: str
+    chart_type: str
+    points: Dict[str, Optional[float]]
+    unit: Optional[str] = None
+    source_title: str = ""
+
+    @property
+    def max_abs(self) -> float:
+        values = [abs(v) for v in self.points.values() if v is not None]
+        return max(values) if values else 0.0
+
+
+@dataclass
+class ChartMergeResult:
+    """合并结果"""
+    option: Dict[str, Any]
+    x_labels: List[str]
+    axis_series: List[List[str]] = field(default_factory=list)  # 每个Y轴上的系列名
+    reason: str = ""
+
+    @property
+    def dual_axis(self) -> bool:
+        return len(self.axis_series) > 1
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _to_number(value: Any) -> Optional[float]:
+    """转为数值，null / "-" / "" 视为缺失，其他非数值抛出 ChartMergeError"""
+    if value is None or value == "-" or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ChartMergeError(f"非数值数据: {value!r}")
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", ""))
+        except ValueError:
+            pass
+    raise ChartMergeError(f"非数值数据: {value!r}")
+
+
+def _label(value: Any) -> str:
+    # 1 与 1.0 视为同一类别
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _unit_from_text(text: Any) -> Optional[str]:
+    """从 "销售额(万元)" / "{value} %" 中提取单位"""
+    if not isinstance(text, str) or not text:
+        return None
+    if "{value}" in text:
+        return text.replace("{value}", "").strip() or None
+    match = _UNIT_IN_TEXT_RE.search(text)
+    return match.group(1) if match else None
+
+
+def _axis_unit(axis: Dict[str, Any]) -> Optional[str]:
+    if not isinstance(axis, dict):
+        return None
+    label = axis.get("axisLabel") or {}
+    formatter = label.get("formatter") if isinstance(label, dict) else None
+    return _unit_from_text(formatter) or _unit_from_text(axis.get("name"))
+
+
+def _pair_label(x: Any, categories: List[Any], category_axis: bool) -> str:
+    """数值对的X值 → X轴标签；类别轴上的数字 X 是类别下标（ECharts 语义）"""
+    is_index = (isinstance(x, int) and not isinstance(x, bool)) or (isinstance(x, float) and x.is_integer())
+    if not (category_axis and is_index):
+        return _label(x)
+    index = int(x)
+    if not 0 <= index < len(categories):
+        raise ChartMergeError(f"数值对的类别下标越界: {x!r}")
+    return _label(categories[index])
+
+
+def _series_points(data: List[Any], categories: List[Any], category_axis: bool = True) -> Dict[str, Optional[float]]:
+    """系列数据 → {X轴标签: 数值}（保持原顺序）"""
+    points: Dict[str, Optional[float]] = {}
+    for i, item in enumerate(data):
+        if isinstance(item, dict):
+            item = item.get("value")
+        if isinstance(item, (list, tuple)):
+            if len(item) < 2:
+                raise ChartMergeError("数值对格式不完整")
+            points[_pair_label(item[0], categories, category_axis)] = _to_number(item[1])
+        elif i < len(categories):
+            points[_label(categories[i])] = _to_number(item)
+        else:
+            raise ChartMergeError("系列数据多于X轴类别")
+    return points
+
+
+def extract_series(option: Dict[str, Any], source_title: str = "") -> Tuple[List[str], List[_Series]]:
+    """
+    提取单个 ECharts option 的X轴标签与系列
+
+    Returns:
+        (X轴标签（原顺序）, 系列列表)
+
+    Raises:
+        ChartMergeError: 图表结构不支持本地合并
+    """
+    if not isinstance(option, dict):
+        raise ChartMergeError("echarts_option 不是对象")
+
+    y_axes = [axis for axis in _as_list(option.get("yAxis")) if isinstance(axis, dict)]
+    if any(axis.get("type") == "category" for axis in y_axes):
+        raise ChartMergeError("不支持横向（类别Y轴）图表")
+    if option.get("dataset") is not None:
+        raise ChartMergeError("不支持 dataset 数据源")
+
+    x_axes = [axis for axis in _as_list(option.get("xAxis")) if isinstance(axis, dict)]
+    x_axis = x_axes[0] if x_axes else {}
+    categories = [
+        item.get("value") if isinstance(item, dict) else item
+        for item in _as_list(x_axis.get("data"))
+    ]
+    # xAxis 未指定 type 时 ECharts 默认为类别轴
+    category_axis = x_axis.get("type", "category") == "category"
+
+    series_list = _as_list(option.get("series"))
+    if not series_list:
+        raise ChartMergeError("图表没有系列数据")
+
+    labels: Dict[str, None] = {}
+    extracted = []
+    for index, raw in enumerate(series_list):
+        if not isinstance(raw, dict):
+            raise ChartMergeError("系列格式无效")
+        chart_type = raw.get("type", "line")
+        if chart_type not in SUPPORTED_SERIES_TYPES:
+            raise ChartMergeError(f"不支持的系列类型: {chart_type}")
+        if raw.get("xAxisIndex", 0) != 0:
+            raise ChartMergeError("不支持多X轴图表")
+
+        points = _series_points(_as_list(raw.get("data")), categories, category_axis)
+        labels.update(dict.fromkeys(points))
+
+        name = raw.get("name") or source_title or f"系列{index + 1}"
+        y_index = raw.get("yAxisIndex", 0)
+        y_axis = y_axes[y_index] if isinstance(y_index, int) and y_index < len(y_axes) else {}
+        unit = _axis_unit(y_axis) or _unit_from_text(name)
+        extracted.append(_Series(str(name), chart_type, points, unit, source_title))
+
+    # 没有数据的类别（xAxis.data 比系列长）也保留在X轴上
+    return list(dict.fromkeys([_label(c) for c in categories] + list(labels))), extracted
+
+
+def _sort_key(label: str) -> Tuple:
+    if _NUMBER_RE.match(label):
+        return (0, float(label))
+    # 自然顺序：数字段按数值比较，"2024-2" < "2024-10"，"2月" < "10月"
+    return (1, tuple((0, int(part), "") if part.isdigit() else (1, 0, part)
+                     for part in _DIGITS_RE.split(label) if part))
+
+
+def align_x_axis(label_lists: List[List[str]]) -> List[str]:
+    """
+    多个图表X轴标签的有序并集
+
+    各图表内部的先后顺序作为约束（拓扑排序），无约束的标签之间：
+    全部标签含数字时按数值 / 自然顺序，否则按首次出现顺序。
+    各图表顺序互相矛盾时退化为整体排序（或首次出现顺序）。
+    """
+    first_seen: Dict[str, int] = {}
+    for labels in label_lists:
+        for label in labels:
+            first_seen.setdefault(label, len(first_seen))
+    if len(label_lists) == 1 or all(labels == label_lists[0] for labels in label_lists):
+        return list(label_lists[0]) if label_lists else []
+
+    ordinal = all(_DIGITS_RE.search(label) for label in first_seen)
+    key = _sort_key if ordinal else first_seen.__getitem__
+
+    successors: Dict[str, set] = {label: set() for label in first_seen}
+    indegree = dict.fromkeys(first_seen, 0)
+    for labels in label_lists:
+        for before, after in zip(labels, labels[1:]):
+            if after not in successors[before]:
+                successors[before].add(after)
+                indegree[after] += 1
+
+    ready = sorted((label for label, degree in indegree.items() if degree == 0), key=key)
+    result = []
+    while ready:
+        label = ready.pop(0)
+        result.append(label)
+        for after in successors[label]:
+            indegree[after] -= 1
+            if indegree[after] == 0:
+                ready.append(after)
+        ready.sort(key=key)
+
+    if len(result) != len(first_seen):
+        return sorted(first_seen, key=key)
+    return result
+
+
+def _unique_names(series: List[_Series]) -> None:
+    """不同图表中的同名系列追加来源图表标题"""
+    counts: Dict[str, int] = {}
+    for s in series:
+        counts[s.name] = counts.get(s.name, 0) + 1
+    seen: Dict[str, int] = {}
+    for s in series:
+        if counts[s.name] > 1:
+            base = f"{s.name}（{s.source_title}）" if s.source_title else s.name
+            seen[base] = seen.get(base, 0) + 1
+            s.name = base if seen[base] == 1 else f"{base}{seen[base]}"
+
+
+def _allocate_axes(series: List[_Series], rows: List[Dict[str, Any]]) -> Tuple[Dict[str, int], str]:
+    """按单位与量级分配Y轴，返回 ({系列名: 0/1}, 原因)"""
+    names = [s.name for s in series]
+    maxima = {s.name: s.max_abs for s in series}
+
+    units = {s.unit for s in series}
+    if len(units) == 2 and None not in units:
+        unit_max = {unit: max(maxima[s.name] for s in series if s.unit == unit) for unit in units}
+        left_unit = max(units, key=lambda unit: unit_max[unit])
+        return {s.name: 0 if s.unit == left_unit else 1 for s in series}, f"按单位分轴（{'/'.join(sorted(units))}）"
+
+    dual = should_use_dual_axis(rows, [_X_KEY] + names, DUAL_AXIS_RATIO)
+    if not dual["need_dual"]:
+        return dict.fromkeys(names, 0), dual["reason"]
+
+    # 关键词分配（金额→左，数量→右）与量级一致时采用
+    hint = determine_y_axis_allocation({
+        s.name: [v for v in s.points.values() if v is not None] for s in series
+    })
+    left = [maxima[n] for n in names if hint.get(n) == 0]
+    right = [maxima[n] for n in names if hint.get(n) == 1]
+    if left and right and len(hint) == len(names) and min(left) >= max(right):
+        return hint, dual["reason"]
+
+    # 否则在量级（log10）差距最大处切分，大量级在左轴
+    ordered = sorted(names, key=lambda n: maxima[n], reverse=True)
+    logs = [math.log10(max(maxima[n], 1e-9)) for n in ordered]
+    split = max(range(1, len(ordered)), key=lambda i: logs[i - 1] - logs[i])
+    return {n: 0 if i < split else 1 for i, n in enumerate(ordered)}, dual["reason"]
+
+
+def _series_types(series: List[_Series], allocation: Dict[str, int]) -> Dict[str, str]:
+    if len(set(allocation.values())) < 2:
+        return {s.name: s.chart_type for s in series}
+    left_types = {s.chart_type for s in series if allocation[s.name] == 0}
+    right_types = {s.chart_type for s in series if allocation[s.name] == 1}
+    if not left_types & right_types:
+        return {s.name: s.chart_type for s in series}
+    return {s.name: "line" if allocation[s.name] == 0 else "bar" for s in series}
+
+
+def _axis_name(series: List[_Series]) -> str:
+    units = {s.unit for s in series}
+    if len(units) == 1 and None not in units:
+        return units.pop()
+    return "、".join(s.name for s in series)
+
+
+def merge_chart_options(chart_configs: List[Dict[str, Any]], title: Optional[str] = None) -> ChartMergeResult:
+    """
+    合并多个图表
+
+    Args:
+        chart_configs: [{"title": "...", "echarts_option": {...}}, ...]
+        title: 合并后图表标题，默认由各图表标题拼接
+
+    Returns:
+        ChartMergeResult
+
+    Raises:
+        ChartMergeError: 存在无法本地合并的图表结构
+    """
+    if not chart_configs:
+        raise ChartMergeError("没有需要合并的图表")
+
+    titles, label_lists, series = [], [], []
+    for i, config in enumerate(chart_configs):
+        if not isinstance(config, dict):
+            raise ChartMergeError("图表配置格式无效")
+        option = config.get("echarts_option")
+        option_title = option.get("title") if isinstance(option, dict) else None
+        if isinstance(option_title, dict):
+            option_title = option_title.get("text")
+        chart_title = config.get("title") or option_title or f"图表{i + 1}"
+        labels, chart_series = extract_series(option, chart_title)
+        titles.append(chart_title)
+        label_lists.append(labels)
+        series.extend(chart_series)
+
+    # X轴完全不重合时（如 "2024-01" 与 "1月"）无法按类别对齐
+    if len(label_lists) > 1:
+        for i, labels in enumerate(label_lists):
+            others = set().union(*(set(other) for j, other in enumerate(label_lists) if j != i))
+            if len(labels) > 1 and not others.intersection(labels):
+                raise ChartMergeError(f"图表 {titles[i]} 的X轴与其他图表没有共同类别")
+    if all(v is None for s in series for v in s.points.values()):
+        raise ChartMergeError("图表没有有效数值")
+
+    _unique_names(series)
+    x_labels = align_x_axis(label_lists)
+    rows = [{_X_KEY: label, **{s.name: s.points.get(label) for s in series}} for label in x_labels]
+
+    allocation, reason = _allocate_axes(series, rows)
+    types = _series_types(series, allocation)
+    axis_count = len(set(allocation.values()))
+    axis_names = {
+        axis: _axis_name([s for s in series if allocation[s.name] == axis]) for axis in range(axis_count)
+    }
+    series_config = [
+        {"column": s.name, "yAxisIndex": allocation[s.name], "type": types[s.name],
+         "unit": axis_names[allocation[s.name]]}
+        for s in series
+    ]
+
+    option = build_multi_series_echarts_config(
+        rows, _X_KEY, series_config, title or " vs ".join(dict.fromkeys(titles)), missing_value=None
+    )
+    return ChartMergeResult(
+        option=option,
+        x_labels=x_labels,
+        axis_series=[[s.name for s in series if allocation[s.name] == axis] for axis in range(axis_count)],
+        reason=reason,
+    )
@@ -3,11 +3,13 @@
 
 ## [HEADER]
 **文件名**: chart_service.py
-**职责**: 本地图表生成服务 - 使用 PyEcharts 模拟 MCP ECharts 服务，支持多种图表类型（柱状图、折线图、饼图、散点图、漏斗图）的生成，导出为 PNG/HTML 文件
+**职责**: 本地图表生成服务 - 模拟 MCP ECharts 服务，支持多种图表类型（柱状图、折线图、饼图、散点图、漏斗图）的生成，PNG 经 tools/chart_renderer 渲染，HTML 由 PyEcharts 生成
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.1
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 本地图表生成服务
+- v1.1.0 (2026-10-16): generate_chart 改用 chart_renderer（常驻浏览器池 / 纯 Python 光栅化 + 内容哈希缓存），不再每张图启动一次 Selenium；新增批量接口 generate_charts
+- v1.1.1 (2026-10-16): chart_renderer 去掉纯 Python 光栅化，PNG 只由常驻浏览器池渲染；Agent/chart_service.py 复用 chart_request_to_option
 
 ## [INPUT]
 ### generate_chart() 函数参数
@@ -20,6 +22,10 @@
   - y_axis_name: Optional[str] - Y轴名称（默认None）
 - **output_dir: str** - 输出目录路径（默认"./charts"）
 
+### generate_charts() 函数参数
+- **requests: List[ChartRequest]** - 图表请求列表
+- **output_dir: str** - 输出目录路径（默认"./charts"）
+
 ### generate_chart_simple() 函数参数
 - **request: ChartRequest** - 图表请求对象（同上）
 - **output_dir: str** - 输出目录路径（默认"./charts"）
@@ -51,13 +57,19 @@
   - success=True 时包含 image_path
   - success=False 时包含 error
 
+### generate_charts() 返回值
+- **List[ChartResponse]** - 与输入顺序一致，单张失败只影响对应结果
+
+### chart_request_to_option() 返回值
+- **Dict[str, Any]** - ChartRequest 对应的 ECharts option
+
 ### generate_chart_simple() 返回值
 - **ChartResponse** - 图表生成响应对象（仅生成HTML，无需selenium）
 
 ## [LINK]
 **上游依赖** (已读取源码):
 - [pyecharts](https://github.com/pyecharts/pyecharts) - Python ECharts 库（Bar, Line, Pie, Scatter, Funnel）
-- [snapshot-selenium](https://github.com/pyecharts/snapshot-selenium) - Selenium 快照库（make_snapshot, snapshot）
+- [./tools/chart_renderer.py](./tools/chart_renderer.py) - 图表 PNG 渲染服务（get_chart_renderer, render_many）
 - [python-os](https://docs.python.org/3/library/os.html) - 文件系统操作（os.makedirs, os.path）
 - [python-dataclasses](https://docs.python.org/3/library/dataclasses.html) - 数据类装饰器（@dataclass）
 
@@ -66,15 +78,16 @@
 - [./data_transformer.py](./data_transformer.py) - 数据转换模块（准备 ChartRequest）
 
 **调用方**:
-- **sql_agent.py**: 在生成图表时调用 generate_chart() 或 generate_chart_simple()
+- **sql_agent.py**: 在生成图表时调用 generate_chart() / generate_charts() 或 generate_chart_simple()
+- **Agent/chart_service.py**: generate_chart 使用 chart_request_to_option
 
 ## [POS]
 **路径**: Agent/chart_service.py
 **模块层级**: Level 1（Agent根目录）
-**依赖深度**: 直接依赖 2 层（pyecharts, snapshot-selenium）
+**依赖深度**: 直接依赖 2 层（pyecharts, tools/chart_renderer）
 """
 import os
-from typing import List, Tuple, Optional, Any
+from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 
@@ -108,92 +121,69 @@ class ChartResponse:
     error: Optional[str] = None
 
 
+def _get_renderer():
+    """图表渲染服务（包内导入或以 AgentV2 为工作目录运行时的顶层导入）"""
+    try:
+        from .tools.chart_renderer import get_chart_renderer
+    except ImportError:
+        from tools.chart_renderer import get_chart_renderer
+    return get_chart_renderer()
+
+
+def chart_request_to_option(request: ChartRequest) -> Dict[str, Any]:
+    """ChartRequest → ECharts option"""
+    labels = [item[0] for item in request.data]
+    values = [item[1] for item in request.data]
+    option: Dict[str, Any] = {"title": {"text": request.title}}
+
+    if request.type in (EChartType.PIE.value, EChartType.FUNNEL.value):
+        series = {"name": request.series_name, "type": request.type,
+                  "data": [{"name": label, "value": value} for label, value in zip(labels, values)]}
+        if request.type == EChartType.PIE.value:
+            series["label"] = {"formatter": "{b}: {d}%"}
+        option["series"] = [series]
+    elif request.type in (EChartType.BAR.value, EChartType.LINE.value, EChartType.SCATTER.value):
+        option["xAxis"] = {"type": "category", "data": labels, "name": request.x_axis_name}
+        option["yAxis"] = {"type": "value", "name": request.y_axis_name}
+        option["series"] = [{"name": request.series_name, "type": request.type, "data": values}]
+    else:
+        raise ValueError(f"不支持的图表类型: {request.type}")
+    return option
+
+
 def generate_chart(request: ChartRequest, output_dir: str = "./charts") -> ChartResponse:
     """
     生成图表并保存为 PNG
-    
-    这个函数模拟了 mcp-echarts 的 get-chart 工具
-    后续可以替换为真正的 MCP 调用
+
+    这个函数模拟了 mcp-echarts 的 get-chart 工具。
+    通过 tools/chart_renderer 的常驻浏览器池渲染，相同图表直接命中缓存
     """
+    return generate_charts([request], output_dir)[0]
+
+
+def generate_charts(requests: List[ChartRequest], output_dir: str = "./charts") -> List[ChartResponse]:
+    """批量生成图表 PNG（相同图表只渲染一次，浏览器池上并发渲染），结果与输入顺序一致"""
     try:
-        # 延迟导入，避免未安装时报错
-        from pyecharts.charts import Bar, Line, Pie, Scatter, Funnel
-        from pyecharts import options as opts
-        from pyecharts.render import make_snapshot
-        from snapshot_selenium import snapshot
-        
-        # 确保输出目录存在
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 解析数据
-        labels = [item[0] for item in request.data]
-        values = [item[1] for item in request.data]
-        
-        # 根据类型创建图表
-        chart = None
-        
-        if request.type == "bar":
-            chart = (
-                Bar()
-                .add_xaxis(labels)
-                .add_yaxis(request.series_name, values)
-                .set_global_opts(
-                    title_opts=opts.TitleOpts(title=request.title),
-                    xaxis_opts=opts.AxisOpts(name=request.x_axis_name),
-                    yaxis_opts=opts.AxisOpts(name=request.y_axis_name),
-                )
-            )
-        elif request.type == "line":
-            chart = (
-                Line()
-                .add_xaxis(labels)
-                .add_yaxis(request.series_name, values)
-                .set_global_opts(
-                    title_opts=opts.TitleOpts(title=request.title),
-                    xaxis_opts=opts.AxisOpts(name=request.x_axis_name),
-                    yaxis_opts=opts.AxisOpts(name=request.y_axis_name),
-                )
-            )
-        elif request.type == "pie":
-            chart = (
-                Pie()
-                .add(request.series_name, list(zip(labels, values)))
-                .set_global_opts(title_opts=opts.TitleOpts(title=request.title))
-                .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {d}%"))
-            )
-        elif request.type == "scatter":
-            chart = (
-                Scatter()
-                .add_xaxis(labels)
-                .add_yaxis(request.series_name, values)
-                .set_global_opts(title_opts=opts.TitleOpts(title=request.title))
-            )
-        elif request.type == "funnel":
-            chart = (
-                Funnel()
-                .add(request.series_name, list(zip(labels, values)))
-                .set_global_opts(title_opts=opts.TitleOpts(title=request.title))
-            )
-        else:
-            return ChartResponse(success=False, error=f"不支持的图表类型: {request.type}")
-        
-        # 生成文件名
-        import time
-        filename = f"chart_{request.type}_{int(time.time())}.png"
-        filepath = os.path.join(output_dir, filename)
-        
-        # 渲染为 PNG（需要 selenium + chromedriver）
-        make_snapshot(snapshot, chart.render(), filepath)
-        
-        return ChartResponse(success=True, image_path=filepath)
-        
+        renderer = _get_renderer()
     except ImportError as e:
-        return ChartResponse(
-            success=False, 
-            error=f"缺少依赖: {e}. 请运行: pip install pyecharts snapshot-selenium"
-        )
-    except Exception as e:
-        return ChartResponse(success=False, error=str(e))
+        return [ChartResponse(success=False, error=f"缺少依赖: {e}") for _ in requests]
+
+    responses: List[Optional[ChartResponse]] = [None] * len(requests)
+    options, positions = [], []
+    for i, request in enumerate(requests):
+        try:
+            options.append(chart_request_to_option(request))
+            positions.append(i)
+        except (ValueError, IndexError, TypeError) as e:
+            responses[i] = ChartResponse(success=False, error=f"图表数据无效: {e}")
+
+    # 单张图表失败只体现在对应结果的 error 中
+    for i, result in zip(positions, renderer.render_many(options)):
+        if result.ok:
+            responses[i] = ChartResponse(success=True, image_path=result.save(output_dir))
+        else:
+            responses[i] = ChartResponse(success=False, error=result.error)
+    return responses
 
 
 def generate_chart_simple(request: ChartRequest, output_dir: str = "./charts") -> ChartResponse:
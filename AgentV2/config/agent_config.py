@@ -88,6 +88,14 @@ class MiddlewareConfig:
     enable_xai_logging: bool = False
 
 
+@dataclass
+class AgentPoolConfig:
+    """已编译 Agent 池配置"""
+    max_agents: int = 64  # 池中最多保留的 Agent 数量
+    idle_ttl_seconds: int = 1800  # 空闲超过该时间的 Agent 被淘汰
+    max_memory_mb: int = 512  # 池内 Agent 估算内存上限
+
+
 @dataclass
 class AgentConfig:
     """
@@ -98,12 +106,14 @@ class AgentConfig:
     - database: 数据库配置
     - mcp: MCP 服务器配置
     - middleware: 中间件配置
+    - agent_pool: Agent 池配置
     """
 
     llm: LLMConfig = field(default_factory=LLMConfig)
     database: DatabaseConfig = field(default_factory=DatabaseConfig)
     mcp: MCPConfig = field(default_factory=MCPConfig)
     middleware: MiddlewareConfig = field(default_factory=MiddlewareConfig)
+    agent_pool: AgentPoolConfig = field(default_factory=AgentPoolConfig)
 
     # 租户配置
     default_tenant_id: str = "default_tenant"
@@ -139,6 +149,14 @@ def load_config_from_env() -> AgentConfig:
     if db_url := os.environ.get("DATABASE_URL"):
         config.database.url = db_url
 
+    # Agent 池配置
+    if max_agents := os.environ.get("AGENT_POOL_MAX_AGENTS"):
+        config.agent_pool.max_agents = int(max_agents)
+    if idle_ttl := os.environ.get("AGENT_POOL_IDLE_TTL"):
+        config.agent_pool.idle_ttl_seconds = int(idle_ttl)
+    if max_memory := os.environ.get("AGENT_POOL_MAX_MEMORY_MB"):
+        config.agent_pool.max_memory_mb = int(max_memory)
+
     # 租户配置
     if tenant_id := os.environ.get("DEFAULT_TENANT_ID"):
         config.default_tenant_id = tenant_id
@@ -8,11 +8,20 @@ DeepAgents-based data analysis agent core.
 Exports:
     - AgentFactory: Factory for creating DeepAgents instances
     - create_agent: Convenience function for quick agent creation
+    - AgentPool: Bounded pool of compiled agents (LRU / idle TTL / memory budget)
+    - invalidate_agents: Drop pooled agents for a tenant or data source connection
     - ResponseCache: Agent response caching
 """
 
 from .agent_factory import AgentFactory as AgentFactoryV1
-from .agent_factory_v2 import AgentFactory, create_agent, get_default_factory
+from .agent_factory_v2 import (
+    AgentFactory,
+    create_agent,
+    get_default_factory,
+    invalidate_agents,
+    get_agent_pool_stats,
+)
+from .agent_pool import AgentPool, PooledAgent
 from .response_cache import ResponseCache, get_response_cache, get_cache_stats
 
 __all__ = [
@@ -20,6 +29,10 @@ __all__ = [
     "AgentFactoryV1",
     "create_agent",
     "get_default_factory",
+    "invalidate_agents",
+    "get_agent_pool_stats",
+    "AgentPool",
+    "PooledAgent",
     "ResponseCache",
     "get_response_cache",
     "get_cache_stats",
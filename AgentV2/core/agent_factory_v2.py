@@ -7,16 +7,18 @@ AgentFactory V2 - DeepAgents 工厂类 (完整版)
 
 核心功能:
     - create_agent(): 创建新的 DeepAgents 实例
-    - get_or_create_agent(): 单例模式获取或创建 Agent
+    - get_or_create_agent(): 从 Agent 池获取或创建 Agent
     - 租户隔离支持
     - SubAgent 集成
+    - 有界 Agent 池（LRU + 空闲 TTL + 内存估算），按连接 / 提示词版本失效
 
-版本: 2.0.0
+版本: 2.1.1
 作者: BMad Master
 """
 
+import hashlib
 import os
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 # DeepAgents imports
 from deepagents import create_deep_agent
@@ -38,7 +40,14 @@ from ..middleware import (
     CHART_GUIDANCE_TEMPLATE
 )
 from ..subagents import SubAgentManager, create_subagent_manager
-from ..tools import get_database_tools
+from ..tools import get_database_tools, ToolContext
+from .agent_pool import AgentPool, PooledAgent
+
+# 系统提示词版本：修改 _build_system_prompt 中的提示词时递增，池中旧版本 Agent 随之失效
+SYSTEM_PROMPT_VERSION = "2.1.0"
+
+# 单个已编译 Agent（图 + 中间件 + 工具）的基础内存估算，系统提示词长度另计
+_AGENT_BASE_BYTES = 2 * 1024 * 1024
 
 # ============================================================================
 # AgentFactory
@@ -56,7 +65,7 @@ class AgentFactory:
     """
 
     # 类级别缓存
-    _cached_agents: Dict[str, Any] = {}
+    _agent_pool: Optional[AgentPool] = None
     _cached_llm: Optional[BaseChatModel] = None
 
     def __init__(
@@ -103,6 +112,29 @@ class AgentFactory:
         self._connection_id: Optional[str] = None
         self._db_session: Optional[Any] = None
 
+    @classmethod
+    def get_agent_pool(cls) -> AgentPool:
+        """获取类级别的 Agent 池（按 V2 配置创建）"""
+        if AgentFactory._agent_pool is None:
+            pool_config = v2_config.get_config().agent_pool
+            AgentFactory._agent_pool = AgentPool(
+                max_agents=pool_config.max_agents,
+                idle_ttl_seconds=pool_config.idle_ttl_seconds,
+                max_memory_bytes=pool_config.max_memory_mb * 1024 * 1024
+            )
+        return AgentFactory._agent_pool
+
+    @property
+    def prompt_version(self) -> str:
+        """当前提示词版本（提示词模板或影响提示词的配置变化时改变）"""
+        parts = [
+            SYSTEM_PROMPT_VERSION,
+            self.model,
+            str(self.enable_chart_guidance),
+            CHART_GUIDANCE_TEMPLATE if self.enable_chart_guidance else "",
+        ]
+        return hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
     @property
     def subagent_manager(self) -> SubAgentManager:
         """获取或创建 SubAgent 管理器"""
@@ -155,7 +187,8 @@ class AgentFactory:
         self,
         connection_id: Optional[str] = None,
         db_session: Optional[Any] = None,
-        tenant_id: Optional[str] = None
+        tenant_id: Optional[str] = None,
+        tool_context: Optional[ToolContext] = None
     ) -> List[BaseTool]:
         """
         构建工具列表
@@ -164,6 +197,7 @@ class AgentFactory:
             connection_id: 数据源连接 ID
             db_session: 数据库会话（用于查询数据源配置）
             tenant_id: 租户 ID
+            tool_context: 工具运行时上下文（池化时由并发请求共享，只含连接与租户）
 
         Returns:
             工具列表
@@ -175,7 +209,8 @@ class AgentFactory:
             db_tools = get_database_tools(
                 connection_id=connection_id,
                 db_session=db_session,
-                tenant_id=tenant_id
+                tenant_id=tenant_id,
+                context=tool_context
             )
             tools.extend(db_tools)
         except Exception as e:
@@ -257,7 +292,8 @@ class AgentFactory:
         tools: Optional[List[BaseTool]] = None,
         system_prompt: Optional[str] = None,
         connection_id: Optional[str] = None,
-        db_session: Optional[Any] = None
+        db_session: Optional[Any] = None,
+        tool_context: Optional[ToolContext] = None
     ):
         """
         创建 Data Agent V2 实例
@@ -270,10 +306,35 @@ class AgentFactory:
             system_prompt: 自定义系统提示
             connection_id: 数据源连接 ID
             db_session: 数据库会话（用于查询数据源配置）
+            tool_context: 工具运行时上下文（池化时由并发请求共享，只含连接与租户）
 
         Returns:
             DeepAgents 实例
         """
+        agent, _ = self._create_agent(
+            tenant_id=tenant_id,
+            user_id=user_id,
+            session_id=session_id,
+            tools=tools,
+            system_prompt=system_prompt,
+            connection_id=connection_id,
+            db_session=db_session,
+            tool_context=tool_context
+        )
+        return agent
+
+    def _create_agent(
+        self,
+        tenant_id: str,
+        user_id: Optional[str],
+        session_id: Optional[str],
+        tools: Optional[List[BaseTool]],
+        system_prompt: Optional[str],
+        connection_id: Optional[str],
+        db_session: Optional[Any],
+        tool_context: Optional[ToolContext]
+    ) -> Tuple[Any, str]:
+        """创建 Agent，同时返回最终使用的系统提示词（用于池内存估算）"""
         # 创建 LLM
         llm = self.create_llm()
 
@@ -282,7 +343,8 @@ class AgentFactory:
             tools = self._build_tools(
                 connection_id=connection_id,
                 db_session=db_session,
-                tenant_id=tenant_id
+                tenant_id=tenant_id,
+                tool_context=tool_context
             )
 
         # 构建中间件
@@ -323,7 +385,7 @@ class AgentFactory:
             system_prompt=system_prompt
         )
 
-        return agent
+        return agent, system_prompt
 
     def _build_system_prompt(
         self,
@@ -669,16 +731,21 @@ Remember: 60-90 seconds per retry. Get it right the first time!
         db_session: Optional[Any] = None
     ):
         """
-        获取或创建 Agent (单例模式)
+        从 Agent 池获取或创建 Agent
+
+        同一会话复用已编译的 Agent（池内状态不随请求修改）；
+        提示词版本变化、数据源连接变更（invalidate_agents）或空闲过期时重建。
+        db_session 只用于本次创建；执行 Agent 前调用方须以 bind_db_session(db_session)
+        在请求自己的上下文中绑定会话，并发复用同一 Agent 的请求互不影响。
 
         Args:
             tenant_id: 租户 ID
             user_id: 用户 ID
             session_id: 会话 ID
             tools: 可用的工具列表
-            force_refresh: 是否强制刷新
+            force_refresh: 是否强制重建
             connection_id: 数据源连接 ID
-            db_session: 数据库会话（用于查询数据源配置）
+            db_session: 数据库会话（创建时用于查询数据源配置）
 
         Returns:
             DeepAgents 实例
@@ -690,29 +757,41 @@ Remember: 60-90 seconds per retry. Get it right the first time!
         # 缓存键包含 connection_id 以支持不同数据源
         cache_key = f"{tenant_id}_{user_id or 'none'}_{session_id or 'none'}_{connection_id or 'default'}"
 
-        if force_refresh or cache_key not in self._cached_agents:
-            self._cached_agents[cache_key] = self.create_agent(
-                tenant_id=tenant_id,
-                user_id=user_id,
-                session_id=session_id,
-                tools=tools,
-                connection_id=connection_id,
-                db_session=db_session
-            )
+        pool = self.get_agent_pool()
+        prompt_version = self.prompt_version
+
+        entry = None if force_refresh else pool.get(cache_key, prompt_version)
+        if entry is not None:
+            return entry.agent
 
-        return self._cached_agents[cache_key]
+        # 池化共享的上下文不保存会话（会话由请求经 bind_db_session 绑定）
+        tool_context = ToolContext(connection_id, None, tenant_id) if tools is None else None
+        agent, system_prompt = self._create_agent(
+            tenant_id=tenant_id,
+            user_id=user_id,
+            session_id=session_id,
+            tools=tools,
+            system_prompt=None,
+            connection_id=connection_id,
+            db_session=db_session,
+            tool_context=tool_context
+        )
+        pool.put(cache_key, PooledAgent(
+            agent=agent,
+            tenant_id=tenant_id,
+            connection_id=connection_id,
+            prompt_version=prompt_version,
+            estimated_bytes=_AGENT_BASE_BYTES + len(system_prompt.encode("utf-8")),
+            context=tool_context
+        ))
+        return agent
 
     def reset_cache(self, tenant_id: Optional[str] = None):
         """重置 Agent 缓存"""
         if tenant_id is None:
-            self._cached_agents.clear()
+            self.get_agent_pool().clear()
         else:
-            keys_to_remove = [
-                k for k in self._cached_agents.keys()
-                if k.startswith(tenant_id)
-            ]
-            for key in keys_to_remove:
-                del self._cached_agents[key]
+            self.get_agent_pool().invalidate(tenant_id=tenant_id)
 
     def setup_default_subagents(
         self,
@@ -750,6 +829,31 @@ def get_default_factory() -> AgentFactory:
     return _default_factory
 
 
+def invalidate_agents(
+    tenant_id: Optional[str] = None,
+    connection_id: Optional[str] = None
+) -> int:
+    """
+    使池中的 Agent 失效（数据源连接更新 / 删除时调用）
+
+    Args:
+        tenant_id: 租户 ID
+        connection_id: 数据源连接 ID
+
+    Returns:
+        失效的 Agent 数量
+    """
+    return AgentFactory.get_agent_pool().invalidate(
+        tenant_id=tenant_id,
+        connection_id=connection_id
+    )
+
+
+def get_agent_pool_stats() -> Dict[str, Any]:
+    """获取 Agent 池统计信息"""
+    return AgentFactory.get_agent_pool().get_stats()
+
+
 def create_agent(
     tenant_id: str = "default_tenant",
     user_id: Optional[str] = None,
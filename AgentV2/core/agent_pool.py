@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+AgentPool - 已编译 Agent 池
+==========================
+
+缓存已编译的 DeepAgent 图，避免每次请求重建图、中间件和系统提示词。
+
+核心功能:
+    - LRU 淘汰: 超过数量上限时淘汰最久未使用的 Agent
+    - 空闲 TTL: 长时间未使用的 Agent 自动淘汰
+    - 内存估算: 按条目估算字节数，超过预算时按 LRU 淘汰
+    - 失效钩子: 按租户 / 数据源连接 / 提示词版本失效
+
+版本: 1.0.1
+作者: BMad Master
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+# ============================================================================
+# 池条目
+# ============================================================================
+
+@dataclass
+class PooledAgent:
+    """池中的一个已编译 Agent"""
+    agent: Any
+    tenant_id: str
+    connection_id: Optional[str]
+    prompt_version: str
+    estimated_bytes: int
+    context: Any = None  # 工具的 ToolContext（只含连接与租户，并发请求共享，不可写入请求级状态）
+    created_at: float = field(default_factory=time.time)
+    last_used_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+# ============================================================================
+# AgentPool
+# ============================================================================
+
+class AgentPool:
+    """
+    有界的已编译 Agent 池（线程安全）
+
+    淘汰顺序: 过期（空闲 TTL）→ 数量上限 → 内存预算，后两者按 LRU。
+    """
+
+    def __init__(
+        self,
+        max_agents: int = 64,
+        idle_ttl_seconds: float = 1800,
+        max_memory_bytes: int = 512 * 1024 * 1024
+    ):
+        """
+        初始化 Agent 池
+
+        Args:
+            max_agents: 最多保留的 Agent 数量
+            idle_ttl_seconds: 空闲淘汰时间（秒）
+            max_memory_bytes: 估算内存上限（字节）
+        """
+        self.max_agents = max_agents
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self._entries: "OrderedDict[str, PooledAgent]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._memory_bytes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key: str, prompt_version: Optional[str] = None) -> Optional[PooledAgent]:
+        """
+        获取 Agent（命中时移到 LRU 末尾）
+
+        Args:
+            key: 缓存键
+            prompt_version: 当前提示词版本，与条目不一致时视为失效
+
+        Returns:
+            池条目，未命中返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            now = time.time()
+            if now - entry.last_used_at > self.idle_ttl_seconds:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            if prompt_version is not None and entry.prompt_version != prompt_version:
+                self._remove(key)
+                self._stats["invalidations"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            entry.last_used_at = now
+            entry.hits += 1
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, key: str, entry: PooledAgent) -> None:
+        """放入 Agent，并按需淘汰"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._memory_bytes += entry.estimated_bytes
+            self._evict()
+
+    def invalidate(
+        self,
+        tenant_id: Optional[str] = None,
+        connection_id: Optional[str] = None,
+        predicate: Optional[Callable[[PooledAgent], bool]] = None
+    ) -> int:
+        """
+        按条件失效 Agent（条件之间为 AND，全部为空时清空整个池）
+
+        Args:
+            tenant_id: 租户 ID
+            connection_id: 数据源连接 ID
+            predicate: 自定义匹配函数
+
+        Returns:
+            失效的条目数
+        """
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if (tenant_id is None or entry.tenant_id == tenant_id)
+                and (connection_id is None or entry.connection_id == connection_id)
+                and (predicate is None or predicate(entry))
+            ]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """清空池"""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取池统计信息"""
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_agents": self.max_agents,
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "hit_rate": self._stats["hits"] / total if total else 0.0,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.estimated_bytes
+
+    def _evict(self) -> None:
+        now = time.time()
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry.last_used_at > self.idle_ttl_seconds
+        ]
+        for key in expired:
+            self._remove(key)
+        self._stats["expirations"] += len(expired)
+
+        # 至少保留刚放入的条目
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_agents
+            or self._memory_bytes > self.max_memory_bytes
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._stats["evictions"] += 1
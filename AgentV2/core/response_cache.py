@@ -9,7 +9,8 @@ Agent Response Cache - Agent 响应缓存
     - 基于查询内容的智能缓存
     - 支持 tenant_id 隔离
     - TTL 过期机制
-    - 缓存统计
+    - 有界 LRU（条目数 + 字节预算，O(1) 淘汰）
+    - 按租户统计与失效（租户代数 + 命名空间索引）
 
 使用场景:
     - 相同的自然语言查询
@@ -17,15 +18,16 @@ Agent Response Cache - Agent 响应缓存
     - 减少重复的 LLM API 调用
 
 作者: BMad Master
-版本: 1.0.0
+版本: 1.2.0
 """
 
 import hashlib
 import json
-import time
 import logging
 from typing import Optional, Dict, Any, List
 
+from ..tools.lru_cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -40,20 +42,26 @@ class ResponseCache:
         - subagent_calls (子代理调用)
     """
 
-    def __init__(self, ttl: int = 300, max_size: int = 1000):
+    def __init__(self, ttl: int = 300, max_size: int = 1000, max_bytes: Optional[int] = 64 * 1024 * 1024):
         """
         初始化响应缓存
 
         Args:
             ttl: 缓存过期时间（秒），默认 5 分钟
             max_size: 最大缓存条目数
+            max_bytes: 按估算大小计的字节预算，默认 64MB
         """
-        self._cache: Dict[str, tuple] = {}  # key -> (value, expire_time, metadata)
+        self._cache = LRUCache(
+            name="response_cache",
+            max_entries=max_size,
+            max_bytes=max_bytes,
+            default_ttl=ttl,
+        )
         self.ttl = ttl
         self.max_size = max_size
-        self._hits = 0
-        self._misses = 0
-        self._evictions = 0
+        self.max_bytes = max_bytes
+        # 租户代数：写入键中，invalidate_tenant 递增后旧键立即不可达
+        self._generations: Dict[str, int] = {}
 
     def _make_key(
         self,
@@ -81,6 +89,7 @@ class ResponseCache:
         key_data = {
             "query": normalized_query,
             "tenant_id": tenant_id,
+            "generation": self._generations.get(tenant_id, 0),
             "connection_id": connection_id,
             # 只包含上下文的关键信息，避免数据源列表影响缓存
             "has_data_sources": bool(context and context.get("data_sources")),
@@ -110,18 +119,11 @@ class ResponseCache:
         """
         key = self._make_key(query, tenant_id, connection_id, context)
 
-        if key in self._cache:
-            value, expire_time, metadata = self._cache[key]
-            if time.time() < expire_time:
-                self._hits += 1
-                logger.info(f"Response cache HIT: query='{query[:30]}...', tenant={tenant_id}")
-                return value
-            else:
-                # 缓存过期，删除
-                del self._cache[key]
-                logger.info(f"Response cache EXPIRED: query='{query[:30]}...'")
-
-        self._misses += 1
+        value = self._cache.get(key, namespace=tenant_id)
+        if value is not None:
+            logger.info(f"Response cache HIT: query='{query[:30]}...', tenant={tenant_id}")
+            return value
+
         logger.info(f"Response cache MISS: query='{query[:30]}...', tenant={tenant_id}")
         return None
 
@@ -143,58 +145,32 @@ class ResponseCache:
             connection_id: 连接 ID
             context: 上下文信息
         """
-        # 检查缓存大小限制
-        if len(self._cache) >= self.max_size:
-            self._evict_oldest()
-
+        # 超出条目数或字节预算时由 LRUCache 淘汰最久未使用的条目
         key = self._make_key(query, tenant_id, connection_id, context)
-        expire_time = time.time() + self.ttl
-
-        # 元数据
-        metadata = {
-            "query_length": len(query),
-            "response_length": len(json.dumps(response, default=str)),
-            "cached_at": time.time(),
-            "has_chart": bool(response.get("chart_config")),
-        }
-
-        self._cache[key] = (response, expire_time, metadata)
-        logger.info(f"Response cached: query='{query[:30]}...', tenant={tenant_id}")
-
-    def _evict_oldest(self) -> None:
-        """淘汰最旧的缓存条目"""
-        if not self._cache:
-            return
-
-        oldest_key = min(
-            self._cache.keys(),
-            key=lambda k: self._cache[k][2]["cached_at"]
-        )
-        del self._cache[oldest_key]
-        self._evictions += 1
-        logger.info(f"Cache eviction: removed oldest entry")
+        if self._cache.set(key, response, namespace=tenant_id):
+            logger.info(f"Response cached: query='{query[:30]}...', tenant={tenant_id}")
 
     def clear(self) -> None:
         """清空缓存"""
-        self._cache.clear()
-        self._hits = 0
-        self._misses = 0
-        self._evictions = 0
+        self._cache.clear(reset_stats=True)
         logger.info("Response cache cleared")
 
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计"""
-        total_requests = self._hits + self._misses
-        hit_rate = self._hits / total_requests if total_requests > 0 else 0
+        stats = self._cache.get_stats()
 
         return {
-            "size": len(self._cache),
+            "size": stats["entries"],
             "max_size": self.max_size,
-            "hits": self._hits,
-            "misses": self._misses,
-            "evictions": self._evictions,
-            "hit_rate": hit_rate,
+            "bytes": stats["bytes"],
+            "max_bytes": self.max_bytes,
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+            "hit_rate": stats["hit_rate"],
             "ttl": self.ttl,
+            "tenants": stats["namespaces"],
         }
 
     def invalidate_tenant(self, tenant_id: str) -> int:
@@ -207,20 +183,12 @@ class ResponseCache:
         Returns:
             删除的缓存条目数
         """
-        # 由于缓存键包含 tenant_id，我们需要重建缓存
-        # 这是一个简单的实现，可能不是最高效的
-        count = 0
-        keys_to_remove = []
-
-        for key in self._cache:
-            # 从键中提取租户信息 (需要重新生成)
-            # 这里使用一个简化的方法：记录所有键并在清除时重建
-            keys_to_remove.append(key)
-
-        # 注意：这个实现不完整，因为无法从键反推租户ID
-        # 实际使用时可能需要维护一个租户到键的映射
-        logger.warning(f"Tenant invalidation not fully implemented for tenant={tenant_id}")
-        return 0
+        # 与 backend RedisCache 相同：先递增租户代数（O(1)，并发写入的旧代条目也不会再命中），
+        # 再按命名空间索引释放该租户的条目，不遍历其他租户
+        self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+        count = self._cache.clear_namespace(tenant_id)
+        logger.info(f"Response cache invalidated: tenant={tenant_id}, removed={count}")
+        return count
 
 
 # 全局响应缓存实例
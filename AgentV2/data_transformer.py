@@ -5,9 +5,10 @@
 **文件名**: data_transformer.py
 **职责**: 将SQL查询结果转换为ECharts图表数据格式 - 支持二维数组格式和MCP ECharts格式，自动推断图表类型，智能字段映射
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - SQL结果数据转换
+- v1.1.0 (2026-10-16): build_multi_series_echarts_config 新增 missing_value，供 chart_merge 合并图表时保留缺失点
 
 ## [INPUT]
 ### sql_result_to_echarts_data() 函数参数
@@ -69,6 +70,7 @@
 
 **调用方**:
 - **sql_agent.py**: 在extract_tool_data()和build_visualization_response()中调用数据转换函数
+- **chart_merge.py**: 本地图表合并引擎，调用 should_use_dual_axis / determine_y_axis_allocation / build_multi_series_echarts_config
 
 ## [POS]
 **路径**: Agent/data_transformer.py
@@ -426,7 +428,8 @@ def build_multi_series_echarts_config(
     data: List[Dict[str, Any]],
     x_column: str,
     series_config: List[Dict[str, Any]],
-    title: str = "数据可视化"
+    title: str = "数据可视化",
+    missing_value: Optional[float] = 0
 ) -> Dict[str, Any]:
     """
     构建多系列双Y轴 ECharts 配置
@@ -437,6 +440,7 @@ def build_multi_series_echarts_config(
         series_config: 系列配置列表
             [{"column": "sales", "yAxisIndex": 0, "type": "line", "unit": "元"}]
         title: 图表标题
+        missing_value: 缺失值（None / 非数值）的填充值，传 None 时保留为 null（ECharts 显示为断点）
 
     Returns:
         完整的 ECharts option 配置
@@ -456,11 +460,11 @@ def build_multi_series_echarts_config(
         # 提取系列数据
         series_data = []
         for row in data:
-            val = row.get(col, 0)
+            val = row.get(col)
             try:
-                series_data.append(float(val) if val is not None else 0)
+                series_data.append(float(val) if val is not None else missing_value)
             except (ValueError, TypeError):
-                series_data.append(0)
+                series_data.append(missing_value)
 
         # 记录Y轴单位
         unit = config.get("unit", "")
@@ -93,7 +93,7 @@ class SQLSecurityMiddleware(AgentMiddleware):
 
         Args:
             strict_mode: 严格模式，拒绝任何不安全的查询
-            allow_limitless: 允许无 LIMIT 的查询
+            allow_limitless: 允许无 LIMIT 的查询（行数上限由 query_guard 在执行时保证）
             log_violations: 记录安全违规
         """
         self.strict_mode = strict_mode
@@ -158,6 +158,8 @@ class SQLSecurityMiddleware(AgentMiddleware):
                 )
 
         # 5. 可选：强制 LIMIT 检查 (防止内存溢出)
+        #    默认关闭：execute_query 的查询保护（tools/query_guard.py）会自动补 LIMIT 并有界读取，
+        #    无需让 LLM 因缺少 LIMIT 重新生成 SQL
         if not self.allow_limitless:
             if "LIMIT" not in sql_upper and "COUNT(" not in sql_upper:
                 return False, (
@@ -5,8 +5,9 @@
 **文件名**: sql_agent.py
 **职责**: 实现基于LangGraph和MCP的SQL智能查询代理 - 自然语言理解、Schema发现、SQL生成、图表可视化、多轮对话
 **作者**: Data Agent Team
-**版本**: 1.2.0
+**版本**: 1.3.0
 **变更记录**:
+- v1.3.0 (2026-10-16): call_mcp_chart_tool 复用常驻 mcp-echarts 会话（tools/chart_renderer），相同图表参数直接命中缓存
 - v1.2.0 (2026-01-06): 稳定性增强 - 动态时间上下文注入、JSON解析容错处理
 - v1.1.0 (2026-01-06): 安全增强 - 集成 SQLValidator 模块，增强 should_continue 错误重试逻辑
 - v1.0.1 (2026-01-02): 修复MCP echarts服务器URL配置（本地开发使用localhost）
@@ -51,6 +52,7 @@
 - [./terminal_viz.py](./terminal_viz.py) - 终端可视化（render_response）
 - [./data_transformer.py](./data_transformer.py) - 数据转换（sql_result_to_echarts_data, sql_result_to_mcp_echarts_data）
 - [./chart_service.py](./chart_service.py) - 图表服务（ChartRequest, generate_chart_simple, ChartResponse）
+- [./tools/chart_renderer.py](./tools/chart_renderer.py) - mcp-echarts 常驻会话与图片缓存（get_mcp_chart_client）
 - [backend/src/app/services/agent/tools.py](../../backend/src/app/services/agent/tools.py) - 文件数据源工具（inspect_file, analyze_dataframe）
 
 **外部依赖**:
@@ -58,7 +60,7 @@
 - [langchain-openai](https://github.com/langchain-ai/langchain-openai) - LangChain OpenAI集成（ChatOpenAI）
 - [langchain-core](https://github.com/langchain-ai/langchain-core) - LangChain核心（HumanMessage, SystemMessage, AIMessage, ToolMessage）
 - [langchain-mcp-adapters](https://github.com/langchain-ai/langchain-mcp-adapters) - MCP适配器（MultiServerMCPClient）
-- [mcp](https://modelcontextprotocol.io/) - Model Context Protocol（ClientSession, sse_client）
+- [mcp](https://modelcontextprotocol.io/) - Model Context Protocol（经 tools/chart_renderer 使用 ClientSession, sse_client）
 
 **下游依赖** (已读取源码):
 - [./run.py](./run.py) - 启动脚本（调用interactive_mode）
@@ -756,36 +758,23 @@ async def call_mcp_chart_tool(tool_name: str, args: Dict[str, Any], output_dir:
     Returns:
         保存的图片路径，失败返回 None
     """
-    from mcp import ClientSession
-    from mcp.client.sse import sse_client
-
-    url = "http://localhost:3033/sse"
+    # 常驻 SSE 会话 + 按工具参数缓存，不再每张图新建一次 MCP 会话
+    from tools.chart_renderer import get_mcp_chart_client
 
     try:
-        async with sse_client(url) as streams:
-            async with ClientSession(*streams) as session:
-                await session.initialize()
-
-                result = await session.call_tool(tool_name, args)
-
-                if hasattr(result, 'content') and result.content:
-                    for item in result.content:
-                        if hasattr(item, 'type') and item.type == 'image':
-                            if hasattr(item, 'data') and item.data:
-                                # 保存 Base64 图片
-                                return _save_base64_image(item.data, output_dir, "png")
-                        elif hasattr(item, 'text') and item.text:
-                            # 可能是 URL 或其他文本
-                            text = item.text
-                            if text.startswith("http"):
-                                return text
-
-                return None
-
+        payload = await get_mcp_chart_client().call_tool(tool_name, args)
     except Exception as e:
         print(f"[MCP] Chart tool call failed: {e}")
         return None
 
+    if payload is None:
+        return None
+    kind, value = payload
+    if kind == "url":
+        return value
+    # 保存 Base64 图片
+    return _save_base64_image(value, output_dir, "png")
+
 
 def _save_base64_image(base64_data: str, output_dir: str, ext: str = "png") -> str:
     """保存 Base64 编码的图片到文件
@@ -0,0 +1,90 @@
+"""
+Agent 池测试 - LRU / 空闲 TTL / 内存预算 / 失效钩子
+"""
+import time
+
+import pytest
+
+from AgentV2.core.agent_pool import AgentPool, PooledAgent
+
+
+def _entry(name, tenant_id="t1", connection_id="c1", prompt_version="v1", size=100):
+    return PooledAgent(
+        agent=name,
+        tenant_id=tenant_id,
+        connection_id=connection_id,
+        prompt_version=prompt_version,
+        estimated_bytes=size
+    )
+
+
+@pytest.mark.unit
+class TestAgentPool:
+    """Agent 池测试"""
+
+    def test_hit_returns_same_agent(self):
+        pool = AgentPool()
+        pool.put("k1", _entry("agent-1"))
+
+        entry = pool.get("k1", "v1")
+
+        assert entry.agent == "agent-1"
+        assert entry.hits == 1
+        assert pool.get_stats()["hits"] == 1
+
+    def test_lru_eviction_by_count(self):
+        pool = AgentPool(max_agents=2)
+        pool.put("k1", _entry("a1"))
+        pool.put("k2", _entry("a2"))
+        pool.get("k1")  # k1 变为最近使用
+        pool.put("k3", _entry("a3"))
+
+        assert "k1" in pool and "k3" in pool
+        assert "k2" not in pool
+        assert pool.get_stats()["evictions"] == 1
+
+    def test_eviction_by_memory_budget(self):
+        pool = AgentPool(max_agents=10, max_memory_bytes=250)
+        pool.put("k1", _entry("a1", size=100))
+        pool.put("k2", _entry("a2", size=100))
+        pool.put("k3", _entry("a3", size=100))
+
+        assert len(pool) == 2
+        assert "k1" not in pool
+        assert pool.get_stats()["memory_bytes"] == 200
+
+    def test_idle_ttl_expiration(self):
+        pool = AgentPool(idle_ttl_seconds=60)
+        entry = _entry("a1")
+        entry.last_used_at = time.time() - 120
+        pool.put("k1", entry)
+
+        assert pool.get("k1") is None
+        assert pool.get_stats()["expirations"] == 1
+
+    def test_prompt_version_change_invalidates(self):
+        pool = AgentPool()
+        pool.put("k1", _entry("a1", prompt_version="v1"))
+
+        assert pool.get("k1", "v2") is None
+        assert "k1" not in pool
+
+    def test_invalidate_by_connection(self):
+        pool = AgentPool()
+        pool.put("k1", _entry("a1", connection_id="c1"))
+        pool.put("k2", _entry("a2", connection_id="c2"))
+        pool.put("k3", _entry("a3", tenant_id="t2", connection_id="c1"))
+
+        removed = pool.invalidate(tenant_id="t1", connection_id="c1")
+
+        assert removed == 1
+        assert "k1" not in pool
+        assert "k2" in pool and "k3" in pool
+
+    def test_replace_keeps_memory_accounting(self):
+        pool = AgentPool()
+        pool.put("k1", _entry("a1", size=100))
+        pool.put("k1", _entry("a1b", size=300))
+
+        assert len(pool) == 1
+        assert pool.get_stats()["memory_bytes"] == 300
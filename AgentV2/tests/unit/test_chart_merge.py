@@ -0,0 +1,101 @@
+"""
+图表合并引擎测试 - X轴对齐 / Y轴分配 / 系列类型 / 不支持结构
+"""
+import pytest
+
+from AgentV2.chart_merge import ChartMergeError, align_x_axis, merge_chart_options
+
+
+def chart(title, x, series, y_axis=None):
+    option = {"xAxis": {"type": "category", "data": x}, "yAxis": y_axis or {"type": "value"}, "series": series}
+    return {"title": title, "echarts_option": option}
+
+
+@pytest.mark.unit
+class TestAlignXAxis:
+    """X轴有序并集测试"""
+
+    def test_natural_order_for_gaps(self):
+        assert align_x_axis([["1月", "2月", "10月"], ["2月", "3月", "11月"]]) == ["1月", "2月", "3月", "10月", "11月"]
+        assert align_x_axis([["2024-09", "2024-10"], ["2024-08", "2024-09"]]) == ["2024-08", "2024-09", "2024-10"]
+
+    def test_categories_keep_source_order(self):
+        assert align_x_axis([["华东", "华北", "西南"], ["华北", "华南"]]) == ["华东", "华北", "西南", "华南"]
+
+    def test_conflicting_orders_fall_back_to_sort(self):
+        assert align_x_axis([["Q2", "Q1"], ["Q1", "Q2", "Q3"]]) == ["Q1", "Q2", "Q3"]
+
+
+@pytest.mark.unit
+class TestMergeChartOptions:
+    """合并测试"""
+
+    def test_dual_axis_by_magnitude_with_gaps(self):
+        result = merge_chart_options([
+            chart("月度销售额", ["1月", "2月", "3月"], [{"name": "销售额", "type": "bar", "data": [12000, 15000, 18000]}]),
+            chart("月度订单数", ["2月", "3月", "4月"], [{"name": "订单数", "type": "bar", "data": [{"value": 30}, 42, 55]}]),
+        ])
+
+        option = result.option
+        assert option["xAxis"]["data"] == ["1月", "2月", "3月", "4月"]
+        assert result.axis_series == [["销售额"], ["订单数"]]
+        sales, orders = option["series"]
+        assert (sales["type"], sales["yAxisIndex"], sales["data"]) == ("line", 0, [12000.0, 15000.0, 18000.0, None])
+        assert (orders["type"], orders["yAxisIndex"], orders["data"]) == ("bar", 1, [None, 30.0, 42.0, 55.0])
+        assert [axis["position"] for axis in option["yAxis"]] == ["left", "right"]
+        assert option["title"]["text"] == "月度销售额 vs 月度订单数"
+
+    def test_two_units_split_even_at_similar_magnitude(self):
+        result = merge_chart_options([
+            chart("营收", ["A", "B"], [{"name": "营收", "type": "line", "data": [50, 60]}], {"type": "value", "name": "营收(万元)"}),
+            chart("毛利率", ["A", "B"], [{"name": "毛利率", "type": "bar", "data": [30, 35]}],
+                  {"type": "value", "axisLabel": {"formatter": "{value}%"}}),
+        ])
+
+        assert result.axis_series == [["营收"], ["毛利率"]]
+        assert [axis["name"] for axis in result.option["yAxis"]] == ["万元", "%"]
+        # 原图表已按轴区分类型，保留原类型
+        assert [s["type"] for s in result.option["series"]] == ["line", "bar"]
+
+    def test_single_axis_keeps_types_and_dedupes_names(self):
+        result = merge_chart_options([
+            chart("2023", ["1月", "2月"], [{"name": "销量", "type": "bar", "data": [10, 20]}]),
+            chart("2024", ["1月", "2月"], [{"name": "销量", "type": "line", "data": [15, 25]}]),
+        ])
+
+        assert not result.dual_axis
+        assert [s["name"] for s in result.option["series"]] == ["销量（2023）", "销量（2024）"]
+        assert [s["type"] for s in result.option["series"]] == ["bar", "line"]
+
+    def test_pair_data_without_categories(self):
+        result = merge_chart_options([
+            {"title": "a", "echarts_option": {"xAxis": {"type": "category"}, "series": [{"name": "a", "type": "line", "data": [["2", 5], ["1", 4]]}]}},
+            chart("b", ["1", "3"], [{"name": "b", "type": "line", "data": [7, 8]}]),
+        ])
+        # 图表 a 自身的顺序 "2" → "1" 作为约束保留
+        assert result.x_labels == ["2", "1", "3"]
+        assert result.option["series"][0]["data"] == [5.0, 4.0, None]
+        assert result.option["series"][1]["data"] == [None, 7.0, 8.0]
+
+    def test_pair_data_index_into_categories(self):
+        result = merge_chart_options([
+            chart("a", ["1月", "3月"], [{"name": "a", "type": "line", "data": [[0, 5], [1, 7]]}]),
+            chart("b", ["1月", "2月", "3月"], [{"name": "b", "type": "line", "data": [1, 2, 3]}]),
+        ])
+        # 类别轴上 [0, 5] 表示第 0 个类别，而不是标签 "0"
+        assert result.x_labels == ["1月", "2月", "3月"]
+        assert result.option["series"][0]["data"] == [5.0, None, 7.0]
+
+    @pytest.mark.parametrize("configs", [
+        [chart("饼图", [], [{"type": "pie", "data": [{"name": "a", "value": 1}]}])],
+        [{"title": "横向", "echarts_option": {"yAxis": {"type": "category", "data": ["a"]}, "series": [{"type": "bar", "data": [1]}]}}],
+        [chart("文本", ["a"], [{"type": "bar", "data": ["n/a"]}])],
+        [chart("越界", ["a"], [{"type": "bar", "data": [[3, 1]]}])],
+        [{"title": "无类别", "echarts_option": {"xAxis": {"type": "category"}, "series": [{"type": "bar", "data": [[0, 1]]}]}}],
+        [chart("x", ["2024-01", "2024-02"], [{"type": "bar", "data": [1, 2]}]),
+         chart("y", ["1月", "2月"], [{"type": "bar", "data": [1, 2]}])],
+        [],
+    ])
+    def test_unsupported_shapes_raise(self, configs):
+        with pytest.raises(ChartMergeError):
+            merge_chart_options(configs)
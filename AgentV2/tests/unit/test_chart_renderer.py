@@ -0,0 +1,172 @@
+"""
+图表渲染服务测试 - 规范化缓存键 / 浏览器池复用 / 批量渲染 / MCP 常驻会话
+"""
+import asyncio
+import base64
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from AgentV2.tools.chart_renderer import (
+    BrowserBackend,
+    ChartRenderError,
+    ChartRenderer,
+    McpChartClient,
+    normalize_option,
+    spec_key,
+)
+from AgentV2.tools.lru_cache import LRUCache
+
+BAR = {
+    "title": {"text": "销售额"},
+    "xAxis": {"type": "category", "data": ["1月", "2月", "3月"]},
+    "yAxis": {"type": "value"},
+    "series": [{"name": "销售额", "type": "bar", "data": [120, 200.0, 150]}],
+}
+PIE = {"series": [{"type": "pie", "radius": ["40%", "70%"], "data": [{"name": "a", "value": 1}, {"name": "b", "value": 3}]}]}
+
+
+class FakeDriver:
+    """记录脚本调用的浏览器驱动"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+        self.quit_called = False
+
+    def execute_script(self, script, option, width, height, ratio):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("chrome not reachable")
+        return "data:image/png;base64," + base64.b64encode(f"png:{option['series'][0]['type']}".encode()).decode()
+
+    def quit(self):
+        self.quit_called = True
+
+
+def browser_renderer(drivers, pool_size=2):
+    created = []
+
+    def factory():
+        driver = drivers.pop(0) if drivers else FakeDriver()
+        created.append(driver)
+        return driver
+
+    browser = BrowserBackend(pool_size=pool_size, driver_factory=factory)
+    return ChartRenderer(browser=browser, cache=LRUCache(max_bytes=1024 * 1024)), created
+
+
+@pytest.mark.unit
+class TestSpecKey:
+    """规范化与缓存键测试"""
+
+    def test_key_ignores_order_float_noise_and_animation(self):
+        reordered = {
+            "series": [{"data": [120.0, 200, 150.00000000000003], "type": "bar", "name": "销售额", "animationDuration": 500}],
+            "yAxis": {"type": "value"},
+            "xAxis": {"data": ["1月", "2月", "3月"], "type": "category"},
+            "title": {"text": "销售额"},
+            "tooltip": {"trigger": "axis"},
+            "animation": True,
+        }
+        key = spec_key(normalize_option(BAR), 800, 500, 1)
+        assert spec_key(normalize_option(reordered), 800, 500, 1) == key
+        assert spec_key(normalize_option(BAR), 400, 500, 1) != key
+        assert spec_key(normalize_option(BAR), 800, 500, 2) != key
+
+    def test_rejects_non_dict(self):
+        with pytest.raises(ChartRenderError):
+            normalize_option([1, 2])
+
+
+@pytest.mark.unit
+class TestChartRenderer:
+    """渲染服务测试"""
+
+    def test_cache_hit_on_equivalent_spec(self):
+        renderer, created = browser_renderer([], pool_size=1)
+        first = renderer.render(BAR)
+        second = renderer.render(dict(BAR, animation=False))
+
+        assert first.ok and not first.cached
+        assert second.cached and second.data == first.data and second.key == first.key
+        assert renderer.get_stats()["hits"] == 1 and created[0].calls == 1
+
+    def test_missing_selenium_raises(self, monkeypatch):
+        monkeypatch.setattr(BrowserBackend, "available", staticmethod(lambda: False))
+        renderer = ChartRenderer(cache=LRUCache(max_bytes=1024))
+        with pytest.raises(ChartRenderError):
+            renderer.render(BAR)
+        assert [r.ok for r in renderer.render_many([BAR, PIE])] == [False, False]
+
+    def test_browser_pool_reuses_warm_driver(self):
+        renderer, created = browser_renderer([], pool_size=1)
+        for chart_type in ("bar", "line", "scatter"):
+            result = renderer.render({"series": [{"type": chart_type, "data": [1]}]})
+            assert result.data == f"png:{chart_type}".encode()
+
+        assert len(created) == 1 and created[0].calls == 3
+        assert renderer.get_stats()["browser"]["drivers_started"] == 1
+
+    def test_broken_driver_is_replaced(self):
+        renderer, created = browser_renderer([FakeDriver(fail=True)], pool_size=1)
+        with pytest.raises(ChartRenderError):
+            renderer.render(BAR)
+        assert renderer.render(BAR).ok
+        assert created[0].quit_called and len(created) == 2
+
+    def test_render_many_dedupes_and_isolates_errors(self, tmp_path):
+        renderer, created = browser_renderer([], pool_size=2)
+        results = renderer.render_many([BAR, PIE, "not an option", dict(BAR)])
+
+        assert [r.ok for r in results] == [True, True, False, True]
+        assert results[0].key == results[3].key
+        assert sum(driver.calls for driver in created) == 2
+
+        path = results[1].save(str(tmp_path))
+        assert results[1].save(str(tmp_path)) == path
+        assert open(path, "rb").read() == b"png:pie"
+
+
+@pytest.mark.unit
+class TestMcpChartClient:
+    """MCP 常驻会话测试"""
+
+    def test_session_reused_and_results_cached(self):
+        opened = []
+
+        class FakeSession:
+            def __init__(self):
+                self.calls = []
+
+            async def call_tool(self, name, args):
+                self.calls.append(name)
+                if len(opened) == 1 and len(self.calls) == 3:
+                    raise ConnectionError("stream closed")
+                image = SimpleNamespace(type="image", data=base64.b64encode(name.encode()).decode())
+                return SimpleNamespace(content=[image])
+
+        @asynccontextmanager
+        async def factory():
+            session = FakeSession()
+            opened.append(session)
+            yield session
+
+        client = McpChartClient(cache=LRUCache(max_bytes=1024 * 1024), session_factory=factory)
+
+        async def run():
+            first = await client.call_tool("generate_bar_chart", {"data": [1.0, 2]})
+            again = await client.call_tool("generate_bar_chart", {"data": [1, 2.0]})
+            line = await client.call_tool("generate_line_chart", {"data": [1]})
+            # 第三次调用失败后重连
+            pie = await client.call_tool("generate_pie_chart", {"data": [1]})
+            await client.reset()
+            return first, again, line, pie
+
+        first, again, line, pie = asyncio.run(run())
+
+        assert first == again == ("image", base64.b64encode(b"generate_bar_chart").decode())
+        assert pie[0] == "image"
+        assert len(opened) == 2 and opened[0].calls == ["generate_bar_chart", "generate_line_chart", "generate_pie_chart"]
+        assert client.get_stats()["hits"] == 1 and client.get_stats()["reconnects"] == 1
@@ -0,0 +1,78 @@
+"""
+连接池测试 - 事件循环切换与数据源失效时释放旧池
+"""
+import asyncio
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from AgentV2.tools import connection_pool
+from AgentV2.tools.connection_pool import AsyncPostgresPool, ConnectionPoolManager
+
+
+class FakeAsyncpgPool:
+    """记录关闭方式的 asyncpg 连接池"""
+
+    def __init__(self):
+        self.closed = False
+        self.terminated = False
+
+    async def close(self):
+        self.closed = True
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture
+def fake_asyncpg(monkeypatch):
+    created = []
+
+    async def create_pool(*args, **kwargs):
+        created.append(FakeAsyncpgPool())
+        return created[-1]
+
+    monkeypatch.setitem(sys.modules, "asyncpg", SimpleNamespace(create_pool=create_pool))
+    return created
+
+
+@pytest.mark.unit
+class TestAsyncPoolRelease:
+    """asyncpg 池释放测试"""
+
+    def test_loop_change_terminates_pool_of_finished_loop(self, fake_asyncpg):
+        pool = AsyncPostgresPool("postgresql://u:p@h/db")
+
+        asyncio.run(pool._get_pool())
+        asyncio.run(pool._get_pool())
+
+        assert len(fake_asyncpg) == 2
+        assert fake_asyncpg[0].terminated and not fake_asyncpg[1].terminated
+
+    def test_pool_of_running_loop_is_closed_on_that_loop(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            stale = FakeAsyncpgPool()
+            connection_pool._release_asyncpg_pool(stale, loop)
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(5)
+
+            assert stale.closed and not stale.terminated
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(5)
+            loop.close()
+
+    def test_invalidate_releases_pools_of_connection(self, tmp_path, fake_asyncpg):
+        manager = ConnectionPoolManager()
+        sync_pool = manager.get_sync_pool(f"sqlite:///{tmp_path / 'a.db'}", "c1")
+        async_pool = manager.get_async_pool("postgresql://u:p@h/db", "c1")
+        asyncio.run(async_pool._get_pool())
+
+        manager.invalidate("c1")
+
+        assert sync_pool._closed and fake_asyncpg[0].terminated
+        assert manager.get_stats() == {"sync_pools": {}, "async_pools": {}}
@@ -0,0 +1,70 @@
+"""
+Excel DuckDB 查询测试 - 多工作表视图 / 跨表 JOIN / 数据源名别名
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("duckdb")
+pytest.importorskip("openpyxl")
+
+from AgentV2.tools import database_tools
+from AgentV2.tools.result_store import ResultStore
+
+
+@pytest.fixture
+def workbook(tmp_path, monkeypatch):
+    """两个工作表的 Excel 文件，不使用 backend 列式缓存"""
+    path = tmp_path / "销售数据.xlsx"
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame({"region_id": [1, 2, 1], "amount": [100, 250, 50]}).to_excel(writer, sheet_name="orders", index=False)
+        pd.DataFrame({"region_id": [1, 2], "region": ["华东", "华北"]}).to_excel(writer, sheet_name="regions", index=False)
+
+    store = ResultStore(directory=str(tmp_path / "results"))
+    monkeypatch.setattr(database_tools, "_get_columnar_cache", lambda: None)
+    monkeypatch.setattr(database_tools, "get_result_store", lambda: store)
+    return str(path)
+
+
+def run(query, path, aliases=None):
+    result = json.loads(database_tools.execute_excel_query(query, path, "orders", aliases))
+    assert result.get("success"), result
+    return result
+
+
+@pytest.mark.unit
+class TestExcelQuery:
+    """多工作表查询测试"""
+
+    def test_join_and_aggregate_across_sheets(self, workbook):
+        result = run(
+            "SELECT r.region, SUM(o.amount) AS total FROM orders o JOIN regions r "
+            "ON o.region_id = r.region_id GROUP BY r.region ORDER BY total DESC",
+            workbook,
+        )
+
+        assert result["columns"] == ["region", "total"]
+        assert result["rows"] == [["华北", 250], ["华东", 150]]
+        assert result["data_source"] == "excel"
+
+    def test_data_source_name_aliases_default_sheet(self, workbook):
+        info = SimpleNamespace(table_name="orders", data_source_name="sales 2024", database_name="销售数据.xlsx")
+        aliases = database_tools._excel_aliases(info)
+
+        assert aliases == {"sales 2024": "orders", "sales_2024": "orders", "销售数据": "orders"}
+        assert run('SELECT COUNT(*) AS n FROM "sales 2024"', workbook, aliases)["rows"] == [[3]]
+        assert run("SELECT SUM(amount) AS s FROM sales_2024", workbook, aliases)["rows"] == [[400]]
+        assert run("SELECT COUNT(*) AS n FROM 销售数据", workbook, aliases)["rows"] == [[3]]
+
+    def test_alias_does_not_shadow_sheet(self, workbook):
+        aliases = {"regions": "orders", "legacy": "missing"}
+        assert run("SELECT COUNT(*) AS n FROM regions", workbook, aliases)["rows"] == [[2]]
+
+        result = json.loads(database_tools.execute_excel_query("SELECT * FROM legacy", workbook, None, aliases))
+        assert result["error_type"] == "execution_error"
+
+    def test_no_aliases_without_default_sheet(self):
+        assert database_tools._excel_aliases(None) == {}
+        assert database_tools._excel_aliases(SimpleNamespace(table_name=None, data_source_name="x")) == {}
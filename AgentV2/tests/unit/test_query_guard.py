@@ -0,0 +1,171 @@
+"""
+查询保护测试 - LIMIT 注入 / 执行计划解析 / 成本预算 / 有界读取
+"""
+import sqlite3
+
+import pytest
+
+from AgentV2.tools.connection_pool import SyncConnectionPool
+from AgentV2.tools.query_guard import (
+    QueryBudget,
+    QueryGuard,
+    QueryRejectedError,
+    estimate_plan,
+    inject_limit,
+    parse_tenant_budgets,
+)
+
+
+@pytest.fixture
+def sqlite_pool(tmp_path):
+    db_path = tmp_path / "guard.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE sales (id INTEGER PRIMARY KEY, region TEXT, amount REAL)")
+    conn.executemany("INSERT INTO sales VALUES (?, ?, ?)", [(i, f"r{i % 3}", i * 1.5) for i in range(50)])
+    conn.commit()
+    conn.close()
+    pool = SyncConnectionPool(f"sqlite:///{db_path}", max_size=1)
+    yield pool
+    pool.close()
+
+
+class FakePool:
+    """记录调用的连接池"""
+
+    dialect = "postgresql"
+
+    def __init__(self, plan=None, rows=None, explain_error=None):
+        self.plan = plan
+        self.rows = rows or []
+        self.explain_error = explain_error
+        self.executed = []
+
+    def explain(self, query):
+        if self.explain_error:
+            raise self.explain_error
+        return self.plan
+
+    def execute(self, query, max_rows=None):
+        self.executed.append((query, max_rows))
+        return ["id"], self.rows[:max_rows]
+
+
+def pg_plan(cost, rows=10, node_type="Seq Scan", relation="sales"):
+    return [{"Plan": {"Node Type": "Limit", "Total Cost": cost, "Plan Rows": rows,
+                      "Plans": [{"Node Type": node_type, "Relation Name": relation, "Plan Rows": 10 ** 6}]}}]
+
+
+@pytest.mark.unit
+class TestInjectLimit:
+    """LIMIT 注入测试"""
+
+    def test_appends_limit_when_missing(self):
+        sql, changed = inject_limit("SELECT * FROM sales;", 101)
+        assert changed and sql == "SELECT * FROM sales\nLIMIT 101"
+
+    def test_keeps_smaller_limit_and_tightens_larger(self):
+        assert inject_limit("SELECT * FROM sales LIMIT 10", 101) == ("SELECT * FROM sales LIMIT 10", False)
+        assert inject_limit("select * from sales limit 5000 offset 10", 101) == ("select * from sales limit 101 offset 10", True)
+        assert inject_limit("SELECT * FROM sales LIMIT 20, 5000", 101) == ("SELECT * FROM sales LIMIT 20, 101", True)
+        assert inject_limit("SELECT * FROM sales LIMIT ALL", 101)[0].endswith("LIMIT 101")
+
+    def test_ignores_nested_quoted_and_commented_limits(self):
+        sql = "WITH t AS (SELECT * FROM sales LIMIT 5) SELECT 'limit 3', x FROM t -- LIMIT 2"
+        rewritten, changed = inject_limit(sql, 101)
+        assert changed and rewritten == sql + "\nLIMIT 101"
+
+    def test_wraps_offset_or_fetch_without_limit(self):
+        sql, changed = inject_limit("SELECT * FROM sales ORDER BY id OFFSET 10 ROWS FETCH FIRST 5000 ROWS ONLY", 101)
+        assert changed
+        assert sql.startswith("SELECT * FROM (\n") and sql.endswith(") AS _guarded_query\nLIMIT 101")
+
+    def test_limit_before_locking_clause(self):
+        assert inject_limit("SELECT * FROM sales FOR UPDATE", 101) == ("SELECT * FROM sales LIMIT 101\nFOR UPDATE", True)
+        assert inject_limit("SELECT * FROM sales OFFSET 10 FOR UPDATE", 101) == ("SELECT * FROM sales OFFSET 10 FOR UPDATE", False)
+
+    def test_leaves_other_statements(self):
+        assert inject_limit("SHOW TABLES", 101) == ("SHOW TABLES", False)
+        assert inject_limit("SELECT 1; SELECT 2", 101) == ("SELECT 1; SELECT 2", False)
+
+
+@pytest.mark.unit
+class TestEstimatePlan:
+    """执行计划解析测试"""
+
+    def test_postgres_json_string(self):
+        estimate = estimate_plan("postgresql", '[{"Plan": {"Node Type": "Seq Scan", "Relation Name": "t", "Total Cost": 12.5, "Plan Rows": 300}}]')
+        assert (estimate.cost, estimate.rows, estimate.full_scans) == (12.5, 300, ["t"])
+
+    def test_mysql_nested_loop(self):
+        plan = {"query_block": {"cost_info": {"query_cost": "88.20"}, "nested_loop": [
+            {"table": {"table_name": "a", "rows_produced_per_join": 10}},
+            {"table": {"table_name": "b", "rows_produced_per_join": 40}},
+        ]}}
+        estimate = estimate_plan("mysql", plan)
+        assert (estimate.cost, estimate.rows) == (88.2, 40)
+
+    def test_sqlite_full_scans(self):
+        plan = [{"detail": "SCAN sales"}, {"detail": "SEARCH r USING INDEX idx (id=?)"}, {"detail": "SCAN t USING COVERING INDEX i"}]
+        estimate = estimate_plan("sqlite", plan)
+        assert estimate.cost is None and estimate.full_scans == ["sales"]
+
+
+@pytest.mark.unit
+class TestQueryGuard:
+    """QueryGuard 测试"""
+
+    def test_sqlite_rows_capped_and_reported(self, sqlite_pool):
+        guard = QueryGuard(default_budget=QueryBudget(max_rows=20))
+        columns, rows, extra = guard.execute(sqlite_pool, "SELECT id, region FROM sales ORDER BY id")
+
+        assert columns == ["id", "region"]
+        assert [row[0] for row in rows] == list(range(20))
+        assert extra == {"row_limit_reached": True, "row_limit": 20}
+        assert guard.get_stats()["truncated"] == 1 and guard.get_stats()["limits_injected"] == 1
+
+    def test_sqlite_within_limit_not_reported(self, sqlite_pool):
+        guard = QueryGuard(default_budget=QueryBudget(max_rows=20))
+        _, rows, extra = guard.execute(sqlite_pool, "SELECT region, COUNT(*) FROM sales GROUP BY region")
+        assert len(rows) == 3 and extra == {}
+
+    def test_pool_fetchmany_caps_unlimitable_statements(self, sqlite_pool):
+        _, rows = sqlite_pool.execute("VALUES (1), (2), (3)", max_rows=2)
+        assert rows == [(1,), (2,)]
+
+    def test_rejects_over_budget_without_executing(self):
+        guard = QueryGuard(default_budget=QueryBudget(max_rows=100, max_cost=1000))
+        pool = FakePool(plan=pg_plan(cost=5000))
+
+        with pytest.raises(QueryRejectedError) as exc_info:
+            guard.execute(pool, "SELECT * FROM sales ORDER BY amount")
+
+        assert "sales" in str(exc_info.value) and exc_info.value.estimate.cost == 5000
+        assert pool.executed == []
+        assert guard.get_stats()["rejected"] == 1
+
+    def test_within_budget_executes_rewritten_query(self):
+        guard = QueryGuard(default_budget=QueryBudget(max_rows=2, max_cost=1000))
+        pool = FakePool(plan=pg_plan(cost=10), rows=[[1], [2], [3]])
+
+        columns, rows, extra = guard.execute(pool, "SELECT id FROM sales")
+
+        assert pool.executed == [("SELECT id FROM sales\nLIMIT 3", 3)]
+        assert rows == [[1], [2]] and extra["row_limit_reached"]
+
+    def test_explain_failure_does_not_block(self):
+        guard = QueryGuard(default_budget=QueryBudget(max_cost=1000))
+        pool = FakePool(explain_error=RuntimeError("syntax error"), rows=[[1]])
+
+        _, rows, _ = guard.execute(pool, "SELECT id FROM sales")
+        assert rows == [[1]] and guard.get_stats()["explain_failures"] == 1
+
+    def test_tenant_budgets(self):
+        default = QueryBudget(max_rows=100, max_cost=0)
+        guard = QueryGuard(default_budget=default, tenant_budgets=parse_tenant_budgets('{"small": {"max_rows": 5}}', default))
+        pool = FakePool(rows=[[i] for i in range(10)])
+
+        assert len(guard.execute(pool, "SELECT id FROM sales", tenant_id="small")[1]) == 5
+        assert len(guard.execute(pool, "SELECT id FROM sales", tenant_id="other")[1]) == 10
+        # max_cost 为 0 时不执行 EXPLAIN
+        assert guard.get_stats()["explains"] == 0
+        assert parse_tenant_budgets("not json", default) == {}
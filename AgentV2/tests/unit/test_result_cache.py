@@ -0,0 +1,144 @@
+"""
+查询结果缓存测试 - 规范化键 / 字节预算 LRU / 表级失效 / Redis 共享
+"""
+import pytest
+
+from AgentV2.tools import result_cache
+from AgentV2.tools.result_cache import ANY_TABLE, QueryResultCache, canonicalize_sql
+
+
+requires_sqlglot = pytest.mark.skipif(result_cache.sqlglot is None, reason="sqlglot 未安装")
+
+
+class FakeRedis:
+    """内存中的同步 redis 客户端（只实现缓存用到的命令）"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode("utf-8")
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def incr(self, key):
+        self.commands.append(key)
+
+    def execute(self):
+        return [self.client.incr(key) for key in self.commands]
+
+
+@pytest.mark.unit
+class TestCanonicalizeSql:
+    """SQL 规范化测试"""
+
+    @requires_sqlglot
+    def test_equivalent_queries_share_key(self):
+        a, tables = canonicalize_sql("SELECT name FROM Users WHERE status = 'Active';")
+        b, _ = canonicalize_sql("select  name\nfrom users -- 活跃用户\nwhere status='Active'")
+
+        assert a == b
+        assert "users" in tables
+
+    def test_string_literal_case_preserved(self):
+        a, _ = canonicalize_sql("SELECT * FROM users WHERE status = 'Active'")
+        b, _ = canonicalize_sql("SELECT * FROM users WHERE status = 'active'")
+
+        assert a != b
+
+    def test_fallback_depends_on_any_table(self, monkeypatch):
+        monkeypatch.setattr(result_cache, "sqlglot", None)
+
+        assert canonicalize_sql("SELECT id FROM t -- x\n;")[0] == canonicalize_sql("select id\n  from T")[0]
+        canonical, tables = canonicalize_sql('SELECT * FROM "Orders" o JOIN public.items i ON o.id = i.oid')
+
+        assert canonical.startswith("select * from")
+        assert {"orders", "items", ANY_TABLE} <= tables
+
+
+@pytest.mark.unit
+class TestQueryResultCache:
+    """查询结果缓存测试"""
+
+    def test_hit_and_connection_isolation(self):
+        cache = QueryResultCache()
+        cache.set("SELECT * FROM orders", "c1", '{"rows": [1]}')
+
+        assert cache.get("select * from orders;", "c1") == '{"rows": [1]}'
+        assert cache.get("SELECT * FROM orders", "c2") is None
+        assert cache.get_stats()["hits"] == 1
+
+    def test_byte_budget_lru(self):
+        cache = QueryResultCache(max_bytes=20, max_entry_bytes=20)
+        cache.set("SELECT 1 FROM a", "c1", "x" * 8)
+        cache.set("SELECT 1 FROM b", "c1", "y" * 8)
+        cache.get("SELECT 1 FROM a", "c1")  # a 变为最近使用
+        cache.set("SELECT 1 FROM c", "c1", "z" * 8)
+
+        assert cache.get("SELECT 1 FROM a", "c1") is not None
+        assert cache.get("SELECT 1 FROM b", "c1") is None
+        assert cache.get_stats()["bytes"] == 16
+
+        cache.set("SELECT 1 FROM d", "c1", "w" * 21)
+        assert cache.get_stats()["skipped_oversize"] == 1
+
+    @requires_sqlglot
+    def test_invalidate_by_table(self):
+        cache = QueryResultCache()
+        cache.set("SELECT * FROM orders", "c1", "orders")
+        cache.set("SELECT * FROM users", "c1", "users")
+        cache.set("SELECT * FROM orders", "c2", "other connection")
+
+        assert cache.invalidate_tables("c1", ["ORDERS"]) == 1
+
+        assert cache.get("SELECT * FROM orders", "c1") is None
+        assert cache.get("SELECT * FROM users", "c1") == "users"
+        assert cache.get("SELECT * FROM orders", "c2") == "other connection"
+
+    def test_fallback_invalidated_by_any_table(self, monkeypatch):
+        monkeypatch.setattr(result_cache, "sqlglot", None)
+        cache = QueryResultCache()
+        cache.set("SELECT * FROM users", "c1", "users")
+
+        cache.invalidate_tables("c1", ["orders"])
+
+        assert cache.get("SELECT * FROM users", "c1") is None
+
+    def test_invalidate_connection(self):
+        cache = QueryResultCache()
+        cache.set("SELECT * FROM orders", "c1", "orders")
+        cache.set("SELECT * FROM users", "c1", "users")
+
+        assert cache.invalidate_connection("c1") == 2
+        assert cache.get("SELECT * FROM orders", "c1") is None
+        assert cache.get_stats()["size"] == 0
+
+    def test_redis_shared_between_workers(self):
+        redis = FakeRedis()
+        worker_a = QueryResultCache(redis_client=redis)
+        worker_b = QueryResultCache(redis_client=redis)
+
+        worker_a.set("SELECT * FROM orders", "c1", "orders")
+        assert worker_b.get("SELECT * FROM orders", "c1") == "orders"
+        assert worker_b.get_stats()["remote_hits"] == 1
+
+        # 一个 worker 的失效通过 Redis 版本号对其他 worker 生效
+        worker_b.invalidate_tables("c1", ["orders"])
+        assert worker_a.get("SELECT * FROM orders", "c1") is None
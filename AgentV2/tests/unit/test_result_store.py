@@ -0,0 +1,165 @@
+"""
+结果集存储测试 - 分页 / 共享目录 / 跨实例读取 / 磁盘预算 / 租户隔离 / 列统计 / 内联结果
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from AgentV2.tools import database_tools, result_store
+from AgentV2.tools.result_store import ResultStore, summarize_columns
+
+
+requires_pyarrow = pytest.mark.skipif(result_store.pq is None, reason="pyarrow 未安装")
+
+COLUMNS = ["id", "region", "amount"]
+
+
+def make_rows(count):
+    return [[i, f"r{i % 3}", i * 1.5] for i in range(count)]
+
+
+@pytest.mark.unit
+class TestSummarizeColumns:
+    """列统计测试"""
+
+    def test_numeric_text_and_nulls(self):
+        rows = [[1, "a", Decimal("2.5")], [3, "a", None], [2, "b", Decimal("4.5")]]
+        stats = summarize_columns(["n", "s", "d"], rows)
+
+        assert stats[0] == {"name": "n", "type": "number", "nulls": 0, "distinct": 3, "min": 1, "max": 3, "mean": 2.0}
+        assert stats[1]["top_values"] == [["a", 2], ["b", 1]]
+        assert stats[2]["nulls"] == 1 and stats[2]["mean"] == 3.5
+
+    def test_dates_and_unhashable(self):
+        stats = summarize_columns(["d", "j"], [[date(2026, 1, 2), [1]], [date(2026, 1, 1), [2]]])
+
+        assert stats[0]["min"] == date(2026, 1, 1)
+        assert stats[1]["distinct"] is None
+
+
+@pytest.mark.unit
+class TestResultStore:
+    """ResultStore 测试"""
+
+    def test_page_and_batches(self, tmp_path):
+        store = ResultStore(directory=str(tmp_path))
+        meta = store.put(COLUMNS, make_rows(250), tenant_id="t1", connection_id="c1")
+
+        page = store.get_page(meta.result_id, offset=100, limit=3, tenant_id="t1")
+        assert page["rows"] == [[100, "r1", 150.0], [101, "r2", 151.5], [102, "r0", 153.0]]
+        assert page["row_count"] == 250 and page["columns"] == COLUMNS
+
+        batches = list(store.iter_batches(meta.result_id, tenant_id="t1", batch_size=100))
+        assert [len(batch) for batch in batches] == [100, 100, 50]
+
+    def test_tenant_isolation(self, tmp_path):
+        store = ResultStore(directory=str(tmp_path))
+        meta = store.put(COLUMNS, make_rows(5), tenant_id="t1")
+
+        assert store.get_page(meta.result_id, tenant_id="t2") is None
+        assert store.iter_batches(meta.result_id, tenant_id="t2") is None
+        assert store.get_page("rs_missing", tenant_id="t1") is None
+
+    def test_memory_eviction_reads_shared_file(self, tmp_path):
+        store = ResultStore(directory=str(tmp_path), max_memory_bytes=400_000, file_format="jsonl")
+        first = store.put(COLUMNS, make_rows(1000), tenant_id="t1")
+        for _ in range(5):
+            store.put(COLUMNS, make_rows(1000), tenant_id="t1")
+
+        assert store.get_stats()["disk_writes"] == 6
+        assert store.exists(first.result_id)
+        page = store.get_page(first.result_id, offset=998, limit=10, tenant_id="t1")
+        assert page["rows"] == [[998, "r2", 1497.0], [999, "r0", 1498.5]]
+        assert store.get_stats()["disk_reads"] == 1
+
+    def test_handle_resolves_from_fresh_instance(self, tmp_path):
+        writer = ResultStore(directory=str(tmp_path), file_format="jsonl")
+        meta = writer.put(COLUMNS, make_rows(30), tenant_id="t1", connection_id="c1")
+
+        # 另一个 worker：同一共享目录、空的进程内缓存
+        reader = ResultStore(directory=str(tmp_path), file_format="jsonl")
+        assert reader.exists(meta.result_id)
+        loaded = reader.get_meta(meta.result_id, tenant_id="t1")
+        assert (loaded.row_count, loaded.columns, loaded.connection_id) == (30, COLUMNS, "c1")
+        assert reader.get_page(meta.result_id, offset=28, limit=5, tenant_id="t1")["rows"] == [[28, "r1", 42.0], [29, "r2", 43.5]]
+        assert sum(len(batch) for batch in reader.iter_batches(meta.result_id, tenant_id="t1", batch_size=7)) == 30
+        assert reader.get_meta(meta.result_id, tenant_id="t2") is None
+        assert reader.get_stats()["shared_loads"] == 1
+
+    def test_expired_handle_removed_from_shared_directory(self, tmp_path, monkeypatch):
+        writer = ResultStore(directory=str(tmp_path), ttl=60, file_format="jsonl")
+        meta = writer.put(COLUMNS, make_rows(3), tenant_id="t1")
+
+        now = result_store.time.time()
+        monkeypatch.setattr(result_store.time, "time", lambda: now + 61)
+        reader = ResultStore(directory=str(tmp_path), ttl=60, file_format="jsonl")
+        assert reader.get_page(meta.result_id, tenant_id="t1") is None
+        assert list(tmp_path.iterdir()) == []
+        assert reader.get_meta("../etc/passwd") is None
+
+    def test_oversize_goes_to_disk_and_disk_budget(self, tmp_path):
+        store = ResultStore(directory=str(tmp_path), max_memory_bytes=40_000, max_disk_bytes=60_000, file_format="jsonl")
+        first = store.put(COLUMNS, make_rows(2000), tenant_id="t1")
+        assert first.path is not None
+
+        second = store.put(COLUMNS, make_rows(2000), tenant_id="t1")
+        store._sweep_thread.join(5)
+
+        # 超出磁盘预算时在后台清理，删除最早写入的结果
+        assert not store.exists(first.result_id)
+        assert not (tmp_path / f"{first.result_id}.jsonl").exists()
+        assert not (tmp_path / f"{first.result_id}.meta.json").exists()
+        assert store.get_page(second.result_id, limit=1, tenant_id="t1")["rows"] == [[0, "r0", 0.0]]
+        assert store.get_stats()["disk_evictions"] == 1
+
+    @requires_pyarrow
+    def test_parquet_pages_across_row_groups(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(result_store, "_PARQUET_ROW_GROUP", 100)
+        store = ResultStore(directory=str(tmp_path), max_memory_bytes=4_000, file_format="parquet")
+        meta = store.put(["id", "id", "note"], [[i, -i, None if i % 2 else "x"] for i in range(350)])
+
+        assert meta.file_format == "parquet"
+        page = store.get_page(meta.result_id, offset=95, limit=10)
+        assert [row[0] for row in page["rows"]] == list(range(95, 105))
+        assert page["rows"][0] == [95, -95, None]
+
+    def test_sweep_runs_in_background_once_at_a_time(self, tmp_path, monkeypatch):
+        store = ResultStore(directory=str(tmp_path), file_format="jsonl")
+        release = result_store.threading.Event()
+        calls = []
+        monkeypatch.setattr(store, "sweep", lambda: (calls.append(1), release.wait(5)))
+
+        store.put(COLUMNS, make_rows(3))
+        store._last_sweep = 0  # 到期但上一次清理仍在进行
+        store.put(COLUMNS, make_rows(3))
+        release.set()
+        store._sweep_thread.join(5)
+
+        assert calls == [1]
+
+
+@pytest.mark.unit
+class TestFormatQueryResult:
+    """查询结果格式化与结果集存储测试"""
+
+    @pytest.fixture
+    def store(self, tmp_path, monkeypatch):
+        store = ResultStore(directory=str(tmp_path), file_format="jsonl")
+        monkeypatch.setattr(database_tools, "get_result_store", lambda: store)
+        return store
+
+    def test_inline_result_is_not_stored(self, store, tmp_path):
+        result = json.loads(database_tools._format_query_result(COLUMNS, make_rows(3), "c1"))
+
+        assert result["rows"] == make_rows(3) and "result_id" not in result
+        assert store.get_stats()["puts"] == 0
+        assert list(tmp_path.iterdir()) == []
+
+    def test_large_result_is_stored_with_sample(self, store, monkeypatch):
+        monkeypatch.setattr(database_tools, "INLINE_ROWS", 10)
+        result = json.loads(database_tools._format_query_result(COLUMNS, make_rows(50), "c1"))
+
+        assert result["truncated"] and len(result["rows"]) == database_tools.SAMPLE_ROWS
+        assert store.get_page(result["result_id"], offset=49, limit=5)["rows"] == [[49, "r1", 73.5]]
@@ -0,0 +1,41 @@
+"""
+ToolContext 测试 - 池化 Agent 共享上下文时按请求绑定数据库会话
+"""
+import contextvars
+
+import pytest
+
+from AgentV2.tools import database_tools
+from AgentV2.tools.database_tools import ToolContext, bind_db_session
+
+
+def _run_request(ctx, db_session):
+    """模拟一次请求：在请求上下文中绑定会话后激活共享的 ToolContext"""
+    bind_db_session(db_session)
+    ctx.activate()
+    return database_tools._get_connection_context()
+
+
+@pytest.mark.unit
+class TestToolContext:
+    """请求级会话绑定测试"""
+
+    def test_shared_context_keeps_sessions_per_request(self):
+        ctx = ToolContext("c1", None, "t1")
+
+        first = contextvars.Context().run(_run_request, ctx, "session-a")
+        second = contextvars.Context().run(_run_request, ctx, "session-b")
+
+        assert first == ("c1", "session-a", "t1")
+        assert second == ("c1", "session-b", "t1")
+        assert ctx.db_session is None
+
+    def test_bind_returns_previous_session(self):
+        def request():
+            outer = bind_db_session("outer")
+            previous = bind_db_session("inner")
+            assert previous == "outer"
+            bind_db_session(previous)
+            return database_tools._db_session_ctx.get(), outer
+
+        assert contextvars.Context().run(request) == ("outer", None)
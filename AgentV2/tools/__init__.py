@@ -7,16 +7,60 @@ LangChain tools for Data Agent V2.
 
 Includes:
     - 数据库查询工具 (execute_query, list_tables, get_schema)
+    - 查询结果缓存 (规范化 SQL 键，按表 / 数据源版本失效)
+    - 结果集存储 (完整结果保存在服务端，按 result_id 分页/流式读取，内存 LRU + 落盘)
+    - 查询保护 (自动补 LIMIT、EXPLAIN 成本预算、有界读取并报告截断，按租户配置预算；
+      LIMIT 改写与预算表经 backend_core 复用 backend/src/app/core/query_budget.py)
+    - 有界 LRU 缓存 (进程内缓存共用：O(1) 淘汰、TTL 清理、字节预算、命名空间统计)
+    - 图表 PNG 渲染 (常驻浏览器池，内容哈希缓存，批量渲染，常驻 MCP 会话)
     - MCP 工具包装器 (PostgreSQL, ECharts)
     - 数据转换工具
     - 图表生成工具
 """
 
 from .mcp_tools import get_mcp_tools, wrap_mcp_tools
-from .database_tools import get_database_tools
+from .database_tools import (
+    get_database_tools,
+    ToolContext,
+    bind_db_session,
+    invalidate_connection_cache,
+    invalidate_table_cache,
+)
+from .chart_renderer import (
+    ChartRenderError,
+    ChartRenderer,
+    RenderedChart,
+    get_chart_renderer,
+    get_mcp_chart_client,
+)
+from .lru_cache import LRUCache, get_all_cache_stats
+from .query_guard import QueryBudget, QueryGuard, QueryRejectedError, get_query_guard
+from .result_cache import QueryResultCache, canonicalize_sql, get_result_cache
+from .result_store import ResultMeta, ResultStore, get_result_store
 
 __all__ = [
     "get_mcp_tools",
     "wrap_mcp_tools",
-    "get_database_tools"
+    "get_database_tools",
+    "ToolContext",
+    "bind_db_session",
+    "invalidate_connection_cache",
+    "invalidate_table_cache",
+    "ChartRenderError",
+    "ChartRenderer",
+    "RenderedChart",
+    "get_chart_renderer",
+    "get_mcp_chart_client",
+    "LRUCache",
+    "get_all_cache_stats",
+    "QueryBudget",
+    "QueryGuard",
+    "QueryRejectedError",
+    "get_query_guard",
+    "QueryResultCache",
+    "canonicalize_sql",
+    "get_result_cache",
+    "ResultMeta",
+    "ResultStore",
+    "get_result_store",
 ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Backend Core - 导入 backend 中仅依赖标准库的基础模块
+===================================================
+
+AgentV2 与 backend 共用的实现（LRUCache、查询预算与 LIMIT 改写）只保留在
+backend/src/app/core/ 中，AgentV2 通过这里导入，不再各自维护一份。
+
+核心功能:
+    - backend 进程内（PYTHONPATH 含 backend 根目录）以 src.app.core.<name> 导入，
+      与 backend 自身使用同一模块对象
+    - AgentV2 独立运行时把仓库中的 backend/src 追加到 sys.path，以 app.core.<name> 导入
+      （与 config.py 读取 backend 配置的方式一致）
+
+版本: 1.0.0
+作者: BMad Master
+"""
+
+import importlib
+import sys
+from pathlib import Path
+from types import ModuleType
+
+_BACKEND_SRC = Path(__file__).resolve().parents[2] / "backend" / "src"
+
+
+def load_core_module(name: str) -> ModuleType:
+    """
+    导入 backend/src/app/core/<name>.py
+
+    Args:
+        name: 模块名（如 "lru_cache"）
+
+    Raises:
+        ImportError: 两种路径都找不到 backend 代码
+    """
+    try:
+        return importlib.import_module(f"src.app.core.{name}")
+    except ImportError:
+        pass
+    if _BACKEND_SRC.is_dir() and str(_BACKEND_SRC) not in sys.path:
+        sys.path.append(str(_BACKEND_SRC))
+    return importlib.import_module(f"app.core.{name}")
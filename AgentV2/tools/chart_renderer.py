@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+"""
+ChartRenderer - 图表 PNG 渲染服务
+================================
+
+替代每张图启动一次浏览器的 make_snapshot 和每张图新建一次 SSE 会话的 MCP 调用。
+
+核心功能:
+    - 常驻浏览器池 (BrowserBackend): 预热的无头 Chrome 常驻一个已加载 ECharts 的页面，
+      渲染时只执行 setOption + getDataURL，不重新启动浏览器也不重新加载页面；
+      驱动异常时丢弃该实例，下次按需重建
+    - 内容哈希缓存: 规范化图表配置（键排序、数值归一、去掉动画 / tooltip / toolbox 等不影响图片的项）
+      后取 SHA-256，连同尺寸作为键，图片存入字节预算 LRUCache
+    - 批量渲染: render_many 对相同配置去重，未命中的图表在浏览器池上并发渲染，单张失败不影响其他图表
+    - 常驻 MCP 会话 (McpChartClient): mcp-echarts 的 SSE 会话在事件循环内复用，结果按工具参数缓存
+
+PNG 渲染需要 selenium 与 Chrome；未安装时渲染返回 ChartRenderError，由调用方降级（如只生成 HTML）。
+
+版本: 1.1.0
+作者: BMad Master
+"""
+
+import asyncio
+import base64
+import hashlib
+import importlib.util
+import json
+import logging
+import math
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = int(os.environ.get("AGENT_CHART_POOL_SIZE", "2"))
+DEFAULT_WIDTH = int(os.environ.get("AGENT_CHART_WIDTH", "800"))
+DEFAULT_HEIGHT = int(os.environ.get("AGENT_CHART_HEIGHT", "500"))
+DEFAULT_PIXEL_RATIO = float(os.environ.get("AGENT_CHART_PIXEL_RATIO", "1"))
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get("AGENT_CHART_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+DEFAULT_CACHE_TTL = int(os.environ.get("AGENT_CHART_CACHE_TTL", "3600"))
+DEFAULT_ECHARTS_JS = os.environ.get("AGENT_CHART_ECHARTS_JS", "https://assets.pyecharts.org/assets/v5/echarts.min.js")
+DEFAULT_MCP_URL = os.environ.get("AGENT_ECHARTS_MCP_URL", "http://localhost:3033/sse")
+
+# 规范化时去掉的配置项（不影响静态图片）
+_VOLATILE_KEYS = ("tooltip", "toolbox", "axisPointer", "brush")
+
+
+class ChartRenderError(Exception):
+    """图表无法渲染（后端不可用、图表类型不支持或渲染失败）"""
+
+
+@dataclass
+class RenderedChart:
+    """渲染结果"""
+    key: str
+    data: bytes = b""
+    backend: str = ""
+    cached: bool = False
+    render_ms: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and bool(self.data)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode("ascii")
+
+    def save(self, output_dir: str) -> str:
+        """保存为 PNG，文件名取内容哈希（同一图表重复保存不产生新文件）"""
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"chart_{self.key[:16]}.png")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(self.data)
+        return path
+
+
+# ============================================================
+# 规范化与缓存键
+# ============================================================
+
+def _normalize(value: Any, top_level: bool = False) -> Any:
+    if isinstance(value, dict):
+        return {
+            str(k): _normalize(v) for k, v in value.items()
+            if not str(k).startswith("animation") and not (top_level and k in _VOLATILE_KEYS)
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        value = float(f"{value:.12g}")
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def normalize_option(option: Dict[str, Any]) -> Dict[str, Any]:
+    """规范化 ECharts 配置：数值归一（1.0 → 1、浮点噪声截断），去掉动画与交互配置"""
+    if not isinstance(option, dict):
+        raise ChartRenderError("图表配置必须是 ECharts option 对象")
+    return _normalize(option, top_level=True)
+
+
+def spec_key(option: Dict[str, Any], width: int, height: int, pixel_ratio: float) -> str:
+    """规范化配置的内容哈希（键顺序无关）"""
+    payload = json.dumps(
+        {"option": option, "size": [width, height, pixel_ratio]},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# 常驻浏览器池
+# ============================================================
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><script src="{echarts_js}"></script></head>
+<body style="margin:0"><div id="chart" style="width:{width}px;height:{height}px"></div></body></html>
+"""
+
+_RENDER_SCRIPT = """
+var option = arguments[0], width = arguments[1], height = arguments[2], ratio = arguments[3];
+var el = document.getElementById('chart');
+el.style.width = width + 'px';
+el.style.height = height + 'px';
+var chart = echarts.getInstanceByDom(el) || echarts.init(el);
+chart.resize();
+option.animation = false;
+chart.setOption(option, true);
+return chart.getDataURL({type: 'png', pixelRatio: ratio, backgroundColor: '#fff', excludeComponents: ['toolbox']});
+"""
+
+
+class BrowserBackend:
+    """
+    常驻无头 Chrome 池
+
+    每个驱动常驻一个已加载 ECharts 的页面，渲染只执行一次脚本；
+    驱动按需创建（不超过 pool_size），用完放回池中，执行失败的驱动直接关闭并在下次按需重建。
+    """
+
+    name = "browser"
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, echarts_js: str = DEFAULT_ECHARTS_JS,
+                 driver_factory: Optional[Callable[[], Any]] = None, render_timeout: float = 15.0):
+        self.pool_size = max(pool_size, 1)
+        self.echarts_js = echarts_js
+        self.render_timeout = render_timeout
+        self._driver_factory = driver_factory or self._start_driver
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._page_path: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {"drivers_started": 0, "drivers_discarded": 0, "renders": 0}
+
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("selenium") is not None
+
+    def _page_url(self) -> str:
+        with self._lock:
+            if self._page_path is None:
+                fd, path = tempfile.mkstemp(prefix="agentv2_chart_", suffix=".html")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(_PAGE_TEMPLATE.format(echarts_js=self.echarts_js, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT))
+                self._page_path = path
+            return "file://" + self._page_path
+
+    def _start_driver(self) -> Any:
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        for argument in ("--headless=new", "--no-sandbox", "--disable-gpu", "--disable-dev-shm-usage"):
+            options.add_argument(argument)
+        driver = webdriver.Chrome(options=options)
+        driver.set_script_timeout(self.render_timeout)
+        driver.get(self._page_url())
+        return driver
+
+    def _checkout(self) -> Any:
+        if not self._slots.acquire(timeout=self.render_timeout * 2):
+            raise ChartRenderError("等待浏览器渲染实例超时")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            driver = self._driver_factory()
+        except Exception as e:
+            self._slots.release()
+            raise ChartRenderError(f"启动浏览器失败: {e}") from e
+        self._stats["drivers_started"] += 1
+        return driver
+
+    def _checkin(self, driver: Any, broken: bool) -> None:
+        if broken:
+            self._stats["drivers_discarded"] += 1
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        else:
+            self._idle.put(driver)
+        self._slots.release()
+
+    def render(self, option: Dict[str, Any], width: int, height: int, pixel_ratio: float = 1.0) -> bytes:
+        driver = self._checkout()
+        broken = False
+        try:
+            data_url = driver.execute_script(_RENDER_SCRIPT, option, width, height, pixel_ratio)
+        except Exception as e:
+            broken = True
+            raise ChartRenderError(f"浏览器渲染失败: {e}") from e
+        finally:
+            self._checkin(driver, broken)
+        self._stats["renders"] += 1
+        if not isinstance(data_url, str) or "," not in data_url:
+            raise ChartRenderError("浏览器未返回图片数据")
+        return base64.b64decode(data_url.split(",", 1)[1])
+
+    def close(self) -> None:
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        if self._page_path and os.path.exists(self._page_path):
+            os.remove(self._page_path)
+            self._page_path = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"pool_size": self.pool_size, "idle": self._idle.qsize(), **self._stats}
+
+
+# ============================================================
+# 渲染服务
+# ============================================================
+
+class ChartRenderer:
+    """图表渲染服务（浏览器池 + 内容哈希缓存 + 批量渲染）"""
+
+    def __init__(self, browser: Optional[BrowserBackend] = None, cache: Optional[LRUCache] = None,
+                 width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT, pixel_ratio: float = DEFAULT_PIXEL_RATIO):
+        self._browser = browser
+        self.width = width
+        self.height = height
+        self.pixel_ratio = pixel_ratio
+        self.cache = cache or LRUCache(
+            name="chart_images", max_entries=None, max_bytes=DEFAULT_CACHE_MAX_BYTES, default_ttl=DEFAULT_CACHE_TTL
+        )
+        self._stats = {"hits": 0, "misses": 0, "errors": 0, "render_ms": 0.0}
+
+    @property
+    def browser(self) -> BrowserBackend:
+        """浏览器池（首次使用时创建）"""
+        if self._browser is None:
+            if not BrowserBackend.available():
+                raise ChartRenderError("渲染图表 PNG 需要浏览器后端: pip install selenium（并安装 Chrome）")
+            self._browser = BrowserBackend()
+        return self._browser
+
+    def _prepare(self, option: Dict[str, Any], width: Optional[int], height: Optional[int],
+                 pixel_ratio: Optional[float]) -> Tuple[str, Dict[str, Any], Any, Tuple[int, int, float]]:
+        normalized = normalize_option(option)
+        size = (width or self.width, height or self.height, pixel_ratio or self.pixel_ratio)
+        return spec_key(normalized, *size), normalized, self.browser, size
+
+    def _render_miss(self, key: str, option: Dict[str, Any], backend: Any, size: Tuple[int, int, float]) -> RenderedChart:
+        start = time.perf_counter()
+        try:
+            data = backend.render(option, *size)
+        except ChartRenderError:
+            self._stats["errors"] += 1
+            raise
+        except Exception as e:
+            self._stats["errors"] += 1
+            raise ChartRenderError(f"图表渲染失败: {e}") from e
+        elapsed = (time.perf_counter() - start) * 1000
+        self._stats["render_ms"] += elapsed
+        self.cache.set(key, data, size=len(data))
+        return RenderedChart(key=key, data=data, backend=backend.name, render_ms=elapsed)
+
+    def _lookup(self, key: str, backend: Any) -> Optional[RenderedChart]:
+        data = self.cache.get(key)
+        if data is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return RenderedChart(key=key, data=data, backend=backend.name, cached=True)
+
+    def render(self, option: Dict[str, Any], width: Optional[int] = None, height: Optional[int] = None,
+               pixel_ratio: Optional[float] = None) -> RenderedChart:
+        """
+        渲染单个图表为 PNG
+
+        Raises:
+            ChartRenderError: 图表无法渲染
+        """
+        key, normalized, backend, size = self._prepare(option, width, height, pixel_ratio)
+        return self._lookup(key, backend) or self._render_miss(key, normalized, backend, size)
+
+    def render_many(self, options: Sequence[Dict[str, Any]], width: Optional[int] = None,
+                    height: Optional[int] = None, pixel_ratio: Optional[float] = None) -> List[RenderedChart]:
+        """
+        批量渲染（结果与输入顺序一致）
+
+        相同配置只渲染一次；未命中缓存的图表在浏览器池上并发渲染。
+        单个图表失败时对应结果的 error 非空，不影响其他图表。
+        """
+        results: List[Optional[RenderedChart]] = [None] * len(options)
+        pending: Dict[str, Tuple[Dict[str, Any], Any, Tuple[int, int, float]]] = {}
+        keys: List[Optional[str]] = []
+        for i, option in enumerate(options):
+            try:
+                key, normalized, backend, size = self._prepare(option, width, height, pixel_ratio)
+            except ChartRenderError as e:
+                results[i] = RenderedChart(key="", error=str(e))
+                keys.append(None)
+                continue
+            keys.append(key)
+            if key not in pending:
+                cached = self._lookup(key, backend)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+                pending[key] = (normalized, backend, size)
+
+        def render_one(item: Tuple[str, Tuple[Dict[str, Any], Any, Tuple[int, int, float]]]) -> RenderedChart:
+            key, (normalized, backend, size) = item
+            try:
+                return self._render_miss(key, normalized, backend, size)
+            except ChartRenderError as e:
+                return RenderedChart(key=key, backend=backend.name, error=str(e))
+
+        workers = self._browser.pool_size if self._browser is not None else 1
+        if workers > 1 and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+                rendered = dict(zip(pending, executor.map(render_one, pending.items())))
+        else:
+            rendered = {key: render_one((key, value)) for key, value in pending.items()}
+
+        for i, key in enumerate(keys):
+            if results[i] is None and key is not None:
+                results[i] = rendered[key]
+        return results
+
+    def close(self) -> None:
+        if self._browser is not None:
+            self._browser.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {**self._stats, "cache": self.cache.get_stats()}
+        if self._browser is not None:
+            stats["browser"] = self._browser.get_stats()
+        return stats
+
+
+# ============================================================
+# 常驻 MCP 会话
+# ============================================================
+
+@asynccontextmanager
+async def _open_mcp_session(url: str):
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+
+    async with sse_client(url) as streams:
+        async with ClientSession(*streams) as session:
+            await session.initialize()
+            yield session
+
+
+def _parse_mcp_result(result: Any) -> Optional[Tuple[str, str]]:
+    """MCP 工具结果 → ("image", base64) / ("url", 链接)"""
+    for item in getattr(result, "content", None) or []:
+        if getattr(item, "type", None) == "image" and getattr(item, "data", None):
+            return "image", item.data
+        text = getattr(item, "text", None)
+        if text and text.startswith("http"):
+            return "url", text
+    return None
+
+
+class McpChartClient:
+    """
+    mcp-echarts 常驻会话
+
+    SSE 连接由一个后台任务持有（anyio 要求在同一任务内进入和退出上下文），
+    各调用共用该会话；调用失败时重连一次。事件循环变化时（如多次 asyncio.run）自动重新连接。
+    """
+
+    def __init__(self, url: str = DEFAULT_MCP_URL, cache: Optional[LRUCache] = None,
+                 session_factory: Optional[Callable[[], Any]] = None):
+        self.url = url
+        self.cache = cache if cache is not None else get_chart_renderer().cache
+        self._session_factory = session_factory or (lambda: _open_mcp_session(self.url))
+        self._session: Any = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._closed: Optional[asyncio.Event] = None
+        self._owner: Optional[asyncio.Task] = None
+        self._stats = {"connects": 0, "calls": 0, "hits": 0, "reconnects": 0}
+
+    async def _hold(self, ready: "asyncio.Future", closed: asyncio.Event) -> None:
+        try:
+            async with self._session_factory() as session:
+                ready.set_result(session)
+                await closed.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.info(f"[CHART] MCP 会话已断开: {e}")
+
+    async def _get_session(self) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧事件循环上的会话无法复用
+            self._loop, self._lock, self._session = loop, asyncio.Lock(), None
+        async with self._lock:
+            if self._session is None:
+                self._closed = asyncio.Event()
+                ready = loop.create_future()
+                self._owner = loop.create_task(self._hold(ready, self._closed))
+                self._session = await ready
+                self._stats["connects"] += 1
+            return self._session
+
+    async def reset(self) -> None:
+        """关闭当前会话（下次调用时重新连接）"""
+        self._session = None
+        if self._closed is not None:
+            self._closed.set()
+        if self._owner is not None and self._loop is asyncio.get_running_loop():
+            try:
+                await asyncio.wait_for(self._owner, timeout=5)
+            except Exception:
+                pass
+        self._owner = None
+
+    async def call_tool(self, tool_name: str, args: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """
+        调用图表工具（相同工具与参数直接返回缓存）
+
+        Returns:
+            ("image", base64) / ("url", 链接)，工具未返回图片时为 None
+        """
+        key = "mcp:" + hashlib.sha256(json.dumps(
+            {"tool": tool_name, "args": _normalize(args)}, sort_keys=True, ensure_ascii=False, default=str
+        ).encode("utf-8")).hexdigest()
+        cached = self.cache.get(key, namespace="mcp")
+        if cached is not None:
+            self._stats["hits"] += 1
+            return cached
+
+        self._stats["calls"] += 1
+        for attempt in range(2):
+            session = await self._get_session()
+            try:
+                result = await session.call_tool(tool_name, args)
+                break
+            except Exception:
+                await self.reset()
+                if attempt:
+                    raise
+                self._stats["reconnects"] += 1
+
+        payload = _parse_mcp_result(result)
+        if payload is not None:
+            self.cache.set(key, payload, namespace="mcp", size=len(payload[1]))
+        return payload
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"url": self.url, "connected": self._session is not None, **self._stats}
+
+
+_chart_renderer: Optional[ChartRenderer] = None
+_mcp_chart_client: Optional[McpChartClient] = None
+_singleton_lock = threading.Lock()
+
+
+def get_chart_renderer() -> ChartRenderer:
+    """获取全局图表渲染服务"""
+    global _chart_renderer
+    if _chart_renderer is None:
+        with _singleton_lock:
+            if _chart_renderer is None:
+                _chart_renderer = ChartRenderer()
+    return _chart_renderer
+
+
+def get_mcp_chart_client() -> McpChartClient:
+    """获取全局 mcp-echarts 常驻会话（与渲染服务共用图片缓存）"""
+    global _mcp_chart_client
+    if _mcp_chart_client is None:
+        renderer = get_chart_renderer()
+        with _singleton_lock:
+            if _mcp_chart_client is None:
+                _mcp_chart_client = McpChartClient(cache=renderer.cache)
+    return _mcp_chart_client
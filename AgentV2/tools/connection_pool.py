@@ -0,0 +1,629 @@
+# -*- coding: utf-8 -*-
+"""
+Connection Pool Manager - 数据源连接池管理
+==========================================
+
+为 AgentV2 数据库工具提供按 connection_id 划分的连接池。
+
+核心功能:
+    - 有界连接池：每个数据源最多 max_size 个连接，超出时等待
+    - 健康检查：空闲超过阈值的连接在借出前执行 SELECT 1
+    - 服务端取消：PostgreSQL 使用 statement_timeout / asyncpg 超时取消，
+      SQLite 使用 progress handler 中断
+    - 异步路径：PostgreSQL 通过 asyncpg 连接池原生 await
+    - 有界读取：execute(max_rows=N) 最多读取 N 行（PostgreSQL 服务端游标 / SQLite fetchmany），
+      explain() 返回不执行查询的执行计划，供 query_guard.py 做成本检查
+    - 池释放：事件循环切换、URL 变化或数据源失效（invalidate）时关闭旧的 asyncpg 池，
+      旧循环仍在运行时在其上关闭，已结束时直接终止连接
+
+作者: BMad Master
+版本: 1.1.1
+"""
+
+import os
+import re
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认配置（可通过环境变量覆盖）
+DEFAULT_POOL_MAX_SIZE = int(os.environ.get("AGENT_DB_POOL_MAX_SIZE", "5"))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.environ.get("AGENT_DB_POOL_ACQUIRE_TIMEOUT", "10"))
+DEFAULT_HEALTH_CHECK_INTERVAL = float(os.environ.get("AGENT_DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+DEFAULT_STATEMENT_TIMEOUT = int(os.environ.get("AGENT_DB_STATEMENT_TIMEOUT", "30"))
+
+# 可以用 DECLARE CURSOR 声明服务端游标的语句
+_CURSOR_QUERY_RE = re.compile(r"^\s*(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+
+
+class QueryTimeoutError(Exception):
+    """查询超时（已在服务端取消）"""
+    pass
+
+
+class PoolExhaustedError(Exception):
+    """连接池已满且等待超时"""
+    pass
+
+
+def _is_sqlite_url(database_url: str) -> bool:
+    return database_url.startswith("sqlite:///")
+
+
+def _to_asyncpg_dsn(database_url: str) -> str:
+    """将 SQLAlchemy 风格的 URL 转换为 asyncpg 可接受的 DSN"""
+    scheme, sep, rest = database_url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    if scheme == "postgres":
+        scheme = "postgresql"
+    return f"{scheme}{sep}{rest}"
+
+
+# ============================================================================
+# 同步连接池
+# ============================================================================
+
+class _PooledEntry:
+    """连接池中的一个连接及其元数据"""
+
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn: Any):
+        self.conn = conn
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+
+class SyncConnectionPool:
+    """
+    有界同步连接池（psycopg2 / sqlite3）
+
+    连接按 LIFO 复用，最近使用的连接优先借出，长期空闲的连接在借出前做健康检查。
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        max_size: int = DEFAULT_POOL_MAX_SIZE,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        statement_timeout: int = DEFAULT_STATEMENT_TIMEOUT
+    ):
+        """
+        初始化连接池
+
+        Args:
+            database_url: 数据库连接 URL
+            max_size: 最大连接数
+            acquire_timeout: 借出连接的最长等待时间（秒）
+            health_check_interval: 空闲超过该时间的连接借出前需健康检查（秒）
+            statement_timeout: 服务端语句超时（秒）
+        """
+        self.database_url = database_url
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.statement_timeout = statement_timeout
+        self.is_sqlite = _is_sqlite_url(database_url)
+        self.dialect = "sqlite" if self.is_sqlite else "postgresql"
+
+        self._idle: List[_PooledEntry] = []
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "timeouts": 0,
+            "waits": 0
+        }
+
+    # ------------------------------------------------------------------
+    # 连接生命周期
+    # ------------------------------------------------------------------
+
+    def _create_connection(self) -> Any:
+        """创建新的物理连接，语句超时在连接级别一次性设置"""
+        if self.is_sqlite:
+            import sqlite3
+            db_path = self.database_url.replace("sqlite:///", "")
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+        else:
+            import psycopg2
+            conn = psycopg2.connect(
+                self.database_url,
+                connect_timeout=10,
+                options=f"-c statement_timeout={self.statement_timeout * 1000}"
+            )
+            # 自动提交，避免连接在池中处于 idle in transaction 状态
+            conn.autocommit = True
+        self._stats["created"] += 1
+        logger.info(f"[POOL] New {'SQLite' if self.is_sqlite else 'PostgreSQL'} connection created")
+        return conn
+
+    def _close_connection(self, conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.debug(f"[POOL] Error closing connection: {e}")
+
+    def _is_alive(self, entry: _PooledEntry) -> bool:
+        """健康检查：已关闭的连接直接判死，长期空闲的连接执行 SELECT 1"""
+        if not self.is_sqlite and getattr(entry.conn, "closed", 0):
+            return False
+        if time.time() - entry.last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = entry.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"[POOL] Health check failed, discarding connection: {e}")
+            self._stats["health_check_failures"] += 1
+            return False
+
+    def _checkout(self) -> _PooledEntry:
+        deadline = time.time() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError("Connection pool is closed")
+
+                while self._idle:
+                    entry = self._idle.pop()
+                    if self._is_alive(entry):
+                        self._in_use += 1
+                        self._stats["reused"] += 1
+                        return entry
+                    self._close_connection(entry.conn)
+                    self._stats["discarded"] += 1
+
+                if self._in_use < self.max_size:
+                    # 先占位，再在锁外创建连接
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"No connection available within {self.acquire_timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        try:
+            return _PooledEntry(self._create_connection())
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, entry: _PooledEntry, discard: bool = False) -> None:
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._close_connection(entry.conn)
+                self._stats["discarded"] += 1
+            else:
+                entry.last_used = time.time()
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        借出一个连接
+
+        连接出现致命错误（连接断开等）时会被丢弃而不是归还。
+
+        Yields:
+            DB-API 连接对象
+        """
+        entry = self._checkout()
+        discard = False
+        try:
+            yield entry.conn
+        except Exception as e:
+            discard = self._is_fatal_error(e)
+            raise
+        finally:
+            self._checkin(entry, discard=discard)
+
+    def _is_fatal_error(self, error: Exception) -> bool:
+        """判断错误是否意味着连接已不可用"""
+        if self.is_sqlite:
+            return False
+        try:
+            import psycopg2
+            if isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                # 语句超时被取消的连接仍然可用
+                return not isinstance(error, psycopg2.extensions.QueryCanceledError)
+        except ImportError:
+            pass
+        return False
+
+    # ------------------------------------------------------------------
+    # 查询执行
+    # ------------------------------------------------------------------
+
+    def execute(
+        self,
+        query: str,
+        timeout: Optional[int] = None,
+        max_rows: Optional[int] = None
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        执行查询并返回 (columns, rows)
+
+        Args:
+            query: SQL 查询
+            timeout: 超时秒数（默认使用连接级 statement_timeout）
+            max_rows: 最多读取的行数（None 表示全部）。PostgreSQL 的 SELECT / WITH 使用服务端游标，
+                      其余情况使用 fetchmany，超出部分不会传输到客户端或不会被读取
+
+        Returns:
+            (列名列表, 行列表)
+
+        Raises:
+            QueryTimeoutError: 查询超时，已在服务端取消
+        """
+        timeout = timeout or self.statement_timeout
+        with self.connection() as conn:
+            if self.is_sqlite:
+                return self._execute_sqlite(conn, query, timeout, max_rows)
+            return self._execute_postgres(conn, query, timeout, max_rows)
+
+    def explain(self, query: str) -> Any:
+        """
+        获取执行计划（不执行查询）
+
+        Returns:
+            PostgreSQL: EXPLAIN (FORMAT JSON) 的结果；SQLite: EXPLAIN QUERY PLAN 的 [{"detail": ...}]
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if self.is_sqlite:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query}")
+                    return [{"detail": row[-1]} for row in cursor.fetchall()]
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {query}")
+                return cursor.fetchone()[0]
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def _fetch(cursor: Any, max_rows: Optional[int]) -> List[Any]:
+        return cursor.fetchall() if max_rows is None else cursor.fetchmany(max_rows)
+
+    def _execute_postgres(self, conn: Any, query: str, timeout: int, max_rows: Optional[int]) -> Tuple[List[str], List[Any]]:
+        import psycopg2
+
+        # 服务端游标（命名游标）需要在事务内，连接平时是自动提交模式
+        server_side = max_rows is not None and bool(_CURSOR_QUERY_RE.match(query))
+        if timeout != self.statement_timeout:
+            with conn.cursor() as setup:
+                setup.execute(f"SET statement_timeout = {int(timeout * 1000)}")
+        try:
+            if server_side:
+                conn.autocommit = False
+                cursor = conn.cursor(name=f"agent_{uuid.uuid4().hex[:12]}")
+            else:
+                cursor = conn.cursor()
+            try:
+                try:
+                    cursor.execute(query)
+                    if server_side:
+                        # 命名游标在第一次 FETCH 之后才有 description
+                        rows = cursor.fetchmany(max_rows)
+                    else:
+                        rows = self._fetch(cursor, max_rows) if cursor.description else []
+                except psycopg2.extensions.QueryCanceledError as e:
+                    self._stats["timeouts"] += 1
+                    raise QueryTimeoutError(f"Query execution timeout after {timeout} seconds") from e
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                return columns, rows
+            finally:
+                cursor.close()
+        finally:
+            if not conn.closed:
+                try:
+                    if server_side:
+                        # 只读查询，回滚即可结束事务并释放游标
+                        conn.rollback()
+                        conn.autocommit = True
+                    if timeout != self.statement_timeout:
+                        with conn.cursor() as setup:
+                            setup.execute(f"SET statement_timeout = {self.statement_timeout * 1000}")
+                except Exception:
+                    pass
+
+    def _execute_sqlite(self, conn: Any, query: str, timeout: int, max_rows: Optional[int]) -> Tuple[List[str], List[Any]]:
+        import sqlite3
+
+        deadline = time.monotonic() + timeout
+        # 每执行 N 条虚拟机指令回调一次，返回非零值即中断当前语句
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        cursor = conn.cursor()
+        try:
+            try:
+                cursor.execute(query)
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                # SQLite 逐行步进，fetchmany 读满后不再执行剩余部分
+                rows = self._fetch(cursor, max_rows) if cursor.description else []
+            except sqlite3.OperationalError as e:
+                if "interrupted" in str(e).lower():
+                    self._stats["timeouts"] += 1
+                    raise QueryTimeoutError(f"Query execution timeout after {timeout} seconds") from e
+                raise
+            return columns, rows
+        finally:
+            cursor.close()
+            conn.set_progress_handler(None, 0)
+
+    # ------------------------------------------------------------------
+    # 管理
+    # ------------------------------------------------------------------
+
+    def close(self) -> None:
+        """关闭连接池（在用连接归还时关闭）"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._close_connection(self._idle.pop().conn)
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "type": "sqlite" if self.is_sqlite else "postgresql",
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                **self._stats
+            }
+
+
+# ============================================================================
+# 异步连接池（asyncpg）
+# ============================================================================
+
+def _release_asyncpg_pool(pool: Any, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """
+    释放创建于 loop 上的 asyncpg 池
+
+    asyncpg 连接绑定在创建它的事件循环上：该循环仍在运行时把 close() 提交到该循环，
+    否则（循环已结束或已关闭）用 terminate() 直接断开连接。
+    """
+    if loop is not None and loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(pool.close(), loop)
+            return
+        except RuntimeError:
+            pass  # 提交前循环已关闭
+    try:
+        pool.terminate()
+    except Exception as e:
+        logger.warning(f"[POOL] Failed to terminate asyncpg pool: {e}")
+
+
+class AsyncPostgresPool:
+    """基于 asyncpg 的异步连接池，按事件循环懒加载"""
+
+    def __init__(
+        self,
+        database_url: str,
+        max_size: int = DEFAULT_POOL_MAX_SIZE,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        statement_timeout: int = DEFAULT_STATEMENT_TIMEOUT
+    ):
+        self.database_url = database_url
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.statement_timeout = statement_timeout
+        self.dialect = "postgresql"
+        self._pool = None
+        self._loop = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._stats = {"queries": 0, "timeouts": 0}
+
+    async def _get_pool(self):
+        loop = asyncio.get_running_loop()
+        if self._pool is not None and self._loop is loop:
+            return self._pool
+
+        if self._lock is None or self._loop is not loop:
+            stale, stale_loop = self._pool, self._loop
+            self._lock = asyncio.Lock()
+            self._loop = loop
+            self._pool = None
+            if stale is not None:
+                logger.info("[POOL] Event loop changed, releasing asyncpg pool of the previous loop")
+                _release_asyncpg_pool(stale, stale_loop)
+
+        async with self._lock:
+            if self._pool is None:
+                import asyncpg
+                self._pool = await asyncpg.create_pool(
+                    _to_asyncpg_dsn(self.database_url),
+                    min_size=1,
+                    max_size=self.max_size,
+                    max_inactive_connection_lifetime=300,
+                    server_settings={"statement_timeout": str(self.statement_timeout * 1000)}
+                )
+                logger.info("[POOL] asyncpg pool created")
+        return self._pool
+
+    async def execute(
+        self,
+        query: str,
+        timeout: Optional[int] = None,
+        max_rows: Optional[int] = None
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        异步执行查询并返回 (columns, rows)
+
+        asyncpg 在超时时会向服务端发送取消请求，连接随后可以安全复用。
+        指定 max_rows 时在只读事务中用游标读取，最多传输 max_rows 行。
+
+        Raises:
+            QueryTimeoutError: 查询超时
+        """
+        timeout = timeout or self.statement_timeout
+        pool = await self._get_pool()
+        self._stats["queries"] += 1
+        async with pool.acquire(timeout=self.acquire_timeout) as conn:
+            try:
+                stmt = await conn.prepare(query, timeout=timeout)
+                columns = [attr.name for attr in stmt.get_attributes()]
+                if max_rows is None:
+                    records = await stmt.fetch(timeout=timeout)
+                else:
+                    async with conn.transaction(readonly=True):
+                        cursor = await stmt.cursor(timeout=timeout)
+                        records = await cursor.fetch(max_rows, timeout=timeout)
+            except asyncio.TimeoutError as e:
+                self._stats["timeouts"] += 1
+                raise QueryTimeoutError(f"Query execution timeout after {timeout} seconds") from e
+        return columns, [list(record) for record in records]
+
+    async def explain(self, query: str) -> Any:
+        """获取执行计划（EXPLAIN (FORMAT JSON)，不执行查询）"""
+        pool = await self._get_pool()
+        async with pool.acquire(timeout=self.acquire_timeout) as conn:
+            return await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", timeout=self.statement_timeout)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def discard(self) -> None:
+        """不等待地释放连接池（可在任意线程、事件循环之外调用）"""
+        pool, loop = self._pool, self._loop
+        self._pool = None
+        if pool is not None:
+            _release_asyncpg_pool(pool, loop)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {"type": "asyncpg", "max_size": self.max_size, **self._stats}
+        if self._pool is not None:
+            stats["size"] = self._pool.get_size()
+            stats["idle"] = self._pool.get_idle_size()
+        return stats
+
+
+# ============================================================================
+# 连接池管理器
+# ============================================================================
+
+class ConnectionPoolManager:
+    """
+    按数据源划分的连接池管理器
+
+    池键为 connection_id（未指定时使用 URL 哈希）。同一 connection_id 的连接
+    URL 发生变化时（例如凭据更新），旧池会被关闭并重建。
+    """
+
+    def __init__(self, max_size: int = DEFAULT_POOL_MAX_SIZE):
+        self.max_size = max_size
+        self._sync_pools: Dict[str, SyncConnectionPool] = {}
+        self._async_pools: Dict[str, AsyncPostgresPool] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _pool_key(database_url: str, connection_id: Optional[str]) -> str:
+        if connection_id:
+            return f"conn:{connection_id}"
+        return f"url:{hashlib.md5(database_url.encode()).hexdigest()}"
+
+    def get_sync_pool(self, database_url: str, connection_id: Optional[str] = None) -> SyncConnectionPool:
+        """获取（或创建）同步连接池"""
+        key = self._pool_key(database_url, connection_id)
+        with self._lock:
+            pool = self._sync_pools.get(key)
+            if pool is not None and pool.database_url != database_url:
+                logger.info(f"[POOL] Database URL changed for {key}, recreating pool")
+                pool.close()
+                pool = None
+            if pool is None:
+                pool = SyncConnectionPool(database_url, max_size=self.max_size)
+                self._sync_pools[key] = pool
+            return pool
+
+    def get_async_pool(self, database_url: str, connection_id: Optional[str] = None) -> AsyncPostgresPool:
+        """获取（或创建）异步 PostgreSQL 连接池"""
+        key = self._pool_key(database_url, connection_id)
+        with self._lock:
+            pool = self._async_pools.get(key)
+            if pool is not None and pool.database_url != database_url:
+                logger.info(f"[POOL] Database URL changed for {key}, recreating async pool")
+                pool.discard()
+                pool = None
+            if pool is None:
+                pool = AsyncPostgresPool(database_url, max_size=self.max_size)
+                self._async_pools[key] = pool
+            return pool
+
+    def invalidate(self, connection_id: str) -> None:
+        """关闭指定数据源的连接池（数据源配置变更或删除时调用）"""
+        key = self._pool_key("", connection_id)
+        with self._lock:
+            sync_pool = self._sync_pools.pop(key, None)
+            async_pool = self._async_pools.pop(key, None)
+        if sync_pool is not None:
+            sync_pool.close()
+        if async_pool is not None:
+            async_pool.discard()
+
+    def close_all(self) -> None:
+        """关闭所有同步连接池"""
+        with self._lock:
+            pools = list(self._sync_pools.values())
+            self._sync_pools.clear()
+        for pool in pools:
+            pool.close()
+
+    async def aclose_all(self) -> None:
+        """关闭所有连接池（包括异步池）"""
+        self.close_all()
+        with self._lock:
+            pools = list(self._async_pools.values())
+            self._async_pools.clear()
+        for pool in pools:
+            await pool.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sync_pools": {key: pool.get_stats() for key, pool in self._sync_pools.items()},
+                "async_pools": {key: pool.get_stats() for key, pool in self._async_pools.items()}
+            }
+
+
+_pool_manager: Optional[ConnectionPoolManager] = None
+_pool_manager_lock = threading.Lock()
+
+
+def get_pool_manager() -> ConnectionPoolManager:
+    """获取全局连接池管理器"""
+    global _pool_manager
+    if _pool_manager is None:
+        with _pool_manager_lock:
+            if _pool_manager is None:
+                _pool_manager = ConnectionPoolManager()
+    return _pool_manager
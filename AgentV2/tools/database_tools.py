@@ -11,19 +11,25 @@ Database Query Tools - 数据库查询工具 (带缓存优化 + Excel支持)
     - get_schema: 获取表结构或 Excel 列信息
 
 优化特性:
-    - Schema 缓存：避免重复查询表结构
-    - 查询结果缓存：相同查询直接返回缓存
+    - Schema 缓存：避免重复查询表结构（有界 LRU，按数据源分命名空间，数据源变更时只失效该数据源）
+    - 查询结果缓存：按规范化 SQL 缓存，字节预算 LRU，按表/数据源版本失效，可选 Redis 共享（见 result_cache.py）
+    - 结果集句柄：大结果完整存于服务端（见 result_store.py），只把样例行、列统计和 result_id 交给 LLM；
+      可内联的小结果不写入存储
+    - 连接池：按数据源复用连接，超时由服务端取消（见 connection_pool.py）
+    - 查询保护：自动补 LIMIT、EXPLAIN 成本预算、按行数上限有界读取并报告截断（见 query_guard.py）
+    - 异步执行：aexecute_query 供 LangGraph 直接 await
     - TTL 机制：缓存过期自动刷新
-    - 多数据源支持：PostgreSQL, MySQL, Excel 文件
+    - 多数据源支持：PostgreSQL, MySQL, Excel 文件（Excel 由 DuckDB 执行完整 SQL，每个工作表一个视图，
+      数据源名 / 原文件名作为默认工作表的别名）
+    - 请求级会话：池化 Agent 共享的 ToolContext 不保存会话，请求经 bind_db_session 绑定（contextvars）
 
 作者: BMad Master
-版本: 3.0.0
+版本: 3.6.4
 """
 
 import os
 import hashlib
 import json
-import time
 from typing import Optional, List, Dict, Any, Tuple
 from functools import wraps
 import logging
@@ -31,6 +37,11 @@ import logging
 # 使用 contextvars 替代 threading.local，支持异步/多线程环境
 from contextvars import ContextVar
 
+from .lru_cache import LRUCache
+from .query_guard import QueryRejectedError, get_query_guard
+from .result_cache import get_result_cache
+from .result_store import INLINE_BYTES, INLINE_ROWS, SAMPLE_ROWS, get_result_store
+
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -62,6 +73,22 @@ def _get_connection_context() -> Tuple[Optional[str], Optional[Any], Optional[st
     return (connection_id, db_session, tenant_id)
 
 
+def bind_db_session(db_session: Optional[Any]) -> Optional[Any]:
+    """
+    在当前请求的上下文中绑定数据库会话
+
+    池化复用的 Agent 共享同一个 ToolContext，会话不能存放在其中；调用方在执行 Agent 前
+    于请求自己的上下文中绑定，工具在线程池 / 子任务中运行时随 contextvars 复制获得。
+    结束时以返回值再次调用以恢复（不用 Token.reset：流式生成器可能在另一个上下文中被关闭）。
+
+    Returns:
+        绑定前的会话
+    """
+    previous = _db_session_ctx.get()
+    _db_session_ctx.set(db_session)
+    return previous
+
+
 def _clear_connection_context() -> None:
     """清除连接上下文"""
     _connection_id_ctx.set(None)
@@ -73,72 +100,11 @@ def _clear_connection_context() -> None:
 # 缓存管理
 # ============================================================================
 
-class SimpleCache:
-    """增强的内存缓存，支持统计"""
-
-    def __init__(self, ttl: int = 300, name: str = "cache"):
-        """
-        初始化缓存
-
-        Args:
-            ttl: 缓存过期时间（秒），默认 5 分钟
-            name: 缓存名称（用于统计）
-        """
-        self._cache: Dict[str, tuple] = {}  # key -> (value, expire_time)
-        self.ttl = ttl
-        self.name = name
-        self._hits = 0
-        self._misses = 0
-        self._sets = 0
-
-    def get(self, key: str) -> Optional[Any]:
-        """获取缓存"""
-        if key in self._cache:
-            value, expire_time = self._cache[key]
-            if time.time() < expire_time:
-                self._hits += 1
-                return value
-            else:
-                # 缓存过期，删除
-                del self._cache[key]
-        self._misses += 1
-        return None
-
-    def set(self, key: str, value: Any) -> None:
-        """设置缓存"""
-        expire_time = time.time() + self.ttl
-        self._cache[key] = (value, expire_time)
-        self._sets += 1
-
-    def clear(self) -> None:
-        """清空缓存"""
-        self._cache.clear()
-        self._hits = 0
-        self._misses = 0
-        self._sets = 0
-
-    def has(self, key: str) -> bool:
-        """检查缓存是否存在且未过期"""
-        return self.get(key) is not None
-
-    def get_stats(self) -> Dict[str, Any]:
-        """获取缓存统计"""
-        total_requests = self._hits + self._misses
-        hit_rate = self._hits / total_requests if total_requests > 0 else 0
-        return {
-            "name": self.name,
-            "size": len(self._cache),
-            "hits": self._hits,
-            "misses": self._misses,
-            "sets": self._sets,
-            "hit_rate": hit_rate,
-            "ttl": self.ttl
-        }
-
-
 # 全局缓存实例
-_schema_cache = SimpleCache(ttl=600, name="schema_cache")  # Schema 缓存 10 分钟
-_query_cache = SimpleCache(ttl=300, name="query_cache")    # 查询结果缓存 5 分钟 (延长 TTL)
+_schema_cache = LRUCache(                                  # Schema 缓存 10 分钟，按数据源分命名空间
+    name="schema_cache", max_entries=2000, max_bytes=32 * 1024 * 1024, default_ttl=600
+)
+_query_cache = get_result_cache()                          # 查询结果缓存（规范化 SQL 键，默认 5 分钟）
 
 
 def _normalize_sql(sql: str) -> str:
@@ -186,11 +152,45 @@ def _make_cache_key(*args, **kwargs) -> str:
     return hashlib.md5(key_str.encode()).hexdigest()
 
 
+def _lookup_cached_result(cleaned_query: str, connection_id: Optional[str]) -> Optional[str]:
+    """读取查询结果缓存；引用的结果集已不可用（过期或在其他 worker 上）时按未命中处理"""
+    cached = _query_cache.get(cleaned_query, connection_id)
+    if cached is None or '"result_id"' not in cached:
+        return cached
+    try:
+        result_id = json.loads(cached).get("result_id")
+    except ValueError:
+        return cached
+    if result_id and not get_result_store().exists(result_id):
+        logger.info(f"Cached result set unavailable, re-executing: {result_id}")
+        return None
+    return cached
+
+
+def invalidate_connection_cache(connection_id: Optional[str]) -> None:
+    """使数据源的 schema 缓存、查询结果缓存和连接池失效（数据源更新 / 删除时调用）"""
+    _schema_cache.clear_namespace(connection_id or "default")
+    _query_cache.invalidate_connection(connection_id)
+    if connection_id:
+        from .connection_pool import get_pool_manager
+        get_pool_manager().invalidate(connection_id)
+
+
+def invalidate_table_cache(connection_id: Optional[str], tables: List[str]) -> None:
+    """使引用了指定表的查询结果失效（表数据变更时调用）"""
+    _query_cache.invalidate_tables(connection_id, tables)
+
+
 def get_cache_stats() -> Dict[str, Any]:
     """获取所有缓存统计信息"""
+    from .connection_pool import get_pool_manager
+
     return {
         "schema_cache": _schema_cache.get_stats(),
-        "query_cache": _query_cache.get_stats()
+        "query_cache": _query_cache.get_stats(),
+        "result_store": get_result_store().get_stats(),
+        "query_guard": get_query_guard().get_stats(),
+        "connection_pools": get_pool_manager().get_stats()
     }
 
 # ============================================================================
@@ -416,272 +416,206 @@ def _get_excel_file_path(database_url: str) -> str:
 # Excel 查询工具
 # ============================================================================
 
-def execute_excel_query(
-    query: str,
-    file_path: str,
-    sheet_name: Optional[str] = None
-) -> str:
+def _get_columnar_cache():
     """
-    执行 Excel 文件查询（使用 pandas）
+    获取 backend 的列式物化缓存服务（Excel/CSV → Parquet）
+
+    AgentV2 独立运行（没有 backend 包）时返回 None，调用方回退到直接解析文件。
+    """
+    try:
+        from src.app.services.columnar_cache_service import get_columnar_cache_service
+    except ImportError:
+        try:
+            from app.services.columnar_cache_service import get_columnar_cache_service
+        except ImportError:
+            return None
+    try:
+        return get_columnar_cache_service()
+    except Exception as e:
+        logger.warning(f"Columnar cache unavailable: {e}")
+        return None
+
+
+def _get_cached_excel(file_path: str) -> Optional[Any]:
+    """物化 Excel 文件并返回 CachedFile（缓存不可用时返回 None）"""
+    cache = _get_columnar_cache()
+    if cache is None:
+        return None
+    file_type = os.path.splitext(file_path)[1].lstrip(".").lower() or "xlsx"
+    try:
+        return cache.materialize_file(file_path, file_type)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logger.warning(f"Columnar materialization failed, falling back to direct parsing: {e}")
+        return None
+
+
+# 无列式缓存时（AgentV2 独立运行）的工作表 DataFrame 缓存
+# 键为 (文件路径, mtime_ns, size)，文件变化后自动失效
+_EXCEL_FRAME_CACHE_SIZE = 4
+_excel_frame_cache = LRUCache(name="excel_frames", max_entries=_EXCEL_FRAME_CACHE_SIZE)
 
-    Args:
-        query: 类似 SQL 的查询或 pandas 代码
-        file_path: Excel 文件路径
-        sheet_name: 工作表名称（可选）
+
+def _load_excel_frames(file_path: str) -> Dict[str, Any]:
+    """
+    读取 Excel 全部工作表为 DataFrame（进程内 LRU 缓存）
 
     Returns:
-        查询结果的 JSON 字符串
+        {工作表名: DataFrame}
     """
-    import json
     import pandas as pd
 
-    try:
-        # 读取 Excel 文件
-        if sheet_name:
-            df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl')
-        else:
-            # 读取第一个工作表
-            df = pd.read_excel(file_path, engine='openpyxl')
-            sheet_name = "Sheet1"
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    frames = _excel_frame_cache.get(key)
+    if frames is not None:
+        return frames
 
-        logger.info(f"Excel file loaded: {file_path}, sheet: {sheet_name}, shape: {df.shape}")
+    frames = pd.read_excel(file_path, sheet_name=None, engine='openpyxl')
+    _excel_frame_cache.set(key, frames)
+    return frames
 
-        # 简单的 SQL 解析和转换
-        result_df = _parse_sql_to_pandas(query, df)
 
-        # 转换为结果格式
-        columns = result_df.columns.tolist()
-        rows = result_df.values.tolist()
+def _excel_aliases(connection_info: Optional[Any]) -> Dict[str, str]:
+    """
+    Excel 表名别名：数据源名称 / 原文件名（去扩展名）→ 默认工作表
 
-        # 处理 NaN 值
-        rows = [[None if pd.isna(v) else v for v in row] for row in rows]
+    按数据源名写的 SQL（旧的 pandas 路径会忽略表名直接读默认工作表）继续可用；
+    与 /llm 端点的 DuckDB 路径一致，同时注册清理后的名称（非字母数字中文替换为下划线）。
 
-        result = {
-            "columns": columns,
-            "rows": rows,
-            "row_count": len(rows),
-            "success": True,
-            "data_source": "excel",
-            "sheet_name": sheet_name
-        }
-
-        logger.info(f"Excel query executed: {len(rows)} rows returned")
-        return json.dumps(result, ensure_ascii=False, default=str)
+    Returns:
+        {别名: 工作表名}，没有默认工作表时为空
+    """
+    import re
 
-    except FileNotFoundError:
-        logger.error(f"Excel file not found: {file_path}")
-        return json.dumps({
-            "error": f"Excel file not found: {file_path}",
-            "error_type": "file_not_found"
-        }, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Excel query error: {e}")
-        return json.dumps({
-            "error": str(e),
-            "error_type": "execution_error"
-        }, ensure_ascii=False)
+    sheet = getattr(connection_info, "table_name", None)
+    if not sheet:
+        return {}
+    names = [
+        getattr(connection_info, "data_source_name", None),
+        os.path.splitext(getattr(connection_info, "database_name", None) or "")[0],
+    ]
+    aliases: Dict[str, str] = {}
+    for name in filter(None, names):
+        aliases.setdefault(name, sheet)
+        aliases.setdefault(re.sub(r'[^\w\u4e00-\u9fff]', '_', name), sheet)
+    return aliases
 
 
-def _parse_sql_to_pandas(query: str, df: "Any") -> "Any":
+def _register_excel_tables(conn: Any, file_path: str, aliases: Optional[Dict[str, str]] = None) -> List[str]:
     """
-    简单的 SQL 到 pandas 转换
+    在 DuckDB 连接中注册 Excel 的全部工作表及别名
 
-    支持的基本 SQL 语法:
-    - SELECT col1, col2 FROM table
-    - SELECT * FROM table
-    - SELECT ... FROM table WHERE col = value
-    - SELECT ... FROM table WHERE col LIKE value
-    - SELECT ... FROM table ORDER BY col
-    - SELECT ... FROM table LIMIT n
+    优先注册为指向列式缓存 Parquet 的视图；缓存不可用时将 DataFrame
+    直接注册给 DuckDB（零拷贝扫描，不复制数据）。与工作表同名的别名不覆盖工作表。
 
     Args:
-        query: SQL 查询语句
-        df: pandas DataFrame
+        conn: duckdb 连接
+        file_path: Excel 文件路径
+        aliases: 额外别名 {别名: 工作表名}
 
     Returns:
-        过滤后的 DataFrame
+        已注册的表名列表
     """
-    import re
+    cached = _get_cached_excel(file_path)
+    if cached is not None:
+        return _get_columnar_cache().register_views(conn, cached, aliases)
 
-    query_upper = query.upper().strip()
-    result_df = df.copy()
-
-    # 提取 SELECT 列
-    select_match = re.search(r'SELECT\s+(.+?)\s+FROM', query_upper)
-    if select_match:
-        columns_str = select_match.group(1).strip()
-        if columns_str != '*':
-            # 解析列名（处理逗号分隔的列）
-            columns = [col.strip().lower() for col in columns_str.split(',')]
-            # 匹配实际列名（不区分大小写）
-            actual_columns = {col.lower(): col for col in df.columns}
-            selected_columns = []
-            for col in columns:
-                if col in actual_columns:
-                    selected_columns.append(actual_columns[col])
-            if selected_columns:
-                result_df = result_df[selected_columns]
-
-    # 提取 WHERE 条件
-    where_match = re.search(r'WHERE\s+(.+?)(?:\s+ORDER\s+BY|\s+LIMIT|;|$)', query_upper)
-    if where_match:
-        where_clause = where_match.group(1).strip()
-        result_df = _apply_where_clause(result_df, where_clause)
-
-    # 提取 ORDER BY
-    order_match = re.search(r'ORDER\s+BY\s+(\w+)(?:\s+(ASC|DESC))?', query_upper)
-    if order_match:
-        col_name = order_match.group(1).lower()
-        direction = order_match.group(2) if order_match.group(2) else 'ASC'
-
-        # 匹配实际列名
-        actual_columns = {col.lower(): col for col in result_df.columns}
-        if col_name in actual_columns:
-            actual_col = actual_columns[col_name]
-            ascending = direction == 'ASC'
-            result_df = result_df.sort_values(by=actual_col, ascending=ascending)
-
-    # 提取 LIMIT
-    limit_match = re.search(r'LIMIT\s+(\d+)', query_upper)
-    if limit_match:
-        limit = int(limit_match.group(1))
-        result_df = result_df.head(limit)
-
-    return result_df
-
-
-def _apply_where_clause(df: "Any", where_clause: str) -> "Any":
+    frames = _load_excel_frames(file_path)
+    registered = []
+    for name, df in frames.items():
+        conn.register(str(name), df)
+        registered.append(str(name))
+    for alias, sheet in (aliases or {}).items():
+        if alias not in registered and sheet in frames:
+            conn.register(alias, frames[sheet])
+            registered.append(alias)
+    return registered
+
+
+def execute_excel_query(
+    query: str,
+    file_path: str,
+    sheet_name: Optional[str] = None,
+    aliases: Optional[Dict[str, str]] = None
+) -> str:
     """
-    应用 WHERE 条件到 DataFrame
+    执行 Excel 文件查询（使用 DuckDB）
 
-    支持的条件:
-    - col = value
-    - col LIKE value
-    - col > value, col < value, col >= value, col <= value
-    - col AND col
-    - col OR col
+    所有工作表都注册为表，查询由 DuckDB 向量化执行，支持聚合、GROUP BY、
+    JOIN 等完整 SQL，只返回结果行。
 
     Args:
-        df: pandas DataFrame
-        where_clause: WHERE 子句
+        query: SQL 查询
+        file_path: Excel 文件路径
+        sheet_name: 查询的主工作表名称（可选，仅用于结果标注）
+        aliases: 额外表名别名 {别名: 工作表名}（见 _excel_aliases）
 
     Returns:
-        过滤后的 DataFrame
+        查询结果的 JSON 字符串（格式同 execute_query，附带 data_source 与 sheet_name）
     """
-    import re
+    import json
+    import duckdb
 
-    result_df = df.copy()
+    try:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(file_path)
 
-    # 分割 AND/OR 条件
-    conditions = re.split(r'\s+(AND|OR)\s+', where_clause, flags=re.IGNORECASE)
-    current_op = 'AND'
+        # 内存中的 DuckDB 查询不做 EXPLAIN 成本检查，只应用行数上限
+        guard = get_query_guard()
+        guarded = guard.prepare(query, _tenant_id_ctx.get())
 
-    for i, cond in enumerate(conditions):
-        cond = cond.strip()
-        if cond.upper() in ('AND', 'OR'):
-            current_op = cond.upper()
-            continue
+        conn = duckdb.connect(':memory:')
+        try:
+            tables = _register_excel_tables(conn, file_path, aliases)
+            logger.info(f"Excel file registered: {file_path}, tables: {tables}")
 
-        # 解析条件 - 🔧 修复：将更长的操作符放在前面
-        match = re.match(
-            r'(\w+)\s*(>=|<=|<>|=|LIKE|>|<)\s*[\'"]?([^\'"]+)[\'"]?',
-            cond,
-            re.IGNORECASE
+            cursor = conn.execute(guarded.query)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            rows = [list(row) for row in cursor.fetchmany(guarded.fetch_rows)] if cursor.description else []
+        finally:
+            conn.close()
+
+        rows, limit_extra = guard.finish(guarded, rows)
+        logger.info(f"Excel query executed: {len(rows)} rows returned")
+        return _format_query_result(
+            columns, rows, _connection_id_ctx.get(),
+            extra={"data_source": "excel", "sheet_name": sheet_name, **limit_extra}
         )
-        if match:
-            col_name = match.group(1).lower()
-            operator = match.group(2).upper()
-            value = match.group(3).strip()
-
-            # 匹配实际列名
-            actual_columns = {col.lower(): col for col in result_df.columns}
-            if col_name not in actual_columns:
-                continue
-
-            actual_col = actual_columns[col_name]
-
-            # 应用条件
-            mask = None
-            if operator == '=':
-                # 尝试转换为数字
-                try:
-                    value_num = float(value)
-                    mask = result_df[actual_col] == value_num
-                except ValueError:
-                    mask = result_df[actual_col].astype(str) == value
-            elif operator == 'LIKE':
-                mask = result_df[actual_col].astype(str).str.contains(
-                    value.replace('%', ''),
-                    case=False,
-                    na=False
-                )
-            elif operator == '>':
-                try:
-                    value_num = float(value)
-                    mask = result_df[actual_col] > value_num
-                except ValueError:
-                    mask = result_df[actual_col].astype(str) > value
-            elif operator == '<':
-                try:
-                    value_num = float(value)
-                    mask = result_df[actual_col] < value_num
-                except ValueError:
-                    mask = result_df[actual_col].astype(str) < value
-            elif operator == '>=':
-                try:
-                    value_num = float(value)
-                    mask = result_df[actual_col] >= value_num
-                except ValueError:
-                    mask = result_df[actual_col].astype(str) >= value
-            elif operator == '<=':
-                try:
-                    value_num = float(value)
-                    mask = result_df[actual_col] <= value_num
-                except ValueError:
-                    mask = result_df[actual_col].astype(str) <= value
-            elif operator == '<>':
-                # 不等于
-                try:
-                    value_num = float(value)
-                    mask = result_df[actual_col] != value_num
-                except ValueError:
-                    mask = result_df[actual_col].astype(str) != value
-
-            if mask is not None:
-                if i == 0 or current_op == 'AND':
-                    result_df = result_df[mask]
-                else:  # OR
-                    result_df = pd.concat([result_df, df[mask]]).drop_duplicates()
-
-    return result_df
+
+    except FileNotFoundError:
+        logger.error(f"Excel file not found: {file_path}")
+        return json.dumps({
+            "error": f"Excel file not found: {file_path}",
+            "error_type": "file_not_found"
+        }, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"Excel query error: {e}")
+        return json.dumps({
+            "error": str(e),
+            "error_type": "execution_error",
+            "query": query[:100],
+            "suggestion": get_query_suggestion(str(e), query)
+        }, ensure_ascii=False)
 
 
 # ============================================================================
 # 数据库查询工具
 # ============================================================================
 
-# 注意：这些函数不再使用 @tool 装饰器，而是在 get_database_tools 中手动创建 StructuredTool
-def execute_query(query: str, connection_id: Optional[str] = None) -> str:
+def _prepare_query(query: str) -> Tuple[Optional[str], Optional[str]]:
     """
-    执行数据查询 (支持数据库和 Excel 文件)
-
-    这个工具用于执行只读的数据查询，获取数据。
-    自动检测数据源类型并使用相应的查询方法。
+    执行前的安全检查和 SQL 清理
 
     Args:
-        query: SQL SELECT 查询语句（或用于 Excel 的类 SQL 查询）
-        connection_id: 数据源连接 ID (可选)
+        query: 原始 SQL 查询
 
     Returns:
-        查询结果的 JSON 字符串，包含列信息和行数据
-
-    Example:
-        >>> execute_query("SELECT * FROM users LIMIT 10")
-        '{"columns": ["id", "name"], "rows": [[1, "Alice"], [2, "Bob"]], "row_count": 2}'
+        (cleaned_query, error_json) 元组，检查失败时 cleaned_query 为 None
     """
     import json
     import re
-    import threading
 
     # 安全检查：只允许 SELECT 查询
     query_upper = query.upper().strip()
@@ -694,7 +628,7 @@ def execute_query(query: str, connection_id: Optional[str] = None) -> str:
 
     for keyword in dangerous_keywords:
         if re.search(rf"\b{keyword}\b", query_upper):
-            return json.dumps({
+            return None, json.dumps({
                 "error": f"Security Alert: {keyword} operations are not allowed",
                 "error_type": "forbidden_operation"
             }, ensure_ascii=False)
@@ -702,7 +636,7 @@ def execute_query(query: str, connection_id: Optional[str] = None) -> str:
     # 检查是否以 SELECT 或其他允许的关键字开头
     allowed_starts = ["SELECT", "WITH", "SHOW", "EXPLAIN", "DESCRIBE", "DESC"]
     if not any(query_upper.startswith(start) for start in allowed_starts):
-        return json.dumps({
+        return None, json.dumps({
             "error": "Query must start with SELECT, WITH, SHOW, EXPLAIN, or DESCRIBE",
             "error_type": "invalid_query_type"
         }, ensure_ascii=False)
@@ -712,14 +646,155 @@ def execute_query(query: str, connection_id: Optional[str] = None) -> str:
     if cleaned_query != query:
         logger.info(f"SQL cleaned: {query[:50]}... -> {cleaned_query[:50]}...")
 
+    return cleaned_query, None
+
+
+def _resolve_excel_sheet(cleaned_query: str, connection_info: Optional[Any]) -> Optional[str]:
+    """从 SQL 中解析 Excel 工作表名，失败时回退到 connection_info.table_name"""
+    # 🔥 修复：从 SQL 查询中解析表名，而不是使用固定的 table_name
+    extracted_table_name = _extract_table_name_from_query(cleaned_query)
+
+    # 如果成功提取表名，使用它；否则回退到 connection_info.table_name
+    if extracted_table_name:
+        logger.info(f"Using extracted table name from SQL: '{extracted_table_name}'")
+        return extracted_table_name
+
+    sheet_name = connection_info.table_name if connection_info else None
+    logger.warning(f"Could not extract table name from SQL, using default: '{sheet_name}'")
+    return sheet_name
+
+
+def _format_query_result(
+    columns: List[str],
+    rows: List[Any],
+    connection_id: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    构建查询成功的 JSON 结果
+
+    行数和体积较小时内联全部行（与原格式相同），不写入结果集存储；否则完整结果存入
+    结果集存储并附带 result_id，rows 只保留前 SAMPLE_ROWS 行并附带列统计，
+    避免把整个结果集送入 LLM 上下文。
+    """
+    import json
+
+    logger.info(f"Query executed successfully: {len(rows)} rows returned")
+    result = {
+        "columns": columns,
+        "rows": rows,
+        "row_count": len(rows),
+        "success": True,
+        **(extra or {})
+    }
+
+    # 超出查询保护的行数上限时，结果本身就不完整
+    limit_note = ""
+    if result.get("row_limit_reached"):
+        limit_note = (
+            f"查询结果超过行数上限，只读取了前 {result['row_limit']} 行，实际行数更多；"
+            "请不要把 row_count 当作总行数，需要总数时用 COUNT(*) 查询。"
+        )
+        result["note"] = limit_note
+
+    if len(rows) <= INLINE_ROWS:
+        inline = json.dumps(result, ensure_ascii=False, default=str)
+        if len(inline) <= INLINE_BYTES:
+            return inline
+
+    try:
+        meta = get_result_store().put(columns, rows, tenant_id=_tenant_id_ctx.get(), connection_id=connection_id)
+    except Exception as e:
+        logger.warning(f"Result store unavailable, returning full result: {e}")
+        return json.dumps(result, ensure_ascii=False, default=str)
+
+    result["result_id"] = meta.result_id
+    result["rows"] = rows[:SAMPLE_ROWS]
+    result["truncated"] = True
+    result["column_stats"] = meta.column_stats
+    result["note"] = limit_note + (
+        f"{'已读取' if limit_note else '结果共'} {len(rows)} 行，这里只包含前 {len(result['rows'])} 行样例和列统计，"
+        "完整结果已保存在服务端（result_id），用户可在界面中分页查看。"
+        "需要精确的汇总数字时请用 SQL 聚合（COUNT/SUM/AVG/GROUP BY）查询，不要根据样例推算。"
+    )
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+def _format_query_error(error: Exception, cleaned_query: str) -> str:
+    """构建查询失败的 JSON 结果（超时与执行错误分开报告）"""
+    import json
+    from .connection_pool import QueryTimeoutError, PoolExhaustedError
+
+    if isinstance(error, QueryTimeoutError):
+        logger.error(f"Query execution timeout: {error}")
+        return json.dumps({
+            "error": str(error),
+            "error_type": "timeout_error",
+            "query": cleaned_query[:100]
+        }, ensure_ascii=False)
+
+    if isinstance(error, QueryRejectedError):
+        logger.warning(f"Query rejected by guard: {error}")
+        return json.dumps({
+            "error": str(error),
+            "error_type": "query_budget_exceeded",
+            "query": cleaned_query[:100],
+            "estimate": error.estimate.to_dict() if error.estimate else None
+        }, ensure_ascii=False)
+
+    if isinstance(error, PoolExhaustedError):
+        logger.error(f"Connection pool exhausted: {error}")
+        return json.dumps({
+            "error": str(error),
+            "error_type": "pool_exhausted",
+            "query": cleaned_query[:100]
+        }, ensure_ascii=False)
+
+    logger.error(f"Query execution error: {error}")
+    logger.error(f"Failed query: {cleaned_query[:200]}")
+    return json.dumps({
+        "error": str(error),
+        "error_type": "execution_error",
+        "query": cleaned_query[:100],  # 截断查询
+        "suggestion": get_query_suggestion(str(error), cleaned_query)
+    }, ensure_ascii=False)
+
+
+# 注意：这些函数不再使用 @tool 装饰器，而是在 get_database_tools 中手动创建 StructuredTool
+def execute_query(query: str, connection_id: Optional[str] = None) -> str:
+    """
+    执行数据查询 (支持数据库和 Excel 文件)
+
+    这个工具用于执行只读的数据查询，获取数据。
+    自动检测数据源类型并使用相应的查询方法。
+
+    Args:
+        query: SQL SELECT 查询语句（或用于 Excel 的类 SQL 查询）
+        connection_id: 数据源连接 ID (可选)
+
+    Returns:
+        查询结果的 JSON 字符串，包含列信息和行数据。结果较大时 rows 只包含样例行，
+        并带有 truncated、column_stats（每列空值数、去重数、min/max/mean 或高频值）和 result_id；
+        此时需要精确数字请改用聚合 SQL。结果超过行数上限时只读取前 row_limit 行并带有 row_limit_reached；
+        估算成本超出预算的查询不会执行，返回 error_type 为 query_budget_exceeded 的错误
+
+    Example:
+        >>> execute_query("SELECT * FROM users LIMIT 10")
+        '{"columns": ["id", "name"], "rows": [[1, "Alice"], [2, "Bob"]], "row_count": 2}'
+    """
+    from .connection_pool import get_pool_manager
+
+    cleaned_query, error_json = _prepare_query(query)
+    if error_json is not None:
+        return error_json
+
     # 从 thread-local 获取 connection_id（如果未通过参数传递）
     # Agent 调用工具时不会传递 connection_id，需要从连接上下文获取
     if connection_id is None:
         connection_id, _, _ = _get_connection_context()
 
-    # 检查查询结果缓存 (使用标准化的 SQL 作为缓存键)
-    cache_key = _make_cache_key(cleaned_query, connection_id)
-    cached_result = _query_cache.get(cache_key)
+    # 检查查询结果缓存 (使用规范化的 SQL 作为缓存键)
+    cached_result = _lookup_cached_result(cleaned_query, connection_id)
     if cached_result is not None:
         logger.info(f"Query result cache HIT: {cleaned_query[:50]}...")
         return cached_result
@@ -734,106 +809,90 @@ def execute_query(query: str, connection_id: Optional[str] = None) -> str:
     if _is_excel_connection(database_url):
         logger.info(f"Detected Excel data source, using Excel query")
         file_path = _get_excel_file_path(database_url)
-        
-        # 🔥 修复：从 SQL 查询中解析表名，而不是使用固定的 table_name
-        # 尝试从 SQL 中提取表名
-        extracted_table_name = _extract_table_name_from_query(cleaned_query)
-        
-        # 如果成功提取表名，使用它；否则回退到 connection_info.table_name
-        if extracted_table_name:
-            sheet_name = extracted_table_name
-            logger.info(f"Using extracted table name from SQL: '{sheet_name}'")
-        else:
-            sheet_name = connection_info.table_name if connection_info else None
-            logger.warning(f"Could not extract table name from SQL, using default: '{sheet_name}'")
+        sheet_name = _resolve_excel_sheet(cleaned_query, connection_info)
 
-        result = execute_excel_query(cleaned_query, file_path, sheet_name)
+        result = execute_excel_query(cleaned_query, file_path, sheet_name, _excel_aliases(connection_info))
 
         # 存储到缓存
-        _query_cache.set(cache_key, result)
+        _query_cache.set(cleaned_query, connection_id, result)
         return result
 
-    # 数据库查询（原有逻辑）
-    # 查询结果和错误容器
-    result_container = {"result": None, "error": None}
+    # 数据库查询：从连接池借出连接，超时由服务端 statement_timeout 取消；
+    # 查询保护先 EXPLAIN 检查成本、补 LIMIT，再最多读取上限 + 1 行
+    try:
+        pool = get_pool_manager().get_sync_pool(database_url, connection_id)
+        columns, rows, limit_extra = get_query_guard().execute(pool, cleaned_query, _tenant_id_ctx.get())
+    except Exception as e:
+        return _format_query_error(e, cleaned_query)
 
-    def execute_with_timeout():
-        """在单独的线程中执行查询"""
-        try:
-            # 创建数据库连接
-            conn = create_db_connection(database_url)
-            cursor = conn.cursor()
+    result_json = _format_query_result(columns, rows, connection_id, extra=limit_extra)
 
-            # 设置语句超时（PostgreSQL statement_timeout）
-            # SQLite 不支持此语句，需要跳过
-            if not _is_sqlite_connection(database_url):
-                cursor.execute("SET statement_timeout = 30000")  # 30秒
+    # 存储到缓存 (缓存 5 分钟)
+    _query_cache.set(cleaned_query, connection_id, result_json)
+    logger.info(f"Query result cached: {cleaned_query[:50]}...")
 
-            # 执行查询
-            cursor.execute(cleaned_query)
+    return result_json
 
-            # 获取结果
-            columns = [desc[0] for desc in cursor.description] if cursor.description else []
-            rows = cursor.fetchall()
 
-            # 关闭连接
-            cursor.close()
-            conn.close()
+async def aexecute_query(query: str, connection_id: Optional[str] = None) -> str:
+    """
+    execute_query 的异步版本
 
-            # 构建结果
-            result_container["result"] = {
-                "columns": columns,
-                "rows": rows,
-                "row_count": len(rows),
-                "success": True
-            }
+    PostgreSQL 查询通过 asyncpg 连接池直接在事件循环上 await，
+    不再为每次调用创建线程；SQLite 和 Excel 查询仍在默认线程池中执行。
+
+    Args:
+        query: SQL SELECT 查询语句
+        connection_id: 数据源连接 ID (可选)
 
-            logger.info(f"Query executed successfully: {len(rows)} rows returned")
+    Returns:
+        查询结果的 JSON 字符串，格式与 execute_query 相同
+    """
+    import asyncio
+    from .connection_pool import get_pool_manager
 
-        except Exception as e:
-            result_container["error"] = e
-
-    # 使用线程执行查询，30秒超时
-    query_thread = threading.Thread(target=execute_with_timeout)
-    query_thread.daemon = True
-    query_thread.start()
-    query_thread.join(timeout=30)
-
-    # 检查结果
-    if query_thread.is_alive():
-        # 查询超时
-        logger.error("Query execution timeout (30s)")
-        return json.dumps({
-            "error": "Query execution timeout after 30 seconds",
-            "error_type": "timeout_error",
-            "query": cleaned_query[:100]
-        }, ensure_ascii=False)
+    cleaned_query, error_json = _prepare_query(query)
+    if error_json is not None:
+        return error_json
 
-    if result_container["error"] is not None:
-        error = result_container["error"]
-        logger.error(f"Query execution error: {error}")
-        logger.error(f"Failed query: {cleaned_query[:200]}")
-        return json.dumps({
-            "error": str(error),
-            "error_type": "execution_error",
-            "query": cleaned_query[:100],  # 截断查询
-            "suggestion": get_query_suggestion(str(error), cleaned_query)
-        }, ensure_ascii=False)
+    if connection_id is None:
+        connection_id, _, _ = _get_connection_context()
 
-    if result_container["result"] is not None:
-        result_json = json.dumps(result_container["result"], ensure_ascii=False, default=str)
+    # 规范化 SQL 与 Redis 读取都是同步操作，放到线程池中执行
+    cached_result = await asyncio.to_thread(_lookup_cached_result, cleaned_query, connection_id)
+    if cached_result is not None:
+        logger.info(f"Query result cache HIT (async): {cleaned_query[:50]}...")
+        return cached_result
 
-        # 存储到缓存 (缓存 5 分钟)
-        _query_cache.set(cache_key, result_json)
-        logger.info(f"Query result cached: {cleaned_query[:50]}...")
+    # get_database_url 内部会运行独立的事件循环，因此放到线程池中解析
+    database_url, connection_info = await asyncio.to_thread(get_database_url, connection_id)
 
-        return result_json
+    if _is_excel_connection(database_url):
+        file_path = _get_excel_file_path(database_url)
+        sheet_name = _resolve_excel_sheet(cleaned_query, connection_info)
+        result = await asyncio.to_thread(
+            execute_excel_query, cleaned_query, file_path, sheet_name, _excel_aliases(connection_info)
+        )
+        await asyncio.to_thread(_query_cache.set, cleaned_query, connection_id, result)
+        return result
 
-    # 未知的错误
-    return json.dumps({
-        "error": "Unknown error during query execution",
-        "error_type": "unknown_error"
-    }, ensure_ascii=False)
+    manager = get_pool_manager()
+    guard = get_query_guard()
+    tenant_id = _tenant_id_ctx.get()
+    try:
+        if _is_sqlite_connection(database_url):
+            pool = manager.get_sync_pool(database_url, connection_id)
+            columns, rows, limit_extra = await asyncio.to_thread(guard.execute, pool, cleaned_query, tenant_id)
+        else:
+            pool = manager.get_async_pool(database_url, connection_id)
+            columns, rows, limit_extra = await guard.aexecute(pool, cleaned_query, tenant_id)
+    except Exception as e:
+        return _format_query_error(e, cleaned_query)
+
+    # 列统计、序列化和可能的落盘都是 CPU/IO 操作，放到线程池中执行（contextvars 随之复制）
+    result_json = await asyncio.to_thread(_format_query_result, columns, rows, connection_id, limit_extra)
+    await asyncio.to_thread(_query_cache.set, cleaned_query, connection_id, result_json)
+    return result_json
 
 
 def clean_and_validate_sql(query: str) -> str:
@@ -994,6 +1053,19 @@ def get_query_suggestion(error_msg: str, query: str) -> Optional[str]:
             table = match.group(1)
             return f"表 '{table}' 不存在。请使用 list_tables 查看可用的表。"
 
+    # DuckDB（Excel 数据源）的错误格式
+    if 'table with name' in error_lower and 'does not exist' in error_lower:
+        match = re.search(r'Table with name (.*?) does not exist', error_msg)
+        if match:
+            table = match.group(1)
+            return f"表 '{table}' 不存在。请使用 list_tables 查看可用的工作表，表名含空格或中文时用双引号括起。"
+
+    if 'referenced column' in error_lower and 'not found' in error_lower:
+        match = re.search(r'Referenced column "?(.*?)"? not found', error_msg)
+        if match:
+            col = match.group(1)
+            return f"列 '{col}' 不存在。请使用 get_schema 查看工作表的列名。"
+
     if 'syntax error' in error_lower:
         return "SQL 语法错误。请确保查询格式正确，建议使用简单的 SELECT 语句。"
 
@@ -1023,11 +1095,7 @@ def list_tables(connection_id: Optional[str] = None) -> str:
 
     logger.info(f"list_tables: connection_id={connection_id}")
 
-    # 清除旧缓存以确保使用新的连接信息
-    if connection_id:
-        _schema_cache.clear()
-
-    # 检查缓存
+    # 检查缓存（数据源变更时由 invalidate_connection_cache 按数据源失效）
     cache_key = _make_cache_key("list_tables", connection_id)
     cached = _schema_cache.get(cache_key)
     if cached is not None:
@@ -1042,10 +1110,14 @@ def list_tables(connection_id: Optional[str] = None) -> str:
         logger.info("list_tables: Detected Excel data source, listing sheets")
         try:
             file_path = _get_excel_file_path(database_url)
-            import pandas as pd
+            cached = _get_cached_excel(file_path)
+            if cached is not None:
+                sheets = [sheet.name for sheet in cached.sheets]
+            else:
+                import pandas as pd
 
-            excel_file = pd.ExcelFile(file_path, engine='openpyxl')
-            sheets = excel_file.sheet_names
+                excel_file = pd.ExcelFile(file_path, engine='openpyxl')
+                sheets = excel_file.sheet_names
 
             result = {
                 "tables": sheets,
@@ -1056,7 +1128,7 @@ def list_tables(connection_id: Optional[str] = None) -> str:
             }
 
             result_str = json.dumps(result, ensure_ascii=False)
-            _schema_cache.set(cache_key, result_str)
+            _schema_cache.set(cache_key, result_str, namespace=connection_id or "default")
             logger.info(f"list_tables: Excel 文件，{len(sheets)} 个工作表: {sheets}")
 
             return result_str
@@ -1069,24 +1141,26 @@ def list_tables(connection_id: Optional[str] = None) -> str:
             }, ensure_ascii=False)
             return error_str
 
-    # 数据库查询（原有逻辑）
+    # 数据库查询（复用连接池中的连接）
     try:
-        conn = create_db_connection(database_url)
-        cursor = conn.cursor()
+        from .connection_pool import get_pool_manager
 
-        # PostgreSQL 查询所有表
-        cursor.execute("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public'
-            AND table_type = 'BASE TABLE'
-            ORDER BY table_name
-        """)
+        pool = get_pool_manager().get_sync_pool(database_url, connection_id)
+        with pool.connection() as conn:
+            cursor = conn.cursor()
 
-        tables = [row[0] for row in cursor.fetchall()]
+            # PostgreSQL 查询所有表
+            cursor.execute("""
+                SELECT table_name
+                FROM information_schema.tables
+                WHERE table_schema = 'public'
+                AND table_type = 'BASE TABLE'
+                ORDER BY table_name
+            """)
 
-        cursor.close()
-        conn.close()
+            tables = [row[0] for row in cursor.fetchall()]
+
+            cursor.close()
 
         result = {
             "tables": tables,
@@ -1096,7 +1170,7 @@ def list_tables(connection_id: Optional[str] = None) -> str:
 
         result_str = json.dumps(result, ensure_ascii=False)
         # 存入缓存
-        _schema_cache.set(cache_key, result_str)
+        _schema_cache.set(cache_key, result_str, namespace=connection_id or "default")
         logger.info(f"list_tables: 查询成功，缓存结果 ({len(tables)} 个表)")
 
         return result_str
@@ -1147,6 +1221,21 @@ def get_schema(table_name: str, connection_id: Optional[str] = None) -> str:
         logger.info(f"get_schema({table_name}): Detected Excel data source, getting columns")
         try:
             file_path = _get_excel_file_path(database_url)
+            cached = _get_cached_excel(file_path)
+            cached_sheet = cached.get_sheet(table_name) if cached is not None else None
+            if cached_sheet is not None:
+                # 列式缓存中已有推断好的列类型
+                result_str = json.dumps({
+                    "table_name": table_name,
+                    "columns": cached_sheet.columns,
+                    "column_count": len(cached_sheet.columns),
+                    "row_count": cached_sheet.row_count,
+                    "success": True,
+                    "data_source": "excel"
+                }, ensure_ascii=False)
+                _schema_cache.set(cache_key, result_str, namespace=connection_id or "default")
+                return result_str
+
             import pandas as pd
 
             # 读取 Excel 工作表
@@ -1184,7 +1273,7 @@ def get_schema(table_name: str, connection_id: Optional[str] = None) -> str:
             }
 
             result_str = json.dumps(result, ensure_ascii=False)
-            _schema_cache.set(cache_key, result_str)
+            _schema_cache.set(cache_key, result_str, namespace=connection_id or "default")
             logger.info(f"get_schema({table_name}): Excel 工作表，{len(columns)} 列")
 
             return result_str
@@ -1197,35 +1286,37 @@ def get_schema(table_name: str, connection_id: Optional[str] = None) -> str:
             }, ensure_ascii=False)
             return error_str
 
-    # 数据库查询（原有逻辑）
+    # 数据库查询（复用连接池中的连接）
     try:
-        conn = create_db_connection(database_url)
-        cursor = conn.cursor()
-
-        # PostgreSQL 查询表结构
-        cursor.execute("""
-            SELECT
-                column_name,
-                data_type,
-                is_nullable,
-                column_default
-            FROM information_schema.columns
-            WHERE table_name = %s
-            AND table_schema = 'public'
-            ORDER BY ordinal_position
-        """, (table_name,))
-
-        columns = []
-        for row in cursor.fetchall():
-            columns.append({
-                "name": row[0],
-                "type": row[1],
-                "nullable": row[2] == "YES",
-                "default": row[3]
-            })
-
-        cursor.close()
-        conn.close()
+        from .connection_pool import get_pool_manager
+
+        pool = get_pool_manager().get_sync_pool(database_url, connection_id)
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+
+            # PostgreSQL 查询表结构
+            cursor.execute("""
+                SELECT
+                    column_name,
+                    data_type,
+                    is_nullable,
+                    column_default
+                FROM information_schema.columns
+                WHERE table_name = %s
+                AND table_schema = 'public'
+                ORDER BY ordinal_position
+            """, (table_name,))
+
+            columns = []
+            for row in cursor.fetchall():
+                columns.append({
+                    "name": row[0],
+                    "type": row[1],
+                    "nullable": row[2] == "YES",
+                    "default": row[3]
+                })
+
+            cursor.close()
 
         result = {
             "table_name": table_name,
@@ -1236,7 +1327,7 @@ def get_schema(table_name: str, connection_id: Optional[str] = None) -> str:
 
         result_str = json.dumps(result, ensure_ascii=False)
         # 存入缓存
-        _schema_cache.set(cache_key, result_str)
+        _schema_cache.set(cache_key, result_str, namespace=connection_id or "default")
         logger.info(f"get_schema({table_name}): 查询成功，缓存结果 ({len(columns)} 列)")
 
         return result_str
@@ -1254,10 +1345,41 @@ def get_schema(table_name: str, connection_id: Optional[str] = None) -> str:
 # 工具集合
 # ============================================================================
 
+class ToolContext:
+    """
+    工具运行时上下文
+
+    工具调用时从该对象读取连接上下文。Agent 被池化复用时该对象由并发请求共享，
+    只保存连接与租户（db_session 为 None），会话由每个请求经 bind_db_session 绑定。
+    """
+
+    __slots__ = ("connection_id", "db_session", "tenant_id")
+
+    def __init__(
+        self,
+        connection_id: Optional[str] = None,
+        db_session: Optional[Any] = None,
+        tenant_id: Optional[str] = None
+    ):
+        self.connection_id = connection_id
+        self.db_session = db_session
+        self.tenant_id = tenant_id
+
+    def activate(self) -> None:
+        """
+        将上下文设置到 contextvars，供 get_database_url 等函数读取
+
+        db_session 为 None 时保留当前请求绑定的会话（见 bind_db_session）。
+        """
+        db_session = self.db_session if self.db_session is not None else _db_session_ctx.get()
+        _set_connection_context(self.connection_id, db_session, self.tenant_id)
+
+
 def get_database_tools(
     connection_id: Optional[str] = None,
     db_session: Optional[Any] = None,
-    tenant_id: Optional[str] = None
+    tenant_id: Optional[str] = None,
+    context: Optional[ToolContext] = None
 ) -> List:
     """
     获取所有数据库工具（支持 Excel 和数据库）
@@ -1266,55 +1388,69 @@ def get_database_tools(
         connection_id: 数据源连接 ID（可选）
         db_session: 数据库会话（用于查询数据源配置）
         tenant_id: 租户 ID
+        context: 工具运行时上下文（提供时忽略前三个参数，调用时读取其最新值）
 
     Returns:
         LangChain Tool 列表
     """
+    if context is None:
+        context = ToolContext(connection_id, db_session, tenant_id)
+
     # 设置连接上下文供工具使用（虽然之后会使用闭包，但保留设置以兼容）
-    _set_connection_context(connection_id, db_session, tenant_id)
+    context.activate()
 
-    # 🔧 新方案：使用闭包预绑定 connection_id
+    # 🔧 使用闭包绑定工具上下文
     # 同时在包装函数中设置 context 变量，确保 _get_connection_context() 能够获取到正确的值
 
     from langchain_core.tools import StructuredTool
 
-    # 创建包装函数，预绑定 connection_id 并设置 context
-    def make_execute_query(fixed_connection_id, fixed_db_session, fixed_tenant_id):
+    # 创建包装函数，绑定工具上下文并设置 context 变量
+    def make_execute_query(ctx: ToolContext):
         def wrapped(query: str) -> str:
             # 设置 context 变量，确保 get_database_url 能够获取到正确的值
-            _set_connection_context(fixed_connection_id, fixed_db_session, fixed_tenant_id)
-            return execute_query(query, fixed_connection_id)
+            ctx.activate()
+            return execute_query(query, ctx.connection_id)
+        wrapped.__name__ = "execute_query"
+        wrapped.__doc__ = execute_query.__doc__
+        return wrapped
+
+    def make_aexecute_query(ctx: ToolContext):
+        async def wrapped(query: str) -> str:
+            ctx.activate()
+            return await aexecute_query(query, ctx.connection_id)
         wrapped.__name__ = "execute_query"
         wrapped.__doc__ = execute_query.__doc__
         return wrapped
 
-    def make_list_tables(fixed_connection_id, fixed_db_session, fixed_tenant_id):
+    def make_list_tables(ctx: ToolContext):
         def wrapped() -> str:
             # 设置 context 变量
-            _set_connection_context(fixed_connection_id, fixed_db_session, fixed_tenant_id)
-            return list_tables(fixed_connection_id)
+            ctx.activate()
+            return list_tables(ctx.connection_id)
         wrapped.__name__ = "list_tables"
         wrapped.__doc__ = list_tables.__doc__
         return wrapped
 
-    def make_get_schema(fixed_connection_id, fixed_db_session, fixed_tenant_id):
+    def make_get_schema(ctx: ToolContext):
         def wrapped(table_name: str) -> str:
             # 设置 context 变量
-            _set_connection_context(fixed_connection_id, fixed_db_session, fixed_tenant_id)
-            return get_schema(table_name, fixed_connection_id)
+            ctx.activate()
+            return get_schema(table_name, ctx.connection_id)
         wrapped.__name__ = "get_schema"
         wrapped.__doc__ = get_schema.__doc__
         return wrapped
 
-    # 创建带预绑定 connection_id 的包装函数
-    bound_execute_query = make_execute_query(connection_id, db_session, tenant_id)
-    bound_list_tables = make_list_tables(connection_id, db_session, tenant_id)
-    bound_get_schema = make_get_schema(connection_id, db_session, tenant_id)
+    # 创建绑定上下文的包装函数
+    bound_execute_query = make_execute_query(context)
+    bound_aexecute_query = make_aexecute_query(context)
+    bound_list_tables = make_list_tables(context)
+    bound_get_schema = make_get_schema(context)
 
     # 创建 StructuredTool 对象
     tools = [
         StructuredTool.from_function(
             func=bound_execute_query,
+            coroutine=bound_aexecute_query,
             name="execute_query",
             description=execute_query.__doc__
         ),
@@ -1330,7 +1466,7 @@ def get_database_tools(
         )
     ]
 
-    logger.info(f"[get_database_tools] Created {len(tools)} tools with connection_id={connection_id}")
+    logger.info(f"[get_database_tools] Created {len(tools)} tools with connection_id={context.connection_id}")
     return tools
 
 
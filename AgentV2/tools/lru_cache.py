@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+LRUCache - 进程内有界缓存
+========================
+
+AgentV2 各进程内缓存（响应缓存、schema 缓存、查询结果缓存）共用的有界实现。
+实现只保留在 backend/src/app/core/lru_cache.py（仅依赖标准库），这里经 backend_core
+导入并重新导出，AgentV2 内部继续使用 AgentV2.tools.lru_cache 的导入路径。
+
+核心功能:
+    - O(1) LRU: OrderedDict 维护访问顺序，命中 move_to_end，淘汰 popitem(last=False)
+    - TTL: 访问时惰性检查，并按 sweep_interval 从过期堆 (expires_at, seq, key) 批量清理
+    - 字节预算: 写入时估算一次大小（estimate_size），超出 max_bytes 按 LRU 淘汰，
+      单条超过 max_entry_bytes 不缓存
+    - 命名空间: 按租户/数据源等分组统计，clear_namespace 只删除该组条目
+    - 注册表: backend 进程内与 backend 的缓存登记在同一注册表，get_all_cache_stats 一并汇总
+
+版本: 1.1.0
+作者: BMad Master
+"""
+
+from .backend_core import load_core_module
+
+_lru_cache = load_core_module("lru_cache")
+
+DEFAULT_NAMESPACE = _lru_cache.DEFAULT_NAMESPACE
+LRUCache = _lru_cache.LRUCache
+estimate_size = _lru_cache.estimate_size
+get_all_cache_stats = _lru_cache.get_all_cache_stats
+
+__all__ = ["DEFAULT_NAMESPACE", "LRUCache", "estimate_size", "get_all_cache_stats"]
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Query Guard - 查询执行保护（行数上限 + 成本预算）
+================================================
+
+execute_query 执行 Agent 生成的 SQL 前后的保护层。
+
+核心功能:
+    - LIMIT 注入：SELECT / WITH 查询缺少顶层 LIMIT 时追加 LIMIT（上限 + 1，用于判断截断），
+      已有 LIMIT 超过上限时改写为上限
+    - 成本预算：执行前 EXPLAIN（不执行查询），PostgreSQL / MySQL 计划成本超出租户预算时拒绝执行
+    - 有界读取：连接池按 max_rows 用 fetchmany / 服务端游标读取，不再 fetchall 整个结果集
+    - 截断报告：超出上限的结果只保留前 max_rows 行，并在返回给 Agent 的结果中标记 row_limit_reached
+
+预算配置（环境变量）:
+    AGENT_QUERY_MAX_ROWS            单次查询返回的最大行数（默认 10000）
+    AGENT_QUERY_MAX_COST            EXPLAIN 估算成本上限（默认 1e7，0 表示不检查）
+    AGENT_QUERY_EXPLAIN             是否执行前 EXPLAIN（默认 true）
+    AGENT_QUERY_TENANT_BUDGETS      按租户覆盖，JSON: {"tenant_a": {"max_rows": 5000, "max_cost": 1e6}}
+
+LIMIT 改写、QueryBudget、租户预算解析与预算表与 backend 共用 backend/src/app/core/query_budget.py
+（经 backend_core 导入），这里只保留连接池上的 EXPLAIN 与有界读取。
+
+作者: BMad Master
+版本: 1.1.0
+"""
+
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .backend_core import load_core_module
+
+_query_budget = load_core_module("query_budget")
+QueryBudget = _query_budget.QueryBudget
+QueryGuardBase = _query_budget.QueryGuardBase
+inject_limit = _query_budget.inject_limit
+parse_tenant_budgets = _query_budget.parse_tenant_budgets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ROWS = int(os.environ.get("AGENT_QUERY_MAX_ROWS", "10000"))
+DEFAULT_MAX_COST = float(os.environ.get("AGENT_QUERY_MAX_COST", "1e7"))
+DEFAULT_EXPLAIN = os.environ.get("AGENT_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+
+
+class QueryRejectedError(Exception):
+    """查询的估算成本超出预算，未执行"""
+
+    def __init__(self, message: str, estimate: Optional["PlanEstimate"] = None):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+@dataclass
+class PlanEstimate:
+    """EXPLAIN 估算结果（数据库不提供的项为 None）"""
+    dialect: str
+    rows: Optional[int] = None
+    cost: Optional[float] = None
+    full_scans: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"dialect": self.dialect, "rows": self.rows, "cost": self.cost, "full_scans": self.full_scans}
+
+
+@dataclass
+class GuardedQuery:
+    """经过改写、待执行的查询"""
+    query: str
+    max_rows: int
+    budget: QueryBudget
+    limit_injected: bool = False
+    estimate: Optional[PlanEstimate] = None
+
+    @property
+    def fetch_rows(self) -> int:
+        """从数据库读取的行数（多读一行用于判断是否截断）"""
+        return self.max_rows + 1
+
+
+# ============================================================================
+# 执行计划解析
+# ============================================================================
+
+def _mysql_rows(block: Dict[str, Any]) -> Optional[int]:
+    """MySQL EXPLAIN FORMAT=JSON：取最后一个连接表的 rows_produced_per_join"""
+    if "table" in block:
+        table = block["table"]
+        rows = table.get("rows_produced_per_join", table.get("rows_examined_per_scan"))
+        return int(rows) if rows is not None else None
+    if block.get("nested_loop"):
+        return _mysql_rows(block["nested_loop"][-1])
+    for key in ("ordering_operation", "grouping_operation", "duplicates_removal"):
+        if key in block:
+            return _mysql_rows(block[key])
+    return None
+
+
+def estimate_plan(dialect: str, plan: Any) -> PlanEstimate:
+    """
+    从 EXPLAIN 输出中提取估算行数 / 成本
+
+    Args:
+        dialect: "postgresql" / "mysql" / "sqlite"
+        plan: EXPLAIN (FORMAT JSON) / EXPLAIN FORMAT=JSON 的结果（JSON 字符串或已解析对象），
+              SQLite 为 EXPLAIN QUERY PLAN 的 [{"detail": ...}]
+
+    Returns:
+        PlanEstimate
+    """
+    estimate = PlanEstimate(dialect=dialect)
+    if isinstance(plan, (str, bytes)):
+        plan = json.loads(plan)
+
+    if dialect == "postgresql":
+        root = plan[0] if isinstance(plan, list) and plan else plan
+        node = (root or {}).get("Plan", {})
+        estimate.cost = node.get("Total Cost")
+        estimate.rows = node.get("Plan Rows")
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.get("Node Type") == "Seq Scan" and current.get("Relation Name"):
+                estimate.full_scans.append(current["Relation Name"])
+            stack.extend(current.get("Plans", []))
+    elif dialect == "mysql":
+        block = (plan or {}).get("query_block", {})
+        cost = block.get("cost_info", {}).get("query_cost")
+        estimate.cost = float(cost) if cost is not None else None
+        estimate.rows = _mysql_rows(block)
+    elif dialect == "sqlite":
+        # SQLite 不提供成本估算，只记录全表扫描（"SCAN t"，使用覆盖索引的扫描除外）
+        for step in plan or []:
+            detail = step.get("detail", "")
+            if detail.startswith("SCAN ") and "COVERING INDEX" not in detail:
+                estimate.full_scans.append(detail[5:].split(" ")[0])
+    return estimate
+
+
+# ============================================================================
+# QueryGuard
+# ============================================================================
+
+class QueryGuard(QueryGuardBase):
+    """
+    查询执行保护（Agent 连接池）
+
+    连接池需要提供 dialect 属性、explain(query) 和 execute(query, max_rows=...)，
+    见 connection_pool.SyncConnectionPool / AsyncPostgresPool。
+    """
+
+    def __init__(
+        self,
+        default_budget: Optional[QueryBudget] = None,
+        tenant_budgets: Optional[Dict[str, QueryBudget]] = None,
+        explain: bool = DEFAULT_EXPLAIN
+    ):
+        super().__init__(default_budget or QueryBudget(DEFAULT_MAX_ROWS, DEFAULT_MAX_COST), tenant_budgets)
+        self.explain = explain
+        self._stats["explains"] = 0
+
+    # ------------------------------------------------------------------
+    # 执行前 / 执行后
+    # ------------------------------------------------------------------
+
+    def prepare(self, query: str, tenant_id: Optional[str] = None) -> GuardedQuery:
+        """按租户预算改写查询（注入或收紧 LIMIT）"""
+        rewritten, budget, injected = self.rewrite(query, tenant_id)
+        return GuardedQuery(query=rewritten, max_rows=budget.max_rows, budget=budget, limit_injected=injected)
+
+    def should_explain(self, guarded: GuardedQuery) -> bool:
+        return self.explain and self.should_check_cost(guarded.budget, guarded.query)
+
+    def check_plan(self, guarded: GuardedQuery, dialect: str, plan: Any) -> PlanEstimate:
+        """
+        检查 EXPLAIN 估算成本
+
+        估算的是改写后（已带 LIMIT）的查询，因此单纯的大表明细查询不会因为行数被拒绝，
+        被拒绝的是即使只取 max_rows 行也需要大量扫描/排序/聚合的查询。
+
+        Raises:
+            QueryRejectedError: 估算成本超出预算
+        """
+        estimate = estimate_plan(dialect, plan)
+        guarded.estimate = estimate
+        max_cost = guarded.budget.max_cost
+        if max_cost and estimate.cost is not None and estimate.cost > max_cost:
+            self._count("rejected")
+            scans = f" (full scans: {', '.join(estimate.full_scans)})" if estimate.full_scans else ""
+            raise QueryRejectedError(
+                f"Query rejected: estimated cost {estimate.cost:.0f} exceeds budget {max_cost:.0f}{scans}. "
+                "Add selective WHERE filters (e.g. a date range) or aggregate on fewer rows.",
+                estimate
+            )
+        return estimate
+
+    def finish(self, guarded: GuardedQuery, rows: List[Any]) -> Tuple[List[Any], Dict[str, Any]]:
+        """
+        截断到 max_rows 并生成报告给 Agent 的附加字段
+
+        Returns:
+            (rows, extra)；未截断时 extra 为空
+        """
+        if len(rows) <= guarded.max_rows:
+            return rows, {}
+        self._count("truncated")
+        return rows[:guarded.max_rows], {"row_limit_reached": True, "row_limit": guarded.max_rows}
+
+    def _explain_failed(self, error: Exception) -> None:
+        # EXPLAIN 失败（多为 SQL 错误）时照常执行，由执行阶段报告错误
+        self._count("explain_failures")
+        logger.info(f"[QUERY_GUARD] EXPLAIN failed, executing without cost check: {error}")
+
+    def execute(self, pool: Any, query: str, tenant_id: Optional[str] = None) -> Tuple[List[str], List[Any], Dict[str, Any]]:
+        """
+        在同步连接池上执行受保护的查询
+
+        Returns:
+            (columns, rows, extra)
+
+        Raises:
+            QueryRejectedError: 估算成本超出预算
+        """
+        guarded = self.prepare(query, tenant_id)
+        if self.should_explain(guarded):
+            self._count("explains")
+            try:
+                plan = pool.explain(guarded.query)
+            except Exception as e:
+                self._explain_failed(e)
+            else:
+                self.check_plan(guarded, pool.dialect, plan)
+        columns, rows = pool.execute(guarded.query, max_rows=guarded.fetch_rows)
+        rows, extra = self.finish(guarded, rows)
+        return columns, rows, extra
+
+    async def aexecute(self, pool: Any, query: str, tenant_id: Optional[str] = None) -> Tuple[List[str], List[Any], Dict[str, Any]]:
+        """execute 的异步版本（AsyncPostgresPool）"""
+        guarded = self.prepare(query, tenant_id)
+        if self.should_explain(guarded):
+            self._count("explains")
+            try:
+                plan = await pool.explain(guarded.query)
+            except Exception as e:
+                self._explain_failed(e)
+            else:
+                self.check_plan(guarded, pool.dialect, plan)
+        columns, rows = await pool.execute(guarded.query, max_rows=guarded.fetch_rows)
+        rows, extra = self.finish(guarded, rows)
+        return columns, rows, extra
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "explain": self.explain}
+
+
+_query_guard: Optional[QueryGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_query_guard() -> QueryGuard:
+    """获取全局查询保护实例"""
+    global _query_guard
+    if _query_guard is None:
+        with _guard_lock:
+            if _query_guard is None:
+                default = QueryBudget(DEFAULT_MAX_ROWS, DEFAULT_MAX_COST)
+                _query_guard = QueryGuard(
+                    default_budget=default,
+                    tenant_budgets=parse_tenant_budgets(os.environ.get("AGENT_QUERY_TENANT_BUDGETS", ""), default)
+                )
+    return _query_guard
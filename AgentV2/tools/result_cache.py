@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+QueryResultCache - SQL 查询结果缓存
+==================================
+
+按规范化后的 SQL 缓存查询结果，按表或数据源版本失效。
+
+核心功能:
+    - 规范化键: 用 sqlglot 解析并重新生成 SQL，大小写、空白、注释、引号写法不同的
+      等价查询命中同一条目；未安装 sqlglot 时退回文本规范化（保留字符串字面量的大小写）
+    - 字节预算 LRU: 进程内条目存于 LRUCache（见 lru_cache.py），按结果字节数计入预算，
+      超出时淘汰最久未使用的条目，过期条目周期性清理
+    - 表级依赖: 记录结果引用的表，键中包含数据源版本和各表版本，
+      invalidate_tables / invalidate_connection 递增版本号即可使相关结果全部失效
+    - 可选 Redis: 配置 AGENT_QUERY_CACHE_REDIS_URL 后结果与版本号存入 Redis，所有 worker 共享
+
+版本: 1.1.0
+作者: BMad Master
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+try:
+    import sqlglot
+    from sqlglot import expressions as exp
+except ImportError:  # pragma: no cover - sqlglot 为可选依赖
+    sqlglot = None
+    exp = None
+
+from .lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = int(os.environ.get("AGENT_QUERY_CACHE_TTL", "300"))
+DEFAULT_MAX_BYTES = int(os.environ.get("AGENT_QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_REDIS_URL = os.environ.get("AGENT_QUERY_CACHE_REDIS_URL")
+
+# 无法可靠解析出全部引用表时的依赖标记：任何表失效都会使其失效
+ANY_TABLE = "*"
+
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"[^\"]*\")")
+_TABLE_REF = re.compile(r"\b(?:from|join)\s+(\"[^\"]+\"|[^\s,;()]+)", re.IGNORECASE)
+
+
+# ============================================================================
+# SQL 规范化
+# ============================================================================
+
+def _fallback_canonicalize(sql: str) -> Tuple[str, FrozenSet[str]]:
+    """文本规范化：去注释、合并空白，引号外转小写"""
+    text = re.sub(r"--.*$", "", sql, flags=re.MULTILINE)
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.DOTALL)
+    parts = _QUOTED.split(text)
+    canonical = "".join(part if i % 2 else part.lower() for i, part in enumerate(parts))
+    canonical = " ".join(canonical.split()).rstrip(";").strip()
+
+    tables = {
+        match.group(1).strip('"').split(".")[-1].lower()
+        for match in _TABLE_REF.finditer(text)
+    }
+    # 正则无法覆盖逗号连接、子查询等写法，额外依赖"任意表"
+    tables.add(ANY_TABLE)
+    return canonical, frozenset(tables)
+
+
+def canonicalize_sql(sql: str, dialect: Optional[str] = None) -> Tuple[str, FrozenSet[str]]:
+    """
+    规范化 SQL 并提取引用的表
+
+    Args:
+        sql: SQL 语句
+        dialect: sqlglot 方言（None 为通用方言）
+
+    Returns:
+        (规范化 SQL, 引用的表名集合（小写，不含 CTE 名）)
+    """
+    if sqlglot is not None:
+        try:
+            expression = sqlglot.parse_one(sql, read=dialect)
+            ctes = {cte.alias_or_name.lower() for cte in expression.find_all(exp.CTE)}
+            tables = frozenset(
+                table.name.lower() for table in expression.find_all(exp.Table)
+                if table.name and table.name.lower() not in ctes
+            )
+            canonical = expression.sql(dialect=dialect, normalize=True, comments=False)
+            return canonical, tables
+        except Exception as e:
+            logger.debug(f"sqlglot 解析失败，使用文本规范化: {e}")
+    return _fallback_canonicalize(sql)
+
+
+# ============================================================================
+# 缓存
+# ============================================================================
+
+class QueryResultCache:
+    """
+    SQL 查询结果缓存（线程安全）
+
+    键 = hash(数据源, 规范化 SQL, 数据源版本, 各引用表版本)。失效只需递增版本号，
+    旧条目不再可达；进程内条目同时按依赖索引立即删除以释放内存。
+    """
+
+    def __init__(
+        self,
+        ttl: int = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_entry_bytes: Optional[int] = None,
+        redis_client: Optional[Any] = None,
+        key_prefix: str = "agentv2:qcache:"
+    ):
+        """
+        初始化结果缓存
+
+        Args:
+            ttl: 结果有效期（秒）
+            max_bytes: 进程内缓存的字节预算
+            max_entry_bytes: 单条结果上限，超出不缓存（默认预算的 1/8）
+            redis_client: 同步 redis 客户端（可选）
+            key_prefix: Redis 键前缀
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max(1, max_bytes // 8)
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        # 条目值为 (结果, 数据源, 引用的表)，命名空间为数据源
+        self._entries = LRUCache(
+            name="query_cache",
+            max_entries=None,
+            max_bytes=max_bytes,
+            max_entry_bytes=self.max_entry_bytes,
+            default_ttl=ttl,
+            on_remove=self._forget,
+        )
+        self._versions: Dict[str, int] = {}
+        self._dependents: Dict[Tuple[str, str], Set[str]] = {}
+        self._lock = threading.RLock()
+        self._stats = {
+            "hits": 0,
+            "remote_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    # ---------------------------------------------------------------- 版本
+
+    def _version_keys(self, connection_id: str, tables: Iterable[str]) -> List[str]:
+        return [f"ver:{connection_id}"] + [f"ver:{connection_id}:{table}" for table in sorted(tables)]
+
+    def _read_versions(self, names: List[str]) -> List[int]:
+        if self.redis is not None:
+            try:
+                values = self.redis.mget([self.key_prefix + name for name in names])
+                return [int(value or 0) for value in values]
+            except Exception as e:
+                logger.warning(f"读取查询缓存版本失败，使用进程内版本: {e}")
+        with self._lock:
+            return [self._versions.get(name, 0) for name in names]
+
+    def _bump_versions(self, names: List[str]) -> None:
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                for name in names:
+                    pipe.incr(self.key_prefix + name)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"递增查询缓存版本失败: {e}")
+
+    def _key(self, sql: str, connection_id: Optional[str]) -> Tuple[str, str, FrozenSet[str]]:
+        connection = connection_id or "default"
+        canonical, tables = canonicalize_sql(sql)
+        versions = self._read_versions(self._version_keys(connection, tables))
+        raw = "\0".join([connection, canonical, ",".join(map(str, versions))])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest(), connection, tables
+
+    # ---------------------------------------------------------------- 读写
+
+    def get(self, sql: str, connection_id: Optional[str] = None) -> Optional[str]:
+        """获取缓存结果，未命中或已过期时返回 None"""
+        key, connection, _ = self._key(sql, connection_id)
+        item = self._entries.get(key, namespace=connection)
+        if item is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+            return item[0]
+
+        if self.redis is not None:
+            try:
+                value = self.redis.get(self.key_prefix + key)
+            except Exception as e:
+                logger.warning(f"读取 Redis 查询缓存失败: {e}")
+                value = None
+            if value is not None:
+                value = value.decode("utf-8") if isinstance(value, bytes) else value
+                with self._lock:
+                    self._stats["remote_hits"] += 1
+                return value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, sql: str, connection_id: Optional[str], value: str) -> None:
+        """缓存查询结果"""
+        key, connection, tables = self._key(sql, connection_id)
+        size = len(value.encode("utf-8"))
+        if not self._entries.set(key, (value, connection, tables), namespace=connection, size=size):
+            return
+
+        with self._lock:
+            for table in tables:
+                self._dependents.setdefault((connection, table), set()).add(key)
+
+        if self.redis is not None:
+            try:
+                self.redis.set(self.key_prefix + key, value, ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"写入 Redis 查询缓存失败: {e}")
+
+    def _forget(self, key: str, item: Tuple[str, str, FrozenSet[str]], reason: str) -> None:
+        """条目离开进程内缓存时清理依赖索引"""
+        _, connection, tables = item
+        with self._lock:
+            for table in tables:
+                dependents = self._dependents.get((connection, table))
+                if dependents is not None:
+                    dependents.discard(key)
+                    if not dependents:
+                        del self._dependents[(connection, table)]
+
+    # ---------------------------------------------------------------- 失效
+
+    def invalidate_tables(self, connection_id: Optional[str], tables: Iterable[str]) -> int:
+        """
+        使引用了指定表的结果失效
+
+        Returns:
+            删除的进程内条目数
+        """
+        connection = connection_id or "default"
+        names = {table.lower() for table in tables} | {ANY_TABLE}
+        self._bump_versions([f"ver:{connection}:{table}" for table in sorted(names)])
+
+        with self._lock:
+            keys: Set[str] = set()
+            for table in names:
+                keys |= self._dependents.get((connection, table), set())
+            self._stats["invalidations"] += 1
+        return sum(1 for key in keys if self._entries.delete(key))
+
+    def invalidate_connection(self, connection_id: Optional[str]) -> int:
+        """
+        递增数据源版本，使该数据源的全部结果失效
+
+        Returns:
+            删除的进程内条目数
+        """
+        connection = connection_id or "default"
+        self._bump_versions([f"ver:{connection}"])
+
+        with self._lock:
+            self._stats["invalidations"] += 1
+        return self._entries.clear_namespace(connection)
+
+    def clear(self) -> None:
+        """清空进程内条目和统计（Redis 中的条目随 TTL 过期）"""
+        self._entries.clear(reset_stats=True)
+        with self._lock:
+            self._dependents.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        entries = self._entries.get_stats()
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["remote_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["remote_hits"]
+            return {
+                "name": "query_cache",
+                "size": entries["entries"],
+                "bytes": entries["bytes"],
+                "max_bytes": self.max_bytes,
+                **self._stats,
+                "sets": entries["sets"],
+                "evictions": entries["evictions"],
+                "expirations": entries["expirations"],
+                "skipped_oversize": entries["skipped_oversize"],
+                "hit_rate": hits / lookups if lookups else 0,
+                "ttl": self.ttl,
+                "backend": "redis" if self.redis is not None else "memory",
+                "canonicalizer": "sqlglot" if sqlglot is not None else "text",
+            }
+
+
+def _create_redis_client(url: Optional[str]) -> Optional[Any]:
+    if not url:
+        return None
+    try:
+        import redis
+        return redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+    except Exception as e:
+        logger.warning(f"查询结果缓存无法连接 Redis，仅使用进程内缓存: {e}")
+        return None
+
+
+_result_cache: Optional[QueryResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> QueryResultCache:
+    """获取全局查询结果缓存"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = QueryResultCache(redis_client=_create_redis_client(DEFAULT_REDIS_URL))
+    return _result_cache
@@ -0,0 +1,557 @@
+# -*- coding: utf-8 -*-
+"""
+ResultStore - 查询结果集服务端存储
+==================================
+
+完整查询结果保存在服务端，LLM 只拿到结果句柄（result_id）、列结构、行数、列统计和样例行，
+前端按句柄分页或流式读取完整数据。
+
+核心功能:
+    - 共享存储: 每个结果写入共享目录，按句柄命名（{result_id}.parquet/.jsonl + {result_id}.meta.json），
+      同一目录下的任意 worker / 副本都能按句柄读取；安装 pyarrow 时写 Parquet（按行组分页读取），否则写 JSON Lines
+    - 内存层: 本进程写入的结果行同时存于 LRUCache（见 lru_cache.py），按估算字节数计入预算，
+      淘汰后从共享目录读取；其他进程写入的元数据按需从 .meta.json 加载并缓存
+    - 磁盘预算: 清理时删除过期结果，超出 max_disk_bytes 时删除最早写入的结果（以目录内容为准，多进程一致）；
+      清理每 60 秒或超出预算时在后台线程中执行（同一时刻最多一个），不阻塞写入
+    - 列统计: 空值数、去重数、数值列 min/max/mean、文本列高频值，供 LLM 在只看样例时作答
+    - 租户隔离: 读取时校验写入时记录的 tenant_id，不匹配按不存在处理
+    - TTL: 过期时间写入元数据，过期后按不存在处理并删除文件
+
+配置（环境变量）:
+    AGENT_RESULT_STORE_TTL / AGENT_RESULT_STORE_MAX_BYTES / AGENT_RESULT_STORE_DISK_MAX_BYTES /
+    AGENT_RESULT_STORE_DIR / AGENT_RESULT_INLINE_ROWS / AGENT_RESULT_INLINE_BYTES / AGENT_RESULT_SAMPLE_ROWS
+
+    多 worker 部署时 AGENT_RESULT_STORE_DIR 必须是所有 worker 都能访问的目录
+    （同一容器内默认的临时目录即可；多副本部署需挂载共享卷）。
+
+版本: 1.1.1
+作者: BMad Master
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow 为可选依赖
+    pa = None
+    pq = None
+
+from .lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = int(os.environ.get("AGENT_RESULT_STORE_TTL", "1800"))
+DEFAULT_MAX_BYTES = int(os.environ.get("AGENT_RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+DEFAULT_DISK_MAX_BYTES = int(os.environ.get("AGENT_RESULT_STORE_DISK_MAX_BYTES", str(2 * 1024 ** 3)))
+DEFAULT_DIRECTORY = os.environ.get("AGENT_RESULT_STORE_DIR") or os.path.join(tempfile.gettempdir(), "agentv2_results")
+
+# 返回给 LLM 的结果：不超过 INLINE_ROWS 行且 JSON 不超过 INLINE_BYTES 时内联全部行，否则只给样例
+INLINE_ROWS = int(os.environ.get("AGENT_RESULT_INLINE_ROWS", "100"))
+INLINE_BYTES = int(os.environ.get("AGENT_RESULT_INLINE_BYTES", str(32 * 1024)))
+SAMPLE_ROWS = int(os.environ.get("AGENT_RESULT_SAMPLE_ROWS", "20"))
+
+_TOP_VALUES = 5
+_PARQUET_ROW_GROUP = 10000
+_SWEEP_INTERVAL = 60
+_META_SUFFIX = ".meta.json"
+_RESULT_ID_RE = re.compile(r"^rs_[0-9a-f]{32}$")
+
+
+# ============================================================================
+# 列统计
+# ============================================================================
+
+def _kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float, Decimal)):
+        return "number"
+    if isinstance(value, datetime):
+        return "datetime"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, str):
+        return "string"
+    return "other"
+
+
+def summarize_columns(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    计算列统计
+
+    Returns:
+        每列一个字典: name, type, nulls, distinct，以及数值/日期列的 min/max（数值列含 mean）、
+        文本/布尔列的高频值 top_values
+    """
+    stats = []
+    for index, name in enumerate(columns):
+        values = [row[index] for row in rows if row[index] is not None]
+        kind = _kind(values[0]) if values else "null"
+        column: Dict[str, Any] = {"name": name, "type": kind, "nulls": len(rows) - len(values)}
+
+        try:
+            counts = Counter(values)
+        except TypeError:  # 不可哈希的值（数组/JSON 列）
+            counts = None
+        column["distinct"] = len(counts) if counts is not None else None
+
+        if kind in ("number", "date", "datetime"):
+            try:
+                column["min"] = min(values)
+                column["max"] = max(values)
+                if kind == "number":
+                    column["mean"] = round(sum(float(v) for v in values) / len(values), 4)
+            except (TypeError, ValueError):
+                pass
+        elif kind in ("string", "boolean") and counts:
+            column["top_values"] = [[value, count] for value, count in counts.most_common(_TOP_VALUES)]
+        stats.append(column)
+    return stats
+
+
+# ============================================================================
+# 结果存储
+# ============================================================================
+
+@dataclass
+class ResultMeta:
+    """结果集元数据"""
+    result_id: str
+    tenant_id: Optional[str]
+    connection_id: Optional[str]
+    columns: List[str]
+    row_count: int
+    column_stats: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    expires_at: Optional[float] = None  # None 表示不过期
+    path: Optional[str] = None          # 共享目录中的数据文件路径
+    file_format: Optional[str] = None   # "parquet" / "jsonl"
+    disk_bytes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("path")
+        data["spilled"] = self.path is not None
+        return data
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.expires_at is not None and self.expires_at <= (now or time.time())
+
+
+class ResultStore:
+    """查询结果集存储（共享目录 + 进程内 LRU）"""
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_DIRECTORY,
+        max_memory_bytes: int = DEFAULT_MAX_BYTES,
+        max_disk_bytes: int = DEFAULT_DISK_MAX_BYTES,
+        ttl: int = DEFAULT_TTL,
+        max_results: int = 10000,
+        file_format: Optional[str] = None,
+    ):
+        """
+        Args:
+            directory: 共享存储目录（多 worker / 多副本需指向同一目录）
+            max_memory_bytes: 内存层字节预算
+            max_disk_bytes: 磁盘字节预算（整个目录）
+            ttl: 结果保留时间（秒）
+            max_results: 进程内缓存的元数据条目数上限
+            file_format: 文件格式，None 时安装了 pyarrow 用 parquet，否则 jsonl
+        """
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.file_format = file_format or ("parquet" if pq is not None else "jsonl")
+
+        self._meta = LRUCache(
+            name="result_store_meta", max_entries=max_results, default_ttl=ttl,
+            on_remove=self._on_meta_removed,
+        )
+        self._rows = LRUCache(
+            name="result_store_rows", max_entries=None, max_bytes=max_memory_bytes,
+            max_entry_bytes=max_memory_bytes // 4, default_ttl=ttl,
+        )
+        self._lock = threading.Lock()
+        self._disk_results = 0
+        self._disk_bytes = 0  # 上次清理时的目录用量 + 之后本进程写入的字节数
+        self._last_sweep = 0.0
+        self._sweep_thread: Optional[threading.Thread] = None
+        self._stats = {
+            "puts": 0, "disk_writes": 0, "write_errors": 0, "disk_evictions": 0,
+            "shared_loads": 0, "page_reads": 0, "disk_reads": 0,
+        }
+
+    # ---------------------------------------------------------------- 写入
+
+    def put(
+        self,
+        columns: Sequence[str],
+        rows: List[Sequence[Any]],
+        tenant_id: Optional[str] = None,
+        connection_id: Optional[str] = None,
+    ) -> ResultMeta:
+        """保存结果集，返回元数据（含 result_id 与列统计）"""
+        now = time.time()
+        meta = ResultMeta(
+            result_id=f"rs_{uuid.uuid4().hex}",
+            tenant_id=tenant_id,
+            connection_id=connection_id,
+            columns=list(columns),
+            row_count=len(rows),
+            column_stats=summarize_columns(columns, rows),
+            created_at=now,
+            expires_at=now + self.ttl if self.ttl > 0 else None,
+        )
+        # 先写共享目录再登记，其他 worker 看到元数据时数据文件已完整
+        self._write(meta, rows)
+        self._meta.set(meta.result_id, meta)
+        self._rows.set(meta.result_id, rows)
+        with self._lock:
+            self._stats["puts"] += 1
+            due = self._disk_bytes > self.max_disk_bytes or now - self._last_sweep >= _SWEEP_INTERVAL
+            if due and not (self._sweep_thread and self._sweep_thread.is_alive()):
+                # 清理要列目录并读取每个元数据文件，放到后台线程，不阻塞查询工具
+                self._last_sweep = now
+                self._sweep_thread = threading.Thread(target=self._background_sweep, name="result-store-sweep", daemon=True)
+                self._sweep_thread.start()
+        return meta
+
+    def _background_sweep(self) -> None:
+        try:
+            self.sweep()
+        except Exception as e:
+            logger.warning(f"结果集目录清理失败: {e}")
+
+    def _on_meta_removed(self, result_id: str, meta: ResultMeta, reason: str) -> None:
+        if reason == "replaced":
+            return
+        self._rows.delete(result_id)
+        # 按条目数淘汰只是丢弃本进程的缓存，共享文件仍可被其他 worker 读取
+        if reason != "evicted":
+            self._remove_files(result_id)
+
+    # ---------------------------------------------------------------- 共享目录
+
+    def _data_path(self, result_id: str, file_format: str) -> str:
+        return os.path.join(self.directory, f"{result_id}.{file_format}")
+
+    def _meta_path(self, result_id: str) -> str:
+        return os.path.join(self.directory, f"{result_id}{_META_SUFFIX}")
+
+    def _write(self, meta: ResultMeta, rows: List[Sequence[Any]]) -> None:
+        """写入数据文件和元数据文件；失败时结果只保留在本进程内存中"""
+        path = self._data_path(meta.result_id, self.file_format)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.file_format == "parquet":
+                self._atomic_write(path, lambda tmp: self._write_parquet(tmp, len(meta.columns), rows))
+            else:
+                self._atomic_write(path, lambda tmp: self._write_jsonl(tmp, rows))
+            meta.path, meta.file_format, meta.disk_bytes = path, self.file_format, os.path.getsize(path)
+
+            data = meta.to_dict()
+            data.pop("spilled")
+            payload = json.dumps(data, ensure_ascii=False, default=str)
+            self._atomic_write(self._meta_path(meta.result_id), lambda tmp: self._write_text(tmp, payload))
+        except Exception as e:
+            logger.warning(f"结果集写入共享目录失败 {meta.result_id}: {e}")
+            meta.path, meta.file_format, meta.disk_bytes = None, None, 0
+            self._remove_files(meta.result_id)
+            with self._lock:
+                self._stats["write_errors"] += 1
+            return
+
+        with self._lock:
+            self._disk_bytes += meta.disk_bytes
+            self._disk_results += 1
+            self._stats["disk_writes"] += 1
+
+    @staticmethod
+    def _atomic_write(path: str, write) -> None:
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _write_text(path: str, text: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    @staticmethod
+    def _write_jsonl(path: str, rows: List[Sequence[Any]]) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(list(row), ensure_ascii=False, default=str))
+                f.write("\n")
+
+    @staticmethod
+    def _write_parquet(path: str, column_count: int, rows: List[Sequence[Any]]) -> None:
+        arrays = []
+        for index in range(column_count):
+            values = [row[index] for row in rows]
+            try:
+                arrays.append(pa.array(values))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, OverflowError):
+                # 混合类型的列按文本保存
+                arrays.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
+        # 列名可能重复（JOIN），文件内使用位置列名，真实列名保存在元数据中
+        table = pa.Table.from_arrays(arrays, names=[f"c{i}" for i in range(column_count)])
+        pq.write_table(table, path, row_group_size=_PARQUET_ROW_GROUP, compression="zstd")
+
+    def _remove_files(self, result_id: str) -> None:
+        """删除结果的共享文件（先删元数据，其他 worker 随即按不存在处理）"""
+        paths = [self._meta_path(result_id)] + [self._data_path(result_id, fmt) for fmt in ("parquet", "jsonl")]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除结果集文件失败 {path}: {e}")
+
+    def _load_meta(self, result_id: str) -> Optional[ResultMeta]:
+        """从共享目录加载其他 worker 写入的元数据"""
+        if not _RESULT_ID_RE.match(result_id):
+            return None
+        try:
+            with open(self._meta_path(result_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            meta = ResultMeta(**data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"读取结果集元数据失败 {result_id}: {e}")
+            return None
+
+        now = time.time()
+        if meta.expired(now):
+            self._remove_files(result_id)
+            return None
+        meta.path = self._data_path(result_id, meta.file_format)
+        ttl = meta.expires_at - now if meta.expires_at is not None else 0
+        self._meta.set(result_id, meta, ttl=ttl)
+        with self._lock:
+            self._stats["shared_loads"] += 1
+        return meta
+
+    def sweep(self) -> int:
+        """
+        清理共享目录：删除过期结果和无元数据的残留文件，超出磁盘预算时删除最早写入的结果
+
+        Returns:
+            删除的结果数
+        """
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+
+        live = []
+        referenced = set()
+        removed = 0
+        for name in names:
+            if not name.endswith(_META_SUFFIX):
+                continue
+            result_id = name[:-len(_META_SUFFIX)]
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get("expires_at") is not None and data["expires_at"] <= now:
+                self._forget(result_id)
+                removed += 1
+                continue
+            referenced.add(result_id)
+            live.append((data.get("created_at", 0), result_id, data.get("disk_bytes", 0)))
+
+        # 写入中途崩溃留下的数据文件 / 临时文件，超过 TTL 后删除
+        for name in names:
+            if name.endswith(_META_SUFFIX) or name.split(".", 1)[0] in referenced:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) + max(self.ttl, _SWEEP_INTERVAL) <= now:
+                    os.remove(path)
+            except OSError:
+                pass
+
+        live.sort()
+        total = sum(size for _, _, size in live)
+        evicted = 0
+        while total > self.max_disk_bytes and live:
+            _, result_id, size = live.pop(0)
+            self._forget(result_id)
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._disk_results = len(live)
+            self._disk_bytes = total
+            self._last_sweep = now
+            self._stats["disk_evictions"] += evicted
+        return removed + evicted
+
+    def _forget(self, result_id: str) -> None:
+        if not self._meta.delete(result_id):
+            self._remove_files(result_id)
+
+    # ---------------------------------------------------------------- 读取
+
+    def get_meta(self, result_id: str, tenant_id: Optional[str] = None) -> Optional[ResultMeta]:
+        """获取元数据（不存在、已过期或租户不匹配时返回 None）"""
+        meta = self._meta.get(result_id)
+        if meta is None:
+            meta = self._load_meta(result_id)
+        if meta is None or meta.tenant_id != tenant_id:
+            return None
+        return meta
+
+    def exists(self, result_id: str) -> bool:
+        """结果集是否仍可读取（不校验租户）"""
+        meta = self._meta.peek(result_id) or self._load_meta(result_id)
+        if meta is None:
+            return False
+        return result_id in self._rows or (meta.path is not None and os.path.exists(meta.path))
+
+    def get_page(
+        self,
+        result_id: str,
+        offset: int = 0,
+        limit: int = 100,
+        tenant_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        分页读取
+
+        Returns:
+            {"result_id", "columns", "row_count", "offset", "limit", "rows"}，结果不可用时返回 None
+        """
+        meta = self.get_meta(result_id, tenant_id)
+        if meta is None:
+            return None
+        rows = self._read(meta, offset, limit)
+        if rows is None:
+            return None
+        with self._lock:
+            self._stats["page_reads"] += 1
+        return {
+            "result_id": result_id,
+            "columns": meta.columns,
+            "row_count": meta.row_count,
+            "offset": offset,
+            "limit": limit,
+            "rows": rows,
+        }
+
+    def iter_batches(
+        self,
+        result_id: str,
+        tenant_id: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> Optional[Iterator[List[List[Any]]]]:
+        """按批流式读取全部行，结果不可用时返回 None"""
+        meta = self.get_meta(result_id, tenant_id)
+        if meta is None or not self.exists(result_id):
+            return None
+
+        def batches() -> Iterator[List[List[Any]]]:
+            for offset in range(0, meta.row_count, batch_size):
+                rows = self._read(meta, offset, batch_size)
+                if not rows:
+                    return
+                yield rows
+
+        return batches()
+
+    def _read(self, meta: ResultMeta, offset: int, limit: int) -> Optional[List[List[Any]]]:
+        rows = self._rows.get(meta.result_id)
+        if rows is not None:
+            return [list(row) for row in rows[offset:offset + limit]]
+        if meta.path is None or not os.path.exists(meta.path):
+            return None
+
+        with self._lock:
+            self._stats["disk_reads"] += 1
+        try:
+            if meta.file_format == "parquet":
+                return self._read_parquet(meta.path, offset, limit)
+            with open(meta.path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in islice(f, offset, offset + limit)]
+        except FileNotFoundError:
+            # 读取前被其他 worker 清理
+            return None
+
+    @staticmethod
+    def _read_parquet(path: str, offset: int, limit: int) -> List[List[Any]]:
+        """只读取覆盖 [offset, offset+limit) 的行组"""
+        parquet = pq.ParquetFile(path)
+        rows: List[List[Any]] = []
+        start = 0
+        end = offset + limit
+        for index in range(parquet.num_row_groups):
+            count = parquet.metadata.row_group(index).num_rows
+            if start + count <= offset:
+                start += count
+                continue
+            if start >= end:
+                break
+            low = max(offset - start, 0)
+            table = parquet.read_row_group(index).slice(low, min(end - start, count) - low)
+            rows.extend(list(row) for row in zip(*(column.to_pylist() for column in table.columns)))
+            start += count
+        return rows
+
+    # ---------------------------------------------------------------- 统计
+
+    def get_stats(self) -> Dict[str, Any]:
+        rows = self._rows.get_stats()
+        with self._lock:
+            return {
+                "name": "result_store",
+                "directory": self.directory,
+                "cached_results": len(self._meta),
+                "memory_results": rows["entries"],
+                "memory_bytes": rows["bytes"],
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_results": self._disk_results,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "file_format": self.file_format,
+                **self._stats,
+            }
+
+
+_result_store: Optional[ResultStore] = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """获取全局结果集存储"""
+    global _result_store
+    if _result_store is None:
+        with _result_store_lock:
+            if _result_store is None:
+                _result_store = ResultStore()
+    return _result_store
@@ -0,0 +1,173 @@
+"""
+[HEADER]
+缓存编解码基准测试 - Cache Codec Benchmark
+对比当前 json.dumps/json.loads 路径与 orjson / msgpack / zstd 压缩的编解码耗时与体积，
+可选对比 Redis 逐键往返与管道批量 get_many/set_many
+
+[MODULE]
+模块类型: 基准测试脚本 (Standalone Script)
+所属功能: 开发工具与性能基准
+技术栈: Python 3.8+, asyncio, time
+
+[INPUT]
+- 命令行参数:
+  - --rows: 模拟结果集行数 (默认2000)
+  - --iterations: 每种编解码的重复次数 (默认200)
+  - --keys: Redis批量测试的键数 (默认100)
+- 环境变量依赖:
+  - REDIS_URL: Redis连接URL (可选，设置后运行Redis往返对比)
+- 测试数据:
+  - 小回答: {"answer": 短文本, "processing_steps": [...], "query": ...}
+  - 大回答: 在小回答基础上附带 --rows 行结果集与长 Markdown 回答
+
+[OUTPUT]
+- 控制台输出:
+  - 每种编解码: 编码/解码平均耗时 (μs)、编码后字节数、相对json的体积比
+  - Redis: 逐键 set/get 与 set_many/get_many 的总耗时
+- 未安装的可选库对应的行标记为 "未安装" 并跳过
+
+[LINK]
+- 依赖模块:
+  - src.app.services.cache_codec.CacheCodec - 被测编解码器
+  - src.app.services.cache_service.RedisCache - Redis批量操作 (仅 REDIS_URL 时)
+- 关联脚本:
+  - scripts/validate_cache_config.py - 缓存配置验证
+
+[POS]
+- 文件路径: backend/scripts/benchmark_cache_codec.py
+- 执行方式:
+  - 直接运行: python scripts/benchmark_cache_codec.py --rows 2000
+  - 带Redis: REDIS_URL=redis://localhost:6379/0 python scripts/benchmark_cache_codec.py
+- 使用场景:
+  - 调整 cache_serializer / cache_compression / cache_compress_min_bytes 前后对比
+
+[PERFORMANCE]
+- 基线为 json(不压缩)，即 v1.2.0 及以前 RedisCache 的写入格式
+- 计时使用 time.perf_counter，取多次重复的平均值
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.app.services import cache_codec
+from src.app.services.cache_codec import CacheCodec
+
+CODECS = [
+    ("json", "none", None),
+    ("orjson", "none", "orjson"),
+    ("msgpack", "none", "msgpack"),
+    ("json", "zstd", "zstandard"),
+    ("orjson", "zstd", "zstandard"),
+    ("msgpack", "zstd", "zstandard"),
+]
+
+
+def build_payload(rows: int) -> dict:
+    """构造与v2流式缓存相同结构的回答"""
+    records = [
+        {"id": i, "region": f"华东-{i % 17}", "product": f"产品{i % 53}", "amount": round(i * 13.7, 2), "month": f"2026-{i % 12 + 1:02d}"}
+        for i in range(rows)
+    ]
+    table = "\n".join(f"| {r['region']} | {r['product']} | {r['amount']} |" for r in records[:200])
+    return {
+        "answer": f"## 销售分析\n\n共 {rows} 条记录，按区域汇总如下：\n\n| 区域 | 产品 | 金额 |\n|---|---|---|\n{table}",
+        "processing_steps": ["接收查询", "租户隔离验证", "AgentV2 处理", "DeepSeek LLM 调用", "返回结果"],
+        "query": "按区域统计本年度各产品销售额",
+        "rows": records,
+    }
+
+
+def bench_codec(codec: CacheCodec, payload: dict, iterations: int) -> tuple:
+    """返回 (编码平均μs, 解码平均μs, 编码后字节数)"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encoded = codec.encode(payload)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decoded = codec.decode(encoded)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    assert decoded == payload, "编解码结果不一致"
+    return encode_us, decode_us, len(encoded)
+
+
+def run_codec_benchmark(payload: dict, label: str, iterations: int) -> None:
+    print(f"\n📦 {label}")
+    print(f"{'编解码':<18}{'编码(μs)':>12}{'解码(μs)':>12}{'字节数':>12}{'体积比':>10}")
+    baseline = None
+    for serializer, compression, module in CODECS:
+        name = f"{serializer}+{compression}"
+        if module is not None and getattr(cache_codec, module) is None:
+            print(f"{name:<18}{'未安装':>12}")
+            continue
+        codec = CacheCodec(serializer=serializer, compression=compression, compress_min_bytes=0)
+        encode_us, decode_us, size = bench_codec(codec, payload, iterations)
+        baseline = baseline or size
+        print(f"{name:<18}{encode_us:>12.1f}{decode_us:>12.1f}{size:>12}{size / baseline:>10.2f}")
+
+
+async def run_redis_benchmark(redis_url: str, payload: dict, key_count: int) -> None:
+    """逐键往返 vs 管道批量"""
+    import redis.asyncio as aioredis
+
+    from src.app.services.cache_service import RedisCache
+
+    client = aioredis.from_url(redis_url)
+    try:
+        for serializer, compression in (("json", "none"), ("auto", "auto")):
+            codec = CacheCodec(serializer=serializer, compression=compression)
+            cache = RedisCache(client, key_prefix="benchmark:", codec=codec)
+            items = {f"tenant:bench:v2:query:{i}": payload for i in range(key_count)}
+            keys = list(items)
+
+            start = time.perf_counter()
+            for key, value in items.items():
+                await cache.set(key, value, ttl=60)
+            for key in keys:
+                await cache.get(key)
+            single_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            await cache.set_many(items, ttl=60)
+            fetched = await cache.get_many(keys)
+            batch_ms = (time.perf_counter() - start) * 1000
+
+            assert len(fetched) == key_count, "批量读取数量不一致"
+            await cache.clear_namespace("tenant:bench")
+            await asyncio.gather(*cache._cleanup_tasks)
+            print(f"{codec.serializer}+{codec.compression:<10} 逐键: {single_ms:>9.1f}ms   管道批量: {batch_ms:>9.1f}ms   ({key_count}键 set+get)")
+    finally:
+        await client.aclose() if hasattr(client, "aclose") else await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="缓存编解码基准测试")
+    parser.add_argument("--rows", type=int, default=2000, help="模拟结果集行数")
+    parser.add_argument("--iterations", type=int, default=200, help="每种编解码的重复次数")
+    parser.add_argument("--keys", type=int, default=100, help="Redis批量测试的键数")
+    args = parser.parse_args()
+
+    small = build_payload(0)
+    small.pop("rows")
+    run_codec_benchmark(small, "小回答（无结果集）", args.iterations * 10)
+    run_codec_benchmark(build_payload(args.rows), f"大回答（{args.rows} 行结果集）", args.iterations)
+
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        print(f"\n🔌 Redis往返对比 ({redis_url})")
+        asyncio.run(run_redis_benchmark(redis_url, build_payload(min(args.rows, 200)), args.keys))
+    else:
+        print("\n⚠️  未设置 REDIS_URL，跳过Redis往返对比")
+
+
+if __name__ == "__main__":
+    main()
@@ -47,11 +47,12 @@
 
 ## [LINK]
 **上游依赖** (已读取源码):
-- [../../data/database.py](../../data/database.py) - get_db(), Session
+- [../../data/database.py](../../data/database.py) - get_db(), Session；列表/详情读接口使用 get_async_db(), AsyncSession
 - [../../data/models.py](../../data/models.py) - DataSourceConnection, Tenant, DataSourceConnectionStatus, TenantStatus
 - [../../services/data_source_service.py](../../services/data_source_service.py) - data_source_service, 数据源CRUD操作
 - [../../services/connection_test_service.py](../../services/connection_test_service.py) - connection_test_service, 连接测试
 - [../../services/minio_client.py](../../services/minio_client.py) - minio_service, 文件存储
+- [../../services/columnar_cache_service.py](../../services/columnar_cache_service.py) - 上传后后台预热列式缓存
 
 **下游依赖** (已读取源码):
 - 无（API端点是叶子模块）
@@ -68,22 +69,27 @@
 **依赖深度**: 直接依赖 data/*, services/*；被前端数据管理模块调用
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Form, Request
 from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
+import asyncio
+import hashlib
 import logging
 import uuid
 import os
 import tempfile
 import json
 
-from src.app.data.database import get_db
+from src.app.data.database import get_db, get_async_db
 from src.app.data.models import DataSourceConnection, Tenant, DataSourceConnectionStatus, TenantStatus
 from src.app.services.data_source_service import data_source_service
 from src.app.services.connection_test_service import connection_test_service
 from src.app.services.minio_client import minio_service
+from src.app.services.columnar_cache_service import get_columnar_cache_service
+from src.app.core.config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -139,7 +145,7 @@ async def get_data_sources(
     skip: int = 0,
     limit: int = 100,
     active_only: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取数据源连接列表
@@ -230,8 +236,105 @@ def _validate_file_type(filename: str, content_type: str, file_size: int) -> Dic
     }
 
 
+# 上传后需要预热列式缓存的文件类型（SQLite 文件由查询直接读取）
+COLUMNAR_FILE_TYPES = {"csv", "xlsx", "xls"}
+
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+
+def _write_upload_chunk(f, digest, chunk: bytes) -> None:
+    f.write(chunk)
+    digest.update(chunk)
+
+
+async def _stream_upload_to_file(
+    upload: UploadFile,
+    dest_path: str,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024
+) -> Tuple[int, str]:
+    """
+    流式写入上传文件
+
+    逐块读取上传内容，边增量计算SHA256边写入临时文件（磁盘IO在线程池执行），
+    完成后原子重命名为 dest_path。超过 max_bytes 时立即停止并删除临时文件。
+
+    Returns:
+        Tuple[int, str]: (文件大小, SHA256)
+
+    Raises:
+        UploadTooLargeError: 文件超过大小限制
+    """
+    digest = hashlib.sha256()
+    file_size = 0
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.part"
+
+    f = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            file_size += len(chunk)
+            if file_size > max_bytes:
+                raise UploadTooLargeError(f"文件大小超过限制，最大允许 {max_bytes // (1024 * 1024)}MB")
+            await asyncio.to_thread(_write_upload_chunk, f, digest, chunk)
+
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, tmp_path, dest_path)
+    except BaseException:
+        f.close()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    return file_size, digest.hexdigest()
+
+
+def _mirror_and_warm_upload(
+    local_file_path: str,
+    storage_path: str,
+    file_size: int,
+    content_type: str,
+    file_type: str,
+    content_hash: str
+) -> None:
+    """
+    上传后的后台任务：从本地文件流式镜像到MinIO，并预先物化列式缓存
+
+    数据源以本地文件为准，两步失败都只记录日志。
+    """
+    try:
+        with open(local_file_path, "rb") as f:
+            # put_object 对大文件自动使用分片上传，按块从磁盘读取
+            if minio_service.upload_file(
+                bucket_name="data-sources",
+                object_name=storage_path,
+                file_data=f,
+                file_size=file_size,
+                content_type=content_type
+            ):
+                logger.info(f"✅ 文件已同步到MinIO: {storage_path}")
+    except Exception as e:
+        logger.warning(f"⚠️ MinIO上传失败（不影响主流程）: {e}")
+
+    if file_type in COLUMNAR_FILE_TYPES:
+        try:
+            cached = get_columnar_cache_service().materialize_file(
+                local_file_path, file_type, content_hash=content_hash
+            )
+            logger.info(f"列式缓存预热完成: {storage_path}（{len(cached.sheets)} 个工作表）")
+        except Exception as e:
+            logger.warning(f"列式缓存预热失败（首次查询时重试）: {e}")
+
+
 @router.post("/upload", summary="上传数据文件创建数据源", status_code=status.HTTP_201_CREATED)
 async def upload_data_source(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="数据文件 (CSV, Excel, SQLite)"),
     name: str = Form(..., description="数据源名称"),
     db_type: Optional[str] = Form(None, description="数据类型"),
@@ -242,6 +345,9 @@ async def upload_data_source(
     """
     上传数据文件创建数据源
     支持 CSV、Excel (.xls/.xlsx) 和 SQLite 数据库 (.db/.sqlite/.sqlite3) 文件
+
+    文件按块流式写入本地磁盘并同时计算SHA256，不在内存中保留完整内容；
+    MinIO镜像和列式缓存预热在响应返回后于后台线程执行。
     """
     # 从查询参数获取tenant_id
     if not tenant_id and request:
@@ -261,15 +367,12 @@ async def upload_data_source(
         )
 
     try:
-        # 读取文件内容
-        file_content = await file.read()
-        file_size = len(file_content)
-
-        # 验证文件类型和大小
+        # 先按已知大小验证文件类型和大小（未知时按0处理，写入过程中再限制）
+        known_size = getattr(file, "size", None)
         validation_result = _validate_file_type(
             file.filename,
             file.content_type or "application/octet-stream",
-            file_size
+            known_size or 0
         )
 
         if not validation_result["valid"]:
@@ -279,6 +382,7 @@ async def upload_data_source(
             )
 
         detected_file_type = validation_result["file_type"]
+        max_bytes = SUPPORTED_FILE_TYPES[detected_file_type]['max_size_mb'] * 1024 * 1024
 
         # 生成唯一的存储路径
         file_id = str(uuid.uuid4())
@@ -286,46 +390,36 @@ async def upload_data_source(
         storage_path = f"data-sources/{tenant_id}/{file_id}{file_ext}"
 
         # 🚨 修复策略：强制落地逻辑 - 确保文件一定会保存到本地磁盘
-        import io
-        import os
-        
         # 定义本地存储目录（使用Docker卷挂载的目录）
-        local_upload_dir = "/app/uploads/data-sources"
+        local_upload_dir = settings.data_source_upload_dir
         tenant_upload_dir = os.path.join(local_upload_dir, tenant_id)
-        
+
         # 确保目录存在
         os.makedirs(tenant_upload_dir, exist_ok=True)
-        
+
         # 本地文件路径（容器内绝对路径）
         local_file_path = os.path.join(tenant_upload_dir, f"{file_id}{file_ext}")
-        
+
         # 🔥 关键修复：无论MinIO是否成功，都先保存到本地磁盘
         try:
-            with open(local_file_path, "wb") as f:
-                f.write(file_content)
+            file_size, content_hash = await _stream_upload_to_file(
+                file,
+                local_file_path,
+                max_bytes=max_bytes,
+                chunk_size=settings.data_source_upload_chunk_size
+            )
             logger.info(f"✅ 文件已强制保存到本地: {local_file_path}")
+        except UploadTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as save_error:
             logger.error(f"❌ 保存文件到本地失败: {save_error}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"文件保存失败: {str(save_error)}"
             )
-        
-        # 尝试上传到 MinIO（可选，不影响主流程）
-        minio_upload_success = False
-        try:
-            upload_success = minio_service.upload_file(
-                bucket_name="data-sources",
-                object_name=storage_path,
-                file_data=io.BytesIO(file_content),
-                file_size=file_size,
-                content_type=file.content_type or "application/octet-stream"
-            )
-            if upload_success:
-                minio_upload_success = True
-                logger.info(f"✅ 文件已同时上传到MinIO: {storage_path}")
-        except Exception as e:
-            logger.warning(f"⚠️ MinIO上传失败（不影响主流程）: {e}")
 
         # 创建数据源记录
         # 🔧 修复：统一路径格式
@@ -350,6 +444,17 @@ async def upload_data_source(
 
         logger.info(f"Created file-based data source '{name}' for tenant '{tenant_id}'")
 
+        # 尝试上传到 MinIO + 预热列式缓存（后台执行，不影响主流程）
+        background_tasks.add_task(
+            _mirror_and_warm_upload,
+            local_file_path,
+            storage_path,
+            file_size,
+            file.content_type or "application/octet-stream",
+            detected_file_type,
+            content_hash
+        )
+
         return {
             "id": str(new_connection.id),
             "tenant_id": new_connection.tenant_id,
@@ -367,7 +472,8 @@ async def upload_data_source(
                 "original_name": file.filename,
                 "file_type": detected_file_type,
                 "file_size": file_size,
-                "storage_path": storage_path
+                "storage_path": storage_path,
+                "checksum": content_hash
             }
         }
 
@@ -619,6 +725,9 @@ async def bulk_delete_data_sources_route(
                 errors.append({"item_id": item_id, "error": "Document deletion not implemented"})
 
         db.commit()
+        for item in deleted_items:
+            if item["type"] == "database":
+                await data_source_service.invalidate_cached_schema(item["item_id"], tenant_id)
         return {
             "success_count": success_count,
             "error_count": error_count,
@@ -864,7 +973,7 @@ async def create_data_source(
 async def get_data_source(
     connection_id: str,
     tenant_id: str = None,  # 实际应该从认证中间件获取
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     根据ID获取数据源连接详情
@@ -980,6 +1089,7 @@ async def update_data_source(
 
         db.commit()
         db.refresh(connection)
+        await data_source_service.invalidate_cached_schema(connection_id, tenant_id)
 
         logger.info(f"Updated data source {connection_id}")
         return DataSourceResponse.from_orm(connection)
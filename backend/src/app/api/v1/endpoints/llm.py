@@ -23,7 +23,7 @@
   - connection_id: 数据源连接ID
   - data_source_id: 数据源ID
 - **data_source_id: str** - 数据源ID（路径参数）
-- **db: Session** - 数据库会话（通过依赖注入获取）
+- **db: AsyncSession** - 异步数据库会话（通过依赖注入获取）
 
 ## [OUTPUT]
 - **chat_response: LLMResponse** - LLM聊天响应
@@ -48,14 +48,18 @@
 
 ## [LINK]
 **上游依赖** (已读取源码):
-- [../../data/database.py](../../data/database.py) - get_db(), Session
+- [../../data/database.py](../../data/database.py) - get_async_db(), AsyncSession
 - [../../data/models.py](../../data/models.py) - Tenant, DataSourceConnection, DataSourceConnectionStatus
 - [../../services/llm_service.py](../../services/llm_service.py) - llm_service, LLMProvider, LLMMessage, LLMResponse
 - [../../services/data_source_service.py](../../services/data_source_service.py) - data_source_service, 数据源服务
 - [../../services/minio_client.py](../../services/minio_client.py) - minio_service, 对象存储
+- [../../services/columnar_cache_service.py](../../services/columnar_cache_service.py) - 文件数据源列式物化缓存（Excel/CSV → Parquet）
+- [../../services/schema_catalog_service.py](../../services/schema_catalog_service.py) - 数据源schema目录缓存（预渲染提示词片段）
 - [../../services/zhipu_client.py](../../services/zhipu_client.py) - zhipu_service, 智谱AI服务
 - [../../services/database_interface.py](../../services/database_interface.py) - PostgreSQLAdapter, 数据库适配器
+- [../../services/query_guard.py](../../services/query_guard.py) - LLM生成SQL的执行保护（自动补LIMIT、成本预算、有界读取）
 - [../../core/auth.py](../../core/auth.py) - get_current_user_with_tenant, 用户认证
+- [../../core/config.py](../../core/config.py) - settings, 数据源上下文并发数/单源超时
 
 **下游依赖** (已读取源码):
 - 无（API端点是叶子模块）
@@ -75,7 +79,6 @@
 import json
 import asyncio
 import logging
-import io
 import os
 import sys
 import time
@@ -85,8 +88,7 @@ from typing import Dict, Any, Optional, List, Union
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.app.services.llm_service import (
     llm_service,
@@ -96,11 +98,19 @@ from src.app.services.llm_service import (
     LLMStreamChunk
 )
 from src.app.core.auth import get_current_user_with_tenant
+from src.app.core.config import settings
 from src.app.data.models import Tenant, DataSourceConnection, DataSourceConnectionStatus
-from src.app.data.database import get_db
+from src.app.data.database import get_async_db, maybe_await
 from src.app.services.data_source_service import data_source_service
 from src.app.services.minio_client import minio_service
+from src.app.services.columnar_cache_service import (
+    CachedFile,
+    get_columnar_cache_service,
+    sanitize_table_name,
+)
 from src.app.services.database_interface import PostgreSQLAdapter
+from src.app.services.query_guard import get_query_guard
+from src.app.services.schema_catalog_service import get_schema_catalog_service
 from src.app.services.zhipu_client import zhipu_service
 from src.app.services.sql_error_memory_service import SQLErrorMemoryService
 import re
@@ -440,53 +450,74 @@ def _convert_chat_messages(messages: List[ChatMessage]) -> List[LLMMessage]:
     return llm_messages
 
 
-def _get_column_type(dtype_str: str) -> str:
-    """将pandas数据类型转换为友好的类型描述"""
-    if 'int' in dtype_str:
-        return 'integer'
-    elif 'float' in dtype_str:
-        return 'float'
-    elif 'datetime' in dtype_str:
-        return 'datetime'
-    elif 'bool' in dtype_str:
-        return 'boolean'
-    else:
-        return 'text'
-
-
-def _build_table_schema(df: pd.DataFrame, table_name: str) -> Dict[str, Any]:
-    """从DataFrame构建单个表的schema信息"""
-    columns = []
-    for col in df.columns:
-        dtype = str(df[col].dtype)
-        columns.append({
-            "name": str(col),
-            "type": _get_column_type(dtype),
-            "nullable": df[col].isnull().any()
-        })
+def _load_cached_file(
+    db_type: str,
+    local_path: Optional[str] = None,
+    object_name: Optional[str] = None,
+    file_data: Optional[bytes] = None
+) -> Optional[CachedFile]:
+    """
+    获取文件数据源的列式物化结果（阻塞调用，需在线程池中执行）
 
-    # 获取示例数据（前5行）
-    sample_rows = []
-    for _, row in df.head(5).iterrows():
-        row_data = {}
-        for col in df.columns[:10]:  # 限制列数
-            value = row[col]
-            if pd.isna(value):
-                row_data[str(col)] = None
-            else:
-                row_data[str(col)] = str(value)
-        sample_rows.append(row_data)
+    按优先级使用本地文件、已下载的字节或 MinIO 对象。MinIO 对象先比对 ETag，
+    命中缓存时不再下载文件。
 
-    return {
-        "table_info": {
+    Returns:
+        CachedFile，无法获取文件时返回 None
+    """
+    cache = get_columnar_cache_service()
+
+    if local_path and os.path.exists(local_path):
+        return cache.materialize_file(local_path, db_type)
+
+    if file_data:
+        return cache.materialize_bytes(file_data, db_type)
+
+    if object_name:
+        ref = f"data-sources/{object_name}"
+        stat = minio_service.stat_file(bucket_name="data-sources", object_name=object_name)
+        if stat and stat.get("etag"):
+            cached = cache.get_by_ref(ref, stat["etag"])
+            if cached:
+                logger.info(f"列式缓存命中（ETag）: {object_name}")
+                return cached
+
+        downloaded = minio_service.download_file(bucket_name="data-sources", object_name=object_name)
+        if not downloaded:
+            return None
+        return cache.materialize_bytes(
+            downloaded,
+            db_type,
+            ref=ref,
+            ref_version=stat.get("etag") if stat else None
+        )
+
+    return None
+
+
+def _build_schema_from_cached_file(cached: CachedFile, db_type: str, data_source_name: str) -> Dict[str, Any]:
+    """从物化清单构建schema信息（无需重新解析文件）"""
+    tables = []
+    sample_data = {}
+    for sheet in cached.sheets:
+        # CSV只有一个表，使用数据源名称作为表名
+        table_name = data_source_name if db_type == "csv" else sheet.name
+        tables.append({
             "name": table_name,
-            "columns": columns,
-            "row_count": len(df)
-        },
-        "sample_data": {
-            "columns": [str(c) for c in df.columns[:10]],
-            "data": sample_rows
+            "columns": sheet.columns,
+            "row_count": sheet.row_count
+        })
+        sample_data[table_name] = {
+            "columns": [c["name"] for c in sheet.columns[:10]],
+            "data": sheet.sample_rows
         }
+        logger.info(f"Sheet '{table_name}': {sheet.row_count}行, {len(sheet.columns)}列")
+
+    if not tables:
+        return {}
+    return {
+        "tables": tables,
+        "sample_data": sample_data
     }
 
 
@@ -505,117 +536,34 @@ async def _get_file_schema(connection_string: str, db_type: str, data_source_nam
     try:
         # 🔧 修复：使用新的路径解析逻辑，优先尝试本地文件系统
         from src.app.services.agent.path_extractor import resolve_file_path_with_fallback
-        
+
         # 首先尝试解析路径（包含本地回退逻辑）
         local_file_path = resolve_file_path_with_fallback(connection_string)
-        file_data = None
-        use_local_file = False
-        
-        # 如果找到本地文件，直接使用
+        storage_path = connection_string[7:] if connection_string.startswith("file://") else connection_string
+
         if local_file_path and os.path.exists(local_file_path):
             logger.info(f"从本地文件系统读取文件: {local_file_path}")
-            use_local_file = True
-            file_path_for_read = local_file_path
+            cached = await asyncio.to_thread(_load_cached_file, db_type, local_path=local_file_path)
         else:
-            # 尝试从MinIO下载
-            storage_path = connection_string[7:] if connection_string.startswith("file://") else connection_string
-            logger.info(f"尝试从MinIO下载文件: {storage_path}")
-            file_data = minio_service.download_file(
-                bucket_name="data-sources",
-                object_name=storage_path
-            )
-            
-            if not file_data:
-                logger.warning(f"无法从MinIO获取文件: {storage_path}")
-                # 最后尝试本地回退
-                if local_file_path:
-                    logger.info(f"尝试使用解析的本地路径: {local_file_path}")
-                    if os.path.exists(local_file_path):
-                        use_local_file = True
-                        file_path_for_read = local_file_path
-                    else:
-                        return {}
-                else:
-                    return {}
-
-        tables = []
-        sample_data = {}
+            logger.info(f"尝试从MinIO获取文件: {storage_path}")
+            cached = await asyncio.to_thread(_load_cached_file, db_type, object_name=storage_path)
 
-        if db_type in ["xlsx", "xls"]:
-            # 读取所有Sheet
-            try:
-                if use_local_file:
-                    # 从本地文件读取
-                    excel_file = pd.ExcelFile(file_path_for_read, engine='openpyxl')
-                else:
-                    # 从MinIO下载的数据读取
-                    excel_file = pd.ExcelFile(io.BytesIO(file_data), engine='openpyxl')
-            except ImportError as e:
-                logger.error(f"System Error: Missing dependency 'openpyxl'. {str(e)}")
-                return {}
-            except Exception as e:
-                logger.error(f"Execution Error: Failed to read Excel file. {str(e)}")
-                return {}
-            
-            sheet_names = excel_file.sheet_names
-            logger.info(f"Excel文件包含 {len(sheet_names)} 个Sheet: {sheet_names}")
-
-            for sheet_name in sheet_names:
-                try:
-                    # 显式指定 engine='openpyxl'
-                    df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
-                    if df.empty:
-                        logger.debug(f"跳过空Sheet: {sheet_name}")
-                        continue
-
-                    # 使用Sheet名称作为表名
-                    table_schema = _build_table_schema(df, sheet_name)
-                    tables.append(table_schema["table_info"])
-                    sample_data[sheet_name] = table_schema["sample_data"]
-                    logger.info(f"Sheet '{sheet_name}': {len(df)}行, {len(df.columns)}列")
-                except Exception as e:
-                    logger.warning(f"读取Sheet '{sheet_name}' 失败: {e}")
-                    continue
-
-        elif db_type == "csv":
-            # CSV文件只有一个表
-            df = None
-            if use_local_file:
-                # 从本地文件读取
-                for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030']:
-                    try:
-                        df = pd.read_csv(file_path_for_read, encoding=encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-            else:
-                # 从MinIO下载的数据读取
-                for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030']:
-                    try:
-                        df = pd.read_csv(io.BytesIO(file_data), encoding=encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-
-            if df is not None:
-                table_schema = _build_table_schema(df, data_source_name)
-                tables.append(table_schema["table_info"])
-                sample_data[data_source_name] = table_schema["sample_data"]
-
-        if not tables:
-            path_info = file_path_for_read if use_local_file else (connection_string[7:] if connection_string.startswith("file://") else connection_string)
-            logger.warning(f"无法从文件解析任何表: {path_info}")
+        if cached is None:
+            logger.warning(f"无法获取文件: {storage_path}")
             return {}
 
-        schema_info = {
-            "tables": tables,
-            "sample_data": sample_data
-        }
+        schema_info = _build_schema_from_cached_file(cached, db_type, data_source_name)
+        if not schema_info:
+            logger.warning(f"无法从文件解析任何表: {storage_path}")
+            return {}
 
-        total_rows = sum(t.get("row_count", 0) for t in tables)
-        logger.info(f"成功获取文件schema: {len(tables)}个表, 共{total_rows}行")
+        total_rows = sum(t.get("row_count", 0) for t in schema_info["tables"])
+        logger.info(f"成功获取文件schema: {len(schema_info['tables'])}个表, 共{total_rows}行")
         return schema_info
 
+    except ImportError as e:
+        logger.error(f"System Error: Missing dependency 'openpyxl'. {str(e)}")
+        return {}
     except Exception as e:
         logger.error(f"获取文件schema失败: {e}")
         return {}
@@ -639,7 +587,8 @@ async def _try_find_file_in_minio(tenant_id: str, data_source_id: str, db_type:
         ext = f".{db_type}"
 
         # 列出MinIO中的文件
-        objects = minio_service.list_files(
+        objects = await asyncio.to_thread(
+            minio_service.list_files,
             bucket_name="data-sources",
             prefix=prefix
         )
@@ -681,64 +630,15 @@ async def _try_get_file_schema_fallback(tenant_id: str, data_source_id: str, db_
         for path in possible_paths:
             try:
                 logger.info(f"尝试从MinIO获取文件: {path}")
-                file_data = minio_service.download_file(
-                    bucket_name="data-sources",
-                    object_name=path
-                )
-
-                if file_data:
-                    tables = []
-                    sample_data = {}
+                cached = await asyncio.to_thread(_load_cached_file, db_type, object_name=path)
+                if cached is None:
+                    continue
 
-                    if db_type in ["xlsx", "xls"]:
-                        # 读取所有Sheet
-                        try:
-                            # 显式指定 engine='openpyxl' 以确保正确读取
-                            excel_file = pd.ExcelFile(io.BytesIO(file_data), engine='openpyxl')
-                        except ImportError as e:
-                            logger.error(f"System Error: Missing dependency 'openpyxl'. {str(e)}")
-                            continue  # 尝试下一个路径
-                        except Exception as e:
-                            logger.error(f"Execution Error: Failed to read Excel file. {str(e)}")
-                            continue  # 尝试下一个路径
-                        
-                        sheet_names = excel_file.sheet_names
-                        logger.info(f"备选方案: Excel包含 {len(sheet_names)} 个Sheet: {sheet_names}")
-
-                        for sheet_name in sheet_names:
-                            try:
-                                # 显式指定 engine='openpyxl'
-                                df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
-                                if df.empty:
-                                    continue
-                                table_schema = _build_table_schema(df, sheet_name)
-                                tables.append(table_schema["table_info"])
-                                sample_data[sheet_name] = table_schema["sample_data"]
-                            except Exception as e:
-                                logger.debug(f"读取Sheet '{sheet_name}' 失败: {e}")
-                                continue
-
-                    elif db_type == "csv":
-                        df = None
-                        for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030']:
-                            try:
-                                df = pd.read_csv(io.BytesIO(file_data), encoding=encoding)
-                                break
-                            except UnicodeDecodeError:
-                                continue
-
-                        if df is not None:
-                            table_schema = _build_table_schema(df, data_source_name)
-                            tables.append(table_schema["table_info"])
-                            sample_data[data_source_name] = table_schema["sample_data"]
-
-                    if tables:
-                        total_rows = sum(t.get("row_count", 0) for t in tables)
-                        logger.info(f"备选方案成功获取schema: {len(tables)}个表, 共{total_rows}行")
-                        return {
-                            "tables": tables,
-                            "sample_data": sample_data
-                        }
+                schema_info = _build_schema_from_cached_file(cached, db_type, data_source_name)
+                if schema_info:
+                    total_rows = sum(t.get("row_count", 0) for t in schema_info["tables"])
+                    logger.info(f"备选方案成功获取schema: {len(schema_info['tables'])}个表, 共{total_rows}行")
+                    return schema_info
 
             except Exception as e:
                 logger.debug(f"尝试路径 {path} 失败: {e}")
@@ -752,7 +652,310 @@ async def _try_get_file_schema_fallback(tenant_id: str, data_source_id: str, db_
         return {}
 
 
-async def _get_data_sources_context(tenant_id: str, db: Session, data_source_ids: Optional[List[str]] = None) -> str:
+async def _get_postgres_schema(connection_string: str) -> Dict[str, Any]:
+    """
+    内省PostgreSQL数据源schema，并自动检测枚举字段的实际取值
+
+    Args:
+        connection_string: 解密后的连接字符串
+
+    Returns:
+        schema信息字典（tables / relationships，列中包含enum_values）
+    """
+    adapter = PostgreSQLAdapter(connection_string)
+    try:
+        await adapter.connect()
+        schema_result = await adapter.get_schema_info()
+
+        # 🔧 新增：自动检测枚举字段并获取其实际值
+        # 常见的枚举字段名模式
+        enum_field_patterns = [
+            'status', 'state', 'type', 'category', 'level', 'role',
+            'gender', 'priority', 'payment_method', 'payment_status',
+            'order_status', 'shipping_status', 'user_type'
+        ]
+
+        # 用于存储每个表的枚举值
+        enum_values_cache = {}
+
+        for table in schema_result.tables.values():
+            table_enum_values = {}
+            for col in table.columns:
+                col_lower = col.name.lower()
+                # 检查是否是可能的枚举字段
+                is_enum_field = any(pattern in col_lower for pattern in enum_field_patterns)
+                # 也检查字符串类型的短字段（可能是枚举）
+                is_short_varchar = (
+                    col.data_type in ['character varying', 'varchar', 'text'] and
+                    col.max_length and col.max_length <= 50
+                )
+
+                if is_enum_field or (is_short_varchar and col_lower.endswith(('_type', '_status', '_state'))):
+                    try:
+                        # 查询该字段的distinct值（限制10个，避免太多）
+                        distinct_query = f"""
+                            SELECT DISTINCT "{col.name}"
+                            FROM "{table.name}"
+                            WHERE "{col.name}" IS NOT NULL
+                            LIMIT 10
+                        """
+                        distinct_result = await adapter.execute_query(distinct_query)
+                        if distinct_result and distinct_result.data:
+                            values = [row[col.name] for row in distinct_result.data if row.get(col.name)]
+                            if values and len(values) <= 10:  # 只保留合理数量的枚举值
+                                table_enum_values[col.name] = values
+                    except Exception as enum_err:
+                        logger.debug(f"获取枚举值失败 {table.name}.{col.name}: {enum_err}")
+
+            if table_enum_values:
+                enum_values_cache[table.name] = table_enum_values
+
+        # 将SchemaInfo对象转换为字典格式，并包含枚举值
+        return {
+            "database_type": schema_result.database_type.value if schema_result.database_type else "postgresql",
+            "tables": [
+                {
+                    "name": table.name,
+                    "row_count": table.row_count,
+                    "columns": [
+                        {
+                            "name": col.name,
+                            "type": col.data_type,
+                            "nullable": col.is_nullable,
+                            # 添加枚举值（如果有）
+                            "enum_values": enum_values_cache.get(table.name, {}).get(col.name)
+                        }
+                        for col in table.columns
+                    ]
+                }
+                for table in schema_result.tables.values()
+            ] if schema_result.tables else [],
+            "relationships": schema_result.relationships
+        }
+    finally:
+        await adapter.disconnect()
+
+
+async def _get_postgres_fingerprint(connection_string: str) -> Optional[str]:
+    """获取PostgreSQL数据源的schema指纹（单次目录查询）"""
+    adapter = PostgreSQLAdapter(connection_string)
+    try:
+        if not await adapter.connect():
+            return None
+        return await adapter.get_schema_fingerprint()
+    finally:
+        await adapter.disconnect()
+
+
+def _get_file_fingerprint(connection_string: str) -> Optional[str]:
+    """
+    获取文件数据源的指纹（阻塞调用，需在线程池中执行）
+
+    本地文件使用 size + mtime，MinIO 对象使用 ETag，均无需读取文件内容。
+    """
+    from src.app.services.agent.path_extractor import resolve_file_path_with_fallback
+
+    local_file_path = resolve_file_path_with_fallback(connection_string)
+    if local_file_path and os.path.exists(local_file_path):
+        stat = os.stat(local_file_path)
+        return f"file:{local_file_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    storage_path = connection_string[7:] if connection_string.startswith("file://") else connection_string
+    stat = minio_service.stat_file(bucket_name="data-sources", object_name=storage_path)
+    if stat and stat.get("etag"):
+        return f"minio:{storage_path}:{stat['etag']}"
+    return None
+
+
+def _render_data_source_context(ds: Any, schema_info: Dict[str, Any]) -> str:
+    """
+    将数据源schema渲染为系统提示词片段
+
+    Args:
+        ds: 数据源连接对象
+        schema_info: schema信息字典
+
+    Returns:
+        提示词片段文本
+    """
+    context_parts = []
+
+    if schema_info and schema_info.get("tables"):
+        context_parts.append(f"\n### 数据源: {ds.name}")
+        context_parts.append(f"- 类型: {ds.db_type}")
+        context_parts.append(f"- 文件/数据库: {ds.database_name or '未知'}")
+
+        # 添加表信息
+        context_parts.append("\n#### 表结构:")
+        for table in schema_info["tables"][:20]:  # 限制表数量避免token过多
+            table_name = table.get("name", "unknown")
+            row_count = table.get("row_count")
+            if row_count is None:
+                row_count = "未知"
+            context_parts.append(f"\n**表: {table_name}** (共{row_count}行)")
+
+            columns = table.get("columns", [])
+            if columns:
+                col_info = []
+                for col in columns[:30]:  # 限制列数量
+                    col_name = col.get("name", "unknown")
+                    col_type = col.get("type", "unknown")
+                    nullable = "可空" if col.get("nullable") else "非空"
+                    # 🔧 新增：显示枚举值
+                    enum_values = col.get("enum_values")
+                    if enum_values:
+                        enum_str = ", ".join([f"'{v}'" for v in enum_values[:8]])  # 最多显示8个
+                        if len(enum_values) > 8:
+                            enum_str += ", ..."
+                        col_info.append(f"  - {col_name} ({col_type}, {nullable}) **可选值: [{enum_str}]**")
+                    else:
+                        col_info.append(f"  - {col_name} ({col_type}, {nullable})")
+                context_parts.append("\n".join(col_info))
+
+            # 添加主键信息
+            if table.get("primary_key"):
+                context_parts.append(f"  - 主键: {', '.join(table['primary_key'])}")
+
+            # 添加外键信息
+            if table.get("foreign_keys"):
+                for fk in table["foreign_keys"]:
+                    context_parts.append(
+                        f"  - 外键: {fk['column']} -> {fk['references_table']}.{fk['references_column']}"
+                    )
+
+        # 添加表关系信息（外键关联）
+        relationships = schema_info.get("relationships", [])
+        if relationships:
+            context_parts.append("\n#### 表关系（外键）:")
+            context_parts.append("**重要：** 以下是表之间的关联关系，查询时必须通过这些外键进行JOIN：")
+            for rel in relationships:
+                from_table = rel.get("from_table", "unknown")
+                from_column = rel.get("from_column", "unknown")
+                to_table = rel.get("to_table", "unknown")
+                to_column = rel.get("to_column", "unknown")
+                context_parts.append(
+                    f"  - {from_table}.{from_column} -> {to_table}.{to_column}"
+                )
+
+        # 添加示例数据
+        sample_data = schema_info.get("sample_data", {})
+        if sample_data:
+            context_parts.append("\n#### 示例数据:")
+            for table_name, samples in list(sample_data.items())[:5]:  # 限制表数量
+                if samples.get("data"):
+                    context_parts.append(f"\n**{table_name}** (前5行):")
+                    for row in samples["data"][:3]:  # 限制行数
+                        row_str = ", ".join([f"{k}={v}" for k, v in list(row.items())[:5]])
+                        context_parts.append(f"  {row_str}")
+    else:
+        # 其他数据库类型暂时只显示基本信息
+        context_parts.append(f"\n### 数据源: {ds.name}")
+        context_parts.append(f"- 类型: {ds.db_type}")
+        context_parts.append(f"- 数据库: {ds.database_name or '未知'}")
+        context_parts.append("- 注: 此数据库类型的schema发现功能开发中")
+
+    return "\n".join(context_parts)
+
+
+def _render_unavailable_context(ds: Any, reason: str) -> str:
+    """数据源schema暂不可用时的占位提示词片段"""
+    return "\n".join([
+        f"\n### 数据源: {ds.name}",
+        f"- 类型: {ds.db_type}",
+        f"- 注: 无法获取schema信息 ({reason})",
+    ])
+
+
+async def _get_data_source_context(tenant_id: str, ds: Any, db: AsyncSession) -> str:
+    """
+    获取单个数据源的提示词片段（经schema目录缓存）
+
+    缓存条目在指纹（PostgreSQL目录校验值 / 文件ETag或mtime）与数据源
+    配置均未变化时直接复用，不再重新连接数据库内省。
+
+    Args:
+        tenant_id: 租户ID
+        ds: 数据源连接对象（已按租户加载）
+        db: 数据库会话（保留参数，当前未使用）
+
+    Returns:
+        提示词片段文本
+    """
+    connection_string = None
+
+    # 尝试获取解密后的连接字符串
+    # ds 已按租户查询加载，直接解密；各数据源并发构建，不能在同一异步会话上并发查询
+    try:
+        t2 = time.time()
+        connection_string = ds.connection_string
+        print(f"[PERF] decrypt connection string for {ds.name} took {time.time() - t2:.2f}s")
+    except Exception as decrypt_error:
+        print(f"[PERF] 解密数据源 {ds.name} 连接字符串失败: {decrypt_error}")
+        # 对于文件类型数据源，尝试从MinIO直接搜索文件
+        if ds.db_type in ["xlsx", "xls", "csv"]:
+            connection_string = await _try_find_file_in_minio(tenant_id, ds.id, ds.db_type)
+
+    # 数据源配置变化（改名、更换连接）也会使缓存失效
+    config_version = f"{ds.name}|{ds.db_type}|{ds.database_name}|{getattr(ds, 'updated_at', None)}"
+
+    async def no_fingerprint() -> Optional[str]:
+        return None
+
+    # 根据数据源类型选择指纹和内省方式
+    if ds.db_type == "postgresql" and connection_string:
+        async def fingerprint() -> Optional[str]:
+            fp = await _get_postgres_fingerprint(connection_string)
+            return f"{config_version}|{fp}" if fp else None
+
+        async def builder() -> Dict[str, Any]:
+            t3 = time.time()
+            schema_info = await _get_postgres_schema(connection_string)
+            print(f"[PERF] PostgreSQL get_schema for {ds.name} took {time.time() - t3:.2f}s")
+            return schema_info
+
+    elif ds.db_type in ["xlsx", "xls", "csv"]:
+        # 🔧 修复：从connection_config或connection_string提取文件路径
+        file_path = connection_string
+        if hasattr(ds, 'connection_config') and ds.connection_config:
+            # 如果存在connection_config字段，优先使用它
+            from src.app.services.agent.path_extractor import extract_file_path_from_config
+            extracted_path = extract_file_path_from_config(ds.connection_config, connection_string)
+            if extracted_path:
+                file_path = extracted_path
+
+        if file_path:
+            async def fingerprint() -> Optional[str]:
+                fp = await asyncio.to_thread(_get_file_fingerprint, file_path)
+                return f"{config_version}|{fp}" if fp else None
+
+            async def builder() -> Dict[str, Any]:
+                # 文件类型数据源：从文件读取并解析schema
+                t4 = time.time()
+                schema_info = await _get_file_schema(file_path, ds.db_type, ds.name)
+                print(f"[PERF] _get_file_schema for {ds.name} took {time.time() - t4:.2f}s")
+                return schema_info
+        else:
+            fingerprint = no_fingerprint
+
+            async def builder() -> Dict[str, Any]:
+                # 连接字符串获取失败，尝试备选方案
+                print(f"[PERF] 尝试备选方案获取数据源 {ds.name} 的schema")
+                return await _try_get_file_schema_fallback(tenant_id, ds.id, ds.db_type, ds.name)
+
+    else:
+        return _render_data_source_context(ds, {})
+
+    entry = await get_schema_catalog_service().get_or_build(
+        tenant_id,
+        ds.id,
+        fingerprint=fingerprint,
+        builder=builder,
+        renderer=lambda schema_info: _render_data_source_context(ds, schema_info)
+    )
+    return entry.prompt_fragment
+
+
+async def _get_data_sources_context(tenant_id: str, db: AsyncSession, data_source_ids: Optional[List[str]] = None) -> str:
     """
     获取租户数据源的上下文信息（包括schema）
 
@@ -798,204 +1001,40 @@ async def _get_data_sources_context(tenant_id: str, db: Session, data_source_ids
         context_parts = []
         context_parts.append("## 可用数据源\n")
 
-        for ds in data_sources:
-            try:
-                ds_start = time.time()
-                schema_info = None
-                connection_string = None
+        # 各数据源并发获取（有界并发 + 单源超时），慢源/故障源降级为占位说明，不拖住整个请求
+        semaphore = asyncio.Semaphore(max(1, settings.data_source_context_concurrency))
+        timeout = settings.data_source_context_timeout
 
-                # 尝试获取解密后的连接字符串
-                try:
-                    t2 = time.time()
-                    connection_string = await data_source_service.get_decrypted_connection_string(
-                        data_source_id=ds.id,
-                        tenant_id=tenant_id,
-                        db=db
+        async def build_one(ds: Any) -> str:
+            ds_start = time.time()
+            status = "ok"
+            try:
+                async with semaphore:
+                    return await asyncio.wait_for(
+                        _get_data_source_context(tenant_id, ds, db),
+                        timeout=timeout
                     )
-                    print(f"[PERF] get_decrypted_connection_string for {ds.name} took {time.time() - t2:.2f}s")
-                except Exception as decrypt_error:
-                    print(f"[PERF] 解密数据源 {ds.name} 连接字符串失败: {decrypt_error}")
-                    # 对于文件类型数据源，尝试从MinIO直接搜索文件
-                    if ds.db_type in ["xlsx", "xls", "csv"]:
-                        connection_string = await _try_find_file_in_minio(tenant_id, ds.id, ds.db_type)
-
-                # 根据数据源类型获取schema
-                if ds.db_type == "postgresql" and connection_string:
-                    t3 = time.time()
-                    adapter = PostgreSQLAdapter(connection_string)
-                    try:
-                        await adapter.connect()
-                        schema_result = await adapter.get_schema_info()
-                        
-                        # 🔧 新增：自动检测枚举字段并获取其实际值
-                        # 常见的枚举字段名模式
-                        enum_field_patterns = [
-                            'status', 'state', 'type', 'category', 'level', 'role',
-                            'gender', 'priority', 'payment_method', 'payment_status',
-                            'order_status', 'shipping_status', 'user_type'
-                        ]
-                        
-                        # 用于存储每个表的枚举值
-                        enum_values_cache = {}
-                        
-                        for table in schema_result.tables.values():
-                            table_enum_values = {}
-                            for col in table.columns:
-                                col_lower = col.name.lower()
-                                # 检查是否是可能的枚举字段
-                                is_enum_field = any(pattern in col_lower for pattern in enum_field_patterns)
-                                # 也检查字符串类型的短字段（可能是枚举）
-                                is_short_varchar = (
-                                    col.data_type in ['character varying', 'varchar', 'text'] and
-                                    col.max_length and col.max_length <= 50
-                                )
-                                
-                                if is_enum_field or (is_short_varchar and col_lower.endswith(('_type', '_status', '_state'))):
-                                    try:
-                                        # 查询该字段的distinct值（限制10个，避免太多）
-                                        distinct_query = f"""
-                                            SELECT DISTINCT "{col.name}" 
-                                            FROM "{table.name}" 
-                                            WHERE "{col.name}" IS NOT NULL 
-                                            LIMIT 10
-                                        """
-                                        distinct_result = await adapter.execute_query(distinct_query)
-                                        if distinct_result and distinct_result.data:
-                                            values = [row[col.name] for row in distinct_result.data if row.get(col.name)]
-                                            if values and len(values) <= 10:  # 只保留合理数量的枚举值
-                                                table_enum_values[col.name] = values
-                                    except Exception as enum_err:
-                                        logger.debug(f"获取枚举值失败 {table.name}.{col.name}: {enum_err}")
-                            
-                            if table_enum_values:
-                                enum_values_cache[table.name] = table_enum_values
-                        
-                        # 将SchemaInfo对象转换为字典格式，并包含枚举值
-                        schema_info = {
-                            "database_type": schema_result.database_type.value if schema_result.database_type else "postgresql",
-                            "tables": [
-                                {
-                                    "name": table.name,
-                                    "columns": [
-                                        {
-                                            "name": col.name,
-                                            "type": col.data_type,
-                                            "nullable": col.is_nullable,
-                                            # 添加枚举值（如果有）
-                                            "enum_values": enum_values_cache.get(table.name, {}).get(col.name)
-                                        }
-                                        for col in table.columns
-                                    ]
-                                }
-                                for table in schema_result.tables.values()
-                            ] if schema_result.tables else []
-                        }
-                    finally:
-                        await adapter.disconnect()
-                    print(f"[PERF] PostgreSQL get_schema for {ds.name} took {time.time() - t3:.2f}s")
-
-                elif ds.db_type in ["xlsx", "xls", "csv"]:
-                    # 🔧 修复：从connection_config或connection_string提取文件路径
-                    file_path = connection_string
-                    if hasattr(ds, 'connection_config') and ds.connection_config:
-                        # 如果存在connection_config字段，优先使用它
-                        from src.app.services.agent.path_extractor import extract_file_path_from_config
-                        extracted_path = extract_file_path_from_config(ds.connection_config, connection_string)
-                        if extracted_path:
-                            file_path = extracted_path
-                    
-                    if file_path:
-                        # 文件类型数据源：从文件读取并解析schema
-                        t4 = time.time()
-                        schema_info = await _get_file_schema(file_path, ds.db_type, ds.name)
-                        print(f"[PERF] _get_file_schema for {ds.name} took {time.time() - t4:.2f}s")
-                    else:
-                        # 连接字符串获取失败，尝试备选方案
-                        print(f"[PERF] 尝试备选方案获取数据源 {ds.name} 的schema")
-                        schema_info = await _try_get_file_schema_fallback(tenant_id, ds.id, ds.db_type, ds.name)
-
-                print(f"[PERF] Total processing for data source {ds.name} took {time.time() - ds_start:.2f}s")
-
-                if schema_info and schema_info.get("tables"):
-                    context_parts.append(f"\n### 数据源: {ds.name}")
-                    context_parts.append(f"- 类型: {ds.db_type}")
-                    context_parts.append(f"- 文件/数据库: {ds.database_name or '未知'}")
-
-                    # 添加表信息
-                    context_parts.append("\n#### 表结构:")
-                    for table in schema_info["tables"][:20]:  # 限制表数量避免token过多
-                        table_name = table.get("name", "unknown")
-                        row_count = table.get("row_count", "未知")
-                        context_parts.append(f"\n**表: {table_name}** (共{row_count}行)")
-
-                        columns = table.get("columns", [])
-                        if columns:
-                            col_info = []
-                            for col in columns[:30]:  # 限制列数量
-                                col_name = col.get("name", "unknown")
-                                col_type = col.get("type", "unknown")
-                                nullable = "可空" if col.get("nullable") else "非空"
-                                # 🔧 新增：显示枚举值
-                                enum_values = col.get("enum_values")
-                                if enum_values:
-                                    enum_str = ", ".join([f"'{v}'" for v in enum_values[:8]])  # 最多显示8个
-                                    if len(enum_values) > 8:
-                                        enum_str += ", ..."
-                                    col_info.append(f"  - {col_name} ({col_type}, {nullable}) **可选值: [{enum_str}]**")
-                                else:
-                                    col_info.append(f"  - {col_name} ({col_type}, {nullable})")
-                            context_parts.append("\n".join(col_info))
-
-                        # 添加主键信息
-                        if table.get("primary_key"):
-                            context_parts.append(f"  - 主键: {', '.join(table['primary_key'])}")
-
-                        # 添加外键信息
-                        if table.get("foreign_keys"):
-                            for fk in table["foreign_keys"]:
-                                context_parts.append(
-                                    f"  - 外键: {fk['column']} -> {fk['references_table']}.{fk['references_column']}"
-                                )
-
-                    # 添加表关系信息（外键关联）
-                    relationships = schema_info.get("relationships", [])
-                    if relationships:
-                        context_parts.append("\n#### 表关系（外键）:")
-                        context_parts.append("**重要：** 以下是表之间的关联关系，查询时必须通过这些外键进行JOIN：")
-                        for rel in relationships:
-                            from_table = rel.get("from_table", "unknown")
-                            from_column = rel.get("from_column", "unknown")
-                            to_table = rel.get("to_table", "unknown")
-                            to_column = rel.get("to_column", "unknown")
-                            context_parts.append(
-                                f"  - {from_table}.{from_column} -> {to_table}.{to_column}"
-                            )
-
-                    # 添加示例数据
-                    sample_data = schema_info.get("sample_data", {})
-                    if sample_data:
-                        context_parts.append("\n#### 示例数据:")
-                        for table_name, samples in list(sample_data.items())[:5]:  # 限制表数量
-                            if samples.get("data"):
-                                context_parts.append(f"\n**{table_name}** (前5行):")
-                                for row in samples["data"][:3]:  # 限制行数
-                                    row_str = ", ".join([f"{k}={v}" for k, v in list(row.items())[:5]])
-                                    context_parts.append(f"  {row_str}")
-                else:
-                    # 其他数据库类型暂时只显示基本信息
-                    context_parts.append(f"\n### 数据源: {ds.name}")
-                    context_parts.append(f"- 类型: {ds.db_type}")
-                    context_parts.append(f"- 数据库: {ds.database_name or '未知'}")
-                    context_parts.append("- 注: 此数据库类型的schema发现功能开发中")
-
+            except asyncio.TimeoutError:
+                status = "timeout"
+                logger.warning(f"获取数据源 {ds.name} 的schema超时（>{timeout}s），使用占位说明")
+                return _render_unavailable_context(ds, f"获取超时（>{timeout:g}秒）")
             except Exception as e:
+                status = "error"
                 logger.warning(f"获取数据源 {ds.name} 的schema失败: {e}")
-                context_parts.append(f"\n### 数据源: {ds.name}")
-                context_parts.append(f"- 类型: {ds.db_type}")
-                context_parts.append(f"- 注: 无法获取schema信息 ({str(e)[:50]})")
+                return _render_unavailable_context(ds, str(e)[:50])
+            finally:
+                elapsed = time.time() - ds_start
+                source_timings.append(f"{ds.name}={elapsed:.2f}s({status})")
+                print(f"[PERF] Total processing for data source {ds.name} took {elapsed:.2f}s ({status})")
+
+        source_timings: List[str] = []
+        context_parts.extend(await asyncio.gather(*(build_one(ds) for ds in data_sources)))
 
         total_time = time.time() - start_time
-        logger.info(f"[PERF] _get_data_sources_context TOTAL took {total_time:.2f}s")
+        logger.info(
+            f"[PERF] _get_data_sources_context TOTAL took {total_time:.2f}s "
+            f"for {len(data_sources)} sources: {', '.join(source_timings)}"
+        )
         return "\n".join(context_parts)
 
     except Exception as e:
@@ -1544,6 +1583,9 @@ async def _execute_sql_on_file_datasource(
     """
     在文件类型数据源上执行SQL查询（使用duckdb，支持Excel多Sheet）
 
+    文件首次访问时物化为Parquet（按内容哈希缓存），之后的查询直接由duckdb
+    扫描Parquet文件，不再重复下载和解析工作簿。
+
     Args:
         connection_string: 文件存储路径
         db_type: 文件类型（xlsx, csv, xls）
@@ -1560,179 +1602,99 @@ async def _execute_sql_on_file_datasource(
         else:
             storage_path = connection_string
 
-        file_data = None
         file_path = None
+        local_path = None
 
-        # 🔧 修复：优先使用本地文件，只有本地不存在时才从 MinIO 下载
+        # 🔧 修复：优先使用本地文件，只有本地不存在时才从 MinIO 获取
         # 检查是否是本地文件路径（通常在 /app/uploads/ 目录下）
         if storage_path.startswith("/app/uploads/") or storage_path.startswith("/app/data/"):
             file_path = storage_path
             if os.path.exists(file_path):
                 logger.info(f"直接使用本地文件: {file_path}")
-                try:
-                    with open(file_path, 'rb') as f:
-                        file_data = f.read()
-                except Exception as e:
-                    logger.warning(f"读取本地文件失败: {e}，尝试从 MinIO 下载")
-                    file_data = None
+                local_path = file_path
             else:
                 logger.info(f"本地文件不存在: {file_path}，尝试从 MinIO 下载")
-        
-        # 如果本地文件不存在或读取失败，从 MinIO 下载
-        if not file_data:
-            # 从路径中提取正确的 object_name（去掉 /app/uploads/ 前缀）
-            if storage_path.startswith("/app/uploads/"):
-                # 提取相对于 uploads 的路径作为 object_name
-                object_name = storage_path.replace("/app/uploads/", "", 1)
-            elif storage_path.startswith("/app/data/"):
-                # 提取相对于 data 的路径作为 object_name
-                object_name = storage_path.replace("/app/data/", "", 1)
-            else:
-                # 如果路径不包含 /app/uploads/ 或 /app/data/，直接使用原路径
-                object_name = storage_path.lstrip("/")
-            
-            logger.info(f"从MinIO下载文件用于SQL执行: bucket=data-sources, object_name={object_name}")
-            try:
-                file_data = minio_service.download_file(
-                    bucket_name="data-sources",
-                    object_name=object_name
-                )
-            except Exception as e:
-                logger.error(f"从MinIO下载文件失败: {e}")
-                file_data = None
 
-        if not file_data:
+        # 从路径中提取正确的 object_name（去掉 /app/uploads/ 前缀）
+        if storage_path.startswith("/app/uploads/"):
+            object_name = storage_path.replace("/app/uploads/", "", 1)
+        elif storage_path.startswith("/app/data/"):
+            object_name = storage_path.replace("/app/data/", "", 1)
+        else:
+            object_name = storage_path.lstrip("/")
+
+        try:
+            cached = await asyncio.to_thread(
+                _load_cached_file,
+                db_type,
+                local_path=local_path,
+                object_name=object_name
+            )
+        except ImportError as e:
             return {
                 "success": False,
-                "error": f"无法获取文件: {storage_path} (本地路径: {file_path if file_path else 'N/A'})",
+                "error": f"System Error: Missing dependency 'openpyxl'. Please install it: pip install openpyxl. Original error: {str(e)}",
                 "data": [],
                 "columns": [],
                 "row_count": 0
             }
-
-        # 创建duckdb连接
-        conn = duckdb.connect(':memory:')
-        registered_tables = []
-
-        if db_type in ["xlsx", "xls"]:
-            # 读取所有Sheet并注册为不同的表
-            try:
-                # 显式指定 engine='openpyxl' 以确保正确读取
-                excel_file = pd.ExcelFile(io.BytesIO(file_data), engine='openpyxl')
-            except ImportError as e:
-                conn.close()
-                return {
-                    "success": False,
-                    "error": f"System Error: Missing dependency 'openpyxl'. Please install it: pip install openpyxl. Original error: {str(e)}",
-                    "data": [],
-                    "columns": [],
-                    "row_count": 0
-                }
-            except Exception as e:
-                conn.close()
-                return {
-                    "success": False,
-                    "error": f"Execution Error: Failed to read Excel file. {str(e)}",
-                    "data": [],
-                    "columns": [],
-                    "row_count": 0
-                }
-            
-            sheet_names = excel_file.sheet_names
-            logger.info(f"Excel包含 {len(sheet_names)} 个Sheet: {sheet_names}")
-
-            for sheet_name in sheet_names:
-                try:
-                    # 显式指定 engine='openpyxl'
-                    df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
-                    if df.empty:
-                        logger.debug(f"跳过空Sheet: {sheet_name}")
-                        continue
-
-                    # 使用Sheet名称作为表名（清理特殊字符）
-                    # 保留中文字符，因为DuckDB支持中文表名
-                    clean_table_name = re.sub(r'[^\w\u4e00-\u9fff]', '_', sheet_name)
-                    if not clean_table_name or clean_table_name[0].isdigit():
-                        clean_table_name = f"sheet_{clean_table_name}"
-
-                    conn.register(clean_table_name, df)
-                    registered_tables.append(clean_table_name)
-                    logger.info(f"注册表 '{clean_table_name}' (来自Sheet '{sheet_name}'): {len(df)}行")
-
-                    # 同时用原始Sheet名注册（如果不同）
-                    if sheet_name != clean_table_name:
-                        try:
-                            conn.register(sheet_name, df)
-                            registered_tables.append(sheet_name)
-                        except Exception:
-                            pass  # 如果原名注册失败，忽略
-
-                except Exception as e:
-                    logger.warning(f"读取Sheet '{sheet_name}' 失败: {e}")
-                    continue
-
-            # 如果第一个Sheet存在，也用数据源名称注册（向后兼容）
-            if sheet_names:
-                try:
-                    # 显式指定 engine='openpyxl'
-                    first_df = pd.read_excel(excel_file, sheet_name=0, engine='openpyxl')
-                    if not first_df.empty:
-                        ds_table_name = re.sub(r'[^\w\u4e00-\u9fff]', '_', data_source_name)
-                        if ds_table_name not in registered_tables:
-                            conn.register(ds_table_name, first_df)
-                            registered_tables.append(ds_table_name)
-                except Exception as e:
-                    logger.warning(f"注册数据源名称表失败: {e}")
-                    pass
-
-        elif db_type == "csv":
-            # CSV文件只有一个表
-            df = None
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030']:
-                try:
-                    df = pd.read_csv(io.BytesIO(file_data), encoding=encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
-
-            if df is not None:
-                table_name = re.sub(r'[^\w\u4e00-\u9fff]', '_', data_source_name)
-                if not table_name or table_name[0].isdigit():
-                    table_name = f"data_{table_name}"
-                conn.register(table_name, df)
-                registered_tables.append(table_name)
-                # 同时注册为 'data' 作为备用
-                conn.register('data', df)
-
-        if not registered_tables:
-            conn.close()
+        except Exception as e:
+            logger.error(f"读取文件失败: {e}")
             return {
                 "success": False,
-                "error": f"无法从文件读取任何数据: {storage_path}",
+                "error": f"Execution Error: Failed to read file. {str(e)}",
                 "data": [],
                 "columns": [],
                 "row_count": 0
             }
 
-        logger.info(f"成功注册 {len(registered_tables)} 个表: {registered_tables}")
+        if cached is None:
+            return {
+                "success": False,
+                "error": f"无法获取文件: {storage_path} (本地路径: {file_path if file_path else 'N/A'})",
+                "data": [],
+                "columns": [],
+                "row_count": 0
+            }
 
-        # 执行SQL查询
-        try:
-            result_df = conn.execute(sql_query).fetchdf()
-        except Exception as sql_error:
-            error_msg = str(sql_error)
-            logger.warning(f"SQL执行失败: {error_msg}")
-            # 提供更友好的错误信息，包含可用的表名
-            conn.close()
+        if not cached.sheets:
             return {
                 "success": False,
-                "error": f"SQL执行失败: {error_msg}\n\n可用的表: {', '.join(registered_tables)}",
+                "error": f"无法从文件读取任何数据: {storage_path}",
                 "data": [],
                 "columns": [],
                 "row_count": 0
             }
 
-        conn.close()
+        # 数据源名称别名（向后兼容）：Excel 指向第一个Sheet，CSV 指向唯一的表
+        if db_type == "csv":
+            aliases = {sanitize_table_name(data_source_name, "data"): cached.sheets[0].name}
+        else:
+            ds_table_name = re.sub(r'[^\w\u4e00-\u9fff]', '_', data_source_name)
+            aliases = {ds_table_name: cached.sheets[0].name}
+
+        # 创建duckdb连接，视图直接指向Parquet文件（零拷贝）
+        conn = duckdb.connect(':memory:')
+        try:
+            registered_tables = get_columnar_cache_service().register_views(conn, cached, aliases)
+            logger.info(f"成功注册 {len(registered_tables)} 个表: {registered_tables}")
+
+            # 执行SQL查询
+            try:
+                result_df = conn.execute(sql_query).fetchdf()
+            except Exception as sql_error:
+                error_msg = str(sql_error)
+                logger.warning(f"SQL执行失败: {error_msg}")
+                # 提供更友好的错误信息，包含可用的表名
+                return {
+                    "success": False,
+                    "error": f"SQL执行失败: {error_msg}\n\n可用的表: {', '.join(registered_tables)}",
+                    "data": [],
+                    "columns": [],
+                    "row_count": 0
+                }
+        finally:
+            conn.close()
 
         # 转换结果为字典列表
         columns = list(result_df.columns)
@@ -1761,7 +1723,7 @@ async def _execute_sql_on_file_datasource(
 async def _execute_sql_if_needed(
     content: str,
     tenant_id: str,
-    db: Session,
+    db: AsyncSession,
     original_question: str = "",
     data_source_ids: Optional[List[str]] = None
 ) -> str:
@@ -1880,12 +1842,13 @@ async def _execute_sql_if_needed(
                         adapter = PostgreSQLAdapter(connection_string)
                         try:
                             await adapter.connect()
-                            query_result = await adapter.execute_query(current_sql)
+                            query_result = await get_query_guard().execute(adapter, current_sql, tenant_id)
                             # 将QueryResult对象转换为字典格式
                             result = {
                                 "data": query_result.data,
                                 "columns": query_result.columns,
-                                "row_count": query_result.row_count
+                                "row_count": query_result.row_count,
+                                "truncated": query_result.has_more
                             }
                         finally:
                             await adapter.disconnect()
@@ -2035,7 +1998,7 @@ def _convert_response(response: LLMResponse) -> ChatCompletionResponse:
 async def _execute_tool_call(
     tool_call: Dict[str, Any],
     tenant_id: str,
-    db: Session,
+    db: AsyncSession,
     data_source_ids: Optional[List[str]] = None
 ) -> Dict[str, Any]:
     """
@@ -2134,11 +2097,12 @@ async def _execute_tool_call(
                     adapter = PostgreSQLAdapter(connection_string)
                     try:
                         await adapter.connect()
-                        query_result = await adapter.execute_query(processed_sql)
+                        query_result = await get_query_guard().execute(adapter, processed_sql, tenant_id)
                         result = {
                             "data": query_result.data,
                             "columns": query_result.columns,
-                            "row_count": query_result.row_count
+                            "row_count": query_result.row_count,
+                            "truncated": query_result.has_more
                         }
                     finally:
                         await adapter.disconnect()
@@ -2453,10 +2417,24 @@ async def _stream_general_chat_generator(
     yield f"data: {json.dumps(done_event, ensure_ascii=False)}\n\n"
 
 
+async def _release_session_after(stream, db: AsyncSession):
+    """
+    流式响应结束（或客户端断开）后关闭数据库会话
+
+    依赖注入的会话在响应体开始发送前即已退出，流式生成器中再次使用会话会
+    重新检出连接，这里确保连接在流结束时归还连接池。
+    """
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await maybe_await(db.close())
+
+
 async def _stream_response_generator(
     stream_generator,
     tenant_id: str,
-    db: Session,
+    db: AsyncSession,
     original_question: str = "",
     data_source_ids: Optional[List[str]] = None,
     initial_messages: Optional[List[LLMMessage]] = None,
@@ -2887,12 +2865,13 @@ async def _stream_response_generator(
                                         adapter = PostgreSQLAdapter(connection_string)
                                         try:
                                             await adapter.connect()
-                                            query_result = await adapter.execute_query(current_sql)
+                                            query_result = await get_query_guard().execute(adapter, current_sql, tenant_id)
                                             # 将QueryResult对象转换为字典格式
                                             result = {
                                                 "data": query_result.data,
                                                 "columns": query_result.columns,
-                                                "row_count": query_result.row_count
+                                                "row_count": query_result.row_count,
+                                                "truncated": query_result.has_more
                                             }
                                         finally:
                                             await adapter.disconnect()
@@ -4225,7 +4204,7 @@ async def _stream_response_generator(
 async def chat_completion(
     request: ChatCompletionRequest,
     current_user: Dict[str, Any] = Depends(get_current_user_with_tenant),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     聊天完成接口
@@ -4445,7 +4424,7 @@ async def chat_completion(
                 # Agent SQL查询模式：6-8步流程（仅在真正需要数据查询时使用）
                 logger.info(f"[STREAM] Using Agent SQL mode for data query, question_type={question_type.value}")
                 return StreamingResponse(
-                    _stream_response_generator(
+                    _release_session_after(_stream_response_generator(
                         response_generator,
                         tenant_id,
                         db,
@@ -4454,7 +4433,7 @@ async def chat_completion(
                         initial_messages=messages,  # 传递初始消息历史
                         schema_info=schema_info,  # 传递Schema获取信息
                         question_type=question_type  # 🔧 传递问题类型
-                    ),
+                    ), db),
                     media_type="text/event-stream",
                     headers={
                         "Cache-Control": "no-cache",
@@ -4899,7 +4878,7 @@ async def test_tenant_isolation(
 @router.get("/test/data-sources-context")
 async def test_data_sources_context(
     current_user: Dict[str, Any] = Depends(get_current_user_with_tenant),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     测试数据源上下文获取
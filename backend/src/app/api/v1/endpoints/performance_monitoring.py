@@ -5,9 +5,10 @@
 **文件名**: performance_monitoring.py
 **职责**: 提供实时性能统计、租户性能报告、慢查询分析、告警管理和系统资源监控的RESTful API
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本
+- v1.1.0 (2026-10-16): 新增 /metrics/prometheus 导出统一指标引擎的全部指标
 
 ## [INPUT]
 - hours: int - 时间范围（小时，1-168）
@@ -23,6 +24,7 @@
 - 查询类型性能分析: Dict[str, Any]
 - 性能警告列表: List[Dict[str, Any]]
 - 导出的性能指标数据: PlainTextResponse（JSON/CSV）
+- Prometheus指标: PlainTextResponse（text/plain; version=0.0.4）
 - 活跃告警列表: List[Dict[str, Any]]
 - 告警历史记录: List[Dict[str, Any]]
 - 系统资源指标: Dict[str, Any]
@@ -32,6 +34,7 @@
 **上游依赖**:
 - [../../core/auth.py](../../core/auth.py) - get_current_user_with_tenant依赖注入
 - [../../services/query_performance_monitor.py](../../services/query_performance_monitor.py) - query_perf_monitor单例服务
+- [../../core/metrics.py](../../core/metrics.py) - export_prometheus统一指标导出
 
 **下游依赖**:
 - 无（API端点为最外层）
@@ -55,6 +58,7 @@ from fastapi import APIRouter, HTTPException, Query, Depends
 from fastapi.responses import PlainTextResponse
 
 from src.app.core.auth import get_current_user_with_tenant
+from src.app.core.metrics import export_prometheus
 from src.app.services.query_performance_monitor import query_perf_monitor
 
 logger = logging.getLogger(__name__)
@@ -208,6 +212,23 @@ async def export_performance_metrics(
         raise HTTPException(status_code=500, detail="导出性能指标失败")
 
 
+@router.get("/metrics/prometheus")
+async def export_prometheus_metrics(current_user = Depends(get_current_user_with_tenant)):
+    """
+    以 Prometheus 文本格式导出所有监控器的指标
+
+    分位数为最近5分钟的值，_sum/_count 为进程启动以来的累计值。
+    """
+    try:
+        return PlainTextResponse(
+            content=export_prometheus(),
+            media_type="text/plain; version=0.0.4"
+        )
+    except Exception as e:
+        logger.error(f"导出Prometheus指标失败: {e}")
+        raise HTTPException(status_code=500, detail="导出Prometheus指标失败")
+
+
 @router.post("/monitor/start")
 async def start_monitoring(current_user = Depends(get_current_user_with_tenant)):
     """
@@ -5,9 +5,12 @@
 **文件名**: query.py
 **职责**: 实现自然语言查询API，集成LangGraph SQL Agent和LLM服务，支持SQL/文档/混合查询，提供查询历史、状态跟踪和缓存管理，确保租户隔离和查询安全
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.2.1
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 实现Story 3.1规范的智能查询API
+- v1.1.0 (2026-10-16): /query 改用共享限流依赖（每小时限额 + 并发槽位），不再在请求路径上COUNT QueryLog
+- v1.2.0 (2026-10-16): 图表合并优先使用 AgentV2 本地合并引擎（chart_merge），不支持的图表结构才回退到 LLM
+- v1.2.1 (2026-10-16): /query 增加客户端IP限流依赖（enforce_client_rate_limit）
 
 ## [INPUT]
 - **tenant_id: str** - 租户ID（从JWT token中提取）
@@ -64,10 +67,12 @@
 - [../../data/database.py](../../data/database.py) - get_db(), Session
 - [../../data/models.py](../../data/models.py) - QueryStatus, QueryType
 - [../../middleware/tenant_context.py](../../middleware/tenant_context.py) - get_current_tenant_from_request, get_current_tenant_id
+- [../../middleware/rate_limit.py](../../middleware/rate_limit.py) - enforce_client_rate_limit, enforce_query_rate_limit, query_concurrency_slot
 - [../../services/query_context.py](../../services/query_context.py) - get_query_context, 查询上下文管理
 - [../../services/llm_service.py](../../services/llm_service.py) - llm_service, LLM服务调用
 - [../../services/agent_service.py](../../services/agent_service.py) - run_agent_query, convert_agent_response_to_query_response, is_agent_available
 - [../../services/data_source_service.py](../../services/data_source_service.py) - DataSourceService, 数据源服务
+- [../../../../../../AgentV2/chart_merge.py](../../../../../../AgentV2/chart_merge.py) - merge_chart_options, 本地图表合并引擎（延迟导入，不可用时回退LLM）
 - [../../core/jwt_utils.py](../../core/jwt_utils.py) - get_current_user_from_token, JWT解析
 
 **下游依赖** (已读取源码):
@@ -94,11 +99,14 @@ from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query as QueryParam, status
 from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from src.app.data.database import get_db
+from src.app.data.database import get_db, get_async_db
 from src.app.data.models import QueryStatus, QueryType
 from src.app.middleware.tenant_context import get_current_tenant_from_request, get_current_tenant_id
+from src.app.middleware.rate_limit import enforce_client_rate_limit, enforce_query_rate_limit, query_concurrency_slot
 from src.app.services.query_context import get_query_context
 from src.app.services.llm_service import llm_service
 from src.app.services.agent_service import (
@@ -534,47 +542,39 @@ class QueryService:
         return "\n".join(log_lines)
 
 
-async def handle_chart_merge_request(
-    request: QueryRequest,
-    tenant,
-    user_info: Dict[str, Any],
-    query_id: str
-) -> QueryResponseV3:
+def _merge_charts_locally(chart_configs: List[Dict[str, Any]]):
     """
-    处理图表合并请求
-
-    Args:
-        request: 查询请求，包含 merge_request
-        tenant: 租户对象
-        user_info: 用户信息
-        query_id: 查询ID
+    使用 AgentV2 本地合并引擎合并图表
 
     Returns:
-        QueryResponseV3: 合并后的图表响应
+        ChartMergeResult；AgentV2 不可用或图表结构不支持本地合并时返回 None（回退到 LLM）
     """
-    start_time = time.time()
+    try:
+        from AgentV2.chart_merge import ChartMergeError, merge_chart_options
+    except ImportError as e:
+        logger.info(f"📊 [图表合并] 本地合并引擎不可用，使用LLM合并: {e}")
+        return None
 
     try:
-        merge_data = request.merge_request
-        chart_configs = merge_data.get("chart_configs", [])
+        return merge_chart_options(chart_configs)
+    except ChartMergeError as e:
+        logger.info(f"📊 [图表合并] 图表结构不支持本地合并，回退到LLM: {e}")
+        return None
 
-        logger.info(
-            f"📊 [图表合并] 开始处理 {len(chart_configs)} 个图表的合并请求",
-            tenant_id=tenant.id,
-            chart_titles=[c.get("title", "未命名") for c in chart_configs]
-        )
 
-        # 构建图表合并提示词
-        merge_prompt = f"""请将以下 {len(chart_configs)} 个图表合并为一个双Y轴图表。
+async def _merge_charts_with_llm(chart_configs: List[Dict[str, Any]], tenant_id: str) -> Optional[Dict[str, Any]]:
+    """将图表配置序列化进提示词，由 LLM 生成合并后的 ECharts 配置（解析失败返回 None）"""
+    # 构建图表合并提示词
+    merge_prompt = f"""请将以下 {len(chart_configs)} 个图表合并为一个双Y轴图表。
 
 """
-        for i, chart_config in enumerate(chart_configs):
-            title = chart_config.get("title", f"图表{i+1}")
-            echarts_option = chart_config.get("echarts_option", {})
-            merge_prompt += f"\n## 图表 {i+1}：{title}\n"
-            merge_prompt += f"```json\n{json.dumps(echarts_option, ensure_ascii=False, indent=2)}\n```\n"
+    for i, chart_config in enumerate(chart_configs):
+        title = chart_config.get("title", f"图表{i+1}")
+        echarts_option = chart_config.get("echarts_option", {})
+        merge_prompt += f"\n## 图表 {i+1}：{title}\n"
+        merge_prompt += f"```json\n{json.dumps(echarts_option, ensure_ascii=False, indent=2)}\n```\n"
 
-        merge_prompt += """
+    merge_prompt += """
 
 请分析这些图表的数据结构，生成一个合并的双Y轴图表配置。要求：
 
@@ -604,39 +604,93 @@ async def handle_chart_merge_request(
 
 请只输出图表配置，不要添加其他解释文字。"""
 
-        # 调用 LLM 生成合并配置
-        messages = [
-            {
-                "role": "system",
-                "content": "你是一个专业的数据可视化专家，擅长将多个图表合并为一个清晰易懂的双Y轴图表。请严格按照用户要求的格式输出。"
-            },
-            {
-                "role": "user",
-                "content": merge_prompt
-            }
-        ]
+    # 调用 LLM 生成合并配置
+    messages = [
+        {
+            "role": "system",
+            "content": "你是一个专业的数据可视化专家，擅长将多个图表合并为一个清晰易懂的双Y轴图表。请严格按照用户要求的格式输出。"
+        },
+        {
+            "role": "user",
+            "content": merge_prompt
+        }
+    ]
+
+    # 使用 LLM 服务生成合并配置
+    llm_response = await llm_service.chat_completion(
+        messages=messages,
+        tenant_id=tenant_id,
+        temperature=0.3,
+        max_tokens=2000
+    )
+
+    # 提取图表配置
+    answer = llm_response.content
+    echarts_config = None
+
+    # 解析 [CHART_START]...[CHART_END] 标记
+    import re
+    chart_match = re.search(r'\[CHART_START\](.*?)\[CHART_END\]', answer, re.DOTALL)
+    if chart_match:
+        try:
+            echarts_config = json.loads(chart_match.group(1).strip())
+            logger.info("📊 [图表合并] 成功解析图表配置")
+        except json.JSONDecodeError as e:
+            logger.warning(f"📊 [图表合并] 图表配置JSON解析失败: {e}")
+
+    return echarts_config
 
-        # 使用 LLM 服务生成合并配置
-        llm_response = await llm_service.chat_completion(
-            messages=messages,
+
+async def handle_chart_merge_request(
+    request: QueryRequest,
+    tenant,
+    user_info: Dict[str, Any],
+    query_id: str
+) -> QueryResponseV3:
+    """
+    处理图表合并请求
+
+    Args:
+        request: 查询请求，包含 merge_request
+        tenant: 租户对象
+        user_info: 用户信息
+        query_id: 查询ID
+
+    Returns:
+        QueryResponseV3: 合并后的图表响应
+    """
+    start_time = time.time()
+
+    try:
+        merge_data = request.merge_request
+        chart_configs = merge_data.get("chart_configs", [])
+
+        logger.info(
+            f"📊 [图表合并] 开始处理 {len(chart_configs)} 个图表的合并请求",
             tenant_id=tenant.id,
-            temperature=0.3,
-            max_tokens=2000
+            chart_titles=[c.get("title", "未命名") for c in chart_configs]
         )
 
-        # 提取图表配置
-        answer = llm_response.content
-        echarts_config = None
-
-        # 解析 [CHART_START]...[CHART_END] 标记
-        import re
-        chart_match = re.search(r'\[CHART_START\](.*?)\[CHART_END\]', answer, re.DOTALL)
-        if chart_match:
-            try:
-                echarts_config = json.loads(chart_match.group(1).strip())
-                logger.info("📊 [图表合并] 成功解析图表配置")
-            except json.JSONDecodeError as e:
-                logger.warning(f"📊 [图表合并] 图表配置JSON解析失败: {e}")
+        # 优先本地合并（毫秒级），不支持的图表结构回退到 LLM
+        merge_result = _merge_charts_locally(chart_configs)
+        if merge_result is not None:
+            merge_engine = "local"
+            echarts_config = merge_result.option
+            axis_content = "；".join(
+                f"{'左' if axis == 0 else '右'}Y轴: {'、'.join(names)}"
+                for axis, names in enumerate(merge_result.axis_series)
+            ) + f"（{merge_result.reason}）"
+            logger.info(
+                "📊 [图表合并] 本地合并完成",
+                tenant_id=tenant.id,
+                dual_axis=merge_result.dual_axis,
+                x_points=len(merge_result.x_labels)
+            )
+        else:
+            merge_engine = "llm"
+            echarts_config = await _merge_charts_with_llm(chart_configs, tenant.id)
+            axis_content = "根据数值量级分配Y轴（双轴配置）"
+        chart_kind = "多系列图表" if merge_result is not None and not merge_result.dual_axis else "双Y轴图表"
 
         # 构建处理步骤
         processing_steps = [
@@ -659,7 +713,7 @@ async def handle_chart_merge_request(
             row_count=0,
             processing_time_ms=processing_time_ms,
             confidence_score=0.9,
-            explanation=f"已将 {len(chart_configs)} 个图表合并为一个双Y轴图表。",
+            explanation=f"已将 {len(chart_configs)} 个图表合并为一个{chart_kind}。",
             processing_steps=processing_steps,
             validation_result=None,
             execution_result=None,
@@ -668,6 +722,7 @@ async def handle_chart_merge_request(
                 "chart_merge": True,
                 "merged_chart_count": len(chart_configs),
                 "echarts_option": echarts_config,
+                "merge_engine": merge_engine,
                 "processing_steps": [
                     {
                         "step": 1,
@@ -682,7 +737,7 @@ async def handle_chart_merge_request(
                     {
                         "step": 3,
                         "title": "Y轴分配",
-                        "content": "根据数值量级分配Y轴（双轴配置）"
+                        "content": axis_content
                     },
                     {
                         "step": 4,
@@ -751,13 +806,17 @@ async def create_query(
     tenant=Depends(get_current_tenant_from_request),
     user_info: Dict[str, Any] = Depends(get_current_user_info_from_request),
     db: Session = Depends(get_db),
-    query_service: QueryService = Depends(get_query_service)
+    query_service: QueryService = Depends(get_query_service),
+    _client_limit=Depends(enforce_client_rate_limit),
+    _rate_limit=Depends(enforce_query_rate_limit),
+    _query_slot=Depends(query_concurrency_slot)
 ):
     """
     创建查询请求
     Story 3.1: 核心查询端点，处理自然语言查询
     集成 LangGraph SQL Agent（使用 DeepSeek 作为默认 LLM）
     支持图表合并请求（merge_request）
+    客户端IP限流、频率限额与并发槽位由依赖检查（超限返回429），槽位在响应结束后释放
     """
     # ============================================================
     # 🔍 [诊断] /query 端点被调用 - 记录完整请求信息
@@ -799,11 +858,6 @@ async def create_query(
         # 创建查询上下文
         query_context = get_query_context(db, tenant.id, user_id)
 
-        # 检查频率限制
-        can_proceed, error_msg = query_context.check_rate_limits()
-        if not can_proceed:
-            raise HTTPException(status_code=429, detail=error_msg)
-
         # 数据源服务实例
         data_source_service = DataSourceService()
 
@@ -1160,23 +1214,22 @@ async def get_query_status(
     query_id: str,
     tenant=Depends(get_current_tenant_from_request),
     user_info: Dict[str, Any] = Depends(get_current_user_info_from_request),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取查询状态
-    Story 3.1: 查询状态跟踪端点
+    Story 3.1: 查询状态跟踪端点（前端轮询，使用异步会话不阻塞事件循环）
     """
     try:
-        # 创建查询上下文（使用正确的用户ID）
-        user_id = user_info["user_id"]
-        query_context = get_query_context(db, tenant.id, user_id)
-
         # 查询状态
         from src.app.data.models import QueryLog
-        query_log = db.query(QueryLog).filter(
-            QueryLog.id == query_id,
-            QueryLog.tenant_id == tenant.id
-        ).first()
+        result = await db.execute(
+            select(QueryLog).where(
+                QueryLog.id == query_id,
+                QueryLog.tenant_id == tenant.id
+            ).limit(1)
+        )
+        query_log = result.scalars().first()
 
         if not query_log:
             raise HTTPException(status_code=404, detail="查询不存在")
@@ -11,13 +11,14 @@ API v2 版本路由包
     - SubAgent 委派
     - 可解释性日志
     - 错误追踪
+    - 查询结果集按 result_id 分页/流式读取
 
 作者: BMad Master
 版本: 2.0.0
 """
 
 from fastapi import APIRouter
-from .endpoints import query_v2, query_stream_v2
+from .endpoints import query_v2, query_stream_v2, results_v2
 
 # 创建API v2路由器
 api_router_v2 = APIRouter()
@@ -25,5 +26,6 @@ api_router_v2 = APIRouter()
 # 注册各个端点路由
 api_router_v2.include_router(query_v2.router, tags=["Query V2"])
 api_router_v2.include_router(query_stream_v2.router, tags=["Query V2 Stream"])
+api_router_v2.include_router(results_v2.router, tags=["Results V2"])
 
 __all__ = ["api_router_v2"]
@@ -11,12 +11,20 @@ API: POST /api/v2/query/stream
     - 实时流式输出
     - 处理步骤推送
     - 可取消的长时间查询
+    - 租户取自认证信息，租户级频率限额与并发槽位（流结束或客户端断开时释放槽位）
+    - 客户端IP限流（与 /api/v1/query 相同的阈值）
+    - 可选的语义缓存（semantic_cache_enabled）：精确缓存未命中时按问题相似度复用回答
+    - 回答写入缓存在后台任务中完成，不阻塞 done 事件
+    - token 经 SSEWriter 按时间/大小合并为帧（默认 30ms / 1KB），可按 Accept-Encoding 压缩
+    - 表格步骤携带 result_id，前端按句柄读取完整结果（大结果只有样例行经过 LLM 和 SSE）
+    - 数据库会话按请求经 contextvars 绑定，池化 Agent 并发复用时互不替换会话
+    - 语义缓存误命中反馈的租户同样取自认证信息
 
 作者: BMad Master
-版本: 2.0.0
+版本: 2.3.3
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any, AsyncGenerator, Callable
@@ -33,12 +41,51 @@ from src.app.services.cache_service import (
     get_cache_manager,
     TenantCacheKeyGenerator
 )
+from src.app.services.semantic_query_cache import get_semantic_query_cache
 
 # 数据库依赖导入
 from src.app.data.database import SessionLocal
 
+# 限流依赖导入
+from src.app.core.config import settings
+from src.app.core.rate_limiter import ConcurrencySlot
+from src.app.core.sse_writer import SSEWriter, negotiate_encoding
+from src.app.middleware.rate_limit import enforce_client_rate_limit, stream_query_slot
+from src.app.middleware.tenant_context import get_current_tenant_from_request
+
 logger = logging.getLogger(__name__)
 
+# 后台缓存写入任务（保持强引用，避免任务在完成前被回收）
+_background_tasks: set = set()
+
+
+async def _persist_answer(
+    cache_manager,
+    semantic_cache,
+    cache_key: Optional[str],
+    cache_data: Dict[str, Any],
+    tenant_id: str,
+    connection_id: Optional[str],
+    query: str,
+    schema_version: Optional[str],
+    sql: Optional[str],
+) -> None:
+    """并发写入精确缓存与语义缓存（后台执行，失败只记录日志）"""
+    writes = []
+    if cache_manager is not None and cache_key:
+        writes.append(cache_manager.cache.set(cache_key, cache_data, ttl=600))
+    if semantic_cache is not None:
+        # 记录当时的schema版本用于命中校验
+        writes.append(semantic_cache.store(
+            tenant_id, connection_id, query, cache_data,
+            schema_version=schema_version, sql=sql
+        ))
+    for result in await asyncio.gather(*writes, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning(f"查询结果写入缓存失败: {result}")
+    if cache_key:
+        logger.debug(f"查询结果已缓存: {cache_key}")
+
 # ============================================================================
 # 会话状态管理
 # ============================================================================
@@ -210,8 +257,11 @@ class StreamQueryRequestV2(BaseModel):
 @router.post("/stream")
 async def create_stream_query_v2(
     request: StreamQueryRequestV2,
-    tenant_id: str = "default_tenant",
-    user_id: str = "default_user"
+    user_id: str = "default_user",
+    tenant=Depends(get_current_tenant_from_request),
+    _client_limit=Depends(enforce_client_rate_limit),
+    slot: ConcurrencySlot = Depends(stream_query_slot),
+    accept_encoding: Optional[str] = Header(None)
 ):
     """
     流式查询端点 (Server-Sent Events)
@@ -239,23 +289,36 @@ async def create_stream_query_v2(
     });
     ```
     """
+    # 租户与限流槽位使用同一个认证租户
+    tenant_id = tenant.id
+
     # 记录请求开始时间
     request_start_time = time.time()
 
-    async def event_generator() -> AsyncGenerator[str, None]:
+    # token 合并写出器（客户端支持且配置允许时压缩）
+    allowed_encodings = [e.strip() for e in settings.sse_compression.split(",") if e.strip()]
+    writer = SSEWriter(
+        flush_interval=settings.sse_flush_interval_ms / 1000,
+        flush_bytes=settings.sse_flush_bytes,
+        progress_interval=settings.sse_progress_interval,
+        encoding=negotiate_encoding(accept_encoding, allowed_encodings)
+    )
+
+    async def event_generator() -> AsyncGenerator[bytes, None]:
         """SSE 事件生成器"""
 
-        def send_event(event_type: str, data: Dict[str, Any]):
-            """发送 SSE 事件（同步生成器）"""
-            event_data = json.dumps(data, ensure_ascii=False)
-            yield f"event: {event_type}\n"
-            yield f"data: {event_data}\n\n"
+        def send_event(event_type: str, data: Dict[str, Any]) -> bytes:
+            """发送 SSE 事件（先写出已合并的 token，保持事件顺序）"""
+            return writer.event(event_type, data)
 
         try:
             # 步骤时间记录
             step_timings: Dict[str, float] = {}
             overall_start = time.time()  # 初始化总开始时间
 
+            # 同一会话的后续提问依赖对话上下文，不参与语义缓存
+            is_follow_up = bool(request.session_id) and get_session_state(request.session_id) is not None
+
             # 初始化会话状态
             session_id = request.session_id or f"stream_{int(time.time() * 1000)}"
             abort_event = asyncio.Event()
@@ -270,28 +333,25 @@ async def create_stream_query_v2(
             set_session_state(session_state)
 
             # 发送开始事件（包含 session_id）
-            for event in send_event("start", {
+            yield send_event("start", {
                 "query": request.query,
                 "tenant_id": tenant_id,
                 "session_id": session_id,
                 "timestamp": time.time()
-            }):
-                yield event
+            })
 
             # 步骤 1: 接收查询（保留，作为唯一的初始化步骤）
             step_start = time.time()
             step_timings["receive_query"] = (time.time() - step_start) * 1000
 
-            for event in send_event("step", {
+            yield send_event("step", {
                 "step": 1,
                 "message": "理解问题",
                 "detail": f"正在分析: {request.query[:50]}...",
                 "status": "running"
-            }):
-                yield event
+            })
 
-            for event in send_event("progress", {"value": 10}):
-                yield event
+            yield send_event("progress", {"value": 10})
 
             # 🔧 删除了步骤 2（租户隔离验证）和步骤 3（AgentV2 处理）
             # 这些是内部步骤，对用户无价值
@@ -309,6 +369,19 @@ async def create_stream_query_v2(
                 cached_data = await cache_manager.cache.get(cache_key)
                 cache_hit = cached_data is not None
 
+            # 精确缓存未命中时查语义缓存（表述不同、语义相同的问题）
+            semantic_cache = None if is_follow_up else get_semantic_query_cache()
+            semantic_hit = None
+            schema_version = None
+            if semantic_cache is not None and not cache_hit:
+                schema_version = await semantic_cache.current_schema_version(tenant_id, request.connection_id)
+                semantic_hit = await semantic_cache.lookup(
+                    tenant_id, request.connection_id, request.query, schema_version
+                )
+                if semantic_hit is not None:
+                    cached_data = semantic_hit.entry.payload
+                    cache_hit = True
+
             step_timings["cache_check"] = (time.time() - step_start) * 1000
 
             if cache_hit and cached_data:
@@ -319,21 +392,12 @@ async def create_stream_query_v2(
                 cached_answer = cached_data.get("answer", "")
                 processing_steps = cached_data.get("processing_steps", [])
 
-                for event in send_event("progress", {"value": 80}):
-                    yield event
+                yield send_event("progress", {"value": 80})
 
-                # 分块发送答案
+                # 按与实时输出相同的合并规则回放答案
                 step_start = time.time()
-                chunk_size = 200
-                for i in range(0, len(cached_answer), chunk_size):
-                    chunk = cached_answer[i:i+chunk_size]
-                    progress = 80 + int((i / len(cached_answer)) * 15)
-
-                    for event in send_event("data", {
-                        "chunk": chunk,
-                        "progress": progress
-                    }):
-                        yield event
+                for frame in writer.replay(cached_answer, 80, 95):
+                    yield frame
 
                 step_timings["answer_streaming"] = (time.time() - step_start) * 1000
 
@@ -350,11 +414,13 @@ async def create_stream_query_v2(
                         "query_length": len(request.query),
                         "answer_length": len(cached_answer),
                         "step_timings": step_timings,
-                        "cache_hit": True
+                        "cache_hit": True,
+                        "sse": writer.get_stats(),
+                        "semantic_similarity": semantic_hit.similarity if semantic_hit else None
                     }
                 )
 
-                for event in send_event("done", {
+                done_data = {
                     "success": True,
                     "answer": cached_answer,
                     "processing_steps": processing_steps,
@@ -362,31 +428,39 @@ async def create_stream_query_v2(
                     "processing_time_ms": round(total_processing_time_ms, 2),
                     "step_timings": {k: round(v, 2) for k, v in step_timings.items()},
                     "from_cache": True
-                }):
-                    yield event
+                }
+                if semantic_hit is not None:
+                    # 客户端可凭 entry_id 反馈误命中（POST /stream/cache/false-hit）
+                    done_data["semantic_match"] = semantic_hit.to_dict()
+
+                yield send_event("done", done_data)
 
-                for event in send_event("progress", {"value": 100}):
-                    yield event
+                yield send_event("progress", {"value": 100})
 
             else:
                 # 缓存未命中 - 执行 AgentV2 查询
                 step_start = time.time()
                 try:
                     from AgentV2.core import get_default_factory
+                    from AgentV2.tools import bind_db_session
 
                     agent_factory = get_default_factory()
 
-                    # 获取数据库会话用于查询数据源配置
+                    # 获取数据库会话用于查询数据源配置；池化 Agent 不保存会话，
+                    # 工具从本请求的上下文读取（to_thread 与 astream_events 都会复制 contextvars）
                     db_session = SessionLocal()
+                    previous_session = bind_db_session(db_session)
                     try:
-                        agent = agent_factory.get_or_create_agent(
+                        # 工厂为同步实现（未命中池时查询数据源配置并编译 Agent），
+                        # 放到线程池执行，避免阻塞同一 worker 上的其他 SSE 流
+                        agent = await asyncio.to_thread(
+                            agent_factory.get_or_create_agent,
                             tenant_id=tenant_id,
                             user_id=user_id,
                             session_id=request.session_id,
                             connection_id=request.connection_id,
-                            db_session=db_session,
-                            force_refresh=True  # 🔧 强制刷新以确保使用最新的系统提示词
-                        )
+                            db_session=db_session
+                        )  # 池化复用已编译 Agent；提示词版本变化或数据源变更时工厂自动重建
 
                         # 🔧 使用原始用户查询（CHART_GUIDANCE_TEMPLATE 已包含图表生成指令）
                         agent_input = {
@@ -396,8 +470,7 @@ async def create_stream_query_v2(
                         }
 
                         # 🔧 删除了 AgentV2 处理步骤的发送，直接进入实际工具调用
-                        for event in send_event("progress", {"value": 20}):
-                            yield event
+                        yield send_event("progress", {"value": 20})
 
                         # 🔧🔧🔧 使用 astream_events 实现真正的 token 级别流式输出
                         # 参考: LangGraph 文档 - Streaming Events
@@ -406,8 +479,8 @@ async def create_stream_query_v2(
                         accumulated_answer = ""
                         step_count = 0
                         processing_step_number = 1  # 🔧 从步骤1开始计数（删除了步骤2、3）
-                        last_progress_update = time.time()
                         current_tool_call = None  # 跟踪当前工具调用
+                        last_sql = None  # 最后执行的SQL（随语义缓存条目保存，便于排查误命中）
 
                         async for event in agent.astream_events(
                             agent_input,
@@ -428,19 +501,10 @@ async def create_stream_query_v2(
                                     step_count += 1
                                     progress = 30 + min(int((step_count / 100) * 50), 50)
                                     
-                                    # 实时发送每个 token
-                                    for sse in send_event("data", {
-                                        "chunk": chunk.content,
-                                        "progress": progress
-                                    }):
-                                        yield sse
-                                    
-                                    # 定期发送进度更新（每 0.5 秒）
-                                    now = time.time()
-                                    if now - last_progress_update > 0.5:
-                                        for sse in send_event("progress", {"value": progress}):
-                                            yield sse
-                                        last_progress_update = now
+                                    # token 先合并，达到时间/大小上限时写出一帧（进度事件随帧按间隔发送）
+                                    frame = writer.token(chunk.content, progress)
+                                    if frame:
+                                        yield frame
 
                             # 🔧 处理工具调用开始
                             elif event_kind == "on_tool_start":
@@ -461,6 +525,7 @@ async def create_stream_query_v2(
                                     if sql_query:
                                         step_data["content_type"] = "sql"
                                         step_data["content_data"] = {"sql": sql_query}
+                                        last_sql = sql_query
                                         step_data["detail"] = f"执行查询: {sql_query[:100]}..."
                                 elif "schema" in tool_name.lower():
                                     step_data["message"] = "获取数据库结构"
@@ -473,8 +538,7 @@ async def create_stream_query_v2(
                                     step_data["detail"] = "正在生成可视化图表..."
                                 
                                 current_tool_call = step_data
-                                for sse in send_event("step", step_data):
-                                    yield sse
+                                yield send_event("step", step_data)
 
                             # 🔧 处理工具调用结束
                             elif event_kind == "on_tool_end":
@@ -520,8 +584,7 @@ async def create_stream_query_v2(
                                         except (json_module.JSONDecodeError, TypeError):
                                             pass
                                     
-                                    for sse in send_event("step", current_tool_call):
-                                        yield sse
+                                    yield send_event("step", current_tool_call)
                                     
                                     # 🔧 从工具输出中提取表格数据
                                     if tool_output and isinstance(tool_output, str):
@@ -551,12 +614,13 @@ async def create_stream_query_v2(
                                                             "table": {
                                                                 "columns": columns,
                                                                 "rows": rows[:50],  # 限制前50行
-                                                                "row_count": row_count
+                                                                "row_count": row_count,
+                                                                # 完整结果按句柄分页读取（GET /api/v2/results/{result_id}）
+                                                                "result_id": output_data.get("result_id")
                                                             }
                                                         }
                                                     }
-                                                    for sse in send_event("step", table_step):
-                                                        yield sse
+                                                    yield send_event("step", table_step)
                                                     logger.info(f"[V2 Stream] 发送表格数据: {row_count} 行, {len(columns)} 列")
                                             
                                             # 检测是否为列表格式（直接是行数组）
@@ -582,8 +646,7 @@ async def create_stream_query_v2(
                                                             }
                                                         }
                                                     }
-                                                    for sse in send_event("step", table_step):
-                                                        yield sse
+                                                    yield send_event("step", table_step)
                                                     logger.info(f"[V2 Stream] 发送表格数据 (列表): {row_count} 行")
                                         except (json_module.JSONDecodeError, TypeError):
                                             # 不是 JSON 格式，跳过
@@ -631,24 +694,33 @@ async def create_stream_query_v2(
                                 "answer_length": len(answer),
                                 "step_timings": step_timings,
                                 "processing_steps": processing_steps,
-                                "connection_id": request.connection_id
+                                "connection_id": request.connection_id,
+                                "sse": writer.get_stats()
                             }
                         )
 
-                        # 存储到缓存（如果缓存管理器可用）
-                        if cache_manager is not None and answer:
-                            cache_key = TenantCacheKeyGenerator.generate_v2_query_key(
-                                tenant_id, user_id, request.query, request.session_id
-                            )
-                            cache_data = {
-                                "answer": answer,
-                                "processing_steps": processing_steps,
-                                "query": request.query
-                            }
-                            await cache_manager.cache.set(cache_key, cache_data, ttl=600)
-                            logger.debug(f"查询结果已缓存: {cache_key}")
+                        cache_data = {
+                            "answer": answer,
+                            "processing_steps": processing_steps,
+                            "query": request.query
+                        }
 
-                        for event in send_event("done", {
+                        # 存储到精确缓存与语义缓存（后台并发写入，不延迟 done 事件）
+                        if answer and (cache_manager is not None or semantic_cache is not None):
+                            cache_key = None
+                            if cache_manager is not None:
+                                cache_key = TenantCacheKeyGenerator.generate_v2_query_key(
+                                    tenant_id, user_id, request.query, request.session_id
+                                )
+                            task = asyncio.create_task(_persist_answer(
+                                cache_manager, semantic_cache, cache_key, cache_data,
+                                tenant_id, request.connection_id, request.query,
+                                schema_version, last_sql
+                            ))
+                            _background_tasks.add(task)
+                            task.add_done_callback(_background_tasks.discard)
+
+                        yield send_event("done", {
                             "success": True,
                             "answer": answer,
                             "chart_config": chart_config,  # 🔧 添加图表配置
@@ -657,12 +729,11 @@ async def create_stream_query_v2(
                             "processing_time_ms": round(total_processing_time_ms, 2),
                             "step_timings": {k: round(v, 2) for k, v in step_timings.items()},
                             "connection_id": request.connection_id
-                        }):
-                            yield event
+                        })
 
-                        for event in send_event("progress", {"value": 100}):
-                            yield event
+                        yield send_event("progress", {"value": 100})
                     finally:
+                        bind_db_session(previous_session)
                         db_session.close()
 
                 except ImportError:
@@ -677,11 +748,10 @@ async def create_stream_query_v2(
                         metadata={"error": "AgentV2 not available"}
                     )
 
-                    for event in send_event("error", {
+                    yield send_event("error", {
                         "error": "AgentV2 not available",
                         "detail": "流式查询功能需要 AgentV2 模块"
-                    }):
-                        yield event
+                    })
 
         except Exception as e:
             total_processing_time_ms = (time.time() - overall_start) * 1000
@@ -695,11 +765,10 @@ async def create_stream_query_v2(
             )
 
             logger.error(f"Stream query error: {e}")
-            for event in send_event("error", {
+            yield send_event("error", {
                 "error": str(e),
                 "error_type": "internal_error"
-            }):
-                yield event
+            })
 
         finally:
             # 清理会话状态
@@ -710,13 +779,20 @@ async def create_stream_query_v2(
                 # 保留会话状态一段时间以便客户端查询状态
                 # 可以在之后的任务中添加定时清理机制
 
+        # 写出剩余 token 并结束压缩流
+        tail = writer.close()
+        if tail:
+            yield tail
+
+    # 并发槽位随流释放：正常结束、异常或客户端断开（生成器被关闭）时
     return StreamingResponse(
-        event_generator(),
+        slot.wrap_stream(event_generator()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # 禁用 Nginx 缓冲
+            "X-Accel-Buffering": "no",  # 禁用 Nginx 缓冲
+            **writer.headers
         }
     )
 
@@ -732,6 +808,38 @@ async def stream_health_check():
     }
 
 
+class SemanticCacheFeedback(BaseModel):
+    """语义缓存误命中反馈"""
+    entry_id: str = Field(..., description="done 事件 semantic_match 中的条目 ID")
+    connection_id: Optional[str] = Field(None, description="数据源连接 ID")
+
+
+@router.post("/stream/cache/false-hit")
+async def report_semantic_cache_false_hit(
+    feedback: SemanticCacheFeedback,
+    tenant=Depends(get_current_tenant_from_request)
+):
+    """
+    反馈语义缓存误命中（答非所问）
+
+    删除对应条目并计入误命中指标，之后相同问题会重新执行查询。
+    租户取自认证信息，只能删除本租户的条目。
+    """
+    semantic_cache = get_semantic_query_cache()
+    if semantic_cache is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="语义缓存未启用"
+        )
+
+    removed = semantic_cache.report_false_hit(tenant.id, feedback.connection_id, feedback.entry_id)
+    return {
+        "entry_id": feedback.entry_id,
+        "removed": removed,
+        "stats": semantic_cache.get_stats()
+    }
+
+
 # ============================================================================
 # 会话管理端点
 # ============================================================================
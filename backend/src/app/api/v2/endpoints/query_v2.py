@@ -12,9 +12,10 @@ API: POST /api/v2/query
     - SQL 安全验证
     - SubAgent 委派
     - 可解释性日志
+    - 数据库会话按请求绑定，池化 Agent 并发复用时互不替换会话
 
 作者: BMad Master
-版本: 2.0.0
+版本: 2.0.1
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -83,6 +84,7 @@ try:
     logger.info(f"[query_v2 import] project_root in sys.path: {project_root in sys.path}")
     from AgentV2.core import AgentFactory, get_default_factory, get_response_cache
     from AgentV2.middleware import TenantIsolationMiddleware, SQLSecurityMiddleware
+    from AgentV2.tools import bind_db_session
     AGENTV2_AVAILABLE = True
     logger.info("[query_v2 import] SUCCESS: AgentV2 imported successfully")
 except ImportError as e:
@@ -341,7 +343,12 @@ async def create_query_v2(
         logger.info(f"[V2] 执行查询: {request.query}")
         # 注意：由于中间件暂未实现异步方法，使用 to_thread 运行同步调用
         import asyncio
-        result = await asyncio.to_thread(agent.invoke, agent_input)
+        # 池化 Agent 不保存会话：在本请求的上下文中绑定，to_thread 会复制 contextvars
+        previous_session = bind_db_session(db)
+        try:
+            result = await asyncio.to_thread(agent.invoke, agent_input)
+        finally:
+            bind_db_session(previous_session)
         logger.info(f"[V2] 查询完成，结果类型: {type(result)}")
 
         # 7. 解析返回结果
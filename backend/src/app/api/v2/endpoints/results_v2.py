@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Results V2 Endpoint - 查询结果集端点
+===================================
+
+按 result_id 读取 AgentV2 保存在服务端的完整查询结果。
+execute_query 对大结果只把样例行交给 LLM，流式查询的表格步骤携带 result_id，
+前端通过本端点分页或流式获取全部数据。
+结果集存放在共享目录（AGENT_RESULT_STORE_DIR），任意 worker 都能按 result_id 读取。
+租户取自认证信息（get_current_tenant_from_request），与 /query/stream 保存结果时使用的租户一致。
+
+API:
+    GET /api/v2/results/{result_id}          分页读取（offset / limit）
+    GET /api/v2/results/{result_id}/meta     列结构、行数、列统计
+    GET /api/v2/results/{result_id}/stream   NDJSON 流式读取全部行（首行为列信息）
+
+作者: BMad Master
+版本: 1.0.2
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Iterator, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
+
+from src.app.middleware.tenant_context import get_current_tenant_from_request
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/results", tags=["results-v2"])
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _get_store():
+    """获取 AgentV2 结果集存储（AgentV2 不可用时返回 503）"""
+    try:
+        from AgentV2.tools.result_store import get_result_store
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="结果集存储需要 AgentV2 模块"
+        )
+    return get_result_store()
+
+
+def _not_found(result_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"结果集不存在或已过期: {result_id}"
+    )
+
+
+@router.get("/{result_id}")
+async def get_result_page(
+    result_id: str,
+    offset: int = Query(0, ge=0, description="起始行"),
+    limit: int = Query(100, ge=1, le=5000, description="每页行数"),
+    tenant=Depends(get_current_tenant_from_request)
+):
+    """分页读取结果集"""
+    store = _get_store()
+    # 结果可能已落盘，读取放到线程池
+    page = await asyncio.to_thread(store.get_page, result_id, offset, limit, tenant.id)
+    if page is None:
+        raise _not_found(result_id)
+    return Response(content=_dumps(page), media_type="application/json")
+
+
+@router.get("/{result_id}/meta")
+async def get_result_meta(result_id: str, tenant=Depends(get_current_tenant_from_request)):
+    """读取结果集元数据（列结构、行数、列统计）"""
+    meta = _get_store().get_meta(result_id, tenant.id)
+    if meta is None:
+        raise _not_found(result_id)
+    data = meta.to_dict()
+    data.pop("tenant_id")
+    return Response(content=_dumps(data), media_type="application/json")
+
+
+@router.get("/{result_id}/stream")
+async def stream_result(
+    result_id: str,
+    batch_size: int = Query(1000, ge=1, le=10000, description="每批读取行数"),
+    tenant=Depends(get_current_tenant_from_request)
+):
+    """
+    流式读取全部行（application/x-ndjson）
+
+    首行为 {"columns": [...], "row_count": N}，之后每行一个 JSON 数组。
+    """
+    store = _get_store()
+    meta = store.get_meta(result_id, tenant.id)
+    batches = store.iter_batches(result_id, tenant.id, batch_size) if meta is not None else None
+    if batches is None:
+        raise _not_found(result_id)
+
+    def body(rows_batches: Iterator[List[List[Any]]]) -> Iterator[str]:
+        # 同步生成器由 StreamingResponse 在线程池中迭代，落盘读取不阻塞事件循环
+        yield _dumps({"columns": meta.columns, "row_count": meta.row_count}) + "\n"
+        for rows in rows_batches:
+            yield "".join(_dumps(row) + "\n" for row in rows)
+
+    return StreamingResponse(body(batches), media_type="application/x-ndjson")
@@ -56,6 +56,8 @@ class Settings(BaseSettings):
     database_pool_timeout: int = 30
     database_pool_recycle: int = 3600
     database_connect_timeout: int = 10
+    database_async_pool_size: int = 10  # 异步引擎（asyncpg）连接池大小，与同步引擎分别计算
+    database_async_max_overflow: int = 10
 
     # MinIO 配置
     minio_endpoint: str = "minio:9000"
@@ -72,11 +74,53 @@ class Settings(BaseSettings):
     # Redis 缓存配置
     redis_url: str = "redis://localhost:6379/0"
     redis_enabled: bool = False
-    redis_max_connections: int = 10
+    redis_max_connections: int = 50  # 共享连接池大小（缓存、限流、并发槽位共用同一 redis.asyncio 连接池）
     redis_timeout: int = 5
     redis_socket_timeout: int = 5
     redis_socket_connect_timeout: int = 5
-    cache_type: str = "memory"  # memory, redis
+    cache_type: str = "memory"  # memory, redis（redis 时限流与并发槽位在多worker间共享）
+    query_slot_lease_seconds: int = 900  # 并发查询槽位租约（秒），worker异常退出未释放时到期自动回收
+    memory_cache_max_bytes: int = 256 * 1024 ** 2  # 进程内MemoryCache字节预算 256MB（按估算大小），超出按 LRU 淘汰
+    cache_serializer: str = "auto"  # RedisCache值序列化：json, orjson, msgpack, auto（orjson可用时用orjson，输出仍是JSON，新旧worker可互读）
+    cache_compression: str = "auto"  # RedisCache值压缩：zstd, none, auto（zstandard可用时用zstd）
+    cache_compress_min_bytes: int = 4096  # 序列化后不小于该字节数才压缩（大回答/结果集）
+
+    # SSE 流式输出配置（/api/v2/query/stream）
+    sse_flush_interval_ms: int = 30  # token 合并窗口（毫秒），缓冲中最早的 token 超过该时长即写出一帧
+    sse_flush_bytes: int = 1024  # 缓冲的 token 累计字节数达到该值即写出一帧
+    sse_progress_interval: float = 0.5  # progress 事件最小间隔（秒）
+    sse_compression: str = "gzip,deflate"  # 允许与客户端协商的压缩方式（按优先级，逗号分隔），留空则不压缩
+
+    # 文件数据源列式缓存配置（Excel/CSV → Parquet）
+    columnar_cache_dir: Optional[str] = None  # 默认 backend/data/columnar_cache
+    columnar_cache_max_bytes: int = 2 * 1024 ** 3  # 磁盘预算 2GB，超出按 LRU 淘汰
+
+    # 数据文件上传配置（POST /data-sources/upload）
+    data_source_upload_dir: str = "/app/uploads/data-sources"  # 本地落盘目录（Docker卷挂载）
+    data_source_upload_chunk_size: int = 1024 * 1024  # 流式读写块大小（字节）
+
+    # 文本嵌入向量缓存配置（语义搜索）
+    embedding_cache_path: Optional[str] = None  # 默认 backend/data/embedding_cache.sqlite3
+    embedding_cache_max_entries: int = 5000  # 进程内LRU保留的向量数
+
+    # 语义查询缓存配置（v2流式查询：表述不同但语义相同的问题复用已缓存的回答）
+    semantic_cache_enabled: bool = False  # 默认关闭；开启后精确缓存未命中时额外调用一次嵌入API
+    semantic_cache_threshold: float = 0.92  # 命中所需的最低余弦相似度
+    semantic_cache_ttl: int = 600  # 条目有效期（秒），与精确缓存一致
+    semantic_cache_max_entries: int = 500  # 每个 租户+数据源 最多保留的问题数
+
+    # Schema目录缓存配置（数据源schema + 预渲染的提示词片段）
+    schema_catalog_ttl: int = 86400  # 缓存条目最长保留时间（秒）
+    schema_catalog_check_interval: int = 60  # 指纹校验最小间隔（秒），间隔内直接使用缓存
+
+    # 数据源上下文构建配置（对话前并发获取各数据源schema）
+    data_source_context_concurrency: int = 4  # 同时获取schema的数据源数量上限
+    data_source_context_timeout: float = 15.0  # 单个数据源超时（秒），超时降级为占位说明
+
+    # LLM生成SQL的执行保护（自动补 LIMIT + EXPLAIN 成本预算 + 有界读取）
+    query_max_rows: int = 10000  # 单次查询最多读取的行数，超出部分不读取并标记截断
+    query_max_cost: float = 1e7  # EXPLAIN 估算成本上限（PostgreSQL/MySQL 成本单位），超出拒绝执行；0 表示不检查
+    query_tenant_budgets: str = ""  # 按租户覆盖预算，JSON: {"tenant_id": {"max_rows": 5000, "max_cost": 1e6}}
 
     # 智谱 AI 配置
     zhipuai_api_key: str
@@ -84,6 +128,9 @@ class Settings(BaseSettings):
     zhipuai_base_url: str = "https://open.bigmodel.cn/api/paas/v4"
     zhipuai_timeout: int = 300  # 增加到 300 秒（5分钟），支持长文本生成
     zhipuai_max_retries: int = 3
+    zhipuai_max_concurrency: int = 32  # 同步SDK调用线程池大小（流式调用占用一个线程直至结束）
+    zhipuai_embedding_batch_size: int = 64  # 单次嵌入请求的最大文本数，超出分批请求
+    zhipuai_stream_buffer_size: int = 64  # 流式响应最多预读的块数，消费端变慢时后台线程等待
 
     # OpenRouter 配置
     openrouter_api_key: Optional[str] = None
@@ -100,6 +147,7 @@ class Settings(BaseSettings):
     
     # Agent 执行超时配置
     agent_execution_timeout: int = 180  # Agent 整体执行超时（秒），设置为 180 秒以应对复杂查询
+    agent_pool_size: int = 4  # 按数据库URL缓存的已编译 Agent / MCP 客户端数量（LRU 淘汰）
     
     # LLM 输出 Token 限制配置
     llm_max_output_tokens: int = 8192  # LLM 最大输出 Token 数，设置为 8192 以确保完整的 ECharts JSON 配置输出
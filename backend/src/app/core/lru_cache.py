@@ -0,0 +1,450 @@
+"""
+# 进程内有界缓存 - O(1) LRU + TTL过期堆 + 字节预算 + 命名空间统计
+
+## [HEADER]
+**文件名**: lru_cache.py
+**职责**: 为各服务的进程内缓存提供统一的有界实现：O(1) 读写与淘汰、惰性+周期性TTL清理、按估算字节数限额、按命名空间统计与清理
+**作者**: Data Agent Team
+**版本**: 1.0.1
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 替代各缓存以 min() 遍历全表淘汰、或从不淘汰的字典实现
+- v1.0.1 (2026-10-16): AgentV2 不再保留副本，AgentV2/tools/lru_cache.py 经 backend_core 重新导出本模块
+
+## [INPUT]
+- **key: Hashable** - 缓存键
+- **value: Any** - 缓存值
+- **ttl: Optional[float]** - 有效期（秒）；None 使用 default_ttl，<=0 表示不过期
+- **namespace: Optional[str]** - 命名空间（租户、数据源、查询类型等），用于分组统计与批量清理
+- **max_entries / max_bytes** - 条目数上限 / 字节预算（任一为 None 表示不限）
+- **sizeof: Callable[[Any], int]** - 字节估算函数（默认 estimate_size）
+- **on_remove: Callable[[key, value, reason], None]** - 条目移除回调（在锁外调用）
+
+## [OUTPUT]
+- **LRUCache.get/set/delete/pop/clear_namespace/sweep** - 缓存操作
+- **Dict[str, Any]** - 统计信息（get_stats，含各命名空间的 entries/bytes/hits/misses/evictions/expirations）
+- **get_all_cache_stats()** - 进程内所有具名缓存的统计
+
+## [LINK]
+**上游依赖**:
+- Python标准库 - heapq, itertools, sys, threading, time, weakref, collections.OrderedDict
+
+**下游依赖**:
+- 无
+
+**调用方**:
+- [../services/cache_service.py](../services/cache_service.py) - MemoryCache
+- [../services/zhipu_client.py](../services/zhipu_client.py) - LLM响应缓存
+- [../services/query_optimization_service.py](../services/query_optimization_service.py) - 文档查询缓存
+- [performance_optimizer.py](performance_optimizer.py) - SmartCache
+- AgentV2/tools/lru_cache.py - 重新导出，供 AgentV2 各进程内缓存使用
+
+## [STATE]
+- **LRU顺序**: OrderedDict 维护访问顺序，命中 move_to_end，淘汰 popitem(last=False)，均为 O(1)
+- **过期堆**: (expires_at, seq, key) 小顶堆；get 时惰性检查，set/get 时每 sweep_interval 秒从堆顶批量清理；
+  覆盖写入留下的失效堆项在清理时按 seq 识别并丢弃，堆长度超过条目数两倍时重建
+- **字节预算**: 写入时估算一次大小并累加；超出 max_bytes 按 LRU 淘汰，单条超过 max_entry_bytes 不缓存
+- **锁**: 一把 RLock 保护全部状态；on_remove 回调在释放锁之后调用
+- **注册表**: 具名缓存以弱引用登记，供 get_all_cache_stats 汇总
+
+## [POS]
+**路径**: backend/src/app/core/lru_cache.py
+**模块层级**: Level 1（基础设施层）
+**依赖深度**: 0 层（仅标准库）
+"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_NAMESPACE = "default"
+
+# 估算容器大小时的递归深度与采样数：超过采样数的容器按前N个元素的平均大小外推
+_SIZE_MAX_DEPTH = 4
+_SIZE_SAMPLE = 64
+
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, bool, complex, type(None))
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    估算对象占用的字节数
+
+    str/bytes 等原子类型取 sys.getsizeof；dict/list/tuple/set 递归累加，
+    元素多于 _SIZE_SAMPLE 时按采样平均值外推；普通对象按 __dict__ 估算。
+    结果用于预算控制，只要求数量级正确。
+    """
+    size = sys.getsizeof(value, 64)
+    if isinstance(value, _ATOMIC_TYPES) or _depth >= _SIZE_MAX_DEPTH:
+        return size
+
+    if isinstance(value, dict):
+        count = len(value)
+        sample = itertools.islice(value.items(), _SIZE_SAMPLE)
+        sampled = [estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in sample]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        count = len(value)
+        sample = itertools.islice(value, _SIZE_SAMPLE)
+        sampled = [estimate_size(item, _depth + 1) for item in sample]
+    elif hasattr(value, "__dict__"):
+        return size + estimate_size(vars(value), _depth + 1)
+    else:
+        return size
+
+    if not sampled:
+        return size
+    return size + int(sum(sampled) * count / len(sampled))
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "namespace", "seq")
+
+    def __init__(self, value: Any, size: int, expires_at: Optional[float], namespace: str, seq: int):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.namespace = namespace
+        self.seq = seq
+
+
+class _NamespaceStats:
+    __slots__ = ("keys", "bytes", "hits", "misses", "sets", "evictions", "expirations")
+
+    def __init__(self):
+        self.keys: set = set()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.keys),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+        }
+
+
+_MISSING = object()
+
+_registry: "weakref.WeakSet[LRUCache]" = weakref.WeakSet()
+
+
+class LRUCache:
+    """
+    有界 LRU 缓存（线程安全）
+
+    条目数和字节预算任一超限时淘汰最久未使用的条目；过期条目在访问时惰性删除，
+    并按 sweep_interval 周期性从过期堆批量清理，避免不再访问的条目长期占用内存。
+    """
+
+    def __init__(
+        self,
+        name: str = "cache",
+        max_entries: Optional[int] = 1000,
+        max_bytes: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+        max_entry_bytes: Optional[int] = None,
+        sweep_interval: float = 30.0,
+        sizeof: Callable[[Any], int] = estimate_size,
+        on_remove: Optional[Callable[[Hashable, Any, str], None]] = None,
+    ):
+        """
+        初始化缓存
+
+        Args:
+            name: 缓存名称（统计与注册表使用）
+            max_entries: 最大条目数，None 表示不限
+            max_bytes: 字节预算，None 表示不限（不限时不估算大小）
+            default_ttl: 默认有效期（秒），None 表示不过期
+            max_entry_bytes: 单条上限，超出不缓存（默认与 max_bytes 相同）
+            sweep_interval: 周期性清理过期条目的间隔（秒）
+            sizeof: 字节估算函数
+            on_remove: 条目被淘汰/过期/删除/覆盖时的回调 (key, value, reason)
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes
+        self.sweep_interval = sweep_interval
+        self._sizeof = sizeof
+        self._on_remove = on_remove
+
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._expiry: List[Tuple[float, int, Hashable]] = []
+        self._namespaces: Dict[str, _NamespaceStats] = {}
+        self._bytes = 0
+        self._seq = itertools.count()
+        self._last_sweep = time.monotonic()
+        self._lock = threading.RLock()
+        self._removed: List[Tuple[Hashable, Any, str]] = []
+        self.skipped_oversize = 0
+
+        _registry.add(self)
+
+    # ---------------------------------------------------------------- 内部
+
+    def _ns(self, namespace: Optional[str]) -> _NamespaceStats:
+        name = namespace or DEFAULT_NAMESPACE
+        stats = self._namespaces.get(name)
+        if stats is None:
+            stats = self._namespaces[name] = _NamespaceStats()
+        return stats
+
+    def _remove(self, key: Hashable, reason: str) -> Optional[_Entry]:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry.size
+        stats = self._namespaces.get(entry.namespace)
+        if stats is not None:
+            stats.keys.discard(key)
+            stats.bytes -= entry.size
+            if reason == "evicted":
+                stats.evictions += 1
+            elif reason == "expired":
+                stats.expirations += 1
+        if self._on_remove is not None:
+            self._removed.append((key, entry.value, reason))
+        return entry
+
+    def _drain(self) -> None:
+        """在锁外调用 on_remove 回调"""
+        if self._on_remove is None or not self._removed:
+            return
+        with self._lock:
+            removed, self._removed = self._removed, []
+        for key, value, reason in removed:
+            self._on_remove(key, value, reason)
+
+    def _sweep_locked(self, now: float) -> int:
+        removed = 0
+        heap = self._expiry
+        while heap and heap[0][0] <= now:
+            expires_at, seq, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            if entry is not None and entry.seq == seq:
+                self._remove(key, "expired")
+                removed += 1
+        if len(heap) > 2 * len(self._data) + 64:
+            self._expiry = [
+                (entry.expires_at, entry.seq, key)
+                for key, entry in self._data.items() if entry.expires_at is not None
+            ]
+            heapq.heapify(self._expiry)
+        self._last_sweep = time.monotonic()
+        return removed
+
+    def _maybe_sweep(self, now: float) -> None:
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self._sweep_locked(now)
+
+    def _over_budget(self) -> bool:
+        if self.max_entries is not None and len(self._data) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    # ---------------------------------------------------------------- 读写
+
+    def get(self, key: Hashable, default: Any = None, namespace: Optional[str] = None) -> Any:
+        """
+        获取缓存值并标记为最近使用
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值
+            namespace: 未命中时计入的命名空间（命中时使用条目自身的命名空间）
+        """
+        now = time.time()
+        with self._lock:
+            self._maybe_sweep(now)
+            entry = self._data.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                self._remove(key, "expired")
+                entry = None
+            if entry is None:
+                self._ns(namespace).misses += 1
+                value = default
+            else:
+                self._data.move_to_end(key)
+                self._ns(entry.namespace).hits += 1
+                value = entry.value
+        self._drain()
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存值，不更新LRU顺序和统计"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry.expires_at is not None and entry.expires_at <= time.time()):
+                return default
+            return entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        namespace: Optional[str] = None,
+        size: Optional[int] = None,
+    ) -> bool:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 有效期（秒），None 使用 default_ttl，<=0 表示不过期
+            namespace: 命名空间
+            size: 已知的字节数（省略时在需要字节预算的情况下估算）
+
+        Returns:
+            是否已缓存（单条超过 max_entry_bytes 时返回 False，并删除该键的旧值）
+        """
+        if size is None:
+            size = self._sizeof(value) if self.max_bytes is not None else 0
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None and ttl > 0 else None
+        namespace = namespace or DEFAULT_NAMESPACE
+
+        with self._lock:
+            self._remove(key, "replaced")
+            if self.max_entry_bytes is not None and size > self.max_entry_bytes:
+                self.skipped_oversize += 1
+                stored = False
+            else:
+                entry = _Entry(value, size, expires_at, namespace, next(self._seq))
+                self._data[key] = entry
+                self._bytes += size
+                stats = self._ns(namespace)
+                stats.keys.add(key)
+                stats.bytes += size
+                stats.sets += 1
+                if expires_at is not None:
+                    heapq.heappush(self._expiry, (expires_at, entry.seq, key))
+                stored = True
+
+            self._maybe_sweep(now)
+            while self._data and self._over_budget():
+                self._remove(next(iter(self._data)), "evicted")
+        self._drain()
+        return stored
+
+    def delete(self, key: Hashable) -> bool:
+        """删除缓存项"""
+        with self._lock:
+            removed = self._remove(key, "deleted") is not None
+        self._drain()
+        return removed
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """删除并返回缓存值（已过期视为不存在）"""
+        with self._lock:
+            entry = self._remove(key, "deleted")
+        self._drain()
+        if entry is None or (entry.expires_at is not None and entry.expires_at <= time.time()):
+            return default
+        return entry.value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def keys(self, namespace: Optional[str] = None) -> List[Hashable]:
+        """当前键的快照（可能包含尚未清理的过期键）"""
+        with self._lock:
+            if namespace is None:
+                return list(self._data.keys())
+            stats = self._namespaces.get(namespace)
+            return list(stats.keys) if stats else []
+
+    # ---------------------------------------------------------------- 清理
+
+    def sweep(self) -> int:
+        """立即清理所有已过期条目，返回清理数"""
+        with self._lock:
+            removed = self._sweep_locked(time.time())
+        self._drain()
+        return removed
+
+    def clear_namespace(self, namespace: str) -> int:
+        """删除命名空间下的全部条目，返回删除数"""
+        with self._lock:
+            stats = self._namespaces.get(namespace)
+            keys = list(stats.keys) if stats else []
+            for key in keys:
+                self._remove(key, "deleted")
+        self._drain()
+        return len(keys)
+
+    def clear(self, reset_stats: bool = False) -> int:
+        """清空缓存，返回删除数"""
+        with self._lock:
+            count = len(self._data)
+            for key in list(self._data.keys()):
+                self._remove(key, "deleted")
+            self._expiry.clear()
+            if reset_stats:
+                self._namespaces.clear()
+                self.skipped_oversize = 0
+        self._drain()
+        return count
+
+    # ---------------------------------------------------------------- 统计
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计（总计 + 各命名空间）"""
+        with self._lock:
+            namespaces = {name: stats.to_dict() for name, stats in self._namespaces.items()}
+            entries = len(self._data)
+            total_bytes = self._bytes
+            skipped = self.skipped_oversize
+        totals = {
+            field: sum(ns[field] for ns in namespaces.values())
+            for field in ("hits", "misses", "sets", "evictions", "expirations")
+        }
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            "name": self.name,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **totals,
+            "skipped_oversize": skipped,
+            "hit_rate": round(totals["hits"] / lookups, 4) if lookups else 0,
+            "namespaces": namespaces,
+        }
+
+
+def get_all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """汇总进程内所有 LRUCache 的统计（同名缓存以 name#2、name#3 区分）"""
+    result: Dict[str, Dict[str, Any]] = {}
+    for cache in list(_registry):
+        name = cache.name
+        suffix = 2
+        while name in result:
+            name = f"{cache.name}#{suffix}"
+            suffix += 1
+        result[name] = cache.get_stats()
+    return result
@@ -0,0 +1,504 @@
+"""
+# 统一指标引擎 - 时间分桶环形缓冲 + 可合并分位数草图
+
+## [HEADER]
+**文件名**: metrics.py
+**职责**: 为各监控器提供共享的低开销指标存储：按时间分桶聚合、流式分位数、慢样本保留、Prometheus文本导出
+**作者**: Data Agent Team
+**版本**: 1.0.0
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 替代各监控器对大deque的线性过滤与排序
+
+## [INPUT]
+- **name: str** - 指标名称（如 query_duration_seconds）
+- **value: float** - 观测值
+- **labels: Dict[str, str]** - 标签（tenant_id、operation等）
+- **exemplar: Any** - 可选样本对象（按观测值保留每个桶最大的前K个，用于慢查询列表）
+- **window / since: float** - 查询窗口（秒）或起始时间戳
+
+## [OUTPUT]
+- **MetricAggregate** - 聚合结果：count/sum/min/max/last、分位数、最大样本
+- **str** - Prometheus文本格式（export_prometheus）
+
+## [LINK]
+**上游依赖**:
+- Python标准库 - math, heapq, threading, weakref
+
+**下游依赖**:
+- 无
+
+**调用方**:
+- [../services/performance_monitor.py](../services/performance_monitor.py) - 查询性能汇总
+- [../services/query_performance_monitor.py](../services/query_performance_monitor.py) - 租户性能、慢查询
+- [../services/usage_monitoring_service.py](../services/usage_monitoring_service.py) - Token/成本用量
+- [performance_optimizer.py](performance_optimizer.py) - ResourceMonitor指标摘要
+
+## [STATE]
+- **分桶层级**: 默认两级 —— 60秒×120（最近2小时）、3600秒×840（最近35天）；
+  查询时选择能覆盖窗口的最细层级，窗口边界精度为一个桶宽
+- **分位数草图**: 对数分桶（DDSketch思路），相对误差 ≤ alpha（默认1%），按桶相加即可合并
+- **累计值**: 每个序列另有一份全时段聚合（Prometheus的 _sum/_count 使用累计值）
+- **锁**: 每个序列一把锁；注册表锁只在创建序列时持有，读写互不阻塞其他序列
+
+## [POS]
+**路径**: backend/src/app/core/metrics.py
+**模块层级**: Level 1（基础设施层）
+**依赖深度**: 0 层（仅标准库）
+"""
+
+import heapq
+import itertools
+import math
+import re
+import threading
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# (桶宽秒数, 桶数量)，由细到粗
+DEFAULT_TIERS: Tuple[Tuple[int, int], ...] = ((60, 120), (3600, 24 * 35))
+
+# 小于该值的观测计入零桶
+_MIN_POSITIVE = 1e-9
+
+_sequence = itertools.count()
+
+
+class QuantileSketch:
+    """
+    可合并的分位数草图
+
+    正值按 gamma = (1+alpha)/(1-alpha) 的对数刻度分桶，分位数估计的相对误差不超过 alpha；
+    零和负值计入零桶。桶数与数值跨度的对数成正比（1ms~1h、alpha=1% 约 760 个桶）。
+    """
+
+    __slots__ = ("alpha", "_log_gamma", "bins", "zero_count", "count")
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self._log_gamma = math.log((1 + alpha) / (1 - alpha))
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # 桶 (gamma^(k-1), gamma^k] 的代表值，保证相对误差 ≤ alpha
+        return 2 * math.exp(key * self._log_gamma) / (1 + math.exp(self._log_gamma))
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= _MIN_POSITIVE:
+            self.zero_count += count
+        else:
+            key = self._key(value)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other: "QuantileSketch") -> None:
+        bins = self.bins
+        for key, count in other.bins.items():
+            bins[key] = bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.bins))
+
+    def count_above(self, threshold: float) -> int:
+        """估计大于 threshold 的观测数（精度为一个对数桶）"""
+        if threshold <= _MIN_POSITIVE:
+            return self.count - self.zero_count
+        limit = self._key(threshold)
+        return sum(count for key, count in self.bins.items() if key > limit)
+
+
+class MetricAggregate:
+    """
+    一段时间内的聚合结果
+
+    同时用作环形缓冲中的单个时间桶，多个桶通过 merge 合并。
+    """
+
+    __slots__ = ("count", "total", "min", "max", "last", "last_ts", "sketch", "top", "keep_top")
+
+    def __init__(self, alpha: float = 0.01, keep_top: int = 0):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last: Optional[float] = None
+        self.last_ts = 0.0
+        self.sketch = QuantileSketch(alpha)
+        # 小根堆 (value, seq, exemplar)，保留观测值最大的 keep_top 个样本
+        self.top: List[Tuple[float, int, Any]] = []
+        self.keep_top = keep_top
+
+    def add(self, value: float, timestamp: float, exemplar: Any = None) -> None:
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if timestamp >= self.last_ts:
+            self.last = value
+            self.last_ts = timestamp
+        self.sketch.add(value)
+        if exemplar is not None and self.keep_top > 0:
+            self._push_top((value, next(_sequence), exemplar))
+
+    def _push_top(self, item: Tuple[float, int, Any]) -> None:
+        if len(self.top) < self.keep_top:
+            heapq.heappush(self.top, item)
+        elif item[0] > self.top[0][0]:
+            heapq.heapreplace(self.top, item)
+
+    def merge(self, other: "MetricAggregate") -> None:
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.last_ts >= self.last_ts:
+            self.last = other.last
+            self.last_ts = other.last_ts
+        self.sketch.merge(other.sketch)
+        if other.top:
+            self.keep_top = max(self.keep_top, other.keep_top)
+            for item in other.top:
+                self._push_top(item)
+
+    @classmethod
+    def merged(cls, aggregates: Iterable["MetricAggregate"], alpha: float = 0.01) -> "MetricAggregate":
+        result = cls(alpha)
+        for aggregate in aggregates:
+            result.merge(aggregate)
+        return result
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """分位数估计，结果限制在精确的 [min, max] 内"""
+        if self.count == 0:
+            return 0.0
+        return min(max(self.sketch.quantile(q), self.min), self.max)
+
+    def count_above(self, threshold: float) -> int:
+        if self.count == 0 or self.max <= threshold:
+            return 0
+        if self.min > threshold:
+            return self.count
+        return self.sketch.count_above(threshold)
+
+    def top_exemplars(self, limit: int) -> List[Any]:
+        """按观测值从大到小返回样本"""
+        return [item[2] for item in heapq.nlargest(limit, self.top)]
+
+    def to_dict(self, quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> Dict[str, float]:
+        if self.count == 0:
+            return {"count": 0}
+        data = {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.avg,
+            "latest": self.last
+        }
+        for q in quantiles:
+            data[f"p{int(q * 100)}"] = self.quantile(q)
+        return data
+
+
+class MetricSeries:
+    """单个 (指标名, 标签) 序列：多级时间环形缓冲 + 累计聚合"""
+
+    def __init__(self, tiers: Sequence[Tuple[int, int]], alpha: float, keep_top: int):
+        self.tiers = tuple(tiers)
+        self.alpha = alpha
+        self.keep_top = keep_top
+        self._rings: List[List[Optional[Tuple[int, MetricAggregate]]]] = [
+            [None] * size for _, size in self.tiers
+        ]
+        self.cumulative = MetricAggregate(alpha, keep_top)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, timestamp: float, exemplar: Any = None) -> None:
+        with self._lock:
+            self.cumulative.add(value, timestamp, exemplar)
+            for (width, size), ring in zip(self.tiers, self._rings):
+                epoch = int(timestamp // width)
+                slot = epoch % size
+                entry = ring[slot]
+                if entry is not None and entry[0] > epoch:
+                    # 迟到的观测已超出该层级保留范围
+                    continue
+                if entry is None or entry[0] != epoch:
+                    entry = (epoch, MetricAggregate(self.alpha, self.keep_top))
+                    ring[slot] = entry
+                entry[1].add(value, timestamp, exemplar)
+
+    def collect(self, since: Optional[float], now: float) -> MetricAggregate:
+        """
+        合并 since 之后的时间桶；since 为 None 时返回累计聚合
+
+        选择能覆盖 since 的最细层级；since 早于最粗层级的保留范围时返回该层级保留的全部数据。
+        与 since 相交的桶整体计入，窗口边界精度为一个桶宽。
+        """
+        result = MetricAggregate(self.alpha)
+        with self._lock:
+            if since is None:
+                result.merge(self.cumulative)
+                return result
+
+            tier_index = len(self.tiers) - 1
+            for index, (width, size) in enumerate(self.tiers):
+                oldest_start = (int(now // width) - size + 1) * width
+                if oldest_start <= since:
+                    tier_index = index
+                    break
+
+            width, size = self.tiers[tier_index]
+            current = int(now // width)
+            for entry in self._rings[tier_index]:
+                if entry is None:
+                    continue
+                epoch, aggregate = entry
+                if epoch > current - size and (epoch + 1) * width > since:
+                    result.merge(aggregate)
+        return result
+
+
+def _label_key(labels: Optional[Dict[str, Any]]) -> LabelKey:
+    if not labels:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+_PROM_NAME_RE = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _prom_name(name: str) -> str:
+    name = _PROM_NAME_RE.sub("_", name)
+    return f"_{name}" if name[:1].isdigit() else name
+
+
+def _prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _prom_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{_prom_name(k)}="{_prom_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _prom_value(value: float) -> str:
+    if value is None or math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+# 所有存活的注册表（用于统一导出）
+_registries: "weakref.WeakSet[MetricsRegistry]" = weakref.WeakSet()
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    每个监控器持有自己的注册表（互不干扰，便于单独清空），
+    所有注册表通过 export_prometheus() 统一导出。
+    """
+
+    def __init__(
+        self,
+        namespace: str = "dataagent",
+        tiers: Sequence[Tuple[int, int]] = DEFAULT_TIERS,
+        alpha: float = 0.01,
+        export_window: float = 300.0
+    ):
+        """
+        Args:
+            namespace: Prometheus 指标名前缀
+            tiers: 时间分桶层级 ((桶宽秒数, 桶数量), ...)，由细到粗
+            alpha: 分位数相对误差
+            export_window: Prometheus 导出分位数使用的最近时间窗口（秒）
+        """
+        self.namespace = namespace
+        self.tiers = tuple(sorted(tiers))
+        self.alpha = alpha
+        self.export_window = export_window
+        self._series: Dict[str, Dict[LabelKey, MetricSeries]] = {}
+        self._meta: Dict[str, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+        _registries.add(self)
+
+    def describe(self, name: str, help_text: str = "", keep_top: int = 0) -> None:
+        """
+        声明指标
+
+        Args:
+            name: 指标名称
+            help_text: Prometheus HELP 文本
+            keep_top: 每个时间桶保留的最大样本数（0 表示不保留样本）
+        """
+        with self._lock:
+            self._meta[name] = (help_text, keep_top)
+
+    def _get_series(self, name: str, key: LabelKey) -> MetricSeries:
+        by_labels = self._series.get(name)
+        series = by_labels.get(key) if by_labels is not None else None
+        if series is not None:
+            return series
+        with self._lock:
+            by_labels = self._series.setdefault(name, {})
+            series = by_labels.get(key)
+            if series is None:
+                keep_top = self._meta.get(name, ("", 0))[1]
+                series = MetricSeries(self.tiers, self.alpha, keep_top)
+                by_labels[key] = series
+            return series
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Optional[Dict[str, Any]] = None,
+        exemplar: Any = None,
+        timestamp: Optional[float] = None
+    ) -> None:
+        """记录一次观测"""
+        self._get_series(name, _label_key(labels)).observe(
+            float(value), time.time() if timestamp is None else timestamp, exemplar
+        )
+
+    def _resolve_since(self, window: Optional[float], since: Optional[float], now: float) -> Optional[float]:
+        if since is not None:
+            return since
+        if window is not None:
+            return now - window
+        return None
+
+    def collect(
+        self,
+        name: str,
+        labels: Optional[Dict[str, Any]] = None,
+        window: Optional[float] = None,
+        since: Optional[float] = None,
+        now: Optional[float] = None
+    ) -> List[Tuple[Dict[str, str], MetricAggregate]]:
+        """
+        按序列返回聚合结果
+
+        Args:
+            name: 指标名称
+            labels: 标签过滤（子集匹配）
+            window: 最近 window 秒
+            since: 起始时间戳（优先于 window）；两者都为空时返回累计值
+            now: 当前时间戳（测试用）
+        """
+        now = time.time() if now is None else now
+        start = self._resolve_since(window, since, now)
+        wanted = _label_key(labels)
+
+        with self._lock:
+            items = list(self._series.get(name, {}).items())
+
+        results = []
+        for key, series in items:
+            if wanted and not set(wanted).issubset(key):
+                continue
+            aggregate = series.collect(start, now)
+            if aggregate.count:
+                results.append((dict(key), aggregate))
+        return results
+
+    def aggregate(
+        self,
+        name: str,
+        labels: Optional[Dict[str, Any]] = None,
+        window: Optional[float] = None,
+        since: Optional[float] = None,
+        group_by: Optional[str] = None,
+        now: Optional[float] = None
+    ) -> Union[MetricAggregate, Dict[str, MetricAggregate]]:
+        """
+        合并匹配序列的聚合结果
+
+        Returns:
+            MetricAggregate；指定 group_by 时返回 标签值 -> MetricAggregate
+        """
+        collected = self.collect(name, labels, window=window, since=since, now=now)
+        if group_by is None:
+            return MetricAggregate.merged((agg for _, agg in collected), self.alpha)
+
+        groups: Dict[str, MetricAggregate] = {}
+        for series_labels, aggregate in collected:
+            value = series_labels.get(group_by, "")
+            if value not in groups:
+                groups[value] = MetricAggregate(self.alpha)
+            groups[value].merge(aggregate)
+        return groups
+
+    def series_count(self) -> int:
+        with self._lock:
+            return sum(len(by_labels) for by_labels in self._series.values())
+
+    def clear(self) -> None:
+        """清空所有序列（保留指标声明）"""
+        with self._lock:
+            self._series.clear()
+
+    def export_prometheus(self) -> str:
+        """
+        导出 Prometheus 文本格式
+
+        每个指标导出为 summary：分位数取最近 export_window 秒，_sum/_count 为累计值。
+        """
+        now = time.time()
+        with self._lock:
+            names = sorted(self._series)
+            snapshot = {name: list(self._series[name].items()) for name in names}
+            meta = dict(self._meta)
+
+        lines: List[str] = []
+        for name in names:
+            metric = _prom_name(f"{self.namespace}_{name}" if self.namespace else name)
+            help_text = meta.get(name, ("", 0))[0]
+            if help_text:
+                lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for key, series in sorted(snapshot[name]):
+                recent = series.collect(now - self.export_window, now)
+                cumulative = series.collect(None, now)
+                for q in (0.5, 0.95, 0.99):
+                    value = recent.quantile(q) if recent.count else math.nan
+                    lines.append(f"{metric}{_prom_labels(key + (('quantile', str(q)),))} {_prom_value(value)}")
+                lines.append(f"{metric}_sum{_prom_labels(key)} {_prom_value(cumulative.total)}")
+                lines.append(f"{metric}_count{_prom_labels(key)} {cumulative.count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+def export_prometheus() -> str:
+    """导出所有注册表的指标（Prometheus 文本格式）"""
+    return "".join(registry.export_prometheus() for registry in list(_registries))
@@ -5,9 +5,11 @@
 **文件名**: performance_optimizer.py
 **职责**: 提供通用连接池、智能缓存、批处理器和资源监控功能
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.2.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本，完整性能优化工具集
+- v1.1.0 (2026-10-16): ResourceMonitor 摘要改由统一指标引擎（metrics.py）计算，增加分位数
+- v1.2.0 (2026-10-16): SmartCache 改用 lru_cache.LRUCache，淘汰不再遍历全部访问时间
 
 ## [INPUT]
 - 连接创建函数: Callable - 工厂函数创建新连接
@@ -22,6 +24,8 @@
 
 ## [LINK]
 **上游依赖**:
+- [metrics.py](metrics.py) - 指标摘要（时间分桶 + 分位数草图）
+- [lru_cache.py](lru_cache.py) - SmartCache 的有界LRU存储
 - Python标准库 - asyncio, threading, functools
 - 第三方库 - dataclasses
 
@@ -53,10 +57,15 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 from functools import wraps, lru_cache
 
+from src.app.core.lru_cache import LRUCache
+from src.app.core.metrics import MetricsRegistry
+
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+_CACHE_MISS = object()
+
 
 @dataclass
 class PerformanceMetrics:
@@ -298,14 +307,17 @@ class ConnectionPool(Generic[T]):
 
 
 class SmartCache:
-    """智能缓存系统"""
+    """智能缓存系统（基于有界LRU）"""
 
-    def __init__(self, max_size: int = 1000, default_ttl: float = 300.0):
+    def __init__(self, max_size: int = 1000, default_ttl: float = 300.0, max_bytes: Optional[int] = None):
         self.max_size = max_size
         self.default_ttl = default_ttl
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._access_times: Dict[str, float] = {}
-        self._lock = asyncio.Lock()
+        self._cache = LRUCache(
+            name="smart_cache",
+            max_entries=max_size,
+            max_bytes=max_bytes,
+            default_ttl=default_ttl,
+        )
         self._metrics = PerformanceMetrics()
 
     def _generate_key(self, key_parts: List[Any]) -> str:
@@ -318,83 +330,38 @@ class SmartCache:
         key = self._generate_key(key_parts)
         start_time = time.time()
 
-        async with self._lock:
-            self._metrics.operation_count += 1
-
-            if key not in self._cache:
-                self._metrics.cache_misses += 1
-                return None
-
-            entry = self._cache[key]
-            current_time = time.time()
-
-            # 检查是否过期
-            if current_time - entry['created_at'] > entry['ttl']:
-                del self._cache[key]
-                if key in self._access_times:
-                    del self._access_times[key]
-                self._metrics.cache_misses += 1
-                return None
-
-            # 更新访问时间
-            self._access_times[key] = current_time
-            self._metrics.cache_hits += 1
-            self._metrics.success_count += 1
-
-            duration = time.time() - start_time
-            self._metrics.total_duration += duration
+        self._metrics.operation_count += 1
+        value = self._cache.get(key, _CACHE_MISS)
+        if value is _CACHE_MISS:
+            self._metrics.cache_misses += 1
+            return None
 
-            return entry['value']
+        self._metrics.cache_hits += 1
+        self._metrics.success_count += 1
+        self._metrics.total_duration += time.time() - start_time
+        return value
 
     async def set(self, key_parts: List[Any], value: Any, ttl: Optional[float] = None):
         """设置缓存值"""
         key = self._generate_key(key_parts)
         start_time = time.time()
 
-        async with self._lock:
-            # 检查容量限制
-            if len(self._cache) >= self.max_size and key not in self._cache:
-                await self._evict_lru()
-
-            ttl = ttl or self.default_ttl
-            current_time = time.time()
+        self._cache.set(key, value, ttl=ttl or self.default_ttl)
 
-            self._cache[key] = {
-                'value': value,
-                'created_at': current_time,
-                'ttl': ttl
-            }
-            self._access_times[key] = current_time
-
-            duration = time.time() - start_time
-            self._metrics.operation_count += 1
-            self._metrics.total_duration += duration
-            self._metrics.success_count += 1
-
-    async def _evict_lru(self):
-        """LRU淘汰"""
-        if not self._access_times:
-            return
-
-        # 找到最久未访问的键
-        lru_key = min(self._access_times.items(), key=lambda x: x[1])[0]
-
-        # 删除条目
-        if lru_key in self._cache:
-            del self._cache[lru_key]
-        del self._access_times[lru_key]
+        self._metrics.operation_count += 1
+        self._metrics.total_duration += time.time() - start_time
+        self._metrics.success_count += 1
 
     async def clear(self):
         """清空缓存"""
-        async with self._lock:
-            self._cache.clear()
-            self._access_times.clear()
+        self._cache.clear()
 
     def get_metrics(self) -> Dict[str, Any]:
         """获取缓存指标"""
         return {
             "size": len(self._cache),
             "max_size": self.max_size,
+            "bytes": self._cache.bytes,
             "default_ttl": self.default_ttl,
             "metrics": {
                 "operation_count": self._metrics.operation_count,
@@ -544,22 +511,22 @@ class ResourceMonitor:
     """资源监控器"""
 
     def __init__(self):
-        self._metrics = defaultdict(list)
-        self._lock = threading.Lock()
         self._max_history = 1000
+        self._metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self._max_history))
+        self._lock = threading.Lock()
+        # 摘要统计按指标名聚合（不区分标签），历史明细仍保留最近 _max_history 条
+        self.registry = MetricsRegistry()
 
     def record_metric(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
         """记录指标"""
+        timestamp = time.time()
         with self._lock:
             self._metrics[name].append({
-                'timestamp': time.time(),
+                'timestamp': timestamp,
                 'value': value,
                 'labels': labels or {}
             })
-
-            # 限制历史记录数量
-            if len(self._metrics[name]) > self._max_history:
-                self._metrics[name] = self._metrics[name][-self._max_history:]
+        self.registry.observe(name, value, timestamp=timestamp)
 
     def get_metric_history(self, name: str, duration: Optional[float] = None) -> List[Dict]:
         """获取指标历史"""
@@ -567,28 +534,29 @@ class ResourceMonitor:
             if name not in self._metrics:
                 return []
 
-            history = self._metrics[name]
+            history = list(self._metrics[name])
 
-            if duration is not None:
-                cutoff_time = time.time() - duration
-                history = [m for m in history if m['timestamp'] >= cutoff_time]
+        if duration is not None:
+            cutoff_time = time.time() - duration
+            history = [m for m in history if m['timestamp'] >= cutoff_time]
 
-            return history
+        return history
 
     def get_metric_summary(self, name: str, duration: Optional[float] = None) -> Dict[str, float]:
-        """获取指标摘要"""
-        history = self.get_metric_history(name, duration)
-
-        if not history:
+        """获取指标摘要（duration 为空时为进程启动以来的累计值）"""
+        summary = self.registry.aggregate(name, window=duration)
+        if summary.count == 0:
             return {}
 
-        values = [m['value'] for m in history]
         return {
-            'count': len(values),
-            'min': min(values),
-            'max': max(values),
-            'avg': sum(values) / len(values),
-            'latest': values[-1] if values else 0
+            'count': summary.count,
+            'min': summary.min,
+            'max': summary.max,
+            'avg': summary.avg,
+            'latest': summary.last,
+            'p50': summary.quantile(0.5),
+            'p95': summary.quantile(0.95),
+            'p99': summary.quantile(0.99)
         }
 
 
@@ -0,0 +1,254 @@
+"""
+# 查询预算与LIMIT改写 - backend 与 AgentV2 查询保护共用
+
+## [HEADER]
+**文件名**: query_budget.py
+**职责**: 查询保护中与执行方式无关的部分：顶层关键字扫描、LIMIT 注入/收紧、租户预算（QueryBudget）及其 JSON 配置解析、按租户取预算与改写计数（QueryGuardBase）
+**作者**: Data Agent Team
+**版本**: 1.0.1
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 从 services/query_guard.py 与 AgentV2/tools/query_guard.py 中合并重复实现；带顶层锁定子句（FOR UPDATE / FOR SHARE / LOCK IN SHARE MODE）的查询把 LIMIT 插在锁定子句之前
+- v1.0.1 (2026-10-16): 只把到语句末尾为止完整匹配锁定子句语法的顶层 FOR / LOCK 视为锁定子句，名为 lock / for 的列或表不再被误判
+
+## [INPUT]
+- **sql: str** - 待改写的SQL
+- **limit: int** - 顶层 LIMIT 上限
+- **raw: str** - 按租户覆盖预算的 JSON: {"tenant_id": {"max_rows": 5000, "max_cost": 1e6}}
+- **tenant_id: Optional[str]** - 租户ID
+
+## [OUTPUT]
+- **Tuple[str, bool]** - (改写后的SQL, 是否改写)（inject_limit）
+- **Dict[str, QueryBudget]** - 租户预算（parse_tenant_budgets）
+- **QueryGuardBase** - 预算表 + 改写 + 统计，执行部分由子类实现
+
+## [LINK]
+**上游依赖**:
+- Python标准库 - json, logging, re, threading, dataclasses
+
+**下游依赖**:
+- 无
+
+**调用方**:
+- [../services/query_guard.py](../services/query_guard.py) - backend 数据库适配器上的执行保护
+- AgentV2/tools/query_guard.py - Agent 连接池上的执行保护（经 AgentV2/tools/backend_core.py 导入）
+
+## [STATE]
+- **LIMIT改写**: 只改写 SELECT / WITH；扫描顶层（括号、字符串、注释之外）关键字，
+  没有 LIMIT 时追加 LIMIT（有锁定子句时插在锁定子句之前），已有 LIMIT 超过上限时收紧，
+  只有 OFFSET / FETCH 时包装为子查询（有锁定子句时不改写，只靠有界读取保护）
+- **预算表**: 一把 Lock 保护租户预算与统计计数
+
+## [POS]
+**路径**: backend/src/app/core/query_budget.py
+**模块层级**: Level 1（基础设施层）
+**依赖深度**: 0 层（仅标准库）
+"""
+
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 可以追加 LIMIT 的语句（SHOW / EXPLAIN / DESCRIBE 只靠有界读取保护）
+_LIMITABLE_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_LIMIT_VALUE_RE = re.compile(r"LIMIT\s+(?:(\d+)\s*,\s*)?(\d+|ALL)\b", re.IGNORECASE)
+
+# 语句末尾的锁定子句（LIMIT 必须在其之前）：一个或多个 FOR UPDATE / SHARE / NO KEY UPDATE / KEY SHARE
+# （可带 OF 表名、NOWAIT / SKIP LOCKED），或 MySQL 的 LOCK IN SHARE MODE
+_LOCKING_CLAUSE_RE = re.compile(
+    r"(?:FOR\s+(?:UPDATE|SHARE|NO\s+KEY\s+UPDATE|KEY\s+SHARE)"
+    r"(?:\s+OF\s+[\w\"`.]+(?:\s*,\s*[\w\"`.]+)*)?(?:\s+(?:NOWAIT|SKIP\s+LOCKED))?\s*)+"
+    r"|LOCK\s+IN\s+SHARE\s+MODE\s*",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class QueryBudget:
+    """租户查询预算"""
+    max_rows: int = 10000
+    max_cost: float = 1e7  # EXPLAIN 估算成本上限，0 表示不做成本检查
+
+
+def is_limitable(sql: str) -> bool:
+    """是否为可以改写 LIMIT / 做成本检查的 SELECT / WITH 查询"""
+    return bool(_LIMITABLE_RE.match(sql))
+
+
+def _top_level_keywords(sql: str) -> Tuple[List[Tuple[str, int]], bool]:
+    """
+    扫描括号外、字符串与注释外的关键字
+
+    Returns:
+        ([(大写关键字, 起始位置)], 是否包含顶层分号)
+    """
+    keywords = []
+    has_semicolon = False
+    depth = 0
+    i = 0
+    length = len(sql)
+    while i < length:
+        ch = sql[i]
+        if ch in ("'", '"', "`"):
+            end = sql.find(ch, i + 1)
+            # 'it''s' 形式的转义：连续两个引号继续扫描
+            while end != -1 and end + 1 < length and sql[end + 1] == ch:
+                end = sql.find(ch, end + 2)
+            i = length if end == -1 else end + 1
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = length if end == -1 else end + 1
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+        elif ch in "()":
+            depth += 1 if ch == "(" else -1
+            i += 1
+        elif ch == ";" and depth == 0:
+            has_semicolon = True
+            i += 1
+        elif ch.isalpha() or ch == "_":
+            start = i
+            while i < length and (sql[i].isalnum() or sql[i] == "_"):
+                i += 1
+            if depth == 0:
+                keywords.append((sql[start:i].upper(), start))
+        else:
+            i += 1
+    return keywords, has_semicolon
+
+
+def _locking_clause_position(sql: str, keywords: List[Tuple[str, int]]) -> Optional[int]:
+    """顶层锁定子句的起始位置（从该处到语句末尾必须完整匹配锁定子句语法），没有时返回 None"""
+    for word, pos in keywords:
+        if word in ("FOR", "LOCK") and _LOCKING_CLAUSE_RE.fullmatch(sql, pos):
+            return pos
+    return None
+
+
+def inject_limit(sql: str, limit: int) -> Tuple[str, bool]:
+    """
+    保证 SELECT / WITH 查询的顶层 LIMIT 不超过 limit
+
+    - 没有顶层 LIMIT：追加 LIMIT limit（另起一行，避免被末尾的 -- 注释吞掉）；
+      有顶层锁定子句（FOR UPDATE 等）时插在锁定子句之前
+    - LIMIT n（或 MySQL 的 LIMIT offset, n / LIMIT ALL）且 n > limit：改写为 limit
+    - 有 OFFSET / FETCH 但没有 LIMIT，或 LIMIT 后不是数字：包装为子查询再加 LIMIT；
+      有锁定子句时不改写（锁定子句不能出现在子查询外层）
+    - 非 SELECT / WITH 或多语句：不改写
+
+    Returns:
+        (改写后的 SQL, 是否改写)
+    """
+    stripped = sql.strip()
+    while stripped.endswith(";"):
+        stripped = stripped[:-1].rstrip()
+    if not is_limitable(stripped):
+        return sql, False
+
+    keywords, has_semicolon = _top_level_keywords(stripped)
+    if has_semicolon:
+        return sql, False
+    lock_pos = _locking_clause_position(stripped, keywords)
+
+    limit_positions = [pos for word, pos in keywords if word == "LIMIT"]
+    if limit_positions:
+        match = _LIMIT_VALUE_RE.match(stripped, limit_positions[-1])
+        if match:
+            value = match.group(2)
+            if value.upper() != "ALL" and int(value) <= limit:
+                return stripped, False
+            start, end = match.span(2)
+            return f"{stripped[:start]}{limit}{stripped[end:]}", True
+    elif not any(word in ("OFFSET", "FETCH") for word, _ in keywords):
+        if lock_pos is None:
+            return f"{stripped}\nLIMIT {limit}", True
+        return f"{stripped[:lock_pos]}LIMIT {limit}\n{stripped[lock_pos:]}", True
+
+    if lock_pos is not None:
+        return sql, False
+    return f"SELECT * FROM (\n{stripped}\n) AS _guarded_query\nLIMIT {limit}", True
+
+
+def parse_tenant_budgets(raw: str, default: QueryBudget) -> Dict[str, QueryBudget]:
+    """
+    解析按租户覆盖的预算 JSON（未指定的字段沿用默认预算）
+
+    配置无效时记录警告并返回空字典。
+    """
+    if not raw:
+        return {}
+    try:
+        return {
+            tenant: QueryBudget(
+                max_rows=int(overrides.get("max_rows", default.max_rows)),
+                max_cost=float(overrides.get("max_cost", default.max_cost))
+            )
+            for tenant, overrides in json.loads(raw).items()
+        }
+    except (ValueError, AttributeError, TypeError) as e:
+        logger.warning(f"[QUERY_GUARD] 租户预算配置无效，已忽略: {e}")
+        return {}
+
+
+class QueryGuardBase:
+    """
+    查询保护的公共部分：租户预算表、LIMIT 改写与统计计数
+
+    子类实现具体连接对象上的 EXPLAIN 与有界读取，可在 _stats 中追加计数项。
+    """
+
+    def __init__(self, default_budget: Optional[QueryBudget] = None,
+                 tenant_budgets: Optional[Dict[str, QueryBudget]] = None):
+        self.default_budget = default_budget or QueryBudget()
+        self._tenant_budgets: Dict[str, QueryBudget] = dict(tenant_budgets or {})
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "limits_injected": 0, "truncated": 0, "rejected": 0, "explain_failures": 0}
+
+    def set_budget(self, tenant_id: str, budget: Optional[QueryBudget]) -> None:
+        """设置（budget 为 None 时移除）租户预算"""
+        with self._lock:
+            if budget is None:
+                self._tenant_budgets.pop(tenant_id, None)
+            else:
+                self._tenant_budgets[tenant_id] = budget
+
+    def budget_for(self, tenant_id: Optional[str]) -> QueryBudget:
+        with self._lock:
+            return self._tenant_budgets.get(tenant_id or "", self.default_budget)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def rewrite(self, query: str, tenant_id: Optional[str] = None) -> Tuple[str, QueryBudget, bool]:
+        """
+        按租户预算改写查询（LIMIT 上限为 max_rows + 1，多一行用于判断截断）
+
+        Returns:
+            (改写后的 SQL, 预算, 是否改写)
+        """
+        budget = self.budget_for(tenant_id)
+        rewritten, injected = inject_limit(query, budget.max_rows + 1)
+        self._count("queries")
+        if injected:
+            self._count("limits_injected")
+            logger.info(f"[QUERY_GUARD] LIMIT {budget.max_rows + 1} applied: {query[:50]}...")
+        return rewritten, budget, injected
+
+    def should_check_cost(self, budget: QueryBudget, query: str) -> bool:
+        """是否需要执行前 EXPLAIN 检查成本"""
+        return budget.max_cost > 0 and is_limitable(query)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_rows": self.default_budget.max_rows,
+                "max_cost": self.default_budget.max_cost,
+                "tenant_budgets": len(self._tenant_budgets),
+                **self._stats
+            }
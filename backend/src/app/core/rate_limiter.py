@@ -0,0 +1,408 @@
+"""
+# 分布式限流器 - 滑动窗口计数 + 并发槽位
+
+## [HEADER]
+**文件名**: rate_limiter.py
+**职责**: 基于Redis的多worker共享限流（滑动窗口计数）与并发控制（带租约的槽位），Redis不可用时退回进程内实现
+**作者**: Data Agent Team
+**版本**: 1.0.0
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 替代每次请求对QueryLog的COUNT查询和进程内的IP请求队列
+
+## [INPUT]
+- **key: str** - 限流键（如 tenant:{tenant_id}:queries、ip:{client_ip}）
+- **limit: int** - 窗口内允许的次数 / 最大并发数
+- **window_seconds: float** - 窗口长度（秒）
+- **redis_client** - redis.asyncio 客户端（可选，默认取全局 CacheManager 中 RedisCache 的客户端）
+
+## [OUTPUT]
+- **RateLimitResult** - 是否允许、剩余次数、建议重试秒数
+- **ConcurrencySlot** - 并发槽位（release 幂等；wrap_stream 在流结束/取消时释放）
+
+## [LINK]
+**上游依赖**:
+- [../services/cache_service.py](../services/cache_service.py) - 复用 RedisCache 的客户端（延迟导入）
+- Python标准库 - asyncio, math, threading, time, uuid
+
+**下游依赖**:
+- 无
+
+**调用方**:
+- [../middleware/rate_limit.py](../middleware/rate_limit.py) - FastAPI 限流/并发依赖
+- [security_monitor.py](security_monitor.py) - ThreatDetector 的 IP 限流
+
+## [STATE]
+- **滑动窗口计数**: 每个键只保存当前窗口和上一窗口两个计数，
+  估算值 = 上一窗口计数 × 剩余比例 + 当前窗口计数；Redis 中由 Lua 脚本原子完成判断与自增
+- **并发槽位**: Redis 有序集合（成员=租约ID，分值=过期时间），获取时先清理过期租约；
+  worker 崩溃未释放的槽位在 lease_seconds 后自动回收
+- **降级**: Redis 调用失败时记录警告并使用进程内计数（限流仍生效，但仅限当前进程）
+
+## [POS]
+**路径**: backend/src/app/core/rate_limiter.py
+**模块层级**: Level 1（基础设施层）
+**依赖深度**: 0 层（Redis 客户端运行时注入）
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# KEYS: 当前窗口键, 上一窗口键；ARGV: limit, cost, 上一窗口权重, 键过期秒数
+_SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+if previous * tonumber(ARGV[3]) + current + cost > limit then
+    return {0, current, previous}
+end
+current = redis.call('INCRBY', KEYS[1], cost)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return {1, current, previous}
+"""
+
+# KEYS: 槽位集合键；ARGV: now, limit, 租约ID, 租约过期时间, 键过期毫秒数
+_ACQUIRE_SLOT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+@dataclass
+class RateLimitResult:
+    """限流检查结果"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+
+    @property
+    def retry_after_seconds(self) -> int:
+        """Retry-After 响应头取值（向上取整，至少1秒）"""
+        return max(1, math.ceil(self.retry_after))
+
+
+def _shared_redis_client() -> Optional[Any]:
+    """全局缓存管理器使用 RedisCache 时返回其客户端"""
+    try:
+        from src.app.services.cache_service import RedisCache, get_cache_manager
+    except Exception:
+        return None
+    manager = get_cache_manager()
+    cache = manager.cache if manager is not None else None
+    return cache.redis if isinstance(cache, RedisCache) else None
+
+
+def _window_state(now: float, window_seconds: float) -> Tuple[int, float]:
+    """返回 (当前窗口序号, 上一窗口权重)"""
+    index = int(now // window_seconds)
+    elapsed = now - index * window_seconds
+    return index, (window_seconds - elapsed) / window_seconds
+
+
+def _retry_after(current: float, previous: float, weight: float, cost: int,
+                 limit: int, window_seconds: float, now: float) -> float:
+    """估算多久之后请求可以通过"""
+    until_next_window = window_seconds * weight
+    if current + cost > limit or previous <= 0:
+        # 当前窗口本身已满，至少要等到下一窗口
+        return until_next_window
+    excess = previous * weight + current + cost - limit
+    return min(until_next_window, excess * window_seconds / previous)
+
+
+class RateLimiter:
+    """
+    滑动窗口计数限流器
+
+    与逐条记录时间戳的滑动日志相比，每个键只占两个计数器，精度足以用于配额控制。
+    """
+
+    # 进程内计数超过该数量时清理过期键
+    _PRUNE_THRESHOLD = 4096
+
+    def __init__(self, redis_client: Optional[Any] = None, key_prefix: str = "dataagent:ratelimit:"):
+        """
+        Args:
+            redis_client: redis.asyncio 客户端；为空时使用全局缓存管理器的 Redis 客户端（如有）
+            key_prefix: Redis 键前缀
+        """
+        self._redis_client = redis_client
+        self.key_prefix = key_prefix
+        self._scripts: Dict[int, Any] = {}
+        # key -> (窗口长度, 当前窗口序号, 当前窗口计数, 上一窗口计数)
+        self._local: Dict[str, Tuple[float, int, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def _redis(self) -> Optional[Any]:
+        return self._redis_client if self._redis_client is not None else _shared_redis_client()
+
+    def _script(self, client: Any) -> Any:
+        script = self._scripts.get(id(client))
+        if script is None:
+            script = client.register_script(_SLIDING_WINDOW_SCRIPT)
+            self._scripts[id(client)] = script
+        return script
+
+    def hit_local(self, key: str, limit: int, window_seconds: float, cost: int = 1,
+                  now: Optional[float] = None) -> RateLimitResult:
+        """进程内限流（同步，可在非异步代码中调用）"""
+        now = time.time() if now is None else now
+        index, weight = _window_state(now, window_seconds)
+
+        with self._lock:
+            _, stored_index, current, previous = self._local.get(key, (window_seconds, index, 0, 0))
+            if stored_index != index:
+                previous = current if stored_index == index - 1 else 0
+                current = 0
+
+            estimate = previous * weight + current
+            allowed = estimate + cost <= limit
+            if allowed:
+                current += cost
+                estimate += cost
+            self._local[key] = (window_seconds, index, current, previous)
+
+            if len(self._local) > self._PRUNE_THRESHOLD:
+                self._prune_local(now)
+
+        retry_after = 0.0 if allowed else _retry_after(
+            current, previous, weight, cost, limit, window_seconds, now
+        )
+        return RateLimitResult(allowed, limit, max(0, int(limit - estimate)), retry_after)
+
+    def _prune_local(self, now: float) -> None:
+        stale = [
+            key for key, (window, index, _, _) in self._local.items()
+            if index < int(now // window) - 1
+        ]
+        for key in stale:
+            del self._local[key]
+
+    async def hit(self, key: str, limit: int, window_seconds: float, cost: int = 1) -> RateLimitResult:
+        """
+        记录一次请求并判断是否超限
+
+        Args:
+            key: 限流键
+            limit: 窗口内允许的次数
+            window_seconds: 窗口长度（秒）
+            cost: 本次请求消耗的次数
+
+        Returns:
+            RateLimitResult: 超限时 allowed=False，且不计入本次请求
+        """
+        client = self._redis()
+        if client is None:
+            return self.hit_local(key, limit, window_seconds, cost)
+
+        now = time.time()
+        index, weight = _window_state(now, window_seconds)
+        base = f"{self.key_prefix}{key}:{int(window_seconds)}"
+        try:
+            allowed, current, previous = await self._script(client)(
+                keys=[f"{base}:{index}", f"{base}:{index - 1}"],
+                args=[limit, cost, weight, math.ceil(window_seconds * 2)]
+            )
+        except Exception as e:
+            logger.warning(f"Redis限流失败，使用进程内限流: {e}")
+            return self.hit_local(key, limit, window_seconds, cost)
+
+        current, previous = int(current), int(previous)
+        estimate = previous * weight + current
+        if allowed:
+            return RateLimitResult(True, limit, max(0, int(limit - estimate)))
+        return RateLimitResult(
+            False, limit, max(0, int(limit - estimate)),
+            _retry_after(current, previous, weight, cost, limit, window_seconds, now)
+        )
+
+
+class ConcurrencySlot:
+    """已获取的并发槽位"""
+
+    def __init__(self, gate: "ConcurrencyGate", key: str, lease_id: str):
+        self.gate = gate
+        self.key = key
+        self.lease_id = lease_id
+        self.released = False
+        # 交给流式响应后，由流负责释放
+        self.detached = False
+
+    async def release(self) -> None:
+        """释放槽位（幂等；即使当前任务正在被取消也会完成释放）"""
+        if self.released:
+            return
+        self.released = True
+        try:
+            # 当前任务被取消时，shield 内的释放仍会继续执行完
+            await asyncio.shield(self.gate.release(self.key, self.lease_id))
+        except Exception as e:
+            logger.warning(f"释放并发槽位失败 {self.key}: {e}")
+
+    def wrap_stream(self, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """包装流式响应体：流正常结束、出错或客户端断开时释放槽位"""
+        self.detached = True
+
+        async def wrapper():
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await self.release()
+
+        return wrapper()
+
+    async def __aenter__(self) -> "ConcurrencySlot":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.release()
+
+
+class ConcurrencyGate:
+    """
+    分布式并发闸门
+
+    每个槽位是一份带过期时间的租约，获取时先回收过期租约，因此异常退出的worker不会永久占用槽位。
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[Any] = None,
+        key_prefix: str = "dataagent:concurrency:",
+        lease_seconds: float = 900
+    ):
+        """
+        Args:
+            redis_client: redis.asyncio 客户端；为空时使用全局缓存管理器的 Redis 客户端（如有）
+            key_prefix: Redis 键前缀
+            lease_seconds: 租约时长（秒），应大于最长的正常请求耗时
+        """
+        self._redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.lease_seconds = lease_seconds
+        self._scripts: Dict[int, Any] = {}
+        # key -> {lease_id: 过期时间}
+        self._local: Dict[str, Dict[str, float]] = {}
+        # 获取时写入了 Redis 的租约（释放时需要删除 Redis 中的成员）
+        self._remote_leases: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _redis(self) -> Optional[Any]:
+        return self._redis_client if self._redis_client is not None else _shared_redis_client()
+
+    def _script(self, client: Any) -> Any:
+        script = self._scripts.get(id(client))
+        if script is None:
+            script = client.register_script(_ACQUIRE_SLOT_SCRIPT)
+            self._scripts[id(client)] = script
+        return script
+
+    def _acquire_local(self, key: str, limit: int, lease_id: str, now: float) -> bool:
+        with self._lock:
+            leases = self._local.setdefault(key, {})
+            for expired in [lid for lid, expires in leases.items() if expires <= now]:
+                del leases[expired]
+            if len(leases) >= limit:
+                return False
+            leases[lease_id] = now + self.lease_seconds
+            return True
+
+    async def acquire(self, key: str, limit: int) -> Optional[ConcurrencySlot]:
+        """
+        获取槽位
+
+        Returns:
+            ConcurrencySlot: 获取成功；已达并发上限时返回 None
+        """
+        lease_id = uuid.uuid4().hex
+        now = time.time()
+        client = self._redis()
+
+        if client is not None:
+            try:
+                acquired = await self._script(client)(
+                    keys=[f"{self.key_prefix}{key}"],
+                    args=[now, limit, lease_id, now + self.lease_seconds, int(self.lease_seconds * 1000)]
+                )
+                if not int(acquired):
+                    return None
+                with self._lock:
+                    self._remote_leases.add(lease_id)
+                return ConcurrencySlot(self, key, lease_id)
+            except Exception as e:
+                logger.warning(f"Redis并发控制失败，使用进程内并发控制: {e}")
+
+        if not self._acquire_local(key, limit, lease_id, now):
+            return None
+        return ConcurrencySlot(self, key, lease_id)
+
+    async def release(self, key: str, lease_id: str) -> None:
+        """释放租约"""
+        with self._lock:
+            remote = lease_id in self._remote_leases
+            self._remote_leases.discard(lease_id)
+            leases = self._local.get(key)
+            if leases is not None:
+                leases.pop(lease_id, None)
+                if not leases:
+                    del self._local[key]
+
+        if remote:
+            client = self._redis()
+            if client is not None:
+                await client.zrem(f"{self.key_prefix}{key}", lease_id)
+
+    async def active(self, key: str) -> int:
+        """当前占用的槽位数"""
+        now = time.time()
+        client = self._redis()
+        if client is not None:
+            try:
+                redis_key = f"{self.key_prefix}{key}"
+                await client.zremrangebyscore(redis_key, "-inf", now)
+                return int(await client.zcard(redis_key))
+            except Exception as e:
+                logger.warning(f"Redis读取并发数失败: {e}")
+        with self._lock:
+            return sum(1 for expires in self._local.get(key, {}).values() if expires > now)
+
+
+# 全局实例
+_rate_limiter: Optional[RateLimiter] = None
+_concurrency_gate: Optional[ConcurrencyGate] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取全局限流器"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def get_concurrency_gate() -> ConcurrencyGate:
+    """获取全局并发闸门（租约时长来自配置）"""
+    global _concurrency_gate
+    if _concurrency_gate is None:
+        try:
+            from src.app.core.config import settings
+            lease_seconds = settings.query_slot_lease_seconds
+        except Exception:
+            lease_seconds = 900
+        _concurrency_gate = ConcurrencyGate(lease_seconds=lease_seconds)
+    return _concurrency_gate
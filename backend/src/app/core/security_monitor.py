@@ -5,9 +5,10 @@
 **文件名**: security_monitor.py
 **职责**: 提供敏感信息过滤、安全事件记录和威胁检测功能，保护系统安全
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 实现安全监控和审计功能
+- v1.1.0 (2026-10-16): IP限流改用共享滑动窗口限流器（rate_limiter.py），新增多worker共享的异步检查
 
 ## [INPUT]
 - **log_data: str** - 原始日志数据
@@ -27,7 +28,7 @@
 
 ## [LINK]
 **上游依赖** (已读取源码):
-- 无外部依赖（仅使用Python标准库）
+- [rate_limiter.py](rate_limiter.py) - IP滑动窗口限流
 
 **下游依赖** (已读取源码):
 - [../middleware/security_middleware.py](../middleware/security_middleware.py) - 安全中间件
@@ -45,7 +46,6 @@
 
 import json
 import logging
-import time
 import re
 import hashlib
 import ipaddress
@@ -53,7 +53,9 @@ from typing import Dict, Any, Optional, List, Set
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from enum import Enum
-from collections import defaultdict, deque
+from collections import defaultdict
+
+from src.app.core.rate_limiter import RateLimitResult, get_rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -214,7 +216,6 @@ class ThreatDetector:
         ]
 
         self.rate_limit_threshold = 100  # 每分钟最大请求数
-        self.request_history = defaultdict(lambda: deque(maxlen=1000))
 
     def detect_injection_attempt(self, input_text: str) -> bool:
         """
@@ -239,7 +240,7 @@ class ThreatDetector:
 
     def check_rate_limit(self, client_ip: str, window_minutes: int = 1) -> bool:
         """
-        检查速率限制
+        检查速率限制（进程内，供同步调用方使用）
 
         Args:
             client_ip: 客户端IP
@@ -248,24 +249,32 @@ class ThreatDetector:
         Returns:
             bool: 是否超过限制
         """
-        current_time = time.time()
-        window_start = current_time - (window_minutes * 60)
+        result = get_rate_limiter().hit_local(
+            f"ip:{client_ip}", self.rate_limit_threshold, window_minutes * 60
+        )
+        if not result.allowed:
+            logger.warning(f"IP {client_ip} 超过速率限制: {self.rate_limit_threshold}/{window_minutes}分钟")
+            return True
 
-        # 清理过期记录
-        while (self.request_history[client_ip] and
-               self.request_history[client_ip][0] < window_start):
-            self.request_history[client_ip].popleft()
+        return False
 
-        # 添加当前请求
-        self.request_history[client_ip].append(current_time)
+    async def check_rate_limit_async(self, client_ip: str, window_minutes: int = 1) -> RateLimitResult:
+        """
+        检查速率限制（Redis可用时多worker共享计数）
 
-        # 检查是否超过限制
-        request_count = len(self.request_history[client_ip])
-        if request_count > self.rate_limit_threshold:
-            logger.warning(f"IP {client_ip} 超过速率限制: {request_count}/{self.rate_limit_threshold}")
-            return True
+        Args:
+            client_ip: 客户端IP
+            window_minutes: 时间窗口（分钟）
 
-        return False
+        Returns:
+            RateLimitResult: 限流检查结果
+        """
+        result = await get_rate_limiter().hit(
+            f"ip:{client_ip}", self.rate_limit_threshold, window_minutes * 60
+        )
+        if not result.allowed:
+            logger.warning(f"IP {client_ip} 超过速率限制: {self.rate_limit_threshold}/{window_minutes}分钟")
+        return result
 
     def detect_anomalous_access(self, user_id: str, action: str, context: Dict[str, Any]) -> bool:
         """
@@ -0,0 +1,239 @@
+"""
+# SSE写出器 - token合并 + 预序列化帧 + 可协商压缩
+
+## [HEADER]
+**文件名**: sse_writer.py
+**职责**: 将流式回答的逐token输出合并为按时间/大小封顶的 data 帧，每次刷新只产生一段预格式化的字节；支持客户端协商的 gzip/deflate 压缩
+**作者**: Data Agent Team
+**版本**: 1.0.0
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 替代 v2 流式端点每个token两次 yield + json.dumps 的写法
+
+## [INPUT]
+- **flush_interval: float** - 合并窗口（秒），缓冲中最早的token超过该时长即刷新
+- **flush_bytes: int** - 缓冲的token累计字节数达到该值即刷新
+- **progress_interval: float** - progress 事件的最小间隔（秒），随刷新顺带发送
+- **encoding: Optional[str]** - 压缩方式（"gzip" / "deflate" / None），由 negotiate_encoding 根据 Accept-Encoding 得出
+
+## [OUTPUT]
+- **bytes** - 可直接写入响应体的SSE字节（可能包含多个事件、可能已压缩；为空表示暂不写出）
+- **Dict[str, str]** - 响应头（SSEWriter.headers，压缩时含 Content-Encoding）
+- **Dict[str, int]** - 写出统计（SSEWriter.get_stats：tokens, frames, writes, bytes_raw, bytes_out）
+
+## [LINK]
+**上游依赖**:
+- Python标准库 - json, time, zlib
+- 第三方库（可选）: orjson（未安装时使用 json）
+
+**下游依赖**:
+- 无
+
+**调用方**:
+- [../api/v2/endpoints/query_stream_v2.py](../api/v2/endpoints/query_stream_v2.py) - v2 流式查询（LLM输出与缓存命中回放）
+
+## [STATE]
+- **合并**: token 先进入缓冲区；达到 flush_bytes 或缓冲时长超过 flush_interval 时合并为一个
+  data 事件 {"chunk": 合并文本, "progress": 最新进度}，与原逐token事件的格式相同
+- **时间上限的检查时机**: 在下一个token到达时检查；写出任何其他事件（step/done/error等）前先刷新缓冲，
+  因此事件顺序与原实现一致；模型在段落中途停顿时，缓冲内容最多等到下一个token或下一个事件
+- **预序列化**: 每个事件一次 orjson/json 序列化，直接拼成 b"event: ...\\ndata: ...\\n\\n"
+- **压缩**: 每次写出后 Z_SYNC_FLUSH，客户端可立即解出完整事件；close() 写出压缩流结尾
+
+## [POS]
+**路径**: backend/src/app/core/sse_writer.py
+**模块层级**: Level 1（基础设施层）
+**依赖深度**: 0 层
+"""
+
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+# Accept-Encoding 中可协商的压缩方式（按优先级）
+SUPPORTED_ENCODINGS = ("gzip", "deflate")
+_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+def negotiate_encoding(accept_encoding: Optional[str], allowed: Optional[List[str]] = None) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择压缩方式
+
+    Args:
+        accept_encoding: 请求头 Accept-Encoding
+        allowed: 服务端允许的压缩方式（默认 SUPPORTED_ENCODINGS）
+
+    Returns:
+        "gzip" / "deflate"，不压缩时为 None
+    """
+    if not accept_encoding:
+        return None
+    allowed = [e for e in (allowed if allowed is not None else SUPPORTED_ENCODINGS) if e in SUPPORTED_ENCODINGS]
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in allowed:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def _dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+class SSEWriter:
+    """
+    SSE写出器
+
+    每次调用返回需要写出的字节（可能为空），调用方直接 yield 非空结果。
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 0.03,
+        flush_bytes: int = 1024,
+        progress_interval: float = 0.5,
+        encoding: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if encoding is not None and encoding not in _WBITS:
+            raise ValueError(f"不支持的SSE压缩方式: {encoding}")
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.progress_interval = progress_interval
+        self.encoding = encoding
+        self._clock = clock
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, _WBITS[encoding]) if encoding else None
+
+        self._chunks: List[str] = []
+        self._pending_bytes = 0
+        self._pending_since = 0.0
+        self._progress: Optional[int] = None
+        self._last_progress_event = clock()
+        self._closed = False
+
+        self.stats = {"tokens": 0, "frames": 0, "writes": 0, "bytes_raw": 0, "bytes_out": 0}
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """需要附加到响应上的头"""
+        if self.encoding is None:
+            return {}
+        return {"Content-Encoding": self.encoding, "Vary": "Accept-Encoding"}
+
+    @staticmethod
+    def format_event(event_type: str, data: Dict[str, Any]) -> bytes:
+        """格式化单个SSE事件（未压缩）"""
+        return b"event: " + event_type.encode("utf-8") + b"\ndata: " + _dumps(data) + b"\n\n"
+
+    def _write(self, frames: List[bytes]) -> bytes:
+        raw = b"".join(frames)
+        self.stats["frames"] += len(frames)
+        self.stats["bytes_raw"] += len(raw)
+        if self._compressor is not None:
+            raw = self._compressor.compress(raw) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.stats["writes"] += 1
+        self.stats["bytes_out"] += len(raw)
+        return raw
+
+    def _drain(self) -> List[bytes]:
+        """取出缓冲的token，组成 data 帧（以及到期的 progress 帧）"""
+        frames = []
+        if self._chunks:
+            frames.append(self.format_event("data", {"chunk": "".join(self._chunks), "progress": self._progress}))
+            self._chunks = []
+            self._pending_bytes = 0
+        if self._progress is not None:
+            now = self._clock()
+            if now - self._last_progress_event >= self.progress_interval:
+                frames.append(self.format_event("progress", {"value": self._progress}))
+                self._last_progress_event = now
+        return frames
+
+    def token(self, chunk: str, progress: Optional[int] = None) -> bytes:
+        """
+        写入一个token
+
+        Returns:
+            达到大小/时间上限时返回合并后的帧，否则返回 b""
+        """
+        if not chunk:
+            return b""
+        now = self._clock()
+        if not self._chunks:
+            self._pending_since = now
+        self._chunks.append(chunk)
+        self._pending_bytes += len(chunk.encode("utf-8"))
+        if progress is not None:
+            self._progress = progress
+        self.stats["tokens"] += 1
+
+        if self._pending_bytes >= self.flush_bytes or now - self._pending_since >= self.flush_interval:
+            return self._write(self._drain())
+        return b""
+
+    def event(self, event_type: str, data: Dict[str, Any]) -> bytes:
+        """写出一个事件（先刷新缓冲的token，保证顺序）"""
+        frames = self._drain() if self._chunks else []
+        frames.append(self.format_event(event_type, data))
+        if event_type == "progress":
+            self._last_progress_event = self._clock()
+        return self._write(frames)
+
+    def flush(self) -> bytes:
+        """立即写出缓冲的token"""
+        if not self._chunks:
+            return b""
+        return self._write(self._drain())
+
+    def replay(self, text: str, start_progress: int, end_progress: int, piece_chars: int = 64) -> Iterator[bytes]:
+        """
+        按与实时输出相同的合并规则回放一段完整文本（缓存命中）
+
+        Yields:
+            非空的写出字节
+        """
+        total = len(text)
+        for i in range(0, total, piece_chars):
+            progress = start_progress + int((i / total) * (end_progress - start_progress))
+            data = self.token(text[i:i + piece_chars], progress)
+            if data:
+                yield data
+        data = self.flush()
+        if data:
+            yield data
+
+    def close(self) -> bytes:
+        """写出剩余缓冲并结束压缩流"""
+        if self._closed:
+            return b""
+        self._closed = True
+        data = self.flush()
+        if self._compressor is not None:
+            tail = self._compressor.flush(zlib.Z_FINISH)
+            self.stats["bytes_out"] += len(tail)
+            data += tail
+        return data
+
+    def get_stats(self) -> Dict[str, int]:
+        """写出统计"""
+        return dict(self.stats)
@@ -20,6 +20,9 @@
 ## [OUTPUT]
 - **engine: Engine** - SQLAlchemy数据库引擎实例
 - **SessionLocal: sessionmaker** - 数据库会话工厂
+- **get_async_engine() -> AsyncEngine** - 异步引擎（asyncpg / aiosqlite，首次使用时创建）
+- **get_async_sessionmaker() -> async_sessionmaker** - 异步会话工厂
+- **db: AsyncSession** - 异步数据库会话实例（get_async_db 生成器）
 - **Base: DeclarativeMeta** - ORM基础模型类
 - **db: Session** - 数据库会话实例（生成器）
 - **connection_status: bool** - 数据库连接状态（True/False）
@@ -35,6 +38,7 @@
 
 **调用方**:
 - 所有API端点 - 使用get_db()获取数据库会话
+- 高频读路径（LLM对话、数据源列表/详情、查询状态） - 使用get_async_db()获取异步会话
 - 数据模型 - 继承Base类
 - 健康检查端点 - 使用check_database_connection()
 
@@ -45,10 +49,13 @@
 """
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import Any, AsyncGenerator, Generator, Optional
+import inspect
 import logging
+import threading
 
 from ..core.config import settings
 
@@ -103,6 +110,118 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def to_async_database_url(database_url: str) -> str:
+    """
+    将同步数据库URL转换为异步驱动URL
+
+    postgresql:// / postgresql+psycopg2:// -> postgresql+asyncpg://
+    sqlite:/// -> sqlite+aiosqlite:///
+    """
+    if "://" not in database_url:
+        return database_url
+
+    scheme, rest = database_url.split("://", 1)
+    dialect, _, driver = scheme.partition("+")
+    if dialect == "sqlite" and driver != "aiosqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgresql", "postgres") and driver != "asyncpg":
+        return f"postgresql+asyncpg://{rest}"
+    return database_url
+
+
+# 异步引擎与会话工厂（首次使用时创建，未安装异步驱动时不影响同步路径）
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+_async_engine_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    获取异步数据库引擎
+    """
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                async_url = to_async_database_url(settings.database_url)
+                if settings.database_url.startswith("sqlite"):
+                    # SQLite 配置
+                    _async_engine = create_async_engine(async_url, echo=settings.debug)
+                else:
+                    # PostgreSQL 配置（asyncpg），与同步引擎分开计算连接数
+                    _async_engine = create_async_engine(
+                        async_url,
+                        pool_size=settings.database_async_pool_size,
+                        max_overflow=settings.database_async_max_overflow,
+                        pool_pre_ping=True,
+                        pool_timeout=settings.database_pool_timeout,
+                        pool_recycle=settings.database_pool_recycle,
+                        echo=settings.debug,
+                        connect_args={
+                            "timeout": settings.database_connect_timeout,
+                            "server_settings": {
+                                "application_name": settings.app_name,
+                                "timezone": "UTC",
+                            },
+                        },
+                    )
+                _async_session_factory = async_sessionmaker(
+                    bind=_async_engine,
+                    autoflush=False,
+                    expire_on_commit=False,  # 提交后仍可访问已加载属性，避免隐式IO
+                )
+                logger.info(f"Async database engine created: {async_url.split('://', 1)[0]}")
+    return _async_engine
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """
+    获取异步会话工厂
+    """
+    get_async_engine()
+    return _async_session_factory
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    获取异步数据库会话的依赖注入函数
+
+    查询在等待数据库时让出事件循环，不阻塞同一worker上的其他请求（如SSE流）。
+    """
+    async with get_async_sessionmaker()() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Async database session error: {e}")
+            await db.rollback()
+            raise
+
+
+async def maybe_await(value: Any) -> Any:
+    """
+    等待异步会话方法的返回值，同步会话的返回值原样返回
+
+    供同时接受 Session / AsyncSession 的服务层方法使用，例如::
+
+        result = await maybe_await(db.execute(stmt))
+        await maybe_await(db.commit())
+    """
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def dispose_async_engine() -> None:
+    """
+    关闭异步引擎的连接池（应用关闭时调用）
+    """
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+
+
 def check_database_connection() -> bool:
     """
     检查数据库连接状态
@@ -5,8 +5,9 @@
 **文件名**: main.py
 **职责**: FastAPI应用主入口，负责应用初始化、中间件配置、路由注册、生命周期管理
 **作者**: Data Agent Team
-**版本**: 1.0.1
+**版本**: 1.0.2
 **变更记录**:
+- v1.0.2 (2026-10-16): cache_type=redis 时在启动阶段初始化全局Redis缓存，供限流计数与并发槽位在多worker间共享
 - v1.0.1 (2025-12-28): 添加启动时的 print 日志输出，便于调试和监控应用初始化流程
 - v1.0.0: 初始版本，完整的应用生命周期管理
 
@@ -31,6 +32,7 @@
 - [./core/monitoring.py](./core/monitoring.py) - Sentry错误监控
 - [./core/config_validator.py](./core/config_validator.py) - 配置安全验证
 - [./core/key_rotation.py](./core/key_rotation.py) - 密钥轮换机制
+- [./services/cache_service.py](./services/cache_service.py) - initialize_cache，全局缓存管理器
 
 **下游依赖** (已读取源码):
 - [./data/database.py](./data/database.py) - engine, Base, get_db ✅
@@ -64,11 +66,12 @@ from .core.monitoring import init_sentry, capture_exception, monitor_performance
 from .core.config_validator import config_validator
 from .core.config_audit import generate_audit_report
 from .core.key_rotation import setup_key_rotation, get_rotation_status
-from .data.database import check_database_connection, create_tables, log_pool_health
+from .data.database import check_database_connection, create_tables, log_pool_health, dispose_async_engine
 from .services.minio_client import minio_service
 from .services.chromadb_client import chromadb_service
 from .services.zhipu_client import zhipu_service
 from .services.query_performance_monitor import query_perf_monitor
+from .services.cache_service import initialize_cache
 from .api.v1 import api_router
 from .api.v2 import api_router_v2
 
@@ -183,7 +186,14 @@ async def lifespan(app: FastAPI):
         if settings.environment == "production":
             raise
 
-    # 5. 启动性能监控服务 (暂时禁用以测试超时问题)
+    # 5. 初始化Redis缓存（限流计数与并发槽位通过它在多worker间共享，未初始化时各进程独立计数）
+    if settings.cache_type == "redis":
+        try:
+            await initialize_cache("redis", redis_url=settings.redis_url)
+        except Exception as e:
+            logger.error(f"Failed to initialize Redis cache: {e}")
+
+    # 6. 启动性能监控服务 (暂时禁用以测试超时问题)
     try:
         # query_perf_monitor.start_monitoring()
         # await query_perf_monitor.resource_monitor.start_background_monitoring(interval_seconds=30)
@@ -205,6 +215,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to stop performance monitoring: {e}")
 
+    # 关闭异步数据库连接池
+    try:
+        await dispose_async_engine()
+    except Exception as e:
+        logger.error(f"Failed to dispose async database engine: {e}")
+
     # 记录应用关闭事件
     try:
         from .core.config_audit import log_config_change
@@ -0,0 +1,179 @@
+"""
+# [RATE LIMIT] 查询限流依赖
+
+## [HEADER]
+**文件名**: rate_limit.py
+**职责**: 以FastAPI依赖的形式提供租户级查询限流、租户级并发槽位和客户端IP限流（多worker共享，基于Redis）
+**作者**: Data Agent Team
+**版本**: 1.1.0
+**变更记录**:
+- v1.1.0 (2026-10-16): stream_query_slot 改为从认证租户取ID与限额；enforce_client_rate_limit 挂到 /query 与 /query/stream
+- v1.0.0 (2026-10-16): 初始版本 - 替代查询端点中对QueryLog的两次COUNT查询
+
+## [INPUT]
+- **tenant: Tenant** - 当前租户（get_current_tenant_from_request），限额取自 tenant.settings
+- **request: Request** - FastAPI请求对象（客户端IP）
+
+## [OUTPUT]
+- **RateLimitResult** - 限流检查结果（enforce_query_rate_limit）
+- **ConcurrencySlot** - 并发槽位（query_concurrency_slot / stream_query_slot，yield依赖）
+- **Raises**: HTTPException 429（带 Retry-After 响应头）
+
+## [LINK]
+**上游依赖**:
+- [../core/rate_limiter.py](../core/rate_limiter.py) - 滑动窗口限流器、并发闸门
+- [../core/security_monitor.py](../core/security_monitor.py) - IP限流阈值与安全事件记录
+- [../services/query_context.py](../services/query_context.py) - QueryLimits 租户限额
+- [tenant_context.py](tenant_context.py) - get_current_tenant_from_request
+
+**调用方**:
+- [../api/v1/endpoints/query.py](../api/v1/endpoints/query.py) - /query（租户限额、并发槽位、IP限流）
+- [../api/v2/endpoints/query_stream_v2.py](../api/v2/endpoints/query_stream_v2.py) - /query/stream（流式槽位、IP限流）
+
+## [STATE]
+- **查询频率键**: tenant:{tenant_id}:queries，窗口3600秒，限额 max_queries_per_hour
+- **并发槽位键**: tenant:{tenant_id}:queries，限额 max_concurrent_queries；
+  普通请求在响应后释放，流式请求通过 slot.wrap_stream 在流结束或客户端断开时释放
+- **IP限流键**: ip:{client_ip}，窗口60秒，限额 ThreatDetector.rate_limit_threshold
+
+## [POS]
+**路径**: backend/src/app/middleware/rate_limit.py
+**模块层级**: Level 2（中间件层）
+**依赖深度**: 依赖 core 和 services.query_context
+"""
+
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+import structlog
+
+from src.app.core.rate_limiter import (
+    ConcurrencySlot,
+    RateLimitResult,
+    get_concurrency_gate,
+    get_rate_limiter,
+)
+from src.app.core.security_monitor import SecurityEventLevel, SecurityEventType, security_monitor
+from src.app.data.models import Tenant
+from src.app.middleware.tenant_context import get_current_tenant_from_request
+from src.app.services.query_context import QueryLimits
+
+logger = structlog.get_logger(__name__)
+
+QUERY_WINDOW_SECONDS = 3600
+
+
+def query_rate_key(tenant_id: str) -> str:
+    """租户查询限流/并发键"""
+    return f"tenant:{tenant_id}:queries"
+
+
+def _too_many_requests(detail: str, retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+async def check_query_rate_limit(tenant_id: str, limits: QueryLimits) -> RateLimitResult:
+    """
+    记录一次查询并检查每小时限额
+
+    Raises:
+        HTTPException: 429 超出每小时查询限额
+    """
+    result = await get_rate_limiter().hit(
+        query_rate_key(tenant_id), limits.max_queries_per_hour, QUERY_WINDOW_SECONDS
+    )
+    if not result.allowed:
+        logger.warning(
+            "Rate limit exceeded",
+            tenant_id=tenant_id,
+            limit=limits.max_queries_per_hour,
+            retry_after=result.retry_after_seconds
+        )
+        raise _too_many_requests(
+            f"Query rate limit exceeded. Maximum {limits.max_queries_per_hour} queries per hour allowed.",
+            result.retry_after_seconds
+        )
+    return result
+
+
+async def acquire_query_slot(tenant_id: str, limits: QueryLimits) -> ConcurrencySlot:
+    """
+    获取租户并发查询槽位
+
+    Raises:
+        HTTPException: 429 并发查询数已满
+    """
+    slot = await get_concurrency_gate().acquire(query_rate_key(tenant_id), limits.max_concurrent_queries)
+    if slot is None:
+        logger.warning(
+            "Concurrent query limit exceeded",
+            tenant_id=tenant_id,
+            limit=limits.max_concurrent_queries
+        )
+        raise _too_many_requests(
+            f"Too many concurrent queries. Maximum {limits.max_concurrent_queries} concurrent queries allowed.",
+            1
+        )
+    return slot
+
+
+async def _hold_slot(slot: ConcurrencySlot) -> AsyncIterator[ConcurrencySlot]:
+    try:
+        yield slot
+    finally:
+        # 已交给流式响应的槽位由流负责释放
+        if not slot.detached:
+            await slot.release()
+
+
+async def enforce_query_rate_limit(
+    tenant: Tenant = Depends(get_current_tenant_from_request)
+) -> RateLimitResult:
+    """依赖：当前租户的每小时查询限额"""
+    return await check_query_rate_limit(tenant.id, QueryLimits(tenant.settings))
+
+
+async def query_concurrency_slot(
+    tenant: Tenant = Depends(get_current_tenant_from_request)
+) -> AsyncIterator[ConcurrencySlot]:
+    """依赖：占用当前租户的一个并发查询槽位，请求结束后释放"""
+    slot = await acquire_query_slot(tenant.id, QueryLimits(tenant.settings))
+    async for held in _hold_slot(slot):
+        yield held
+
+
+async def stream_query_slot(
+    tenant: Tenant = Depends(get_current_tenant_from_request)
+) -> AsyncIterator[ConcurrencySlot]:
+    """
+    依赖：当前租户流式查询的频率限额 + 并发槽位
+
+    端点需用 slot.wrap_stream(...) 包装响应体，槽位在流结束或客户端断开时释放。
+    """
+    limits = QueryLimits(tenant.settings)
+    await check_query_rate_limit(tenant.id, limits)
+    slot = await acquire_query_slot(tenant.id, limits)
+    async for held in _hold_slot(slot):
+        yield held
+
+
+async def enforce_client_rate_limit(request: Request) -> Optional[RateLimitResult]:
+    """依赖：客户端IP每分钟请求限额（阈值与 ThreatDetector 一致）"""
+    client_ip = request.client.host if request.client else None
+    if not client_ip:
+        return None
+
+    result = await security_monitor.threat_detector.check_rate_limit_async(client_ip)
+    if not result.allowed:
+        security_monitor.record_event(
+            SecurityEventType.RATE_LIMIT_EXCEEDED,
+            SecurityEventLevel.HIGH,
+            f"IP {client_ip} 超过速率限制",
+            source_ip=client_ip
+        )
+        raise _too_many_requests("Too many requests", result.retry_after_seconds)
+    return result
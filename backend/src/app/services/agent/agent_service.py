@@ -5,8 +5,9 @@
 **文件名**: agent_service.py
 **职责**: 集成LangGraph框架，提供SQL查询和文件数据分析的智能Agent服务
 **作者**: Data Agent Team
-**版本**: 5.1.0
+**版本**: 5.2.0
 **变更记录**:
+- v5.2.0: 按数据库URL池化已编译Agent和MCP客户端（LRU淘汰、并发构建去重、延迟关闭）
 - v5.1.0 (2026-01-01): 集成VisualizationResponse和MCP ECharts
 - v5.0.0 (2025-12-01): 初始版本，安全防火墙和业务逻辑提示
 
@@ -47,7 +48,9 @@ import os
 import re
 import sys
 import traceback
-from typing import Literal, Optional, Dict, Any, List
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Literal, Optional, Dict, Any, List, Set, Tuple
 
 import anyio
 
@@ -108,6 +111,10 @@ MAX_RECURSION_LIMIT = 15
 DEFAULT_MODEL = "deepseek-chat"
 DEFAULT_TEMPERATURE = 0
 
+# Agent Pool Configuration
+AGENT_POOL_SIZE = settings.agent_pool_size  # 按数据库URL缓存的已编译Agent数量
+AGENT_EVICTION_GRACE_SECONDS = settings.agent_execution_timeout  # 被淘汰Agent的MCP客户端延迟关闭，等待进行中的请求
+
 # Context Management Configuration
 MAX_CONTEXT_TOKENS = 120000  # 留出一些余量，避免超过131072限制
 MAX_MESSAGE_HISTORY = 20  # 最多保留最近20条消息
@@ -115,14 +122,26 @@ MAX_TOOL_RESULT_LENGTH = 5000  # 工具返回结果最大长度（字符数）
 
 
 # ============================================================
-# Agent State & Cache (Singleton Pattern)
+# Agent State & Cache (Keyed Pool)
 # ============================================================
 
-_cached_agent = None
-_cached_mcp_client = None
-_cached_tools: List[BaseTool] = []
-_cached_checkpointer = None
-_cached_database_url: Optional[str] = None  # 记录当前缓存Agent使用的数据库URL
+@dataclass
+class _AgentSlot:
+    """A compiled agent and the MCP client/tools it was built with."""
+    agent: Any
+    mcp_client: Any
+    mcp_wrapper: Any
+    tools: List[BaseTool]
+    checkpointer: Any
+    database_url: Optional[str]
+
+
+# Compiled agents keyed by (database_url, enable_echarts, model), LRU order
+_agent_pool: "OrderedDict[Tuple[Optional[str], bool, Optional[str]], _AgentSlot]" = OrderedDict()
+# In-progress builds, so concurrent requests for one key share a single build
+_agent_builds: Dict[Tuple[Optional[str], bool, Optional[str]], "asyncio.Future"] = {}
+# Delayed MCP client shutdowns of evicted slots (kept referenced until done)
+_pending_closes: Set["asyncio.Task"] = set()
 
 
 class MCPClientWrapper:
@@ -765,7 +784,12 @@ async def build_agent(
     model: str = None,
 ) -> tuple:
     """
-    Build and compile the LangGraph agent.
+    Get a compiled LangGraph agent from the pool, building it on first use.
+
+    Agents are pooled per (database_url, enable_echarts, model). Concurrent
+    requests for the same key share one build; the least recently used slot
+    is evicted when the pool is full and its MCP client is closed after a
+    grace period.
 
     Args:
         database_url: PostgreSQL connection string
@@ -775,21 +799,98 @@ async def build_agent(
     Returns:
         Tuple of (compiled_agent, mcp_client)
     """
-    global _cached_agent, _cached_mcp_client, _cached_tools, _cached_checkpointer, _cached_database_url
-
-    # 🔥 关键修复：检查数据库URL是否变化
-    # 如果用户切换了数据源，需要重新创建Agent以连接新的数据库
-    if _cached_agent is not None and _cached_mcp_client is not None:
-        if _cached_database_url == database_url:
-            logger.info("Using cached agent instance (same database)")
-            return _cached_agent, _cached_mcp_client
-        else:
-            logger.info(f"🔄 Database URL changed, rebuilding agent...")
-            logger.info(f"   Old: {_cached_database_url[:50] if _cached_database_url else 'None'}...")
-            logger.info(f"   New: {database_url[:50] if database_url else 'None'}...")
-            # 清除缓存，强制重新创建
-            await reset_agent()
+    key = (database_url, bool(enable_echarts), model)
+
+    slot = _agent_pool.get(key)
+    if slot is not None:
+        _agent_pool.move_to_end(key)
+        _activate_slot(slot)
+        logger.info("Using pooled agent instance (same database)")
+        return slot.agent, slot.mcp_client
+
+    # Single-flight: wait for an in-progress build of the same key
+    pending = _agent_builds.get(key)
+    if pending is not None:
+        logger.info("Waiting for in-progress agent build (same database)")
+        slot = await asyncio.shield(pending)
+        _activate_slot(slot)
+        return slot.agent, slot.mcp_client
+
+    future = asyncio.get_running_loop().create_future()
+    _agent_builds[key] = future
+    try:
+        slot = await _build_agent_slot(database_url, enable_echarts, model)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved when nobody is waiting
+        raise
+    finally:
+        _agent_builds.pop(key, None)
+    future.set_result(slot)
+
+    _agent_pool[key] = slot
+    while len(_agent_pool) > max(1, AGENT_POOL_SIZE):
+        evicted_key, evicted = _agent_pool.popitem(last=False)
+        logger.info(f"Evicting pooled agent (database: {evicted_key[0][:50] if evicted_key[0] else 'None'}...)")
+        _schedule_slot_close(evicted, delay=AGENT_EVICTION_GRACE_SECONDS)
+
+    _activate_slot(slot)
+    return slot.agent, slot.mcp_client
+
+
+def _activate_slot(slot: "_AgentSlot") -> None:
+    """Route the MCP-backed tools of the current request to this slot's client."""
+    set_mcp_client(slot.mcp_wrapper)
+
+
+async def _close_mcp_client(mcp_client) -> None:
+    """Shut down an MCP client and its server subprocesses, if it supports it."""
+    if mcp_client is None:
+        return
+    try:
+        if hasattr(mcp_client, "aclose"):
+            await mcp_client.aclose()
+        elif hasattr(mcp_client, "close"):
+            result = mcp_client.close()
+            if asyncio.iscoroutine(result):
+                await result
+        elif hasattr(mcp_client, "__aexit__"):
+            await mcp_client.__aexit__(None, None, None)
+    except Exception as e:
+        logger.warning(f"Failed to close MCP client: {e}")
 
+
+def _schedule_slot_close(slot: "_AgentSlot", delay: float = 0) -> None:
+    """Close an evicted slot's MCP client once in-flight requests have finished."""
+    async def close_later():
+        if delay:
+            await asyncio.sleep(delay)
+        await _close_mcp_client(slot.mcp_client)
+
+    task = asyncio.get_running_loop().create_task(close_later())
+    _pending_closes.add(task)
+    task.add_done_callback(_pending_closes.discard)
+
+
+async def _build_agent_slot(
+    database_url: str,
+    enable_echarts: bool = False,
+    model: str = None,
+) -> "_AgentSlot":
+    """
+    Build and compile a LangGraph agent together with its MCP client.
+
+    Args:
+        database_url: PostgreSQL connection string
+        enable_echarts: Enable chart generation
+        model: LLM model to use
+
+    Returns:
+        _AgentSlot holding the compiled agent, MCP client and tools
+    """
     logger.info("Building new agent instance...")
 
     # Import MCP client (lazy import to avoid startup issues)
@@ -801,10 +902,11 @@ async def build_agent(
     # Create MCP client
     disable_tools = os.getenv("DISABLE_MCP_TOOLS", "false").lower() == "true"
     
+    mcp_client = None
+    mcp_wrapper = None
     if disable_tools:
         logger.info("⚠️ MCP 工具已禁用，将使用自定义工具")
         mcp_config = None
-        _cached_mcp_client = None
     else:
         try:
             mcp_config = get_mcp_config(database_url, enable_echarts)
@@ -821,13 +923,13 @@ async def build_agent(
             logger.error(f"❌ MCP 配置创建时发生未知错误: {e}", exc_info=True)
             raise
         
-        _cached_mcp_client = MultiServerMCPClient(mcp_config)
+        mcp_client = MultiServerMCPClient(mcp_config)
 
     if not disable_tools:
         # Initialize MCP and get tools
         try:
             logger.info("🔄 正在初始化 MCP 工具...")
-            raw_tools = await _cached_mcp_client.get_tools()
+            raw_tools = await mcp_client.get_tools()
             logger.info(f"✅ MCP 工具加载成功，共 {len(raw_tools)} 个工具")
         except FileNotFoundError as e:
             # 处理 npx 或命令未找到的错误
@@ -877,9 +979,9 @@ async def build_agent(
             if enable_echarts and "echarts" in mcp_config:
                 logger.info("⚠️ 尝试回退：禁用 ECharts 服务，仅使用 PostgreSQL MCP 工具")
                 fallback_config = {k: v for k, v in mcp_config.items() if k != "echarts"}
-                _cached_mcp_client = MultiServerMCPClient(fallback_config)
+                mcp_client = MultiServerMCPClient(fallback_config)
                 try:
-                    raw_tools = await _cached_mcp_client.get_tools()
+                    raw_tools = await mcp_client.get_tools()
                     logger.info("✅ 回退成功：已加载 PostgreSQL MCP 工具（不含 ECharts）")
                 except Exception as fallback_error:
                     logger.error(
@@ -924,27 +1026,26 @@ async def build_agent(
             raw_tools.append(analyze_dataframe)
 
         # Wrap with security layer
-        mcp_wrapper = MCPClientWrapper(_cached_mcp_client)
+        mcp_wrapper = MCPClientWrapper(mcp_client)
         # initialize with injected fallback tools
         await mcp_wrapper.initialize(raw_tools)
-        set_mcp_client(mcp_wrapper)
 
         # Create secure tools
-        _cached_tools = create_secure_tools(raw_tools)
+        agent_tools = create_secure_tools(raw_tools)
         
         # 🔥 确保文件数据源工具总是可用（双重保险）
-        tool_names = [getattr(t, "name", str(t)) for t in _cached_tools]
+        tool_names = [getattr(t, "name", str(t)) for t in agent_tools]
         if "inspect_file" not in tool_names:
             logger.warning("⚠️ inspect_file 工具未在 secure_tools 中找到，强制添加")
-            _cached_tools.append(_wrap_inspect_file_tool(inspect_file))
+            agent_tools.append(_wrap_inspect_file_tool(inspect_file))
         if "analyze_dataframe" not in tool_names:
             logger.warning("⚠️ analyze_dataframe 工具未在 secure_tools 中找到，强制添加")
-            _cached_tools.append(_wrap_tool_for_langgraph(analyze_dataframe))
+            agent_tools.append(_wrap_tool_for_langgraph(analyze_dataframe))
         
         # 记录最终的工具列表
-        final_tool_names = [getattr(t, "name", str(t)) for t in _cached_tools]
+        final_tool_names = [getattr(t, "name", str(t)) for t in agent_tools]
         logger.info(
-            f"✅ 最终工具列表已注册，共 {len(_cached_tools)} 个工具",
+            f"✅ 最终工具列表已注册，共 {len(agent_tools)} 个工具",
             extra={
                 "tool_names": final_tool_names,
                 "has_inspect_file": "inspect_file" in final_tool_names,
@@ -953,7 +1054,7 @@ async def build_agent(
         )
     else:
         logger.warning("DISABLE_MCP_TOOLS=true, building agent without tools")
-        _cached_tools = []
+        agent_tools = []
 
     # Create LLM with tools
     # 🔥 修复：强制优先使用DeepSeek，只有在DeepSeek API密钥不存在时才回退
@@ -975,17 +1076,17 @@ async def build_agent(
     llm = create_llm(model=model, provider=preferred_provider)
     
     # 🔥 确保工具被正确绑定
-    if _cached_tools:
-        tool_names_for_binding = [getattr(t, "name", str(t)) for t in _cached_tools]
+    if agent_tools:
+        tool_names_for_binding = [getattr(t, "name", str(t)) for t in agent_tools]
         logger.info(
-            f"📦 准备绑定工具到 LLM，共 {len(_cached_tools)} 个工具",
+            f"📦 准备绑定工具到 LLM，共 {len(agent_tools)} 个工具",
             extra={
                 "tool_names": tool_names_for_binding,
                 "has_inspect_file": "inspect_file" in tool_names_for_binding,
                 "has_analyze_dataframe": "analyze_dataframe" in tool_names_for_binding
             }
         )
-        llm_with_tools = llm.bind_tools(_cached_tools)
+        llm_with_tools = llm.bind_tools(agent_tools)
         logger.info("✅ 工具已成功绑定到 LLM")
     else:
         logger.warning("⚠️ 没有工具可绑定，LLM 将无法调用工具")
@@ -1065,8 +1166,8 @@ async def build_agent(
             # 检查是否有文件数据源工具（inspect_file 或 analyze_dataframe）
             is_file_mode = any(
                 getattr(tool, "name", "") in ["inspect_file", "analyze_dataframe"]
-                for tool in _cached_tools
-            ) if _cached_tools else False
+                for tool in agent_tools
+            ) if agent_tools else False
 
             # 🔧 图表拆分/合并请求的增强系统提示词
             chart_instructions = ""
@@ -1216,7 +1317,7 @@ async def build_agent(
             if fallback_provider:
                 fallback_llm = create_llm(model=model, provider=fallback_provider)
                 fallback_llm_with_tools = (
-                    fallback_llm.bind_tools(_cached_tools) if _cached_tools else fallback_llm
+                    fallback_llm.bind_tools(agent_tools) if agent_tools else fallback_llm
                 )
                 response = await fallback_llm_with_tools.ainvoke(messages)
             else:
@@ -1286,8 +1387,8 @@ async def build_agent(
     builder.add_node("agent", call_model)
     builder.add_edge(START, "agent")
 
-    if _cached_tools:
-        tool_node = ToolNode(_cached_tools)
+    if agent_tools:
+        tool_node = ToolNode(agent_tools)
         builder.add_node("tools", tool_node)
         builder.add_conditional_edges("agent", should_continue)
         builder.add_edge("tools", "agent")
@@ -1295,14 +1396,18 @@ async def build_agent(
         builder.add_edge("agent", END)
 
     # Compile with checkpointer and recursion limit
-    _cached_checkpointer = MemorySaver()
-    _cached_agent = builder.compile(checkpointer=_cached_checkpointer)
-    
-    # 🔥 保存当前使用的数据库URL，用于后续检测数据源切换
-    _cached_database_url = database_url
+    checkpointer = MemorySaver()
+    agent = builder.compile(checkpointer=checkpointer)
 
     logger.info(f"Agent built successfully (database: {database_url[:50] if database_url else 'None'}...)")
-    return _cached_agent, _cached_mcp_client
+    return _AgentSlot(
+        agent=agent,
+        mcp_client=mcp_client,
+        mcp_wrapper=mcp_wrapper,
+        tools=agent_tools,
+        checkpointer=checkpointer,
+        database_url=database_url,
+    )
 
 
 
@@ -1313,13 +1418,10 @@ async def reset_agent():
     - Configuration updates
     - Error recovery needed
     """
-    global _cached_agent, _cached_mcp_client, _cached_tools, _cached_checkpointer, _cached_database_url
-
-    _cached_agent = None
-    _cached_mcp_client = None
-    _cached_tools = []
-    _cached_checkpointer = None
-    _cached_database_url = None
+    slots = list(_agent_pool.values())
+    _agent_pool.clear()
+    for slot in slots:
+        await _close_mcp_client(slot.mcp_client)
 
     logger.info("Agent cache reset")
 
@@ -1560,115 +1662,154 @@ async def run_agent(
                             all_messages.extend(messages)
 
                             for msg in messages:
-                            # DEBUG: 打印所有消息类型
-                            import sys
-                            try:
-                                print(f"[DEBUG] MESSAGE TYPE: {type(msg).__name__}", flush=True)
-                            except UnicodeEncodeError:
-                                logger.debug(f"MESSAGE TYPE: {type(msg).__name__}")
-                            if isinstance(msg, AIMessage):
+                                # DEBUG: 打印所有消息类型
+                                import sys
                                 try:
-                                    print(f"[DEBUG] AIMessage - has content: {bool(msg.content)}, content type: {type(msg.content)}, has tool_calls: {bool(getattr(msg, 'tool_calls', None))}", flush=True)
+                                    print(f"[DEBUG] MESSAGE TYPE: {type(msg).__name__}", flush=True)
                                 except UnicodeEncodeError:
-                                    logger.debug(f"AIMessage - has content: {bool(msg.content)}, content type: {type(msg.content)}, has tool_calls: {bool(getattr(msg, 'tool_calls', None))}")
-                                if msg.content:
-                                    final_content = msg.content
-                                    # DEBUG: 打印 LLM 原始输出
+                                    logger.debug(f"MESSAGE TYPE: {type(msg).__name__}")
+                                if isinstance(msg, AIMessage):
                                     try:
-                                        print("=" * 80, flush=True)
-                                        print("[DEBUG] FINAL LLM OUTPUT (Raw String):", flush=True)
-                                        print("=" * 80, flush=True)
-                                        print(final_content, flush=True)
-                                        print("=" * 80, flush=True)
-                                        sys.stdout.flush()
+                                        print(f"[DEBUG] AIMessage - has content: {bool(msg.content)}, content type: {type(msg.content)}, has tool_calls: {bool(getattr(msg, 'tool_calls', None))}", flush=True)
                                     except UnicodeEncodeError:
-                                        logger.debug("FINAL LLM OUTPUT (Raw String)")
-                                    logger.info(f"[DEBUG] FINAL LLM OUTPUT (length: {len(final_content)}): {final_content[:500]}...")
-                                elif getattr(msg, 'tool_calls', None):
-                                    try:
-                                        print(f"[DEBUG] AIMessage has tool_calls but no content. Tool calls: {len(msg.tool_calls)}", flush=True)
-                                    except UnicodeEncodeError:
-                                        logger.debug(f"AIMessage has tool_calls but no content. Tool calls: {len(msg.tool_calls)}")
-                                    sys.stdout.flush()
-
-                                # Extract SQL from tool calls
-                                if msg.tool_calls:
-                                    # 🔍 详细记录工具调用（用于诊断编造数据问题）
-                                    logger.info(f"🔍 [AI工具调用] 共 {len(msg.tool_calls)} 个工具调用")
-                                    for tc in msg.tool_calls:
-                                        tool_name = tc.get("name", "unknown")
-                                        tool_args = tc.get("args", {})
-                                        logger.info(f"🔍 [AI工具调用] 工具: {tool_name}, 参数: {tool_args}")
-                                        if verbose:
-                                            logger.debug(f"AI tool call: {tool_name}")
-                                        
-                                        # Check if this is a chart tool call
-                                        if "chart" in tool_name.lower() or "echarts" in tool_name.lower():
+                                        logger.debug(f"AIMessage - has content: {bool(msg.content)}, content type: {type(msg.content)}, has tool_calls: {bool(getattr(msg, 'tool_calls', None))}")
+                                    if msg.content:
+                                        final_content = msg.content
+                                        # DEBUG: 打印 LLM 原始输出
+                                        try:
+                                            print("=" * 80, flush=True)
+                                            print("[DEBUG] FINAL LLM OUTPUT (Raw String):", flush=True)
+                                            print("=" * 80, flush=True)
+                                            print(final_content, flush=True)
+                                            print("=" * 80, flush=True)
+                                            sys.stdout.flush()
+                                        except UnicodeEncodeError:
+                                            logger.debug("FINAL LLM OUTPUT (Raw String)")
+                                        logger.info(f"[DEBUG] FINAL LLM OUTPUT (length: {len(final_content)}): {final_content[:500]}...")
+                                    elif getattr(msg, 'tool_calls', None):
+                                        try:
+                                            print(f"[DEBUG] AIMessage has tool_calls but no content. Tool calls: {len(msg.tool_calls)}", flush=True)
+                                        except UnicodeEncodeError:
+                                            logger.debug(f"AIMessage has tool_calls but no content. Tool calls: {len(msg.tool_calls)}")
+                                        sys.stdout.flush()
+
+                                    # Extract SQL from tool calls
+                                    if msg.tool_calls:
+                                        # 🔍 详细记录工具调用（用于诊断编造数据问题）
+                                        logger.info(f"🔍 [AI工具调用] 共 {len(msg.tool_calls)} 个工具调用")
+                                        for tc in msg.tool_calls:
+                                            tool_name = tc.get("name", "unknown")
+                                            tool_args = tc.get("args", {})
+                                            logger.info(f"🔍 [AI工具调用] 工具: {tool_name}, 参数: {tool_args}")
                                             if verbose:
-                                                logger.info(f"Detected chart tool call: {tool_name}")
+                                                logger.debug(f"AI tool call: {tool_name}")
+                                        
+                                            # Check if this is a chart tool call
+                                            if "chart" in tool_name.lower() or "echarts" in tool_name.lower():
+                                                if verbose:
+                                                    logger.info(f"Detected chart tool call: {tool_name}")
                                         
-                                        if tc.get("name") in ("query", "execute_sql_safe"):
-                                            executed_sql = tc.get("args", {}).get("query") or tc.get("args", {}).get("sql")
+                                            if tc.get("name") in ("query", "execute_sql_safe"):
+                                                executed_sql = tc.get("args", {}).get("query") or tc.get("args", {}).get("sql")
 
-                            # Capture tool results
-                            elif isinstance(msg, ToolMessage):
-                                try:
-                                    content = msg.content
-                                    tool_name = getattr(msg, 'name', None) or 'unknown'
-                                    
-                                    # 🔍 详细记录工具调用结果（用于诊断编造数据问题）
-                                    logger.info(f"🔍 [工具调用结果] 工具名: {tool_name}")
-                                    logger.info(f"🔍 [工具调用结果] 内容类型: {type(content)}")
-                                    if isinstance(content, str):
-                                        content_preview = content[:500] if len(content) > 500 else content
-                                        logger.info(f"🔍 [工具调用结果] 内容预览: {content_preview}")
-                                        # 检查是否包含错误信息
-                                        if "错误" in content or "Error" in content or "失败" in content:
-                                            logger.warning(f"⚠️ [工具调用结果] 工具返回了错误信息: {content[:200]}")
-                                    else:
-                                        logger.info(f"🔍 [工具调用结果] 内容: {str(content)[:500]}")
+                                # Capture tool results
+                                elif isinstance(msg, ToolMessage):
+                                    try:
+                                        content = msg.content
+                                        tool_name = getattr(msg, 'name', None) or 'unknown'
                                     
-                                    # Log tool message for debugging
-                                    if verbose:
-                                        logger.debug(f"Received ToolMessage from tool: {tool_name}, content type: {type(content)}")
+                                        # 🔍 详细记录工具调用结果（用于诊断编造数据问题）
+                                        logger.info(f"🔍 [工具调用结果] 工具名: {tool_name}")
+                                        logger.info(f"🔍 [工具调用结果] 内容类型: {type(content)}")
+                                        if isinstance(content, str):
+                                            content_preview = content[:500] if len(content) > 500 else content
+                                            logger.info(f"🔍 [工具调用结果] 内容预览: {content_preview}")
+                                            # 检查是否包含错误信息
+                                            if "错误" in content or "Error" in content or "失败" in content:
+                                                logger.warning(f"⚠️ [工具调用结果] 工具返回了错误信息: {content[:200]}")
+                                        else:
+                                            logger.info(f"🔍 [工具调用结果] 内容: {str(content)[:500]}")
                                     
-                                    # Check if this is a chart tool result (MCP ECharts)
-                                    # MCP ECharts tools typically return content with image data
-                                    if isinstance(content, str):
+                                        # Log tool message for debugging
                                         if verbose:
-                                            logger.debug(f"ToolMessage content (first 200 chars): {content[:200]}")
-                                        # Try to parse as JSON first
-                                        try:
-                                            parsed_content = json.loads(content)
+                                            logger.debug(f"Received ToolMessage from tool: {tool_name}, content type: {type(content)}")
+                                    
+                                        # Check if this is a chart tool result (MCP ECharts)
+                                        # MCP ECharts tools typically return content with image data
+                                        if isinstance(content, str):
+                                            if verbose:
+                                                logger.debug(f"ToolMessage content (first 200 chars): {content[:200]}")
+                                            # Try to parse as JSON first
+                                            try:
+                                                parsed_content = json.loads(content)
                                             
-                                            # Check if it's a list of content items (MCP format)
-                                            if isinstance(parsed_content, list):
-                                                for item in parsed_content:
-                                                    if isinstance(item, dict):
-                                                        # Check for image type content
-                                                        if item.get("type") == "image" and item.get("data"):
-                                                            # Extract Base64 image data
-                                                            image_data = item.get("data")
-                                                            # Ensure it's a data URI
-                                                            if isinstance(image_data, str):
-                                                                if image_data.startswith("data:"):
-                                                                    chart_image = image_data
-                                                                elif image_data.startswith("http"):
-                                                                    chart_image = image_data
-                                                                else:
-                                                                    # Assume it's base64 without prefix
-                                                                    chart_image = f"data:image/png;base64,{image_data}"
-                                                            logger.info(f"Extracted chart image from MCP tool result (length: {len(chart_image) if chart_image else 0})")
-                                                        # Also check for text content that might be a URL
-                                                        elif item.get("type") == "text" and isinstance(item.get("text"), str):
-                                                            text = item.get("text")
-                                                            if text.startswith("http") and not chart_image:
-                                                                chart_image = text
-                                                                logger.info(f"Extracted chart URL from MCP tool result: {chart_image}")
-                                            # If it's a dict, check for image fields
-                                            elif isinstance(parsed_content, dict):
-                                                if parsed_content.get("type") == "image" and parsed_content.get("data"):
-                                                    image_data = parsed_content.get("data")
+                                                # Check if it's a list of content items (MCP format)
+                                                if isinstance(parsed_content, list):
+                                                    for item in parsed_content:
+                                                        if isinstance(item, dict):
+                                                            # Check for image type content
+                                                            if item.get("type") == "image" and item.get("data"):
+                                                                # Extract Base64 image data
+                                                                image_data = item.get("data")
+                                                                # Ensure it's a data URI
+                                                                if isinstance(image_data, str):
+                                                                    if image_data.startswith("data:"):
+                                                                        chart_image = image_data
+                                                                    elif image_data.startswith("http"):
+                                                                        chart_image = image_data
+                                                                    else:
+                                                                        # Assume it's base64 without prefix
+                                                                        chart_image = f"data:image/png;base64,{image_data}"
+                                                                logger.info(f"Extracted chart image from MCP tool result (length: {len(chart_image) if chart_image else 0})")
+                                                            # Also check for text content that might be a URL
+                                                            elif item.get("type") == "text" and isinstance(item.get("text"), str):
+                                                                text = item.get("text")
+                                                                if text.startswith("http") and not chart_image:
+                                                                    chart_image = text
+                                                                    logger.info(f"Extracted chart URL from MCP tool result: {chart_image}")
+                                                # If it's a dict, check for image fields
+                                                elif isinstance(parsed_content, dict):
+                                                    if parsed_content.get("type") == "image" and parsed_content.get("data"):
+                                                        image_data = parsed_content.get("data")
+                                                        if isinstance(image_data, str):
+                                                            if image_data.startswith("data:"):
+                                                                chart_image = image_data
+                                                            elif image_data.startswith("http"):
+                                                                chart_image = image_data
+                                                            else:
+                                                                chart_image = f"data:image/png;base64,{image_data}"
+                                                        logger.info(f"Extracted chart image from MCP tool result (dict format)")
+                                                    elif parsed_content.get("url") and not chart_image:
+                                                        chart_image = parsed_content.get("url")
+                                                        logger.info(f"Extracted chart URL from MCP tool result: {chart_image}")
+                                                else:
+                                                    # Fallback: treat as query results
+                                                    query_results = parsed_content
+                                            except json.JSONDecodeError:
+                                                # Not JSON, might be plain text or other format
+                                                # Check if it looks like a URL
+                                                if content.startswith("http") and not chart_image:
+                                                    chart_image = content
+                                                    logger.info(f"Extracted chart URL from tool result: {chart_image}")
+                                                else:
+                                                    query_results = content
+                                        else:
+                                            # Content is not a string, check if it's a dict/list with image data
+                                            if isinstance(content, list):
+                                                for item in content:
+                                                    if isinstance(item, dict) and item.get("type") == "image" and item.get("data"):
+                                                        image_data = item.get("data")
+                                                        if isinstance(image_data, str):
+                                                            if image_data.startswith("data:"):
+                                                                chart_image = image_data
+                                                            elif image_data.startswith("http"):
+                                                                chart_image = image_data
+                                                            else:
+                                                                chart_image = f"data:image/png;base64,{image_data}"
+                                                        logger.info(f"Extracted chart image from MCP tool result (list format)")
+                                            elif isinstance(content, dict):
+                                                if content.get("type") == "image" and content.get("data"):
+                                                    image_data = content.get("data")
                                                     if isinstance(image_data, str):
                                                         if image_data.startswith("data:"):
                                                             chart_image = image_data
@@ -1677,55 +1818,16 @@ async def run_agent(
                                                         else:
                                                             chart_image = f"data:image/png;base64,{image_data}"
                                                     logger.info(f"Extracted chart image from MCP tool result (dict format)")
-                                                elif parsed_content.get("url") and not chart_image:
-                                                    chart_image = parsed_content.get("url")
+                                                elif content.get("url") and not chart_image:
+                                                    chart_image = content.get("url")
                                                     logger.info(f"Extracted chart URL from MCP tool result: {chart_image}")
-                                            else:
-                                                # Fallback: treat as query results
-                                                query_results = parsed_content
-                                        except json.JSONDecodeError:
-                                            # Not JSON, might be plain text or other format
-                                            # Check if it looks like a URL
-                                            if content.startswith("http") and not chart_image:
-                                                chart_image = content
-                                                logger.info(f"Extracted chart URL from tool result: {chart_image}")
-                                            else:
-                                                query_results = content
-                                    else:
-                                        # Content is not a string, check if it's a dict/list with image data
-                                        if isinstance(content, list):
-                                            for item in content:
-                                                if isinstance(item, dict) and item.get("type") == "image" and item.get("data"):
-                                                    image_data = item.get("data")
-                                                    if isinstance(image_data, str):
-                                                        if image_data.startswith("data:"):
-                                                            chart_image = image_data
-                                                        elif image_data.startswith("http"):
-                                                            chart_image = image_data
-                                                        else:
-                                                            chart_image = f"data:image/png;base64,{image_data}"
-                                                    logger.info(f"Extracted chart image from MCP tool result (list format)")
-                                        elif isinstance(content, dict):
-                                            if content.get("type") == "image" and content.get("data"):
-                                                image_data = content.get("data")
-                                                if isinstance(image_data, str):
-                                                    if image_data.startswith("data:"):
-                                                        chart_image = image_data
-                                                    elif image_data.startswith("http"):
-                                                        chart_image = image_data
-                                                    else:
-                                                        chart_image = f"data:image/png;base64,{image_data}"
-                                                logger.info(f"Extracted chart image from MCP tool result (dict format)")
-                                            elif content.get("url") and not chart_image:
-                                                chart_image = content.get("url")
-                                                logger.info(f"Extracted chart URL from MCP tool result: {chart_image}")
+                                                else:
+                                                    query_results = content
                                             else:
                                                 query_results = content
-                                        else:
-                                            query_results = content
-                                except (json.JSONDecodeError, TypeError) as e:
-                                    logger.warning(f"Failed to parse tool message content: {e}")
-                                    query_results = msg.content
+                                    except (json.JSONDecodeError, TypeError) as e:
+                                        logger.warning(f"Failed to parse tool message content: {e}")
+                                        query_results = msg.content
         except BaseException as stream_error:
             # Catch TaskGroup and other stream errors (including ExceptionGroup)
             logger.error(f"Agent stream execution failed: {stream_error}", exc_info=True)
@@ -2663,9 +2765,11 @@ def get_agent_status() -> Dict[str, Any]:
         Status dictionary
     """
     return {
-        "initialized": _cached_agent is not None,
-        "tools_loaded": len(_cached_tools),
-        "mcp_connected": _cached_mcp_client is not None,
+        "initialized": bool(_agent_pool),
+        "tools_loaded": max((len(slot.tools) for slot in _agent_pool.values()), default=0),
+        "mcp_connected": any(slot.mcp_client is not None for slot in _agent_pool.values()),
+        "pooled_agents": len(_agent_pool),
+        "pool_size": AGENT_POOL_SIZE,
         "recursion_limit": MAX_RECURSION_LIMIT,
     }
 
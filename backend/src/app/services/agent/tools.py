@@ -5,8 +5,9 @@
 **文件名**: tools.py
 **职责**: 定义LangGraph Agent的工具集，包括SQL安全执行、文件分析、数据查询等
 **作者**: Data Agent Team
-**版本**: 1.5.0
+**版本**: 1.6.0
 **变更记录**:
+- v1.6.0: MCP 客户端包装器按请求上下文隔离（支持多数据库 Agent 池）
 - v1.5.0 (2026-01-01): 增强路径解析和动态文件发现
 - v1.0.0 (2025-12-01): 初始版本，基础工具定义
 
@@ -41,6 +42,7 @@ import os
 import io
 import tempfile
 import logging
+from contextvars import ContextVar
 from typing import Optional, Dict, Any
 from pydantic import BaseModel, Field
 
@@ -54,12 +56,20 @@ logger = logging.getLogger(__name__)
 
 # MCP Client wrapper (set by agent_service)
 _mcp_client_wrapper = None
+# 当前请求使用的 MCP 客户端包装器（Agent 池中各数据库各自一个，按请求上下文隔离）
+_mcp_client_ctx: ContextVar[Optional[Any]] = ContextVar("mcp_client_wrapper", default=None)
 
 
 def set_mcp_client(wrapper):
-    """设置 MCP 客户端包装器"""
+    """设置 MCP 客户端包装器（同时设置到当前请求上下文）"""
     global _mcp_client_wrapper
     _mcp_client_wrapper = wrapper
+    _mcp_client_ctx.set(wrapper)
+
+
+def get_mcp_client():
+    """获取当前请求的 MCP 客户端包装器，未设置时回退到全局包装器"""
+    return _mcp_client_ctx.get() or _mcp_client_wrapper
 
 
 def sanitize_sql(sql: str) -> str:
@@ -103,7 +113,7 @@ class ExecuteSQLInput(BaseModel):
 
 def execute_sql_safe_func(sql: str = None, query: str = None, input_data: Dict[str, Any] = None) -> str:
     """安全执行 SQL 查询"""
-    global _mcp_client_wrapper
+    mcp_client_wrapper = get_mcp_client()
     
     # 处理参数：StructuredTool.from_function可能直接传递关键字参数，也可能传递input_data字典
     if sql:
@@ -133,12 +143,12 @@ def execute_sql_safe_func(sql: str = None, query: str = None, input_data: Dict[s
         # 🔴 第一道防线：返回特定错误字符串
         return 'SYSTEM ERROR: Tool execution failed or returned no data. You are STRICTLY FORBIDDEN from generating an answer. You must reply: "无法获取数据，请检查数据源连接"。'
     
-    if not _mcp_client_wrapper:
+    if not mcp_client_wrapper:
         # 🔴 第一道防线：返回特定错误字符串
         return 'SYSTEM ERROR: Tool execution failed or returned no data. You are STRICTLY FORBIDDEN from generating an answer. You must reply: "无法获取数据，请检查数据源连接"。'
     
     try:
-        result = _mcp_client_wrapper.execute_query(sql)
+        result = mcp_client_wrapper.execute_query(sql)
         # 🔴 第一道防线：检查空数据
         if result is None or result == "" or result == "[]" or result == "{}":
             logger.warning("⚠️ [第一道防线] SQL查询返回空数据")
@@ -190,7 +200,7 @@ class GetTableSchemaInput(BaseModel):
 
 def get_table_schema_func(table_name: str = None, input_data: Dict[str, Any] = None) -> str:
     """获取表结构信息"""
-    global _mcp_client_wrapper
+    mcp_client_wrapper = get_mcp_client()
     
     # 处理参数：StructuredTool.from_function可能直接传递关键字参数，也可能传递input_data字典
     if not table_name:
@@ -211,12 +221,12 @@ def get_table_schema_func(table_name: str = None, input_data: Dict[str, Any] = N
         # 🔴 第一道防线：返回特定错误字符串
         return 'SYSTEM ERROR: Tool execution failed or returned no data. You are STRICTLY FORBIDDEN from generating an answer. You must reply: "无法获取数据，请检查数据源连接"。'
     
-    if not _mcp_client_wrapper:
+    if not mcp_client_wrapper:
         # 🔴 第一道防线：返回特定错误字符串
         return 'SYSTEM ERROR: Tool execution failed or returned no data. You are STRICTLY FORBIDDEN from generating an answer. You must reply: "无法获取数据，请检查数据源连接"。'
     
     try:
-        result = _mcp_client_wrapper.get_schema(table_name)
+        result = mcp_client_wrapper.get_schema(table_name)
         # 🔴 第一道防线：检查空数据
         if result is None or result == "" or result == "[]" or result == "{}":
             logger.warning("⚠️ [第一道防线] 获取表结构返回空数据")
@@ -246,7 +256,7 @@ class ListTablesInput(BaseModel):
 
 def list_available_tables_func(input_data: Dict[str, Any] = None) -> str:
     """列出所有可用的表"""
-    global _mcp_client_wrapper
+    mcp_client_wrapper = get_mcp_client()
     
     # 处理空输入或不同类型的输入（LangChain可能传递BaseModel对象）
     if input_data is None:
@@ -260,12 +270,12 @@ def list_available_tables_func(input_data: Dict[str, Any] = None) -> str:
         else:
             input_data = {}
     
-    if not _mcp_client_wrapper:
+    if not mcp_client_wrapper:
         # 🔴 第一道防线：返回特定错误字符串
         return 'SYSTEM ERROR: Tool execution failed or returned no data. You are STRICTLY FORBIDDEN from generating an answer. You must reply: "无法获取数据，请检查数据源连接"。'
     
     try:
-        result = _mcp_client_wrapper.list_tables()
+        result = mcp_client_wrapper.list_tables()
         # 🔴 第一道防线：检查空数据
         if result is None or result == "" or result == "[]" or result == "{}":
             logger.warning("⚠️ [第一道防线] 列出表返回空数据")
@@ -0,0 +1,161 @@
+"""
+# [CACHE_CODEC] 缓存值编解码
+
+## [HEADER]
+**文件名**: cache_codec.py
+**职责**: RedisCache 的值序列化与压缩：orjson / msgpack / 标准json 可选，大于阈值的值用 zstd 压缩；兼容读取旧格式（json文本、原始字符串）
+**作者**: Data Agent Team
+**版本**: 1.0.0
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 从 RedisCache 的 json.dumps/json.loads 中抽出，支持更快的序列化与大回答压缩
+
+## [INPUT]
+- **serializer: str** - "auto"（orjson可用时用orjson，否则json）、"json"、"orjson"、"msgpack"
+- **compression: str** - "auto"（zstandard可用时用zstd）、"zstd"、"none"
+- **compress_min_bytes: int** - 序列化后不小于该字节数才压缩
+- **compression_level: int** - zstd 压缩级别
+
+## [OUTPUT]
+- **bytes** - 编码后的值（CacheCodec.encode）
+- **Any** - 解码后的值（CacheCodec.decode）
+
+## [LINK]
+**上游依赖**:
+- Python标准库 - json, logging
+- 第三方库（均为可选）: orjson, msgpack, zstandard
+
+**下游依赖**:
+- 无
+
+**调用方**:
+- [cache_service.py](./cache_service.py) - RedisCache 读写
+- [../../../scripts/benchmark_cache_codec.py](../../../scripts/benchmark_cache_codec.py) - 编解码基准测试
+
+## [STATE]
+- **格式识别**: 解码时按前缀识别，无需额外元数据
+  - zstd 帧魔数 28 B5 2F FD → 先解压再识别内部格式
+  - b"\\x00MP" → msgpack
+  - 其他 → JSON（orjson 与 json 输出同为 JSON 文本，可互相读取）；不是合法 JSON 时按 UTF-8 字符串返回（旧版直接存储的字符串）
+- **兼容性**: str/bytes 原样存储；只用 json/orjson 且不压缩时，其他值的写入格式与旧版相同；旧版写入的值均可读取；启用 msgpack 或 zstd 前应确保所有 worker 已升级
+- **降级**: 指定的库未安装时记录警告并退回 json / 不压缩
+
+## [POS]
+**路径**: backend/src/app/services/cache_codec.py
+**模块层级**: Level 1 (服务层)
+**依赖深度**: 0 层（可选第三方库）
+"""
+
+import json
+import logging
+from typing import Any, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+MSGPACK_PREFIX = b"\x00MP"
+
+
+class CacheCodec:
+    """缓存值编解码器"""
+
+    def __init__(
+        self,
+        serializer: str = "auto",
+        compression: str = "auto",
+        compress_min_bytes: int = 4096,
+        compression_level: int = 3,
+    ):
+        self.serializer = self._resolve_serializer(serializer)
+        self.compression = self._resolve_compression(compression)
+        self.compress_min_bytes = compress_min_bytes
+        self.compression_level = compression_level
+
+    @staticmethod
+    def _resolve_serializer(serializer: str) -> str:
+        serializer = (serializer or "auto").lower()
+        if serializer == "auto":
+            return "orjson" if orjson is not None else "json"
+        if serializer == "orjson" and orjson is None:
+            logger.warning("orjson 未安装，缓存序列化使用 json")
+            return "json"
+        if serializer == "msgpack" and msgpack is None:
+            logger.warning("msgpack 未安装，缓存序列化使用 json")
+            return "json"
+        if serializer not in ("json", "orjson", "msgpack"):
+            raise ValueError(f"不支持的缓存序列化方式: {serializer}")
+        return serializer
+
+    @staticmethod
+    def _resolve_compression(compression: str) -> str:
+        compression = (compression or "none").lower()
+        if compression == "auto":
+            return "zstd" if zstandard is not None else "none"
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard 未安装，缓存值不压缩")
+            return "none"
+        if compression not in ("zstd", "none"):
+            raise ValueError(f"不支持的缓存压缩方式: {compression}")
+        return compression
+
+    def _serialize(self, value: Any) -> bytes:
+        if self.serializer == "msgpack":
+            return MSGPACK_PREFIX + msgpack.packb(value, use_bin_type=True, default=str)
+        if self.serializer == "orjson":
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+    def encode(self, value: Any) -> Union[bytes, str]:
+        """编码缓存值（str/bytes 与旧版一致，原样存储）"""
+        if isinstance(value, (str, bytes)):
+            return value
+        data = self._serialize(value)
+        if self.compression == "zstd" and len(data) >= self.compress_min_bytes:
+            # 每次新建压缩器：ZstdCompressor 实例不能并发使用
+            data = zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+        return data
+
+    def decode(self, raw: Union[bytes, str, None]) -> Any:
+        """解码缓存值"""
+        if raw is None:
+            return None
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+
+        if raw.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise ValueError("缓存值经 zstd 压缩，但 zstandard 未安装")
+            raw = zstandard.ZstdDecompressor().decompress(raw)
+
+        if raw.startswith(MSGPACK_PREFIX):
+            if msgpack is None:
+                raise ValueError("缓存值为 msgpack 格式，但 msgpack 未安装")
+            return msgpack.unpackb(raw[len(MSGPACK_PREFIX):], raw=False)
+
+        try:
+            return orjson.loads(raw) if orjson is not None else json.loads(raw)
+        except ValueError:
+            # 旧版直接存储的字符串
+            return raw.decode("utf-8")
+
+    def describe(self) -> Dict[str, Any]:
+        """当前编解码配置"""
+        return {
+            "serializer": self.serializer,
+            "compression": self.compression,
+            "compress_min_bytes": self.compress_min_bytes,
+        }
@@ -5,9 +5,13 @@
 **文件名**: cache_service.py
 **职责**: 提供统一的缓存抽象层，支持内存缓存和Redis分布式缓存，为RAG-SQL服务提供租户隔离的缓存支持
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.3.1
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 缓存服务抽象层
+- v1.1.0 (2026-10-16): MemoryCache改用core.lru_cache.LRUCache（O(1)淘汰、TTL过期堆、可选字节预算）
+- v1.2.0 (2026-10-16): 租户失效改为按索引/代数进行 —— RedisCache租户键版本化并登记到租户键集合，clear_namespace为O(1)；清理改用SCAN/UNLINK分批，不再使用KEYS
+- v1.3.0 (2026-10-16): 新增 get_many/set_many/delete_many（Redis走管道一次往返）；CacheFactory 使用按URL共享的 redis.asyncio 连接池；值编解码抽到 cache_codec.CacheCodec（可选 orjson/msgpack + zstd 压缩）
+- v1.3.1 (2026-10-16): 键登记集合改为按过期时间打分的ZSET，写入时 ZREMRANGEBYSCORE 剪除已过期成员；版本化键在Python侧按本地代数计算并作为 KEYS[3] 传入脚本，代数不一致时脚本返回新代数、客户端重试一次
 
 ## [INPUT]
 - **key: str** - 缓存键
@@ -23,9 +27,13 @@
 - **time_range: str** - 时间范围
 - **cache_type: str** - 缓存类型（"memory" 或 "redis"）
 - **max_size: int** - 内存缓存最大条目数
+- **max_bytes: Optional[int]** - 内存缓存字节预算（默认取 settings.memory_cache_max_bytes）
 - **default_ttl: int** - 默认TTL（秒）
 - **redis_url: str** - Redis连接URL
 - **key_prefix: str** - Redis键前缀
+- **keys: List[str] / items: Dict[str, Any]** - 批量操作的键 / 键值
+- **max_connections: int** - Redis连接池大小（默认取 settings.redis_max_connections）
+- **serializer / compression / compress_min_bytes** - RedisCache值编解码配置（默认取 settings.cache_*）
 - **cache: CacheInterface** - 缓存实例
 - **key_generator: Callable** - 自定义键生成函数
 
@@ -33,14 +41,20 @@
 - **Optional[Any]** - 缓存值（CacheInterface.get）
 - **bool** - 操作是否成功（CacheInterface.set, delete, exists）
 - **int** - 清理的缓存条目数（CacheInterface.clear）
+- **Dict[str, Any]** - 命中的键值（CacheInterface.get_many）
+- **int** - 删除数（CacheInterface.delete_many）
 - **Dict[str, Any]** - 缓存统计信息（CacheInterface.get_stats）
-  - MemoryCache: type, size, max_size, hit_rate, hits, misses, sets, deletes, evictions
+  - MemoryCache: type, size, max_size, bytes, max_bytes, hit_rate, hits, misses, sets, deletes, evictions, expirations
   - RedisCache: type, connected_clients, used_memory, total_commands_processed, keyspace_hits, keyspace_misses
 - **CacheInterface** - 缓存实例（CacheFactory.create_cache）
 - **CacheManager** - 缓存管理器实例（initialize_cache）
 
 **上游依赖** (已读取源码):
-- Python标准库: abc（抽象基类）, asyncio（异步操作）, functools（wraps装饰器）, hashlib（MD5哈希）, json（序列化）, logging（日志）, time（时间戳）
+- Python标准库: abc（抽象基类）, asyncio（异步操作）, functools（wraps装饰器）, hashlib（MD5哈希）, json（序列化）, logging（日志）
+- [../core/lru_cache.py](../core/lru_cache.py) - LRUCache有界进程内缓存（MemoryCache的存储）
+- [../core/config.py](../core/config.py) - memory_cache_max_bytes, redis_max_connections, cache_serializer, cache_compression
+- [cache_codec.py](./cache_codec.py) - CacheCodec值编解码
+- Python标准库: time（登记集合过期打分）
 - 第三方库: redis.asyncio（Redis异步客户端，可选）
 
 **下游依赖** (需要反向索引分析):
@@ -54,14 +68,22 @@
 
 ## [STATE]
 - **抽象基类**: CacheInterface定义缓存操作契约（get, set, delete, exists, clear, get_stats）
-- **内存缓存**: MemoryCache使用Dict存储，支持LRU淘汰策略（max_size=1000）
+- **内存缓存**: MemoryCache使用LRUCache存储，条目数（max_size=1000）与字节预算（max_bytes）任一超限时按LRU淘汰
 - **Redis缓存**: RedisCache使用redis.asyncio客户端，支持分布式缓存（可选依赖）
-- **租户隔离**: TenantCacheKeyGenerator生成租户级别缓存键（tenant:{tenant_id}:...）
+- **租户隔离**: TenantCacheKeyGenerator生成租户级别缓存键（tenant:{tenant_id}:...），key_namespace提取租户命名空间
+- **租户失效**: CacheManager.clear_tenant_cache → clear_namespace("tenant:{tenant_id}")
+  - MemoryCache: 按LRUCache命名空间索引删除，不遍历其他租户的键
+  - RedisCache: 租户键存为 {prefix}{tenant:{id}}:g{代数}:{其余}（hash tag保证同槽位），
+    写入时登记到 {prefix}{tenant:{id}}:keys（ZSET，分数为过期时间，写入时剪除已过期成员）；
+    失效时递增 {prefix}{tenant:{id}}:gen（O(1)），登记集合改名为待回收集合，后台 ZSCAN + 管道 UNLINK 分批删除旧代的键
+  - RedisCache按命名空间记录本地代数，据此计算版本化键并声明在脚本KEYS中（集群模式安全）；
+    其他进程失效租户后脚本返回新代数，客户端更新本地代数并重试一次
 - **缓存键生成**:
   - Schema缓存: `tenant:{tenant_id}:schema:{db_connection_id}`
   - Query缓存: `tenant:{tenant_id}:query:{query_hash}`（MD5哈希SQL）
   - SQL模板缓存: `tenant:{tenant_id}:sql_template:{query_type}:{pattern_hash}`
   - 性能缓存: `tenant:{tenant_id}:performance:{time_range}`
+  - V2查询缓存: `tenant:{tenant_id}:v2:query:{content_hash}`
 - **工厂模式**: CacheFactory.create_cache根据类型创建缓存实例
 - **缓存装饰器**: @cached_result支持函数级缓存
 - **全局单例**: _cache_manager全局缓存管理器实例
@@ -69,14 +91,14 @@
 - **默认配置**: max_size=1000, default_ttl=3600秒（1小时）
 
 ## [SIDE-EFFECTS]
-- **字典操作**: MemoryCache中使用Dict读写缓存项
-- **时间戳记录**: created_at, expires_at记录缓存创建和过期时间
-- **过期检查**: _is_expired中time.time() > expires_at检查
-- **LRU淘汰**: _evict_if_needed中min找出最旧项并删除
-- **统计计数**: hits, misses, sets, deletes, evictions计数器更新
+- **LRUCache操作**: MemoryCache的读写、过期清理与淘汰均由LRUCache完成（O(1)）
+- **统计计数**: hits, misses, sets, evictions, expirations由LRUCache统计，deletes由MemoryCache计数
 - **模式匹配**: fnmatch.fnmatch实现模式匹配清理（clear方法）
-- **JSON序列化**: RedisCache中json.dumps/json.loads序列化值
-- **Redis操作**: redis.get, redis.setex, redis.delete, redis.exists, redis.keys, redis.info
+- **值编解码**: RedisCache经CacheCodec序列化/压缩值（默认json、不压缩，与旧格式一致）
+- **批量操作**: RedisCache.get_many/set_many/delete_many在一个非事务管道中完成（租户键的脚本调用同样入管道）
+- **连接池**: get_redis_pool按URL缓存redis.asyncio.ConnectionPool，多次create_cache共享同一连接池
+- **Redis操作**: 租户键经Lua脚本（GET代数 + GET/SET/DEL/EXISTS + ZADD/ZREMRANGEBYSCORE/ZREM登记集合）；非租户键 get/setex/delete/exists；清理使用 scan_iter/zscan_iter + 管道 UNLINK；redis.info
+- **后台任务**: RedisCache.clear_namespace创建asyncio任务回收旧代键
 - **键前缀**: RedisCache中添加dataagent:前缀避免冲突
 - **MD5哈希**: hashlib.md5(sql.encode()).hexdigest()生成缓存键哈希
 - **全局状态修改**: initialize_cache修改_cache_manager全局变量
@@ -91,14 +113,20 @@
 **依赖深度**: 外部依赖redis库（可选）
 """
 
-import json
+import asyncio
+import sys
 import time
+import uuid
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from functools import wraps
 import hashlib
 import logging
 
+from src.app.core.config import settings
+from src.app.core.lru_cache import LRUCache
+from src.app.services.cache_codec import CacheCodec
+
 logger = logging.getLogger(__name__)
 
 
@@ -135,99 +163,97 @@ class CacheInterface(ABC):
         """获取缓存统计信息"""
         pass
 
+    async def clear_namespace(self, namespace: str) -> int:
+        """清理命名空间（如 tenant:{tenant_id}）下的全部缓存"""
+        return await self.clear(f"{namespace}:*")
 
-class MemoryCache(CacheInterface):
-    """内存缓存实现"""
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """批量获取缓存值，只返回命中的键"""
+        result = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                result[key] = value
+        return result
 
-    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
-        self.cache: Dict[str, Dict[str, Any]] = {}
-        self.max_size = max_size
-        self.default_ttl = default_ttl
-        self.stats = {
-            "hits": 0,
-            "misses": 0,
-            "sets": 0,
-            "deletes": 0,
-            "evictions": 0
-        }
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """批量设置缓存值（同一TTL）"""
+        results = [await self.set(key, value, ttl) for key, value in items.items()]
+        return all(results)
 
-    def _is_expired(self, item: Dict[str, Any]) -> bool:
-        """检查缓存项是否过期"""
-        if item.get("ttl") is None:
-            return False
-        return time.time() > item["expires_at"]
+    async def delete_many(self, keys: List[str]) -> int:
+        """批量删除缓存，返回删除数"""
+        return sum([1 for key in keys if await self.delete(key)])
 
-    def _evict_if_needed(self):
-        """如果需要，清理最旧的缓存项"""
-        if len(self.cache) >= self.max_size:
-            # 找到最旧的项并删除
-            oldest_key = min(self.cache.keys(),
-                           key=lambda k: self.cache[k]["created_at"])
-            del self.cache[oldest_key]
-            self.stats["evictions"] += 1
 
-    async def get(self, key: str) -> Optional[Any]:
-        """获取缓存值"""
-        if key not in self.cache:
-            self.stats["misses"] += 1
-            return None
+def key_namespace(key: str) -> Optional[str]:
+    """
+    提取缓存键的租户命名空间
 
-        item = self.cache[key]
-        if self._is_expired(item):
-            del self.cache[key]
-            self.stats["misses"] += 1
-            return None
+    tenant:{tenant_id}:... 形式的键返回 "tenant:{tenant_id}"，其他键返回 None
+    """
+    if not key.startswith("tenant:"):
+        return None
+    end = key.find(":", len("tenant:"))
+    return key[:end] if end > 0 else None
 
-        self.stats["hits"] += 1
-        return item["value"]
 
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """设置缓存值"""
-        try:
-            self._evict_if_needed()
+def _namespace_pattern(pattern: str) -> Optional[str]:
+    """pattern 恰好为 "{namespace}:*" 时返回命名空间"""
+    if not pattern.endswith(":*"):
+        return None
+    namespace = key_namespace(pattern[:-1])
+    if namespace is None or pattern != f"{namespace}:*" or any(c in namespace for c in "*?[]\\"):
+        return None
+    return namespace
 
-            ttl = ttl or self.default_ttl
-            expires_at = time.time() + ttl if ttl > 0 else None
 
-            self.cache[key] = {
-                "value": value,
-                "created_at": time.time(),
-                "expires_at": expires_at,
-                "ttl": ttl
-            }
+class MemoryCache(CacheInterface):
+    """内存缓存实现（基于有界LRU，条目数与字节预算双重限制）"""
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 3600, max_bytes: Optional[int] = None):
+        self.cache = LRUCache(
+            name="memory_cache",
+            max_entries=max_size,
+            max_bytes=max_bytes,
+            default_ttl=default_ttl,
+        )
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.deletes = 0
 
-            self.stats["sets"] += 1
-            return True
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存值"""
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """设置缓存值"""
+        try:
+            return self.cache.set(key, value, ttl=ttl or self.default_ttl, namespace=key_namespace(key))
         except Exception as e:
             logger.error(f"内存缓存设置失败: {e}")
             return False
 
     async def delete(self, key: str) -> bool:
         """删除缓存"""
-        if key in self.cache:
-            del self.cache[key]
-            self.stats["deletes"] += 1
+        if self.cache.delete(key):
+            self.deletes += 1
             return True
         return False
 
     async def exists(self, key: str) -> bool:
         """检查缓存是否存在"""
-        if key not in self.cache:
-            return False
-
-        item = self.cache[key]
-        if self._is_expired(item):
-            del self.cache[key]
-            return False
-
-        return True
+        return key in self.cache
 
     async def clear(self, pattern: Optional[str] = None) -> int:
         """清理缓存"""
         if pattern is None:
-            count = len(self.cache)
-            self.cache.clear()
-            return count
+            return self.cache.clear()
+
+        namespace = _namespace_pattern(pattern)
+        if namespace is not None:
+            return await self.clear_namespace(namespace)
 
         # 简单的模式匹配
         import fnmatch
@@ -237,50 +263,162 @@ class MemoryCache(CacheInterface):
         ]
 
         for key in keys_to_delete:
-            del self.cache[key]
+            self.cache.delete(key)
 
         return len(keys_to_delete)
 
+    async def clear_namespace(self, namespace: str) -> int:
+        """按命名空间索引删除，不遍历其他租户的键"""
+        return self.cache.clear_namespace(namespace)
+
     async def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        total_requests = self.stats["hits"] + self.stats["misses"]
-        hit_rate = self.stats["hits"] / total_requests if total_requests > 0 else 0
+        stats = self.cache.get_stats()
 
         return {
             "type": "memory",
-            "size": len(self.cache),
+            "size": stats["entries"],
             "max_size": self.max_size,
-            "hit_rate": round(hit_rate, 4),
-            **self.stats
+            "bytes": stats["bytes"],
+            "max_bytes": self.max_bytes,
+            "hit_rate": stats["hit_rate"],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "sets": stats["sets"],
+            "deletes": self.deletes,
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
         }
 
 
+# 租户键的读写/删除/存在性检查。KEYS[1]=代数键, KEYS[2]=键登记集合(ZSET), KEYS[3]=按ARGV[2]代数计算的版本化键；
+# 三个键共用同一 hash tag，集群模式下位于同一槽位。ARGV: 操作, 代数, 当前时间, [值, TTL]
+# 代数已变化时不访问 KEYS[3]，返回 {当前代数} 由客户端重试；登记集合分数为过期时间，写入时剪除已过期成员
+_NAMESPACED_ACCESS_SCRIPT = """
+local gen = redis.call('GET', KEYS[1]) or '0'
+if gen ~= ARGV[2] then
+    return {gen}
+end
+local key = KEYS[3]
+local op = ARGV[1]
+if op == 'get' then
+    return redis.call('GET', key)
+elseif op == 'set' then
+    local now = tonumber(ARGV[3])
+    local ttl = tonumber(ARGV[5])
+    redis.call('SET', key, ARGV[4], 'EX', ttl)
+    redis.call('ZADD', KEYS[2], now + ttl, key)
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+    if redis.call('TTL', KEYS[2]) < ttl then
+        redis.call('EXPIRE', KEYS[2], ttl)
+    end
+    return 1
+elseif op == 'del' then
+    redis.call('ZREM', KEYS[2], key)
+    return redis.call('DEL', key)
+end
+return redis.call('EXISTS', key)
+"""
+
+# 租户整体失效：递增代数（旧代键立即不可达），并把键登记集合改名为待回收集合
+# KEYS[1]=代数键, KEYS[2]=键登记集合, KEYS[3]=待回收集合；ARGV[1]=待回收集合过期时间
+_NAMESPACE_FLUSH_SCRIPT = """
+local gen = redis.call('INCR', KEYS[1])
+local count = redis.call('ZCARD', KEYS[2])
+if count > 0 then
+    redis.call('RENAME', KEYS[2], KEYS[3])
+    redis.call('EXPIRE', KEYS[3], ARGV[1])
+end
+return {gen, count}
+"""
+
+
 class RedisCache(CacheInterface):
-    """Redis分布式缓存实现"""
+    """
+    Redis分布式缓存实现
+
+    tenant:{tenant_id}:... 形式的键按租户版本化存储：
+    {prefix}{tenant:{tenant_id}}:g{代数}:{其余部分}，并登记到租户的键集合（按过期时间打分的ZSET）。
+    租户失效只需递增代数（O(1)），旧代的键在后台按 ZSCAN + UNLINK 分批回收；
+    其他模式的清理使用 SCAN 分批删除，不再使用阻塞整个实例的 KEYS。
+    """
 
-    def __init__(self, redis_client, default_ttl: int = 3600, key_prefix: str = "dataagent:"):
+    def __init__(self, redis_client, default_ttl: int = 3600, key_prefix: str = "dataagent:",
+                 scan_batch_size: int = 500, codec: Optional[CacheCodec] = None):
         self.redis = redis_client
         self.default_ttl = default_ttl
         self.key_prefix = key_prefix
+        self.scan_batch_size = scan_batch_size
+        self.codec = codec or CacheCodec(serializer="json", compression="none")
+        self._access_script = redis_client.register_script(_NAMESPACED_ACCESS_SCRIPT)
+        self._flush_script = redis_client.register_script(_NAMESPACE_FLUSH_SCRIPT)
+        self._cleanup_tasks: set = set()
+        # 命名空间 → 本地记录的代数（脚本发现不一致时更新）
+        self._generations: Dict[str, int] = {}
 
     def _make_key(self, key: str) -> str:
         """生成Redis键"""
         return f"{self.key_prefix}{key}"
 
+    def _namespace_keys(self, namespace: str) -> Tuple[str, str]:
+        """命名空间的 (代数键, 键登记集合)"""
+        base = f"{self.key_prefix}{{{namespace}}}"
+        return f"{base}:gen", f"{base}:keys"
+
+    async def _run_access(self, namespace: str, key: str, op: str, args: Tuple[Any, ...], client: Any = None) -> Any:
+        """按本地代数计算版本化键并执行访问脚本（全部键声明在 KEYS 中）"""
+        gen_key, registry = self._namespace_keys(namespace)
+        gen = self._generations.get(namespace, 0)
+        versioned = f"{self.key_prefix}{{{namespace}}}:g{gen}:{key[len(namespace) + 1:]}"
+        script_keys = [gen_key, registry, versioned]
+        script_args = [op, gen, int(time.time()), *args]
+        if client is not None:
+            return await self._access_script(keys=script_keys, args=script_args, client=client)
+        return await self._access_script(keys=script_keys, args=script_args)
+
+    async def _settle(self, key: str, op: str, result: Any, *args: Any) -> Any:
+        """
+        处理脚本返回的代数不一致（其他进程已使租户失效）：更新本地代数并重试一次
+
+        重试仍不一致时按未命中处理（get 返回 None，其余返回 0）。
+        """
+        if not isinstance(result, list):
+            return result
+        namespace = key_namespace(key)
+        self._generations[namespace] = int(result[0])
+        result = await self._run_access(namespace, key, op, args)
+        if isinstance(result, list):
+            self._generations[namespace] = int(result[0])
+            return None if op == "get" else 0
+        return result
+
+    async def _namespaced(self, op: str, key: str, *args: Any, client: Any = None) -> Tuple[bool, Any]:
+        """
+        对租户键执行脚本操作
+
+        Args:
+            client: 管道（提供时命令加入管道，结果在 execute 后交给 _settle 处理）
+
+        Returns:
+            (是否为租户键, 脚本返回值)
+        """
+        namespace = key_namespace(key)
+        if namespace is None:
+            return False, None
+        if client is not None:
+            await self._run_access(namespace, key, op, args, client=client)
+            return True, None
+        result = await self._run_access(namespace, key, op, args)
+        return True, await self._settle(key, op, result, *args)
+
     async def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
         try:
-            redis_key = self._make_key(key)
-            value = await self.redis.get(redis_key)
+            handled, value = await self._namespaced("get", key)
+            if not handled:
+                value = await self.redis.get(self._make_key(key))
 
-            if value is None:
-                return None
-
-            # 尝试JSON反序列化
-            try:
-                return json.loads(value)
-            except (json.JSONDecodeError, TypeError):
-                return value.decode('utf-8') if isinstance(value, bytes) else value
+            return self.codec.decode(value)
 
         except Exception as e:
             logger.error(f"Redis获取缓存失败: {e}")
@@ -289,16 +427,12 @@ class RedisCache(CacheInterface):
     async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """设置缓存值"""
         try:
-            redis_key = self._make_key(key)
             ttl = ttl or self.default_ttl
+            serialized_value = self.codec.encode(value)
 
-            # 序列化值
-            if not isinstance(value, (str, bytes)):
-                serialized_value = json.dumps(value, ensure_ascii=False)
-            else:
-                serialized_value = value
-
-            await self.redis.setex(redis_key, ttl, serialized_value)
+            handled, _ = await self._namespaced("set", key, serialized_value, ttl)
+            if not handled:
+                await self.redis.setex(self._make_key(key), ttl, serialized_value)
             return True
 
         except Exception as e:
@@ -308,8 +442,9 @@ class RedisCache(CacheInterface):
     async def delete(self, key: str) -> bool:
         """删除缓存"""
         try:
-            redis_key = self._make_key(key)
-            result = await self.redis.delete(redis_key)
+            handled, result = await self._namespaced("del", key)
+            if not handled:
+                result = await self.redis.delete(self._make_key(key))
             return result > 0
         except Exception as e:
             logger.error(f"Redis删除缓存失败: {e}")
@@ -318,30 +453,175 @@ class RedisCache(CacheInterface):
     async def exists(self, key: str) -> bool:
         """检查缓存是否存在"""
         try:
-            redis_key = self._make_key(key)
-            result = await self.redis.exists(redis_key)
+            handled, result = await self._namespaced("exists", key)
+            if not handled:
+                result = await self.redis.exists(self._make_key(key))
             return result > 0
         except Exception as e:
             logger.error(f"Redis检查缓存存在性失败: {e}")
             return False
 
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """在一个管道中批量获取（一次往返），只返回命中的键"""
+        if not keys:
+            return {}
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                handled, _ = await self._namespaced("get", key, client=pipe)
+                if not handled:
+                    pipe.get(self._make_key(key))
+            values = [await self._settle(key, "get", value) for key, value in zip(keys, await pipe.execute())]
+        except Exception as e:
+            logger.error(f"Redis批量获取缓存失败: {e}")
+            return {}
+
+        result = {}
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            try:
+                result[key] = self.codec.decode(value)
+            except Exception as e:
+                logger.warning(f"缓存值解码失败 {key}: {e}")
+        return result
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """在一个管道中批量设置（一次往返）"""
+        if not items:
+            return True
+        try:
+            ttl = ttl or self.default_ttl
+            encoded = {key: self.codec.encode(value) for key, value in items.items()}
+            pipe = self.redis.pipeline(transaction=False)
+            for key, serialized_value in encoded.items():
+                handled, _ = await self._namespaced("set", key, serialized_value, ttl, client=pipe)
+                if not handled:
+                    pipe.setex(self._make_key(key), ttl, serialized_value)
+            for (key, serialized_value), result in zip(encoded.items(), await pipe.execute()):
+                await self._settle(key, "set", result, serialized_value, ttl)
+            return True
+        except Exception as e:
+            logger.error(f"Redis批量设置缓存失败: {e}")
+            return False
+
+    async def delete_many(self, keys: List[str]) -> int:
+        """在一个管道中批量删除（一次往返），返回删除数"""
+        if not keys:
+            return 0
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                handled, _ = await self._namespaced("del", key, client=pipe)
+                if not handled:
+                    pipe.delete(self._make_key(key))
+            results = await pipe.execute()
+            return sum([int(await self._settle(key, "del", n) or 0) for key, n in zip(keys, results)])
+        except Exception as e:
+            logger.error(f"Redis批量删除缓存失败: {e}")
+            return 0
+
+    async def clear_namespace(self, namespace: str) -> int:
+        """
+        使命名空间（tenant:{tenant_id}）下的全部缓存失效
+
+        递增代数后旧键立即不可达；旧键的物理删除在后台分批进行。
+
+        Returns:
+            失效的键数量（登记集合中的键数）
+        """
+        try:
+            gen_key, registry = self._namespace_keys(namespace)
+            garbage = f"{self.key_prefix}{{{namespace}}}:gc:{uuid.uuid4().hex}"
+            gen, count = await self._flush_script(keys=[gen_key, registry, garbage], args=[self.default_ttl])
+            self._generations[namespace] = int(gen)
+            count = int(count)
+            if count:
+                task = asyncio.create_task(self._unlink_registered(garbage))
+                self._cleanup_tasks.add(task)
+                task.add_done_callback(self._cleanup_tasks.discard)
+            return count
+        except Exception as e:
+            logger.error(f"Redis命名空间失效失败: {e}")
+            return 0
+
+    async def _unlink_batch(self, keys: List[Any]) -> int:
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.unlink(key)
+        return sum(int(n or 0) for n in await pipe.execute())
+
+    async def _unlink_registered(self, set_key: str) -> int:
+        """按 ZSCAN 分批 UNLINK 登记集合中的键，最后删除集合本身"""
+        removed = 0
+        try:
+            batch: List[Any] = []
+            async for member, _ in self.redis.zscan_iter(set_key, count=self.scan_batch_size):
+                batch.append(member)
+                if len(batch) >= self.scan_batch_size:
+                    removed += await self._unlink_batch(batch)
+                    batch = []
+            if batch:
+                removed += await self._unlink_batch(batch)
+            await self.redis.unlink(set_key)
+        except Exception as e:
+            logger.warning(f"回收失效缓存键失败（键将随TTL过期）: {e}")
+        return removed
+
+    async def _unlink_matching(self, match: str) -> int:
+        """按 SCAN 分批 UNLINK 匹配的键（不阻塞Redis）"""
+        removed = 0
+        batch: List[Any] = []
+        async for key in self.redis.scan_iter(match=match, count=self.scan_batch_size):
+            batch.append(key)
+            if len(batch) >= self.scan_batch_size:
+                removed += await self._unlink_batch(batch)
+                batch = []
+        if batch:
+            removed += await self._unlink_batch(batch)
+        return removed
+
     async def clear(self, pattern: Optional[str] = None) -> int:
         """清理缓存"""
         try:
             if pattern is None:
                 # 删除所有带前缀的键
-                pattern = f"{self.key_prefix}*"
-            else:
-                pattern = f"{self.key_prefix}{pattern}"
+                return await self._unlink_matching(f"{self.key_prefix}*")
 
-            keys = await self.redis.keys(pattern)
-            if keys:
-                return await self.redis.delete(*keys)
-            return 0
+            namespace = _namespace_pattern(pattern)
+            if namespace is not None:
+                return await self.clear_namespace(namespace)
+
+            if not pattern.startswith("tenant:"):
+                return await self._unlink_matching(f"{self.key_prefix}{pattern}")
+
+            end = pattern.find(":", len("tenant:"))
+            namespace, rest = (pattern, "*") if end < 0 else (pattern[:end], pattern[end + 1:])
+            if any(c in namespace for c in "*?[]\\"):
+                # 跨租户的模式：SCAN 所有代的版本化键
+                return await self._unlink_matching(f"{self.key_prefix}{{{namespace}}}:g*:{rest}")
+            return await self._clear_registered(namespace, rest)
         except Exception as e:
             logger.error(f"Redis清理缓存失败: {e}")
             return 0
 
+    async def _clear_registered(self, namespace: str, rest: str) -> int:
+        """在租户当前代的键登记集合中按模式匹配并删除（只访问该租户的键）"""
+        gen_key, registry = self._namespace_keys(namespace)
+        gen = int(await self.redis.get(gen_key) or 0)
+        match = f"{self.key_prefix}{{{namespace}}}:g{gen}:{rest}"
+
+        keys: List[Any] = []
+        async for member, _ in self.redis.zscan_iter(registry, match=match, count=self.scan_batch_size):
+            keys.append(member)
+
+        removed = 0
+        for start in range(0, len(keys), self.scan_batch_size):
+            batch = keys[start:start + self.scan_batch_size]
+            await self.redis.zrem(registry, *batch)
+            removed += await self._unlink_batch(batch)
+        return removed
+
     async def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
         try:
@@ -404,7 +684,8 @@ class TenantCacheKeyGenerator:
         if session_id:
             content += f":{session_id}"
         content_hash = hashlib.md5(content.encode('utf-8')).hexdigest()
-        return f"v2:query:{content_hash}"
+        # 放在租户命名空间下，clear_tenant_cache 可一并失效
+        return f"tenant:{tenant_id}:v2:query:{content_hash}"
 
     @staticmethod
     def generate_v2_session_key(tenant_id: str, session_id: str) -> str:
@@ -421,6 +702,28 @@ class TenantCacheKeyGenerator:
         return f"v2:session:{tenant_id}:{session_id}"
 
 
+# 按URL共享的 redis.asyncio 连接池（缓存、限流、并发槽位共用）
+_redis_pools: Dict[str, Any] = {}
+
+
+def get_redis_pool(redis_url: str, max_connections: int = 50, **kwargs) -> Any:
+    """
+    获取（或创建）共享的 redis.asyncio 连接池
+
+    Args:
+        redis_url: Redis连接URL
+        max_connections: 连接池大小上限（仅首次创建时生效）
+        **kwargs: 其他连接参数（socket_timeout等）
+    """
+    pool = _redis_pools.get(redis_url)
+    if pool is None:
+        import redis.asyncio as aioredis
+
+        pool = aioredis.ConnectionPool.from_url(redis_url, max_connections=max_connections, **kwargs)
+        _redis_pools[redis_url] = pool
+    return pool
+
+
 class CacheFactory:
     """缓存工厂类"""
 
@@ -439,7 +742,8 @@ class CacheFactory:
         if cache_type.lower() == "memory":
             max_size = kwargs.get("max_size", 1000)
             default_ttl = kwargs.get("default_ttl", 3600)
-            return MemoryCache(max_size=max_size, default_ttl=default_ttl)
+            max_bytes = kwargs.get("max_bytes", settings.memory_cache_max_bytes)
+            return MemoryCache(max_size=max_size, default_ttl=default_ttl, max_bytes=max_bytes)
 
         elif cache_type.lower() == "redis":
             try:
@@ -450,8 +754,20 @@ class CacheFactory:
                 default_ttl = kwargs.get("default_ttl", 3600)
                 key_prefix = kwargs.get("key_prefix", "dataagent:")
 
-                redis_client = await aioredis.from_url(redis_url)
-                return RedisCache(redis_client, default_ttl=default_ttl, key_prefix=key_prefix)
+                pool = get_redis_pool(
+                    redis_url,
+                    max_connections=kwargs.get("max_connections", settings.redis_max_connections),
+                    socket_timeout=kwargs.get("socket_timeout", settings.redis_socket_timeout),
+                    socket_connect_timeout=kwargs.get("socket_connect_timeout", settings.redis_socket_connect_timeout),
+                )
+                redis_client = aioredis.Redis(connection_pool=pool)
+                await redis_client.ping()
+                codec = CacheCodec(
+                    serializer=kwargs.get("serializer", settings.cache_serializer),
+                    compression=kwargs.get("compression", settings.cache_compression),
+                    compress_min_bytes=kwargs.get("compress_min_bytes", settings.cache_compress_min_bytes),
+                )
+                return RedisCache(redis_client, default_ttl=default_ttl, key_prefix=key_prefix, codec=codec)
 
             except ImportError:
                 logger.warning("Redis不可用，回退到内存缓存")
@@ -520,6 +836,11 @@ class CacheManager:
         key = self.key_gen.generate_schema_key(tenant_id, db_connection_id)
         return await self.cache.set(key, schema, ttl)
 
+    async def delete_tenant_schema(self, tenant_id: str, db_connection_id: int) -> bool:
+        """删除租户数据库schema缓存"""
+        key = self.key_gen.generate_schema_key(tenant_id, db_connection_id)
+        return await self.cache.delete(key)
+
     async def get_query_result(self, tenant_id: str, query: str, sql: str) -> Optional[Dict[str, Any]]:
         """获取查询结果缓存"""
         key = self.key_gen.generate_query_cache_key(tenant_id, query, sql)
@@ -532,9 +853,17 @@ class CacheManager:
         return await self.cache.set(key, result, ttl)
 
     async def clear_tenant_cache(self, tenant_id: str) -> int:
-        """清理租户的所有缓存"""
-        pattern = f"tenant:{tenant_id}:*"
-        return await self.cache.clear(pattern)
+        """清理租户的所有缓存（Redis下为O(1)的代数递增）"""
+        count = await self.cache.clear_namespace(f"tenant:{tenant_id}")
+
+        # 仅在AgentV2已加载时一并失效其进程内响应缓存
+        response_cache_module = sys.modules.get("AgentV2.core.response_cache")
+        if response_cache_module is not None:
+            try:
+                count += response_cache_module.get_response_cache().invalidate_tenant(tenant_id)
+            except Exception as e:
+                logger.warning(f"Failed to invalidate AgentV2 response cache for {tenant_id}: {e}")
+        return count
 
     async def get_cache_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
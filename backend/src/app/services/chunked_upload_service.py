@@ -5,9 +5,10 @@
 **文件名**: chunked_upload_service.py
 **职责**: Story 2.4性能优化 - 支持大文件分块上传、断点续传、并发上传、完整性校验
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 分块上传服务（Story 2.4）
+- v1.1.0 (2026-10-16): 会话清单持久化到MinIO（多worker共享、重启保留）；分块并行上传；流式合并（增量SHA256 + 临时文件）
 
 ## [INPUT]
 - **tenant_id: str** - 租户ID
@@ -57,10 +58,12 @@
   - SESSION_TIMEOUT: 24小时
 - **分块大小计算**: calculate_chunk_size（<10MB不分块, 10-100MB分5MB, 100MB-1GB分10MB, >1GB分20MB）
 - **校验和算法**: 文件SHA256, 分块MD5
-- **存储**: active_sessions字典, chunk_data字典（生产环境应使用Redis）
-- **MinIO存储**: upload-chunks桶，路径chunks/{session_id}/chunk_####.dat
+- **存储**: UploadSessionStore - 会话清单写入MinIO（chunks/{session_id}/manifest.json），创建后不再修改；
+  分块完成状态由分块对象是否存在推导，不维护共享计数器，多worker并发上传无竞争；进程内仅缓存清单
+- **MinIO存储**: upload-chunks桶，路径chunks/{session_id}/chunk_####
 - **验证**: 分块大小验证、校验和验证
-- **合并**: 完成时从MinIO下载所有分块并合并
+- **合并**: 按序下载分块（预取MAX_CONCURRENT_CHUNKS个），增量计算SHA256并写入SpooledTemporaryFile，
+  内存峰值与分块大小相关、与文件大小无关
 - **清理**: cleanup_session删除MinIO分块文件和会话数据
 - **过期清理**: cleanup_expired_sessions清理24小时前的会话
 
@@ -68,17 +71,17 @@
 - **校验和计算**: hashlib.sha256(file_data).hexdigest()计算文件校验和，hashlib.md5计算分块校验和
 - **分块计算**: (file_size + chunk_size - 1) // chunk_size计算分块数量
 - **UUID生成**: str(uuid.uuid4())生成会话ID
-- **字典操作**: self.active_sessions[session_id] = session保存会话，self.chunk_data[session_id] = chunks保存分块
+- **清单写入**: UploadSessionStore.save写入MinIO manifest.json
 - **时间戳**: datetime.utcnow()记录created_at和updated_at
 - **对象创建**: UploadSession和ChunkInfo创建
 - **循环切片**: for i in range(total_chunks): file_data[start_byte:end_byte]分割文件
-- **MinIO上传**: minio_service.upload_file上传分块到upload-chunks桶
+- **MinIO上传**: minio_service.upload_file上传分块到upload-chunks桶（asyncio.to_thread，不阻塞事件循环）
 - **状态更新**: chunk.status = ChunkStatus.UPLOADING/COMPLETED/FAILED
-- **计数器更新**: session.completed_chunks += 1, session.failed_chunks += 1
+- **状态推导**: minio_service.list_files列出已上传分块，得到completed_chunks
 - **MinIO下载**: minio_service.download_file下载分块
-- **文件合并**: complete_file_data += chunk_data合并分块
+- **文件合并**: hashlib.sha256().update + 临时文件写入（磁盘溢出阈值SPOOL_MAX_SIZE）
 - **DocumentService调用**: document_service.upload_document保存完整文件
-- **字典删除**: self.active_sessions.pop(session_id)删除会话
+- **清单删除**: cleanup_session删除分块对象和manifest.json
 - **异常处理**: try-except捕获所有异常，返回错误信息
 - **全局单例**: chunked_upload_service全局实例
 
@@ -89,16 +92,19 @@
 """
 
 import asyncio
+import inspect
+import io
 import uuid
 import hashlib
 import json
-from typing import Optional, List, Dict, Any, AsyncGenerator
+import tempfile
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, BinaryIO
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
 
 from src.app.services.minio_client import minio_service
 from src.app.core.logging import get_logger
@@ -154,20 +160,160 @@ class UploadSession:
     failed_chunks: int = 0
 
 
+class UploadSessionStore:
+    """
+    上传会话存储
+
+    会话与分块清单以JSON写入MinIO（chunks/{session_id}/manifest.json），与分块对象放在一起，
+    进程重启后可恢复、多个worker共享同一份状态。清单创建后只读；
+    分块是否完成由对应分块对象是否存在决定，并发上传无需锁或共享计数器。
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, bucket_name: str = "upload-chunks"):
+        self.bucket_name = bucket_name
+        # 进程内清单缓存（清单不可变，无需失效）
+        self._manifests: Dict[str, Tuple[UploadSession, Dict[int, ChunkInfo]]] = {}
+
+    @staticmethod
+    def session_prefix(session_id: str) -> str:
+        return f"chunks/{session_id}/"
+
+    def chunk_object_name(self, session_id: str, chunk_number: int) -> str:
+        return f"{self.session_prefix(session_id)}chunk_{chunk_number:04d}"
+
+    def _manifest_object_name(self, session_id: str) -> str:
+        return f"{self.session_prefix(session_id)}{self.MANIFEST_NAME}"
+
+    async def save(self, session: UploadSession, chunks: Dict[int, ChunkInfo]) -> bool:
+        """写入会话清单"""
+        payload = {
+            "session": {
+                "session_id": session.session_id,
+                "tenant_id": session.tenant_id,
+                "file_name": session.file_name,
+                "file_size": session.file_size,
+                "mime_type": session.mime_type,
+                "total_chunks": session.total_chunks,
+                "chunk_size": session.chunk_size,
+                "file_checksum": session.file_checksum,
+                "created_at": session.created_at.isoformat() if session.created_at else None
+            },
+            "chunks": [
+                {
+                    "chunk_number": chunk.chunk_number,
+                    "chunk_size": chunk.chunk_size,
+                    "start_byte": chunk.start_byte,
+                    "end_byte": chunk.end_byte,
+                    "checksum": chunk.checksum
+                }
+                for chunk in chunks.values()
+            ]
+        }
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+        saved = await asyncio.to_thread(
+            minio_service.upload_file,
+            bucket_name=self.bucket_name,
+            object_name=self._manifest_object_name(session.session_id),
+            file_data=io.BytesIO(data),
+            file_size=len(data),
+            content_type="application/json"
+        )
+        if saved:
+            self._manifests[session.session_id] = (session, chunks)
+        return saved
+
+    async def load(self, session_id: str) -> Optional[Tuple[UploadSession, Dict[int, ChunkInfo]]]:
+        """读取会话清单，不存在时返回None"""
+        cached = self._manifests.get(session_id)
+        if cached is not None:
+            return cached
+
+        try:
+            data = await asyncio.to_thread(
+                minio_service.download_file,
+                bucket_name=self.bucket_name,
+                object_name=self._manifest_object_name(session_id)
+            )
+            if not data:
+                return None
+
+            payload = json.loads(data)
+            session_data = payload["session"]
+            created_at = session_data.pop("created_at", None)
+            created_at = datetime.fromisoformat(created_at) if created_at else None
+            session = UploadSession(**session_data, created_at=created_at, updated_at=created_at)
+            chunks = {item["chunk_number"]: ChunkInfo(**item) for item in payload["chunks"]}
+        except Exception as e:
+            logger.warning(f"读取上传会话清单失败: {e}", extra={"session_id": session_id})
+            return None
+
+        self._manifests[session_id] = (session, chunks)
+        return session, chunks
+
+    async def uploaded_chunks(self, session_id: str) -> Dict[int, Optional[datetime]]:
+        """列出已上传的分块，返回 分块编号 -> 最后修改时间"""
+        prefix = f"{self.session_prefix(session_id)}chunk_"
+        objects = await asyncio.to_thread(
+            minio_service.list_files, bucket_name=self.bucket_name, prefix=prefix
+        )
+        uploaded = {}
+        for obj in objects:
+            suffix = obj["name"][len(prefix):]
+            if suffix.isdigit():
+                last_modified = obj.get("last_modified")
+                if last_modified is not None and last_modified.tzinfo is not None:
+                    last_modified = last_modified.replace(tzinfo=None)
+                uploaded[int(suffix)] = last_modified
+        return uploaded
+
+    async def list_session_ids(self) -> List[str]:
+        """列出所有会话ID"""
+        objects = await asyncio.to_thread(
+            minio_service.list_files, bucket_name=self.bucket_name, prefix="chunks/"
+        )
+        session_ids = [
+            obj["name"][len("chunks/"):].rstrip("/")
+            for obj in objects
+            if obj["name"].endswith("/")
+        ]
+        return list(dict.fromkeys(session_ids + list(self._manifests)))
+
+    async def delete(self, session_id: str) -> None:
+        """删除会话的全部分块对象和清单"""
+        self._manifests.pop(session_id, None)
+        objects = await asyncio.to_thread(
+            minio_service.list_files,
+            bucket_name=self.bucket_name,
+            prefix=self.session_prefix(session_id)
+        )
+        for obj in objects:
+            try:
+                await asyncio.to_thread(
+                    minio_service.delete_file,
+                    bucket_name=self.bucket_name,
+                    object_name=obj["name"]
+                )
+            except Exception as e:
+                logger.warning(f"清理分块文件失败: {e}")
+
+
 class ChunkedUploadService:
     """分块上传服务"""
 
-    def __init__(self):
+    def __init__(self, store: Optional[UploadSessionStore] = None):
         # 默认配置
         self.DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024  # 5MB
         self.MAX_CHUNK_SIZE = 50 * 1024 * 1024     # 50MB
         self.MAX_CONCURRENT_CHUNKS = 3
         self.MAX_RETRY_ATTEMPTS = 3
         self.SESSION_TIMEOUT = timedelta(hours=24)  # 24小时
+        self.SPOOL_MAX_SIZE = 16 * 1024 * 1024     # 合并文件超过16MB时溢出到磁盘
 
-        # 内存存储上传会话信息（生产环境应使用Redis）
-        self.active_sessions: Dict[str, UploadSession] = {}
-        self.chunk_data: Dict[str, Dict[int, ChunkInfo]] = {}
+        # 会话清单存储（MinIO持久化，多worker共享）
+        self.store = store or UploadSessionStore()
 
     def calculate_chunk_size(self, file_size: int) -> int:
         """计算最优分块大小"""
@@ -220,15 +366,13 @@ class ChunkedUploadService:
                 updated_at=datetime.utcnow()
             )
 
-            # 保存会话信息
-            self.active_sessions[session_id] = session
-
-            # 准备分块信息
+            # 准备分块信息（memoryview切片不复制数据）
+            view = memoryview(file_data)
             chunks = {}
             for i in range(total_chunks):
                 start_byte = i * chunk_size
                 end_byte = min(start_byte + chunk_size, file_size)
-                chunk_data = file_data[start_byte:end_byte]
+                chunk_data = view[start_byte:end_byte]
 
                 chunk = ChunkInfo(
                     chunk_number=i,
@@ -239,7 +383,9 @@ class ChunkedUploadService:
                 )
                 chunks[i] = chunk
 
-            self.chunk_data[session_id] = chunks
+            # 保存会话清单
+            if not await self.store.save(session, chunks):
+                raise Exception("会话清单写入失败")
 
             logger.info(
                 f"初始化上传会话成功",
@@ -269,15 +415,46 @@ class ChunkedUploadService:
                 "message": "初始化上传会话失败"
             }
 
+    async def _sync_progress(self, session: UploadSession, chunks: Dict[int, ChunkInfo]) -> None:
+        """根据MinIO中已存在的分块对象刷新会话进度（其他worker上传的分块同样可见）"""
+        uploaded = await self.store.uploaded_chunks(session.session_id)
+
+        for number, chunk in chunks.items():
+            if number in uploaded:
+                chunk.status = ChunkStatus.COMPLETED
+                chunk.upload_id = self.store.chunk_object_name(session.session_id, number)
+            elif chunk.status == ChunkStatus.COMPLETED:
+                chunk.status = ChunkStatus.PENDING
+                chunk.upload_id = None
+
+        session.completed_chunks = sum(1 for number in chunks if number in uploaded)
+        session.failed_chunks = sum(1 for chunk in chunks.values() if chunk.status == ChunkStatus.FAILED)
+        timestamps = [ts for ts in uploaded.values() if ts is not None]
+        if timestamps:
+            session.updated_at = max(timestamps)
+
+        if session.completed_chunks == session.total_chunks:
+            session.status = UploadSessionStatus.COMPLETED
+        elif session.completed_chunks > 0:
+            session.status = UploadSessionStatus.UPLOADING
+        else:
+            session.status = UploadSessionStatus.INITIALIZED
+
     async def get_upload_session(self, session_id: str) -> Optional[UploadSession]:
         """获取上传会话"""
-        return self.active_sessions.get(session_id)
+        manifest = await self.store.load(session_id)
+        if manifest is None:
+            return None
+        session, chunks = manifest
+        await self._sync_progress(session, chunks)
+        return session
 
     async def get_chunk_info(self, session_id: str, chunk_number: int) -> Optional[ChunkInfo]:
         """获取分块信息"""
-        if session_id not in self.chunk_data:
+        manifest = await self.store.load(session_id)
+        if manifest is None:
             return None
-        return self.chunk_data[session_id].get(chunk_number)
+        return manifest[1].get(chunk_number)
 
     async def upload_chunk(
         self,
@@ -285,19 +462,26 @@ class ChunkedUploadService:
         chunk_number: int,
         chunk_data: bytes
     ) -> Dict[str, Any]:
-        """上传单个分块"""
+        """
+        上传单个分块
+
+        可对同一会话并发调用（包括在不同worker上）：MinIO写入在线程池中执行，
+        进度由已存在的分块对象推导，重复上传同一分块不会重复计数。
+        """
+        chunk = None
         try:
             # 验证会话
-            session = await self.get_upload_session(session_id)
-            if not session:
+            manifest = await self.store.load(session_id)
+            if not manifest:
                 return {
                     "success": False,
                     "error": "SESSION_NOT_FOUND",
                     "message": "上传会话不存在"
                 }
+            session, chunks = manifest
 
             # 验证分块
-            chunk = await self.get_chunk_info(session_id, chunk_number)
+            chunk = chunks.get(chunk_number)
             if not chunk:
                 return {
                     "success": False,
@@ -314,7 +498,7 @@ class ChunkedUploadService:
                 }
 
             # 验证校验和
-            chunk_checksum = self.calculate_chunk_checksum(chunk_data)
+            chunk_checksum = await asyncio.to_thread(self.calculate_chunk_checksum, chunk_data)
             if chunk_checksum != chunk.checksum:
                 return {
                     "success": False,
@@ -327,13 +511,14 @@ class ChunkedUploadService:
             chunk.retry_count += 1
 
             # 构造分块对象名
-            chunk_object_name = f"chunks/{session.session_id}/chunk_{chunk_number:04d}"
+            chunk_object_name = self.store.chunk_object_name(session_id, chunk_number)
 
             # 上传到MinIO
-            upload_result = minio_service.upload_file(
-                bucket_name="upload-chunks",
+            upload_result = await asyncio.to_thread(
+                minio_service.upload_file,
+                bucket_name=self.store.bucket_name,
                 object_name=chunk_object_name,
-                file_data=chunk_data,
+                file_data=io.BytesIO(chunk_data),
                 file_size=len(chunk_data),
                 content_type="application/octet-stream"
             )
@@ -341,12 +526,7 @@ class ChunkedUploadService:
             if upload_result:
                 chunk.status = ChunkStatus.COMPLETED
                 chunk.upload_id = chunk_object_name
-                session.completed_chunks += 1
-                session.updated_at = datetime.utcnow()
-
-                # 检查是否所有分块都已完成
-                if session.completed_chunks == session.total_chunks:
-                    session.status = UploadSessionStatus.COMPLETED
+                await self._sync_progress(session, chunks)
 
                 logger.info(
                     f"分块上传成功",
@@ -385,7 +565,6 @@ class ChunkedUploadService:
             # 更新分块状态
             if chunk:
                 chunk.status = ChunkStatus.FAILED
-                session.failed_chunks += 1
 
             return {
                 "success": False,
@@ -403,7 +582,7 @@ class ChunkedUploadService:
                 "message": "上传会话不存在"
             }
 
-        chunks = self.chunk_data.get(session_id, {})
+        _, chunks = await self.store.load(session_id)
         chunk_statuses = []
 
         for i in range(session.total_chunks):
@@ -428,6 +607,55 @@ class ChunkedUploadService:
             "chunks": chunk_statuses
         }
 
+    async def _download_chunk(self, session_id: str, chunk_number: int) -> bytes:
+        chunk_data = await asyncio.to_thread(
+            minio_service.download_file,
+            bucket_name=self.store.bucket_name,
+            object_name=self.store.chunk_object_name(session_id, chunk_number)
+        )
+        if chunk_data is None:
+            raise Exception(f"无法下载分块 {chunk_number}")
+        return chunk_data
+
+    @staticmethod
+    def _append_chunk(merged: BinaryIO, digest, chunk_data: bytes) -> None:
+        merged.write(chunk_data)
+        digest.update(chunk_data)
+
+    async def _merge_chunks(self, session: UploadSession) -> Tuple[BinaryIO, str]:
+        """
+        流式合并分块
+
+        按序下载分块（最多预取 MAX_CONCURRENT_CHUNKS 个），边增量计算SHA256边写入临时文件，
+        内存中同时存在的分块数有上限，与文件大小无关。
+
+        Returns:
+            Tuple[BinaryIO, str]: 已回到开头的合并文件（调用方负责关闭）和文件SHA256
+        """
+        merged = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_SIZE)
+        digest = hashlib.sha256()
+        pending = deque()
+
+        try:
+            for chunk_number in range(session.total_chunks):
+                pending.append(asyncio.ensure_future(
+                    self._download_chunk(session.session_id, chunk_number)
+                ))
+                if len(pending) >= self.MAX_CONCURRENT_CHUNKS:
+                    await asyncio.to_thread(self._append_chunk, merged, digest, await pending.popleft())
+
+            while pending:
+                await asyncio.to_thread(self._append_chunk, merged, digest, await pending.popleft())
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            merged.close()
+            raise
+
+        merged.seek(0)
+        return merged, digest.hexdigest()
+
     async def complete_upload(
         self,
         session_id: str,
@@ -451,47 +679,32 @@ class ChunkedUploadService:
                     "message": "文件上传未完成，无法完成合并"
                 }
 
-            # 获取所有分块
-            chunks = self.chunk_data.get(session_id, {})
-            sorted_chunks = [chunks[i] for i in range(session.total_chunks) if chunks[i]]
-
-            # 合并分块数据
-            complete_file_data = b""
-            for chunk in sorted_chunks:
-                chunk_object_name = chunk.upload_id
-                if chunk_object_name:
-                    chunk_data = minio_service.download_file(
-                        bucket_name="upload-chunks",
-                        object_name=chunk_object_name
-                    )
-                    if chunk_data:
-                        complete_file_data += chunk_data
-                    else:
-                        raise Exception(f"无法下载分块 {chunk.chunk_number}")
-                else:
-                    raise Exception(f"分块 {chunk.chunk_number} 未上传")
-
-            # 验证合并后的文件校验和
-            merged_checksum = self.calculate_file_checksum(complete_file_data)
-            if merged_checksum != session.file_checksum:
-                return {
-                    "success": False,
-                    "error": "FILE_CHECKSUM_MISMATCH",
-                    "message": "文件校验和不匹配，可能数据损坏"
-                }
+            # 流式合并分块
+            file_data, merged_checksum = await self._merge_chunks(session)
+            try:
+                # 验证合并后的文件校验和
+                if merged_checksum != session.file_checksum:
+                    return {
+                        "success": False,
+                        "error": "FILE_CHECKSUM_MISMATCH",
+                        "message": "文件校验和不匹配，可能数据损坏"
+                    }
 
-            # 通过DocumentService保存完整文件
-            import io
-            file_data = io.BytesIO(complete_file_data)
-
-            result = await document_service.upload_document(
-                db=db,
-                tenant_id=session.tenant_id,
-                file_data=file_data,
-                file_name=session.file_name,
-                file_size=session.file_size,
-                mime_type=session.mime_type
-            )
+                # 通过DocumentService保存完整文件（同步实现放到线程池，避免大文件写入阻塞事件循环）
+                upload_kwargs = dict(
+                    db=db,
+                    tenant_id=session.tenant_id,
+                    file_data=file_data,
+                    file_name=session.file_name,
+                    file_size=session.file_size,
+                    mime_type=session.mime_type
+                )
+                if inspect.iscoroutinefunction(document_service.upload_document):
+                    result = await document_service.upload_document(**upload_kwargs)
+                else:
+                    result = await asyncio.to_thread(document_service.upload_document, **upload_kwargs)
+            finally:
+                file_data.close()
 
             if result["success"]:
                 # 清理分块数据
@@ -570,32 +783,18 @@ class ChunkedUploadService:
             }
 
     async def cleanup_session(self, session_id: str):
-        """清理上传会话数据"""
+        """清理上传会话数据（MinIO中的分块文件和会话清单）"""
         try:
-            # 清理MinIO中的分块文件
-            chunks = self.chunk_data.get(session_id, {})
-            for chunk in chunks.values():
-                if chunk.upload_id:
-                    try:
-                        minio_service.delete_file(
-                            bucket_name="upload-chunks",
-                            object_name=chunk.upload_id
-                        )
-                    except Exception as e:
-                        logger.warning(f"清理分块文件失败: {e}")
-
-            # 清理会话数据
-            self.active_sessions.pop(session_id, None)
-            self.chunk_data.pop(session_id, None)
-
+            await self.store.delete(session_id)
         except Exception as e:
             logger.error(f"清理会话数据失败: {str(e)}")
 
     async def get_active_sessions(self, tenant_id: str = None) -> List[Dict[str, Any]]:
         """获取活跃的上传会话"""
         sessions = []
-        for session_id, session in self.active_sessions.items():
-            if tenant_id is None or session.tenant_id == tenant_id:
+        for session_id in await self.store.list_session_ids():
+            session = await self.get_upload_session(session_id)
+            if session and (tenant_id is None or session.tenant_id == tenant_id):
                 sessions.append({
                     "session_id": session_id,
                     "tenant_id": session.tenant_id,
@@ -613,7 +812,11 @@ class ChunkedUploadService:
         current_time = datetime.utcnow()
         expired_sessions = []
 
-        for session_id, session in self.active_sessions.items():
+        for session_id in await self.store.list_session_ids():
+            manifest = await self.store.load(session_id)
+            if manifest is None:
+                continue
+            session = manifest[0]
             if session.created_at and (current_time - session.created_at) > self.SESSION_TIMEOUT:
                 expired_sessions.append(session_id)
 
@@ -625,4 +828,4 @@ class ChunkedUploadService:
 
 
 # 创建全局分块上传服务实例
-chunked_upload_service = ChunkedUploadService()
\ No newline at end of file
+chunked_upload_service = ChunkedUploadService()
@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""
+文件数据源列式物化缓存
+========================================
+
+将 Excel / CSV 数据源按内容哈希一次性转换为 Parquet，
+后续查询直接由 DuckDB 扫描 Parquet 文件，不再重复解析工作簿。
+
+特性:
+- 内容哈希作为缓存键：文件内容变化即自动失效
+- 多进程共享：缓存目录位于磁盘，写入采用临时目录 + 原子重命名
+- 对象存储引用：MinIO 对象按 ETag 映射到内容哈希，命中时无需下载
+- 磁盘预算：超出 max_bytes 时按最近访问时间淘汰（LRU）
+
+作者: BMad Master
+版本: 1.0.0
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+CSV_ENCODINGS = ["utf-8", "gbk", "gb2312", "gb18030"]
+
+
+@dataclass
+class CachedSheet:
+    """已物化的单个工作表"""
+    name: str
+    table_name: str
+    parquet_path: str
+    row_count: int
+    columns: List[Dict[str, Any]]
+    sample_rows: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class CachedFile:
+    """已物化的文件（一个或多个工作表）"""
+    content_hash: str
+    file_type: str
+    directory: str
+    sheets: List[CachedSheet]
+
+    def get_sheet(self, name: str) -> Optional[CachedSheet]:
+        """按工作表名或清理后的表名查找（不区分大小写）"""
+        lowered = name.lower()
+        for sheet in self.sheets:
+            if sheet.name.lower() == lowered or sheet.table_name.lower() == lowered:
+                return sheet
+        return None
+
+
+def sanitize_table_name(name: str, prefix: str = "sheet") -> str:
+    """将工作表名转换为 SQL 友好的表名（保留中文）"""
+    clean = re.sub(r'[^\w\u4e00-\u9fff]', '_', str(name))
+    if not clean or clean[0].isdigit():
+        clean = f"{prefix}_{clean}"
+    return clean
+
+
+def _column_type(dtype_str: str) -> str:
+    """将 pandas 数据类型转换为友好的类型描述"""
+    if 'int' in dtype_str:
+        return 'integer'
+    elif 'float' in dtype_str:
+        return 'float'
+    elif 'datetime' in dtype_str:
+        return 'datetime'
+    elif 'bool' in dtype_str:
+        return 'boolean'
+    return 'text'
+
+
+class ColumnarCacheService:
+    """
+    列式物化缓存服务
+
+    目录结构::
+
+        {cache_dir}/
+        ├── objects/{hash[:2]}/{hash}/manifest.json
+        │                            /sheet_0.parquet ...
+        └── refs/{ref_hash}.json     # 外部引用（如 MinIO 对象）→ 内容哈希
+    """
+
+    # 默认缓存目录（相对于 backend 目录）
+    DEFAULT_CACHE_PATH = Path(__file__).parent.parent.parent / "data" / "columnar_cache"
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None, max_bytes: int = 2 * 1024 ** 3):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存根目录，默认 backend/data/columnar_cache
+            max_bytes: 磁盘预算（字节），超出后按 LRU 淘汰
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else self.DEFAULT_CACHE_PATH
+        self.max_bytes = max_bytes
+        try:
+            self._ensure_dirs()
+        except OSError as e:
+            fallback = Path(tempfile.gettempdir()) / "dataagent_columnar_cache"
+            logger.warning(f"缓存目录不可写 {self.cache_dir}: {e}，改用 {fallback}")
+            self.cache_dir = fallback
+            self._ensure_dirs()
+
+        # 本地文件 (path, size, mtime_ns) -> 内容哈希，避免每次重新计算大文件哈希
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "materializations": 0,
+            "evictions": 0,
+            "ref_hits": 0
+        }
+        logger.info(f"ColumnarCacheService initialized, cache dir: {self.cache_dir}")
+
+    def _ensure_dirs(self) -> None:
+        (self.cache_dir / "objects").mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / "refs").mkdir(parents=True, exist_ok=True)
+
+    def _object_dir(self, content_hash: str) -> Path:
+        return self.cache_dir / "objects" / content_hash[:2] / content_hash
+
+    def _ref_path(self, ref: str) -> Path:
+        return self.cache_dir / "refs" / f"{hashlib.sha1(ref.encode('utf-8')).hexdigest()}.json"
+
+    # ------------------------------------------------------------------
+    # 哈希
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def hash_file(self, file_path: str) -> str:
+        """计算本地文件的内容哈希，(路径, 大小, mtime) 不变时复用上次结果"""
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._hash_memo.get(memo_key)
+        if cached:
+            return cached
+
+        sha256_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for byte_block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256_hash.update(byte_block)
+        content_hash = sha256_hash.hexdigest()
+
+        self._remember_hash(memo_key, content_hash)
+        return content_hash
+
+    def _remember_hash(self, memo_key: Tuple[str, int, int], content_hash: str) -> None:
+        with self._lock:
+            if len(self._hash_memo) >= 1024:
+                self._hash_memo.clear()
+            self._hash_memo[memo_key] = content_hash
+
+    # ------------------------------------------------------------------
+    # 查找
+    # ------------------------------------------------------------------
+
+    def get(self, content_hash: str) -> Optional[CachedFile]:
+        """按内容哈希读取已物化的文件，并刷新访问时间"""
+        manifest_path = self._object_dir(content_hash) / MANIFEST_NAME
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+
+        directory = manifest_path.parent
+        sheets = [
+            CachedSheet(
+                name=s["name"],
+                table_name=s["table_name"],
+                parquet_path=str(directory / s["file"]),
+                row_count=s["row_count"],
+                columns=s["columns"],
+                sample_rows=s.get("sample_rows", [])
+            )
+            for s in manifest["sheets"]
+        ]
+        if any(not os.path.exists(s.parquet_path) for s in sheets):
+            return None
+
+        try:
+            os.utime(manifest_path, None)
+        except OSError:
+            pass
+
+        return CachedFile(
+            content_hash=content_hash,
+            file_type=manifest["file_type"],
+            directory=str(directory),
+            sheets=sheets
+        )
+
+    def get_by_ref(self, ref: str, version: str) -> Optional[CachedFile]:
+        """
+        按外部引用查找（例如 MinIO 对象 + ETag）
+
+        Args:
+            ref: 引用标识，如 "data-sources/tenant/file.xlsx"
+            version: 引用版本（ETag），不一致时视为未命中
+        """
+        try:
+            with open(self._ref_path(ref), "r", encoding="utf-8") as f:
+                ref_info = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if ref_info.get("version") != version:
+            return None
+
+        cached = self.get(ref_info["content_hash"])
+        if cached:
+            self.stats["ref_hits"] += 1
+        return cached
+
+    def _write_ref(self, ref: str, version: str, content_hash: str) -> None:
+        ref_path = self._ref_path(ref)
+        tmp_path = ref_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ref": ref, "version": version, "content_hash": content_hash}, f)
+        os.replace(tmp_path, ref_path)
+
+    # ------------------------------------------------------------------
+    # 物化
+    # ------------------------------------------------------------------
+
+    def materialize_file(
+        self,
+        file_path: str,
+        file_type: str,
+        content_hash: Optional[str] = None
+    ) -> CachedFile:
+        """
+        物化本地文件
+
+        Args:
+            file_path: 本地文件路径
+            file_type: xlsx / xls / csv
+            content_hash: 已知的内容哈希（如上传时流式计算所得），提供时不再重读文件计算
+        """
+        if content_hash:
+            stat = os.stat(file_path)
+            self._remember_hash((os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns), content_hash)
+        else:
+            content_hash = self.hash_file(file_path)
+        cached = self.get(content_hash)
+        if cached:
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        with open(file_path, "rb") as f:
+            data = f.read()
+        return self._materialize(data, content_hash, file_type)
+
+    def materialize_bytes(
+        self,
+        data: bytes,
+        file_type: str,
+        ref: Optional[str] = None,
+        ref_version: Optional[str] = None
+    ) -> CachedFile:
+        """
+        物化内存中的文件内容（例如从 MinIO 下载）
+
+        Args:
+            data: 文件字节
+            file_type: xlsx / xls / csv
+            ref: 外部引用标识，提供时记录 ref -> 内容哈希 映射
+            ref_version: 引用版本（ETag）
+        """
+        content_hash = self.hash_bytes(data)
+        cached = self.get(content_hash)
+        if cached:
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            cached = self._materialize(data, content_hash, file_type)
+
+        if ref and ref_version:
+            try:
+                self._write_ref(ref, ref_version, content_hash)
+            except OSError as e:
+                logger.warning(f"写入缓存引用失败 {ref}: {e}")
+        return cached
+
+    def _read_frames(self, data: bytes, file_type: str) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        解析文件为 (工作表名, DataFrame) 列表，跳过空工作表
+
+        CSV 只有一个表，固定命名为 "data"；与数据源名称相关的别名在注册视图时添加，
+        因为同一内容可能被多个数据源共享。
+        """
+        frames: List[Tuple[str, pd.DataFrame]] = []
+        if file_type in ("xlsx", "xls"):
+            excel_file = pd.ExcelFile(io.BytesIO(data), engine='openpyxl')
+            for sheet_name in excel_file.sheet_names:
+                try:
+                    df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
+                except Exception as e:
+                    logger.warning(f"读取Sheet '{sheet_name}' 失败: {e}")
+                    continue
+                if df.empty:
+                    logger.debug(f"跳过空Sheet: {sheet_name}")
+                    continue
+                frames.append((str(sheet_name), df))
+        elif file_type == "csv":
+            for encoding in CSV_ENCODINGS:
+                try:
+                    frames.append(("data", pd.read_csv(io.BytesIO(data), encoding=encoding)))
+                    break
+                except UnicodeDecodeError:
+                    continue
+        else:
+            raise ValueError(f"不支持的文件类型: {file_type}")
+        return frames
+
+    @staticmethod
+    def _coerce_object_columns(df: pd.DataFrame) -> pd.DataFrame:
+        """混合类型的 object 列统一转为字符串，保证可以写入 Parquet"""
+        df = df.copy()
+        df.columns = [str(c) for c in df.columns]
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+        return df
+
+    @staticmethod
+    def _write_parquet(df: pd.DataFrame, path: Path) -> None:
+        import duckdb
+
+        conn = duckdb.connect(':memory:')
+        try:
+            conn.register("frame", df)
+            quoted_path = str(path).replace("'", "''")
+            conn.execute(f"COPY frame TO '{quoted_path}' (FORMAT PARQUET)")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _describe(df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        columns = [
+            {
+                "name": str(col),
+                "type": _column_type(str(df[col].dtype)),
+                "nullable": bool(df[col].isnull().any())
+            }
+            for col in df.columns
+        ]
+        sample_rows = []
+        for _, row in df.head(5).iterrows():
+            sample_rows.append({
+                str(col): (None if pd.isna(row[col]) else str(row[col]))
+                for col in df.columns[:10]
+            })
+        return columns, sample_rows
+
+    def _materialize(self, data: bytes, content_hash: str, file_type: str) -> CachedFile:
+        start = time.time()
+        frames = self._read_frames(data, file_type)
+
+        final_dir = self._object_dir(content_hash)
+        final_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = final_dir.parent / f".{content_hash}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        tmp_dir.mkdir(parents=True)
+
+        try:
+            sheet_entries = []
+            for index, (sheet_name, df) in enumerate(frames):
+                file_name = f"sheet_{index}.parquet"
+                try:
+                    self._write_parquet(df, tmp_dir / file_name)
+                except Exception as e:
+                    logger.info(f"Sheet '{sheet_name}' 直接写入 Parquet 失败 ({e})，转换 object 列后重试")
+                    df = self._coerce_object_columns(df)
+                    self._write_parquet(df, tmp_dir / file_name)
+
+                columns, sample_rows = self._describe(df)
+                sheet_entries.append({
+                    "name": sheet_name,
+                    "table_name": sanitize_table_name(sheet_name, "sheet" if file_type != "csv" else "data"),
+                    "file": file_name,
+                    "row_count": int(len(df)),
+                    "columns": columns,
+                    "sample_rows": sample_rows
+                })
+
+            with open(tmp_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": MANIFEST_VERSION,
+                    "content_hash": content_hash,
+                    "file_type": file_type,
+                    "created_at": time.time(),
+                    "sheets": sheet_entries
+                }, f, ensure_ascii=False, default=str)
+
+            if final_dir.exists() and self.get(content_hash) is None:
+                # 残留的不完整条目（例如进程中途退出）
+                shutil.rmtree(final_dir, ignore_errors=True)
+            try:
+                os.rename(tmp_dir, final_dir)
+            except OSError:
+                # 其他进程已完成同一文件的物化，使用已有结果
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.stats["materializations"] += 1
+        logger.info(
+            f"文件物化完成 {content_hash[:12]}: {len(frames)} 个表, "
+            f"耗时 {time.time() - start:.2f}s"
+        )
+
+        cached = self.get(content_hash)
+        if cached is None:
+            raise RuntimeError(f"物化结果不可读: {final_dir}")
+
+        self.enforce_budget(keep=content_hash)
+        return cached
+
+    # ------------------------------------------------------------------
+    # DuckDB 注册
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def register_views(conn: Any, cached: CachedFile, aliases: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        在 DuckDB 连接中为每个工作表创建指向 Parquet 的视图（零拷贝）
+
+        每个工作表同时以清理后的表名和原始工作表名注册。
+
+        Args:
+            conn: duckdb 连接
+            cached: 已物化文件
+            aliases: 额外别名 {别名: 工作表名}
+
+        Returns:
+            已注册的表名列表
+        """
+        registered: List[str] = []
+
+        def _create(view_name: str, sheet: CachedSheet) -> None:
+            if view_name in registered:
+                return
+            quoted_view = '"' + view_name.replace('"', '""') + '"'
+            quoted_path = sheet.parquet_path.replace("'", "''")
+            try:
+                conn.execute(f"CREATE OR REPLACE VIEW {quoted_view} AS SELECT * FROM read_parquet('{quoted_path}')")
+                registered.append(view_name)
+            except Exception as e:
+                logger.debug(f"注册视图 '{view_name}' 失败: {e}")
+
+        for sheet in cached.sheets:
+            _create(sheet.table_name, sheet)
+            if sheet.name != sheet.table_name:
+                _create(sheet.name, sheet)
+
+        for alias, sheet_name in (aliases or {}).items():
+            sheet = cached.get_sheet(sheet_name)
+            if sheet:
+                _create(alias, sheet)
+
+        return registered
+
+    # ------------------------------------------------------------------
+    # 淘汰
+    # ------------------------------------------------------------------
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        objects_dir = self.cache_dir / "objects"
+        for prefix_dir in objects_dir.iterdir():
+            if not prefix_dir.is_dir():
+                continue
+            for entry_dir in prefix_dir.iterdir():
+                manifest = entry_dir / MANIFEST_NAME
+                if entry_dir.name.startswith(".") or not manifest.exists():
+                    continue
+                try:
+                    size = sum(p.stat().st_size for p in entry_dir.iterdir())
+                    entries.append((manifest.stat().st_mtime, size, entry_dir))
+                except OSError:
+                    continue
+        return entries
+
+    def enforce_budget(self, keep: Optional[str] = None) -> int:
+        """
+        按最近访问时间淘汰，直到总大小不超过 max_bytes
+
+        Args:
+            keep: 不允许淘汰的内容哈希（刚物化的条目）
+
+        Returns:
+            淘汰的条目数
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry_dir.name == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            evicted += 1
+
+        self.stats["evictions"] += evicted
+        if evicted:
+            logger.info(f"列式缓存淘汰 {evicted} 个条目，当前占用 {total} 字节")
+        return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        entries = self._entries()
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": len(entries),
+            "total_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            **self.stats
+        }
+
+
+# 全局服务实例
+_columnar_cache_service: Optional[ColumnarCacheService] = None
+_columnar_cache_lock = threading.Lock()
+
+
+def get_columnar_cache_service() -> ColumnarCacheService:
+    """获取列式缓存服务单例（目录与预算来自配置）"""
+    global _columnar_cache_service
+    if _columnar_cache_service is None:
+        with _columnar_cache_lock:
+            if _columnar_cache_service is None:
+                try:
+                    from src.app.core.config import settings
+                    cache_dir = settings.columnar_cache_dir
+                    max_bytes = settings.columnar_cache_max_bytes
+                except Exception:
+                    cache_dir = os.environ.get("COLUMNAR_CACHE_DIR")
+                    max_bytes = int(os.environ.get("COLUMNAR_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+                _columnar_cache_service = ColumnarCacheService(cache_dir=cache_dir, max_bytes=max_bytes)
+    return _columnar_cache_service
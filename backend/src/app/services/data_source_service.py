@@ -5,9 +5,11 @@
 **文件名**: data_source_service.py
 **职责**: 实现数据源连接的CRUD操作、租户隔离、连接字符串加密解密、连接解析和批量管理功能
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.0.2
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 数据源管理服务
+- v1.0.1 (2026-10-16): DataSourceConnectionInfo 增加 data_source_name，AgentV2 据此为 Excel 注册数据源名别名
+- v1.0.2 (2026-10-16): 更新/删除数据源后同时关闭AgentV2中该数据源的连接池
 
 ## [INPUT]
 - **tenant_id: str** - 租户ID（强制隔离）
@@ -65,6 +67,7 @@
 - **查询过滤**: 自动过滤INACTIVE状态的记录（active_only=True时）
 - **异常抛出**: 租户不存在、名称重复、数据源不存在时抛出ValueError
 - **时间戳更新**: updated_at自动更新
+- **缓存失效**: 更新/删除后使schema目录缓存、AgentV2 Agent池与连接池失效（invalidate_cached_schema）
 
 ## [POS]
 **路径**: backend/src/app/services/data_source_service.py
@@ -74,10 +77,12 @@
 
 import logging
 import os
-from typing import List, Optional, Dict, Any
+import sys
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, select
 from dataclasses import dataclass
 
 try:
@@ -88,6 +93,8 @@ except ImportError as e:
     Tenant = None
     DataSourceConnectionStatus = None
 
+from ..data.database import maybe_await
+
 try:
     from .encryption_service import encryption_service
 except ImportError as e:
@@ -114,7 +121,8 @@ class DataSourceConnectionInfo:
         table_name: Optional[str] - 默认表名/工作表名
         host: Optional[str] - 数据库主机（对于数据库类型）
         port: Optional[int] - 数据库端口（对于数据库类型）
-        database_name: Optional[str] - 数据库名（对于数据库类型）
+        database_name: Optional[str] - 数据库名（对于数据库类型；Excel 为原始文件名）
+        data_source_name: Optional[str] - 数据源名称（用户命名）
     """
     connection_type: str
     connection_string: Optional[str] = None
@@ -124,6 +132,7 @@ class DataSourceConnectionInfo:
     host: Optional[str] = None
     port: Optional[int] = None
     database_name: Optional[str] = None
+    data_source_name: Optional[str] = None
 
 
 class DataSourceService:
@@ -215,7 +224,7 @@ class DataSourceService:
     async def get_data_sources(
         self,
         tenant_id: str,
-        db: Session,
+        db: Union[Session, AsyncSession],
         active_only: bool = True,
         skip: int = 0,
         limit: int = 100
@@ -225,7 +234,7 @@ class DataSourceService:
 
         Args:
             tenant_id: 租户ID
-            db: 数据库会话
+            db: 数据库会话（同步或异步）
             active_only: 是否只获取活跃的数据源
             skip: 跳过的记录数
             limit: 返回的记录数限制
@@ -235,20 +244,22 @@ class DataSourceService:
         """
         logger.info(f"Fetching data sources for tenant '{tenant_id}'")
 
-        query = db.query(DataSourceConnection).filter(
+        stmt = select(DataSourceConnection).where(
             DataSourceConnection.tenant_id == tenant_id
         )
 
         if active_only:
             # 只获取ACTIVE状态的数据源
-            query = query.filter(DataSourceConnection.status == DataSourceConnectionStatus.ACTIVE)
+            stmt = stmt.where(DataSourceConnection.status == DataSourceConnectionStatus.ACTIVE)
         else:
             # 即使选择"所有状态"，也要排除已软删除的INACTIVE状态
-            query = query.filter(DataSourceConnection.status != DataSourceConnectionStatus.INACTIVE)
+            stmt = stmt.where(DataSourceConnection.status != DataSourceConnectionStatus.INACTIVE)
 
-        connections = query.order_by(
+        stmt = stmt.order_by(
             DataSourceConnection.created_at.desc()
-        ).offset(skip).limit(limit).all()
+        ).offset(skip).limit(limit)
+        result = await maybe_await(db.execute(stmt))
+        connections = list(result.scalars().all())
 
         logger.info(f"Found {len(connections)} data sources for tenant '{tenant_id}'")
         return connections
@@ -257,7 +268,7 @@ class DataSourceService:
         self,
         data_source_id: str,
         tenant_id: str,
-        db: Session
+        db: Union[Session, AsyncSession]
     ) -> Optional[DataSourceConnection]:
         """
         根据ID获取数据源连接（确保租户隔离）
@@ -265,19 +276,22 @@ class DataSourceService:
         Args:
             data_source_id: 数据源ID
             tenant_id: 租户ID
-            db: 数据库会话
+            db: 数据库会话（同步或异步）
 
         Returns:
             数据源连接对象或None
         """
         logger.info(f"Fetching data source {data_source_id} for tenant '{tenant_id}'")
 
-        connection = db.query(DataSourceConnection).filter(
-            and_(
-                DataSourceConnection.id == data_source_id,
-                DataSourceConnection.tenant_id == tenant_id
-            )
-        ).first()
+        result = await maybe_await(db.execute(
+            select(DataSourceConnection).where(
+                and_(
+                    DataSourceConnection.id == data_source_id,
+                    DataSourceConnection.tenant_id == tenant_id
+                )
+            ).limit(1)
+        ))
+        connection = result.scalars().first()
 
         if connection:
             logger.info(f"Data source {data_source_id} found for tenant '{tenant_id}'")
@@ -358,6 +372,7 @@ class DataSourceService:
 
         db.commit()
         db.refresh(connection)
+        await self.invalidate_cached_schema(data_source_id, tenant_id)
 
         logger.info(f"Data source {data_source_id} updated successfully")
         return connection
@@ -391,15 +406,54 @@ class DataSourceService:
         connection.updated_at = datetime.now()
 
         db.commit()
+        await self.invalidate_cached_schema(data_source_id, tenant_id)
 
         logger.info(f"Data source {data_source_id} deleted successfully (soft delete)")
         return True
 
+    async def invalidate_cached_schema(self, data_source_id: str, tenant_id: str) -> None:
+        """
+        使数据源的schema目录缓存、语义查询缓存、池化的AgentV2实例及其查询结果缓存失效（数据源更新或删除后调用）
+
+        Args:
+            data_source_id: 数据源ID
+            tenant_id: 租户ID
+        """
+        try:
+            from .schema_catalog_service import get_schema_catalog_service
+            await get_schema_catalog_service().invalidate(tenant_id, data_source_id)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate schema catalog for {data_source_id}: {e}")
+
+        try:
+            from .semantic_query_cache import get_semantic_query_cache
+            semantic_cache = get_semantic_query_cache()
+            if semantic_cache is not None:
+                semantic_cache.invalidate(tenant_id, data_source_id)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate semantic query cache for {data_source_id}: {e}")
+
+        # 仅在AgentV2已加载时失效其Agent池（未加载说明池中没有Agent）
+        agent_factory_module = sys.modules.get("AgentV2.core.agent_factory_v2")
+        if agent_factory_module is not None:
+            try:
+                agent_factory_module.invalidate_agents(tenant_id=tenant_id, connection_id=data_source_id)
+            except Exception as e:
+                logger.warning(f"Failed to invalidate pooled agents for {data_source_id}: {e}")
+
+        # 同理，仅在AgentV2数据库工具已加载时失效其schema缓存、查询结果缓存和连接池
+        database_tools_module = sys.modules.get("AgentV2.tools.database_tools")
+        if database_tools_module is not None:
+            try:
+                database_tools_module.invalidate_connection_cache(data_source_id)
+            except Exception as e:
+                logger.warning(f"Failed to invalidate AgentV2 query cache for {data_source_id}: {e}")
+
     async def get_decrypted_connection_string(
         self,
         data_source_id: str,
         tenant_id: str,
-        db: Session
+        db: Union[Session, AsyncSession]
     ) -> str:
         """
         获取解密后的连接字符串
@@ -407,7 +461,7 @@ class DataSourceService:
         Args:
             data_source_id: 数据源ID
             tenant_id: 租户ID
-            db: 数据库会话
+            db: 数据库会话（同步或异步）
 
         Returns:
             解密后的连接字符串
@@ -614,7 +668,8 @@ class DataSourceService:
                 file_path=file_path,
                 sheets=sheet_names,
                 table_name=sheet_names[0] if sheet_names else None,  # 默认第一个工作表
-                database_name=connection.database_name  # 原始文件名
+                database_name=connection.database_name,  # 原始文件名
+                data_source_name=connection.name
             )
 
         except FileNotFoundError as e:
@@ -645,7 +700,8 @@ class DataSourceService:
             connection_string=connection_string,
             host=connection.host,
             port=connection.port,
-            database_name=connection.database_name
+            database_name=connection.database_name,
+            data_source_name=connection.name
         )
 
 
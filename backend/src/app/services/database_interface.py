@@ -5,9 +5,13 @@
 **文件名**: database_interface.py
 **职责**: 支持多种数据库类型的统一接口，为RAG-SQL服务提供数据库抽象层
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.3.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 数据库适配器接口
+- v1.1.0: get_schema_info 改为批量目录查询，行数使用统计估算值
+- v1.2.0: 新增 get_schema_fingerprint，用于schema缓存失效判断
+- v1.3.0 (2026-10-16): execute_query 新增 max_rows 有界读取（游标/fetchmany，has_more 标记截断）；
+  explain_query 新增 analyze 参数（False 时不执行查询）；修复 PostgreSQL 计划成本/行数解析
 
 ## [INPUT]
 - **connection_string: str** - 数据库连接字符串
@@ -17,6 +21,8 @@
 - **timeout: int** - 查询超时时间（秒）
 - **table_name: str** - 表名
 - **limit: int** - 限制数量
+- **max_rows: Optional[int]** - execute_query 最多读取的行数（None 表示全部）
+- **analyze: bool** - explain_query 是否实际执行（仅 PostgreSQL 的 EXPLAIN ANALYZE）
 
 ## [OUTPUT]
 - **bool**: 连接/测试连接成功
@@ -33,7 +39,7 @@
   - row_count: 行数
   - execution_time: 执行时间（秒）
   - affected_rows: 影响行数
-  - has_more: 是否有更多数据
+  - has_more: 是否有更多数据（指定 max_rows 且结果超出时为 True）
 - **QueryPlan**: 查询执行计划
   - plan_id: 计划ID
   - query: 查询语句
@@ -70,21 +76,25 @@
   - get_database_type: 获取数据库类型
   - get_table_sample: 获取表样本
   - get_table_statistics: 获取表统计
+  - get_schema_fingerprint: schema指纹（默认None，各适配器可覆盖）
 - **PostgreSQL适配器**: PostgreSQLAdapter
   - asyncpg连接池（min_size=1, max_size=10）
   - 支持参数化查询（$1, $2...）
-  - EXPLAIN (FORMAT JSON, ANALYZE, BUFFERS)
-  - information_schema查询表/列/主键/外键
+  - EXPLAIN (FORMAT JSON, ANALYZE, BUFFERS)；analyze=False 时 EXPLAIN (FORMAT JSON)，只估算不执行
+  - max_rows: 只读事务内用游标读取 max_rows + 1 行
+  - pg_class/information_schema/pg_constraint批量查询表/列/主键/外键
 - **MySQL适配器**: MySQLAdapter
   - aiomysql连接池（minsize=1, maxsize=10）
   - 支持参数化查询（%s占位符）
   - EXPLAIN FORMAT=JSON
+  - max_rows: SSDictCursor（服务端游标）fetchmany
   - information_schema查询
 - **SQLite适配器**: SQLiteDatabaseAdapter
   - aiosqlite连接（支持:memory:）
   - 支持参数化查询（?占位符）
   - EXPLAIN QUERY PLAN
-  - PRAGMA table_info/foreign_key_list/index_list
+  - max_rows: fetchmany（逐行步进，读满即停止）
+  - pragma_table_info/pragma_foreign_key_list表值函数批量查询，PRAGMA index_list
   - sqlite_master查询
 - **连接池管理**: 连接复用和自动释放
 - **异步上下文管理器**: async with conn/acquire()自动释放连接
@@ -112,11 +122,10 @@
 - **条件过滤**: WHERE table_schema NOT IN ('information_schema', 'pg_catalog')过滤系统表
 - **字符串解析**: urllib.parse.urlparse解析MySQL连接字符串
 - **字典构建**: {**default_config, **model_config}合并配置
-- **列表推导式**: [row["column_name"] for row in await conn.fetch(pk_query)]提取主键列
-- **外键映射**: {row["column_name"]: {...} for row in fk_info}构建外键字典
+- **目录组装**: _build_table_infos将批量查询结果组装为TableInfo和关系列表
 - **PRAGMA查询**:
-  - PRAGMA table_info('{table_name}')获取列信息
-  - PRAGMA foreign_key_list('{table_name}')获取外键
+  - sqlite_master JOIN pragma_table_info(name)一次获取所有列
+  - sqlite_master JOIN pragma_foreign_key_list(name)一次获取所有外键
   - PRAGMA index_list('{table_name}')获取索引
 - **数据类型映射**:
   - PostgreSQL: information_schema.columns.data_type
@@ -126,7 +135,10 @@
   - PostgreSQL: information_schema.table_constraints
   - MySQL: column_key == "PRI"/referenced_table_name IS NOT NULL
   - SQLite: PRAGMA的pk字段（1=主键）/foreign_key_list
-- **行数统计**: SELECT COUNT(*) FROM {table_name}
+- **行数统计**（估算值，不扫描表）:
+  - PostgreSQL: pg_class.reltuples（未ANALYZE时为None）
+  - MySQL: information_schema.tables.table_rows
+  - SQLite: sqlite_stat1（未ANALYZE时为None）
 - **统计信息**:
   - PostgreSQL: pg_stats, pg_size_pretty
   - MySQL: information_schema.tables, information_schema.statistics
@@ -155,6 +167,13 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 
+def _bound_rows(rows: List[Any], max_rows: Optional[int]) -> Tuple[List[Any], bool]:
+    """按 max_rows 截断（调用方多读一行），返回 (rows, has_more)"""
+    if max_rows is None or len(rows) <= max_rows:
+        return rows, False
+    return rows[:max_rows], True
+
+
 class DatabaseType(Enum):
     """支持的数据库类型"""
     POSTGRESQL = "postgresql"
@@ -222,6 +241,70 @@ class QueryPlan:
     estimated_rows: Optional[int] = None
 
 
+def _build_table_infos(
+    tables: List[Dict[str, Any]],
+    columns: Dict[str, List[Dict[str, Any]]],
+    primary_keys: Dict[str, set],
+    foreign_keys: Dict[str, Dict[str, Dict[str, str]]]
+) -> Tuple[Dict[str, TableInfo], List[Dict[str, Any]]]:
+    """
+    将批量查询得到的目录数据组装为TableInfo和关系列表
+
+    Args:
+        tables: 表记录列表（name, table_type, row_count, description）
+        columns: 表名 → 按列序排列的列记录
+        primary_keys: 表名 → 主键列名集合
+        foreign_keys: 表名 → {列名: {"foreign_table", "foreign_column"}}
+
+    Returns:
+        (表名→TableInfo, 外键关系列表)
+    """
+    table_infos: Dict[str, TableInfo] = {}
+    relationships: List[Dict[str, Any]] = []
+
+    for table in sorted(tables, key=lambda t: t["name"]):
+        table_name = table["name"]
+        table_pks = primary_keys.get(table_name, set())
+        table_fks = foreign_keys.get(table_name, {})
+
+        column_infos = []
+        for col in columns.get(table_name, []):
+            fk_info_for_col = table_fks.get(col["name"])
+            is_fk = fk_info_for_col is not None
+            column_infos.append(ColumnInfo(
+                name=col["name"],
+                data_type=col["data_type"],
+                is_nullable=col["is_nullable"],
+                default_value=col.get("default_value"),
+                is_primary_key=col["name"] in table_pks,
+                is_foreign_key=is_fk,
+                foreign_table=fk_info_for_col["foreign_table"] if is_fk else None,
+                foreign_column=fk_info_for_col["foreign_column"] if is_fk else None,
+                max_length=col.get("max_length"),
+                precision=col.get("precision"),
+                scale=col.get("scale")
+            ))
+
+        table_infos[table_name] = TableInfo(
+            name=table_name,
+            table_type=table["table_type"],
+            row_count=table.get("row_count"),
+            columns=column_infos,
+            description=table.get("description") or None
+        )
+
+        for from_column, fk in table_fks.items():
+            relationships.append({
+                "from_table": table_name,
+                "from_column": from_column,
+                "to_table": fk["foreign_table"],
+                "to_column": fk["foreign_column"],
+                "relationship_type": "foreign_key"
+            })
+
+    return table_infos, relationships
+
+
 class DatabaseInterface(ABC):
     """数据库接口抽象基类"""
 
@@ -252,13 +335,13 @@ class DatabaseInterface(ABC):
 
     @abstractmethod
     async def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None,
-                          timeout: int = 30) -> QueryResult:
-        """执行SQL查询"""
+                          timeout: int = 30, max_rows: Optional[int] = None) -> QueryResult:
+        """执行SQL查询（max_rows 仅用于只读查询，超出部分不读取，QueryResult.has_more 为 True）"""
         pass
 
     @abstractmethod
-    async def explain_query(self, query: str) -> QueryPlan:
-        """获取查询执行计划"""
+    async def explain_query(self, query: str, analyze: bool = True) -> QueryPlan:
+        """获取查询执行计划（analyze=False 时保证不执行查询）"""
         pass
 
     @abstractmethod
@@ -281,6 +364,14 @@ class DatabaseInterface(ABC):
         """获取表统计信息"""
         pass
 
+    async def get_schema_fingerprint(self) -> Optional[str]:
+        """
+        获取schema指纹（廉价的目录校验值，表/列/约束变化时改变）
+
+        用于判断缓存的schema是否仍然有效，不支持时返回None。
+        """
+        return None
+
 
 class PostgreSQLAdapter(DatabaseInterface):
     """PostgreSQL数据库适配器"""
@@ -333,8 +424,22 @@ class PostgreSQLAdapter(DatabaseInterface):
         """获取数据库类型"""
         return DatabaseType.POSTGRESQL
 
+    # 关系类型 → information_schema.tables.table_type 的对应值
+    _RELKIND_TABLE_TYPES = {
+        "r": "BASE TABLE",
+        "p": "BASE TABLE",
+        "v": "VIEW",
+        "m": "MATERIALIZED VIEW",
+        "f": "FOREIGN",
+    }
+
     async def get_schema_info(self) -> SchemaInfo:
-        """获取PostgreSQL schema信息"""
+        """
+        获取PostgreSQL schema信息
+
+        整个目录通过固定数量的集合查询获取（表、列、约束各一次），
+        行数使用 pg_class.reltuples 统计估算值，不再逐表 COUNT(*)。
+        """
         try:
             if not self._connection:
                 raise Exception("数据库未连接")
@@ -346,104 +451,100 @@ class PostgreSQLAdapter(DatabaseInterface):
                            version() as version
                 """)
 
-                # 获取所有表和视图
-                tables_query = """
-                    SELECT table_name, table_type
-                    FROM information_schema.tables
-                    WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
-                    ORDER BY table_name
-                """
-                tables = await conn.fetch(tables_query)
-
-                # 构建表信息
-                table_infos = {}
-                for table_record in tables:
-                    table_name = table_record["table_name"]
-                    table_type = table_record["table_type"]
-
-                    # 获取列信息
-                    columns_query = """
-                        SELECT column_name, data_type, is_nullable,
-                               column_default, character_maximum_length,
-                               numeric_precision, numeric_scale
-                        FROM information_schema.columns
-                        WHERE table_name = $1
-                        ORDER BY ordinal_position
-                    """
-                    columns = await conn.fetch(columns_query, table_name)
-
-                    # 获取主键信息
-                    pk_query = """
-                        SELECT kcu.column_name
-                        FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu
-                             ON tc.constraint_name = kcu.constraint_name
-                        WHERE tc.table_name = $1
-                              AND tc.constraint_type = 'PRIMARY KEY'
-                    """
-                    pk_columns = [row["column_name"] for row in await conn.fetch(pk_query, table_name)]
-
-                    # 获取外键信息
-                    fk_query = """
-                        SELECT kcu.column_name,
-                               ccu.table_name AS foreign_table_name,
-                               ccu.column_name AS foreign_column_name
-                        FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu
-                             ON tc.constraint_name = kcu.constraint_name
-                        JOIN information_schema.constraint_column_usage ccu
-                             ON ccu.constraint_name = tc.constraint_name
-                        WHERE tc.table_name = $1
-                              AND tc.constraint_type = 'FOREIGN KEY'
-                    """
-                    fk_info = await conn.fetch(fk_query, table_name)
-                    fk_columns = {row["column_name"]: {
-                        "foreign_table": row["foreign_table_name"],
-                        "foreign_column": row["foreign_column_name"]
-                    } for row in fk_info}
-
-                    # 获取表行数
-                    row_count = await conn.fetchval(f"SELECT COUNT(*) FROM {table_name}")
-
-                    # 构建列信息对象
-                    column_infos = []
-                    for col in columns:
-                        is_pk = col["column_name"] in pk_columns
-                        fk_info_for_col = fk_columns.get(col["column_name"])
-                        is_fk = fk_info_for_col is not None
-
-                        column_infos.append(ColumnInfo(
-                            name=col["column_name"],
-                            data_type=col["data_type"],
-                            is_nullable=col["is_nullable"] == "YES",
-                            default_value=col["column_default"],
-                            is_primary_key=is_pk,
-                            is_foreign_key=is_fk,
-                            foreign_table=fk_info_for_col["foreign_table"] if is_fk else None,
-                            foreign_column=fk_info_for_col["foreign_column"] if is_fk else None,
-                            max_length=col["character_maximum_length"],
-                            precision=col["numeric_precision"],
-                            scale=col["numeric_scale"]
-                        ))
-
-                    table_infos[table_name] = TableInfo(
-                        name=table_name,
-                        table_type=table_type,
-                        row_count=row_count,
-                        columns=column_infos
-                    )
+                # 获取所有表和视图（含行数估算值），同名表优先保留 public schema
+                tables = await conn.fetch("""
+                    SELECT n.nspname AS table_schema,
+                           c.relname AS table_name,
+                           c.relkind::text AS relkind,
+                           CASE WHEN c.relkind IN ('r', 'p', 'm') AND c.reltuples >= 0
+                                THEN c.reltuples::bigint END AS estimated_rows,
+                           obj_description(c.oid, 'pg_class') AS description
+                    FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+                      AND NOT c.relispartition
+                      AND n.nspname NOT IN ('information_schema', 'pg_catalog')
+                      AND n.nspname NOT LIKE 'pg_toast%'
+                      AND n.nspname NOT LIKE 'pg_temp%'
+                      AND has_table_privilege(c.oid, 'SELECT')
+                    ORDER BY n.nspname <> 'public', n.nspname, c.relname
+                """)
 
-                # 获取关系信息
-                relationships = []
-                for fk_query_result in fk_info:
-                    relationships.append({
-                        "from_table": table_name,
-                        "from_column": fk_query_result["column_name"],
-                        "to_table": fk_query_result["foreign_table_name"],
-                        "to_column": fk_query_result["foreign_column_name"],
-                        "relationship_type": "foreign_key"
+                table_records = []
+                selected = set()
+                seen_names = set()
+                for row in tables:
+                    if row["table_name"] in seen_names:
+                        continue
+                    seen_names.add(row["table_name"])
+                    selected.add((row["table_schema"], row["table_name"]))
+                    table_records.append({
+                        "name": row["table_name"],
+                        "table_type": self._RELKIND_TABLE_TYPES.get(row["relkind"], "BASE TABLE"),
+                        "row_count": row["estimated_rows"],
+                        "description": row["description"]
                     })
 
+                # 一次性获取所有列
+                column_rows = await conn.fetch("""
+                    SELECT table_schema, table_name, column_name, data_type, is_nullable,
+                           column_default, character_maximum_length,
+                           numeric_precision, numeric_scale
+                    FROM information_schema.columns
+                    WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
+                    ORDER BY table_schema, table_name, ordinal_position
+                """)
+                columns: Dict[str, List[Dict[str, Any]]] = {}
+                for col in column_rows:
+                    if (col["table_schema"], col["table_name"]) not in selected:
+                        continue
+                    columns.setdefault(col["table_name"], []).append({
+                        "name": col["column_name"],
+                        "data_type": col["data_type"],
+                        "is_nullable": col["is_nullable"] == "YES",
+                        "default_value": col["column_default"],
+                        "max_length": col["character_maximum_length"],
+                        "precision": col["numeric_precision"],
+                        "scale": col["numeric_scale"]
+                    })
+
+                # 一次性获取所有主键和外键（复合键按列位置配对）
+                constraint_rows = await conn.fetch("""
+                    SELECT con.contype::text AS constraint_type,
+                           ns.nspname AS table_schema,
+                           cl.relname AS table_name,
+                           att.attname AS column_name,
+                           fcl.relname AS foreign_table_name,
+                           fatt.attname AS foreign_column_name
+                    FROM pg_constraint con
+                    JOIN pg_class cl ON cl.oid = con.conrelid
+                    JOIN pg_namespace ns ON ns.oid = cl.relnamespace
+                    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(attnum, fattnum)
+                    JOIN pg_attribute att
+                         ON att.attrelid = con.conrelid AND att.attnum = k.attnum
+                    LEFT JOIN pg_class fcl ON fcl.oid = con.confrelid
+                    LEFT JOIN pg_attribute fatt
+                         ON fatt.attrelid = con.confrelid AND fatt.attnum = k.fattnum
+                    WHERE con.contype IN ('p', 'f')
+                      AND ns.nspname NOT IN ('information_schema', 'pg_catalog')
+                """)
+                primary_keys: Dict[str, set] = {}
+                foreign_keys: Dict[str, Dict[str, Dict[str, str]]] = {}
+                for row in constraint_rows:
+                    if (row["table_schema"], row["table_name"]) not in selected:
+                        continue
+                    if row["constraint_type"] == "p":
+                        primary_keys.setdefault(row["table_name"], set()).add(row["column_name"])
+                    else:
+                        foreign_keys.setdefault(row["table_name"], {})[row["column_name"]] = {
+                            "foreign_table": row["foreign_table_name"],
+                            "foreign_column": row["foreign_column_name"]
+                        }
+
+                table_infos, relationships = _build_table_infos(
+                    table_records, columns, primary_keys, foreign_keys
+                )
+
                 return SchemaInfo(
                     database_name=db_info["database_name"],
                     database_type=self.get_database_type(),
@@ -457,8 +558,39 @@ class PostgreSQLAdapter(DatabaseInterface):
             logger.error(f"获取PostgreSQL schema信息失败: {e}")
             raise
 
+    async def get_schema_fingerprint(self) -> Optional[str]:
+        """基于系统目录（列定义 + 主外键）计算schema指纹，单次查询"""
+        if not self._connection:
+            raise Exception("数据库未连接")
+
+        async with self._connection.acquire() as conn:
+            return await conn.fetchval("""
+                SELECT
+                    (SELECT md5(coalesce(string_agg(
+                                n.nspname || '.' || c.relname || ':' || c.relkind::text || ':' ||
+                                a.attnum || ':' || a.attname || ':' ||
+                                format_type(a.atttypid, a.atttypmod) || ':' || a.attnotnull::text,
+                                ',' ORDER BY n.nspname, c.relname, a.attnum), ''))
+                     FROM pg_class c
+                     JOIN pg_namespace n ON n.oid = c.relnamespace
+                     JOIN pg_attribute a
+                          ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+                     WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+                       AND n.nspname NOT IN ('information_schema', 'pg_catalog')
+                       AND n.nspname NOT LIKE 'pg_toast%'
+                       AND n.nspname NOT LIKE 'pg_temp%')
+                    || ':' ||
+                    (SELECT md5(coalesce(string_agg(
+                                con.conrelid::regclass::text || ':' || con.contype::text || ':' ||
+                                con.conkey::text || ':' || coalesce(con.confrelid::regclass::text, '') || ':' ||
+                                coalesce(con.confkey::text, ''),
+                                ',' ORDER BY con.conrelid, con.conname), ''))
+                     FROM pg_constraint con
+                     WHERE con.contype IN ('p', 'f'))
+            """)
+
     async def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None,
-                          timeout: int = 30) -> QueryResult:
+                          timeout: int = 30, max_rows: Optional[int] = None) -> QueryResult:
         """执行PostgreSQL查询"""
         try:
             import time
@@ -468,10 +600,15 @@ class PostgreSQLAdapter(DatabaseInterface):
                 raise Exception("数据库未连接")
 
             async with self._connection.acquire() as conn:
-                if params:
-                    result = await conn.fetch(query, *params.values())
+                args = list(params.values()) if params else []
+                if max_rows is None:
+                    result = await conn.fetch(query, *args)
                 else:
-                    result = await conn.fetch(query)
+                    # 游标需要在事务内；多读一行用于判断是否还有更多
+                    async with conn.transaction(readonly=True):
+                        cursor = await conn.cursor(query, *args)
+                        result = await cursor.fetch(max_rows + 1)
+                result, has_more = _bound_rows(result, max_rows)
 
                 execution_time = time.time() - start_time
 
@@ -491,34 +628,41 @@ class PostgreSQLAdapter(DatabaseInterface):
                     data=data,
                     columns=columns,
                     row_count=len(data),
-                    execution_time=execution_time
+                    execution_time=execution_time,
+                    has_more=has_more
                 )
 
         except Exception as e:
             logger.error(f"PostgreSQL查询执行失败: {e}")
             raise
 
-    async def explain_query(self, query: str) -> QueryPlan:
-        """获取PostgreSQL查询执行计划"""
+    async def explain_query(self, query: str, analyze: bool = True) -> QueryPlan:
+        """获取PostgreSQL查询执行计划（analyze=True 时会实际执行查询）"""
         try:
+            import json
+
             if not self._connection:
                 raise Exception("数据库未连接")
 
             async with self._connection.acquire() as conn:
-                # 使用EXPLAIN ANALYZE获取详细执行计划
-                explain_query = f"EXPLAIN (FORMAT JSON, ANALYZE, BUFFERS) {query}"
+                # 使用EXPLAIN ANALYZE获取详细执行计划；只需估算时不加 ANALYZE，查询不会执行
+                options = "FORMAT JSON, ANALYZE, BUFFERS" if analyze else "FORMAT JSON"
+                explain_query = f"EXPLAIN ({options}) {query}"
                 result = await conn.fetchrow(explain_query)
 
                 plan_data = result[0] if result else {}
+                # asyncpg 默认以字符串返回 json 列
+                if isinstance(plan_data, str):
+                    plan_data = json.loads(plan_data)
 
                 # 获取预估成本
                 estimated_cost = None
                 estimated_rows = None
 
                 if isinstance(plan_data, list) and plan_data:
-                    plan = plan_data[0]
+                    plan = plan_data[0].get("Plan", {})
                     estimated_cost = plan.get("Total Cost")
-                    estimated_rows = plan.get("Plan", {}).get("Plan Rows")
+                    estimated_rows = plan.get("Plan Rows")
 
                 return QueryPlan(
                     plan_id=f"pg_plan_{int(datetime.now().timestamp())}",
@@ -668,7 +812,12 @@ class MySQLAdapter(DatabaseInterface):
         return DatabaseType.MYSQL
 
     async def get_schema_info(self) -> SchemaInfo:
-        """获取MySQL schema信息"""
+        """
+        获取MySQL schema信息
+
+        表、列、外键各用一次集合查询获取，行数使用
+        information_schema.tables.table_rows 统计估算值，不再逐表 COUNT(*)。
+        """
         try:
             import aiomysql
 
@@ -681,101 +830,82 @@ class MySQLAdapter(DatabaseInterface):
                     await cursor.execute("SELECT DATABASE() as database_name, VERSION() as version")
                     db_info = await cursor.fetchone()
 
-                    # 获取所有表
+                    # 获取所有表（MySQL 8 的 information_schema 列名为大写，显式指定别名）
                     await cursor.execute("""
-                        SELECT table_name, table_type
+                        SELECT table_name AS table_name,
+                               table_type AS table_type,
+                               table_rows AS table_rows,
+                               table_comment AS table_comment
                         FROM information_schema.tables
                         WHERE table_schema = DATABASE()
                         ORDER BY table_name
                     """)
-                    tables = await cursor.fetchall()
-
-                    # 构建表信息
-                    table_infos = {}
-                    all_relationships = []
-
-                    for table_record in tables:
-                        table_name = table_record["table_name"]
-                        table_type = table_record["table_type"]
-
-                        # 获取列信息
-                        await cursor.execute("""
-                            SELECT column_name, data_type, is_nullable,
-                                   column_default, character_maximum_length,
-                                   numeric_precision, numeric_scale, column_key
-                            FROM information_schema.columns
-                            WHERE table_schema = DATABASE() AND table_name = %s
-                            ORDER BY ordinal_position
-                        """, (table_name,))
-                        columns = await cursor.fetchall()
-
-                        # 获取主键列
-                        pk_columns = [col["column_name"] for col in columns if col["column_key"] == "PRI"]
-
-                        # 获取外键信息
-                        await cursor.execute("""
-                            SELECT column_name,
-                                   referenced_table_name,
-                                   referenced_column_name
-                            FROM information_schema.key_column_usage
-                            WHERE table_schema = DATABASE()
-                              AND table_name = %s
-                              AND referenced_table_name IS NOT NULL
-                        """, (table_name,))
-                        fk_info = await cursor.fetchall()
-                        fk_columns = {row["column_name"]: {
+                    table_records = [
+                        {
+                            "name": row["table_name"],
+                            "table_type": row["table_type"],
+                            "row_count": row["table_rows"] if row["table_type"] == "BASE TABLE" else None,
+                            "description": row["table_comment"]
+                        }
+                        for row in await cursor.fetchall()
+                    ]
+
+                    # 一次性获取所有列
+                    await cursor.execute("""
+                        SELECT table_name AS table_name,
+                               column_name AS column_name,
+                               data_type AS data_type,
+                               is_nullable AS is_nullable,
+                               column_default AS column_default,
+                               character_maximum_length AS character_maximum_length,
+                               numeric_precision AS numeric_precision,
+                               numeric_scale AS numeric_scale,
+                               column_key AS column_key
+                        FROM information_schema.columns
+                        WHERE table_schema = DATABASE()
+                        ORDER BY table_name, ordinal_position
+                    """)
+                    columns: Dict[str, List[Dict[str, Any]]] = {}
+                    primary_keys: Dict[str, set] = {}
+                    for col in await cursor.fetchall():
+                        columns.setdefault(col["table_name"], []).append({
+                            "name": col["column_name"],
+                            "data_type": col["data_type"],
+                            "is_nullable": col["is_nullable"] == "YES",
+                            "default_value": col["column_default"],
+                            "max_length": col["character_maximum_length"],
+                            "precision": col["numeric_precision"],
+                            "scale": col["numeric_scale"]
+                        })
+                        if col["column_key"] == "PRI":
+                            primary_keys.setdefault(col["table_name"], set()).add(col["column_name"])
+
+                    # 一次性获取所有外键
+                    await cursor.execute("""
+                        SELECT table_name AS table_name,
+                               column_name AS column_name,
+                               referenced_table_name AS referenced_table_name,
+                               referenced_column_name AS referenced_column_name
+                        FROM information_schema.key_column_usage
+                        WHERE table_schema = DATABASE()
+                          AND referenced_table_name IS NOT NULL
+                    """)
+                    foreign_keys: Dict[str, Dict[str, Dict[str, str]]] = {}
+                    for row in await cursor.fetchall():
+                        foreign_keys.setdefault(row["table_name"], {})[row["column_name"]] = {
                             "foreign_table": row["referenced_table_name"],
                             "foreign_column": row["referenced_column_name"]
-                        } for row in fk_info}
-
-                        # 获取表行数
-                        await cursor.execute(f"SELECT COUNT(*) as cnt FROM `{table_name}`")
-                        row_count_result = await cursor.fetchone()
-                        row_count = row_count_result["cnt"] if row_count_result else 0
-
-                        # 构建列信息对象
-                        column_infos = []
-                        for col in columns:
-                            is_pk = col["column_name"] in pk_columns
-                            fk_info_for_col = fk_columns.get(col["column_name"])
-                            is_fk = fk_info_for_col is not None
-
-                            column_infos.append(ColumnInfo(
-                                name=col["column_name"],
-                                data_type=col["data_type"],
-                                is_nullable=col["is_nullable"] == "YES",
-                                default_value=col["column_default"],
-                                is_primary_key=is_pk,
-                                is_foreign_key=is_fk,
-                                foreign_table=fk_info_for_col["foreign_table"] if is_fk else None,
-                                foreign_column=fk_info_for_col["foreign_column"] if is_fk else None,
-                                max_length=col["character_maximum_length"],
-                                precision=col["numeric_precision"],
-                                scale=col["numeric_scale"]
-                            ))
-
-                        table_infos[table_name] = TableInfo(
-                            name=table_name,
-                            table_type=table_type,
-                            row_count=row_count,
-                            columns=column_infos
-                        )
+                        }
 
-                        # 收集关系信息
-                        for fk_row in fk_info:
-                            all_relationships.append({
-                                "from_table": table_name,
-                                "from_column": fk_row["column_name"],
-                                "to_table": fk_row["referenced_table_name"],
-                                "to_column": fk_row["referenced_column_name"],
-                                "relationship_type": "foreign_key"
-                            })
+                    table_infos, relationships = _build_table_infos(
+                        table_records, columns, primary_keys, foreign_keys
+                    )
 
                     return SchemaInfo(
                         database_name=db_info["database_name"],
                         database_type=self.get_database_type(),
                         tables=table_infos,
-                        relationships=all_relationships,
+                        relationships=relationships,
                         version=db_info["version"],
                         last_updated=datetime.now()
                     )
@@ -784,8 +914,32 @@ class MySQLAdapter(DatabaseInterface):
             logger.error(f"获取MySQL schema信息失败: {e}")
             raise
 
+    async def get_schema_fingerprint(self) -> Optional[str]:
+        """基于information_schema的列和外键定义计算schema指纹（与顺序无关的校验和）"""
+        if not self._pool:
+            raise Exception("数据库未连接")
+
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT
+                        (SELECT CONCAT(COUNT(*), '-', COALESCE(BIT_XOR(CRC32(CONCAT_WS(':',
+                                    table_name, ordinal_position, column_name,
+                                    column_type, is_nullable, column_key))), 0))
+                         FROM information_schema.columns
+                         WHERE table_schema = DATABASE()),
+                        (SELECT CONCAT(COUNT(*), '-', COALESCE(BIT_XOR(CRC32(CONCAT_WS(':',
+                                    table_name, column_name,
+                                    referenced_table_name, referenced_column_name))), 0))
+                         FROM information_schema.key_column_usage
+                         WHERE table_schema = DATABASE()
+                           AND referenced_table_name IS NOT NULL)
+                """)
+                row = await cursor.fetchone()
+                return ":".join(str(v) for v in row) if row else None
+
     async def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None,
-                          timeout: int = 30) -> QueryResult:
+                          timeout: int = 30, max_rows: Optional[int] = None) -> QueryResult:
         """执行MySQL查询"""
         try:
             import time
@@ -796,8 +950,10 @@ class MySQLAdapter(DatabaseInterface):
             if not self._pool:
                 raise Exception("数据库未连接")
 
+            # 有界读取使用服务端游标，结果不会整体缓冲到客户端
+            cursor_class = aiomysql.DictCursor if max_rows is None else aiomysql.SSDictCursor
             async with self._pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                async with conn.cursor(cursor_class) as cursor:
                     if params:
                         await cursor.execute(query, tuple(params.values()))
                     else:
@@ -806,8 +962,12 @@ class MySQLAdapter(DatabaseInterface):
                     execution_time = time.time() - start_time
 
                     # 检查是否是SELECT等返回数据的查询
-                    if query.strip().upper().startswith(('SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN')):
-                        result = await cursor.fetchall()
+                    if query.strip().upper().startswith(('SELECT', 'WITH', 'SHOW', 'DESCRIBE', 'EXPLAIN')):
+                        if max_rows is None:
+                            result = await cursor.fetchall()
+                        else:
+                            result = await cursor.fetchmany(max_rows + 1)
+                        result, has_more = _bound_rows(result, max_rows)
 
                         if not result:
                             return QueryResult(
@@ -824,7 +984,8 @@ class MySQLAdapter(DatabaseInterface):
                             data=data,
                             columns=columns,
                             row_count=len(data),
-                            execution_time=execution_time
+                            execution_time=execution_time,
+                            has_more=has_more
                         )
                     else:
                         return QueryResult(
@@ -839,8 +1000,8 @@ class MySQLAdapter(DatabaseInterface):
             logger.error(f"MySQL查询执行失败: {e}")
             raise
 
-    async def explain_query(self, query: str) -> QueryPlan:
-        """获取MySQL查询执行计划"""
+    async def explain_query(self, query: str, analyze: bool = True) -> QueryPlan:
+        """获取MySQL查询执行计划（EXPLAIN FORMAT=JSON 不执行查询，忽略 analyze）"""
         try:
             import aiomysql
 
@@ -1050,108 +1211,109 @@ class SQLiteDatabaseAdapter(DatabaseInterface):
         """获取数据库类型"""
         return DatabaseType.SQLITE
 
+    async def _fetch_all(self, query: str) -> List[Any]:
+        cursor = await self._connection.execute(query)
+        try:
+            return await cursor.fetchall()
+        finally:
+            await cursor.close()
+
+    async def _get_estimated_row_counts(self) -> Dict[str, int]:
+        """
+        从 sqlite_stat1 读取行数估算值（仅在执行过 ANALYZE 后存在）
+
+        stat 字段的第一个整数是表（或索引）的近似行数。
+        """
+        stat_table = await self._fetch_all(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        )
+        if not stat_table:
+            return {}
+
+        row_counts: Dict[str, int] = {}
+        for tbl, stat in await self._fetch_all("SELECT tbl, stat FROM sqlite_stat1"):
+            try:
+                estimate = int(str(stat).split()[0])
+            except (ValueError, IndexError):
+                continue
+            row_counts[tbl] = max(row_counts.get(tbl, 0), estimate)
+        return row_counts
+
     async def get_schema_info(self) -> SchemaInfo:
-        """获取SQLite schema信息"""
+        """
+        获取SQLite schema信息
+
+        通过表值 PRAGMA 函数（pragma_table_info / pragma_foreign_key_list）
+        与 sqlite_master 关联，一次查询取回所有表的列或外键；
+        行数使用 sqlite_stat1 统计估算值，不再逐表 COUNT(*)。
+        """
         try:
             if not self._connection:
                 raise Exception("数据库未连接")
 
             # 获取SQLite版本
-            cursor = await self._connection.execute("SELECT sqlite_version()")
-            version_row = await cursor.fetchone()
-            version = version_row[0] if version_row else "unknown"
-            await cursor.close()
+            version_rows = await self._fetch_all("SELECT sqlite_version()")
+            version = version_rows[0][0] if version_rows else "unknown"
 
             # 获取所有表和视图
-            tables_query = """
+            tables = await self._fetch_all("""
                 SELECT name, type
                 FROM sqlite_master
                 WHERE type IN ('table', 'view')
                 AND name NOT LIKE 'sqlite_%'
                 ORDER BY name
-            """
-            cursor = await self._connection.execute(tables_query)
-            tables = await cursor.fetchall()
-            await cursor.close()
-
-            table_infos = {}
-            all_relationships = []
-
-            for table_record in tables:
-                table_name = table_record[0]
-                table_type = table_record[1]
-
-                # 获取列信息 (使用 PRAGMA table_info)
-                pragma_query = f"PRAGMA table_info('{table_name}')"
-                cursor = await self._connection.execute(pragma_query)
-                columns_data = await cursor.fetchall()
-                await cursor.close()
-
-                # 获取外键信息 (使用 PRAGMA foreign_key_list)
-                fk_query = f"PRAGMA foreign_key_list('{table_name}')"
-                cursor = await self._connection.execute(fk_query)
-                fk_data = await cursor.fetchall()
-                await cursor.close()
-
-                # 构建外键映射
-                fk_columns = {}
-                for fk in fk_data:
-                    # fk: (id, seq, table, from, to, on_update, on_delete, match)
-                    from_column = fk[3]
-                    to_table = fk[2]
-                    to_column = fk[4]
-                    fk_columns[from_column] = {
-                        "foreign_table": to_table,
-                        "foreign_column": to_column
-                    }
-                    all_relationships.append({
-                        "from_table": table_name,
-                        "from_column": from_column,
-                        "to_table": to_table,
-                        "to_column": to_column,
-                        "relationship_type": "foreign_key"
-                    })
+            """)
+            row_counts = await self._get_estimated_row_counts()
+            table_records = [
+                {
+                    "name": row[0],
+                    "table_type": row[1],
+                    "row_count": row_counts.get(row[0])
+                }
+                for row in tables
+            ]
+
+            # 一次性获取所有列
+            column_rows = await self._fetch_all("""
+                SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk
+                FROM sqlite_master m
+                JOIN pragma_table_info(m.name) p
+                WHERE m.type IN ('table', 'view')
+                AND m.name NOT LIKE 'sqlite_%'
+                ORDER BY m.name, p.cid
+            """)
+            columns: Dict[str, List[Dict[str, Any]]] = {}
+            primary_keys: Dict[str, set] = {}
+            for table_name, col_name, col_type, notnull, default_value, pk in column_rows:
+                columns.setdefault(table_name, []).append({
+                    "name": col_name,
+                    "data_type": col_type,
+                    "is_nullable": notnull == 0,
+                    "default_value": default_value
+                })
+                # pk 为该列在主键中的位置（从1开始），0 表示非主键
+                if pk:
+                    primary_keys.setdefault(table_name, set()).add(col_name)
+
+            # 一次性获取所有外键
+            fk_rows = await self._fetch_all("""
+                SELECT m.name, f."from", f."table", f."to"
+                FROM sqlite_master m
+                JOIN pragma_foreign_key_list(m.name) f
+                WHERE m.type = 'table'
+                AND m.name NOT LIKE 'sqlite_%'
+                ORDER BY m.name, f.id, f.seq
+            """)
+            foreign_keys: Dict[str, Dict[str, Dict[str, str]]] = {}
+            for table_name, from_column, to_table, to_column in fk_rows:
+                foreign_keys.setdefault(table_name, {})[from_column] = {
+                    "foreign_table": to_table,
+                    "foreign_column": to_column
+                }
 
-                # 获取表行数
-                try:
-                    count_cursor = await self._connection.execute(
-                        f"SELECT COUNT(*) FROM \"{table_name}\""
-                    )
-                    row_count_result = await count_cursor.fetchone()
-                    row_count = row_count_result[0] if row_count_result else 0
-                    await count_cursor.close()
-                except Exception:
-                    row_count = 0
-
-                # 构建列信息对象
-                column_infos = []
-                for col in columns_data:
-                    # col: (cid, name, type, notnull, dflt_value, pk)
-                    col_name = col[1]
-                    col_type = col[2]
-                    is_nullable = col[3] == 0
-                    default_value = col[4]
-                    is_pk = col[5] == 1
-                    fk_info_for_col = fk_columns.get(col_name)
-                    is_fk = fk_info_for_col is not None
-
-                    column_infos.append(ColumnInfo(
-                        name=col_name,
-                        data_type=col_type,
-                        is_nullable=is_nullable,
-                        default_value=default_value,
-                        is_primary_key=is_pk,
-                        is_foreign_key=is_fk,
-                        foreign_table=fk_info_for_col["foreign_table"] if is_fk else None,
-                        foreign_column=fk_info_for_col["foreign_column"] if is_fk else None
-                    ))
-
-                table_infos[table_name] = TableInfo(
-                    name=table_name,
-                    table_type=table_type,
-                    row_count=row_count,
-                    columns=column_infos
-                )
+            table_infos, relationships = _build_table_infos(
+                table_records, columns, primary_keys, foreign_keys
+            )
 
             # 数据库名称从文件路径中提取
             import os
@@ -1161,7 +1323,7 @@ class SQLiteDatabaseAdapter(DatabaseInterface):
                 database_name=db_name,
                 database_type=self.get_database_type(),
                 tables=table_infos,
-                relationships=all_relationships,
+                relationships=relationships,
                 version=version,
                 last_updated=datetime.now()
             )
@@ -1170,8 +1332,16 @@ class SQLiteDatabaseAdapter(DatabaseInterface):
             logger.error(f"获取SQLite schema信息失败: {e}")
             raise
 
+    async def get_schema_fingerprint(self) -> Optional[str]:
+        """使用 PRAGMA schema_version（每次DDL变更时递增）作为schema指纹"""
+        if not self._connection:
+            raise Exception("数据库未连接")
+
+        rows = await self._fetch_all("PRAGMA schema_version")
+        return str(rows[0][0]) if rows else None
+
     async def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None,
-                          timeout: int = 30) -> QueryResult:
+                          timeout: int = 30, max_rows: Optional[int] = None) -> QueryResult:
         """执行SQLite查询"""
         try:
             import time
@@ -1192,8 +1362,13 @@ class SQLiteDatabaseAdapter(DatabaseInterface):
 
             # 检查是否是SELECT等返回数据的查询
             query_upper = query.strip().upper()
-            if query_upper.startswith(('SELECT', 'PRAGMA')):
-                rows = await cursor.fetchall()
+            if query_upper.startswith(('SELECT', 'WITH', 'PRAGMA')):
+                if max_rows is None:
+                    rows = await cursor.fetchall()
+                else:
+                    # 逐行步进，读满即停止，剩余部分不执行
+                    rows = await cursor.fetchmany(max_rows + 1)
+                rows, has_more = _bound_rows(rows, max_rows)
                 await cursor.close()
 
                 if not rows:
@@ -1214,7 +1389,8 @@ class SQLiteDatabaseAdapter(DatabaseInterface):
                     data=data,
                     columns=columns,
                     row_count=len(data),
-                    execution_time=execution_time
+                    execution_time=execution_time,
+                    has_more=has_more
                 )
             else:
                 # INSERT, UPDATE, DELETE等操作
@@ -1234,8 +1410,8 @@ class SQLiteDatabaseAdapter(DatabaseInterface):
             logger.error(f"SQLite查询执行失败: {e}")
             raise
 
-    async def explain_query(self, query: str) -> QueryPlan:
-        """获取SQLite查询执行计划"""
+    async def explain_query(self, query: str, analyze: bool = True) -> QueryPlan:
+        """获取SQLite查询执行计划（EXPLAIN QUERY PLAN 不执行查询，忽略 analyze）"""
         try:
             if not self._connection:
                 raise Exception("数据库未连接")
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+文本嵌入向量缓存
+========================================
+
+按 (模型, 文本内容哈希) 缓存嵌入向量，避免对相同文本重复调用付费的嵌入API。
+
+特性:
+- 两级存储：进程内LRU（array('f')，每维4字节）+ 本地SQLite文件（多进程共享、重启保留）
+- 文档矩阵缓存：同一批文档的向量预先归一化为 NumPy 矩阵，
+  重复检索只需一次矩阵-向量乘法
+- 线程安全：所有读写持有同一把锁，可在线程池中调用
+
+作者: Data Agent Team
+版本: 1.0.0
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy 为可选依赖
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """
+    嵌入向量缓存
+
+    表结构::
+
+        embeddings(key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vector BLOB, created_at REAL)
+
+    key 为 sha256(model + "\\0" + text)，vector 为 float32 小端字节串。
+    db_path 传 ":memory:" 时不落盘。
+    """
+
+    # 默认数据库文件（相对于 backend 目录）
+    DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "embedding_cache.sqlite3"
+
+    def __init__(
+        self,
+        db_path: Optional[Union[str, Path]] = None,
+        max_entries: int = 5000,
+        max_matrices: int = 8
+    ):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite 文件路径，默认 backend/data/embedding_cache.sqlite3
+            max_entries: 进程内LRU最多保留的向量数
+            max_matrices: 最多缓存的文档矩阵数（按文档集合区分）
+        """
+        self.max_entries = max_entries
+        self.max_matrices = max_matrices
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._matrices: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "matrix_hits": 0,
+            "matrix_builds": 0
+        }
+
+        self.db_path = str(db_path) if db_path else str(self.DEFAULT_DB_PATH)
+        try:
+            self._conn = self._connect(self.db_path)
+        except (OSError, sqlite3.Error) as e:
+            fallback = os.path.join(tempfile.gettempdir(), "dataagent_embedding_cache.sqlite3")
+            logger.warning(f"嵌入缓存文件不可用 {self.db_path}: {e}，改用 {fallback}")
+            self.db_path = fallback
+            self._conn = self._connect(self.db_path)
+
+    @staticmethod
+    def _connect(db_path: str) -> sqlite3.Connection:
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+        if db_path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, "
+            "vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """生成缓存键"""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: array) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        批量读取缓存
+
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表（可含重复）
+
+        Returns:
+            Dict[str, List[float]]: 命中的 文本 -> 向量，未命中的文本不在结果中
+        """
+        found: Dict[str, List[float]] = {}
+        pending: Dict[str, str] = {}
+
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                key = self.make_key(model, text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[text] = vector.tolist()
+                    self.stats["memory_hits"] += 1
+                else:
+                    pending[key] = text
+
+            if pending:
+                keys = list(pending)
+                # SQLite 默认最多 999 个绑定参数
+                for start in range(0, len(keys), 900):
+                    batch = keys[start:start + 900]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        self._remember(key, vector)
+                        found[pending.pop(key)] = vector.tolist()
+                        self.stats["disk_hits"] += 1
+
+            self.stats["misses"] += len(pending)
+
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, Sequence[float]]) -> None:
+        """
+        批量写入缓存
+
+        Args:
+            model: 嵌入模型名称
+            vectors: 文本 -> 向量
+        """
+        if not vectors:
+            return
+
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, values in vectors.items():
+                key = self.make_key(model, text)
+                vector = array("f", values)
+                self._remember(key, vector)
+                rows.append((key, model, len(vector), vector.tobytes(), now))
+
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+                self.stats["writes"] += len(rows)
+            except sqlite3.Error as e:
+                # 落盘失败不影响本次结果，向量仍保留在内存LRU中
+                logger.warning(f"嵌入向量写入SQLite失败: {e}")
+
+    def _corpus_key(self, model: str, documents: Sequence[str]) -> str:
+        digest = hashlib.sha256(model.encode("utf-8"))
+        for document in documents:
+            digest.update(self.make_key(model, document).encode("ascii"))
+        return digest.hexdigest()
+
+    def get_matrix(self, model: str, documents: Sequence[str]) -> Optional[Any]:
+        """
+        获取文档集合的归一化向量矩阵
+
+        Returns:
+            np.ndarray: 形状 (len(documents), dim) 的 float32 矩阵，每行已L2归一化；
+            未缓存或 numpy 不可用时返回 None
+        """
+        if np is None or not documents:
+            return None
+
+        key = self._corpus_key(model, documents)
+        with self._lock:
+            matrix = self._matrices.get(key)
+            if matrix is not None:
+                self._matrices.move_to_end(key)
+                self.stats["matrix_hits"] += 1
+            return matrix
+
+    def build_matrix(self, model: str, documents: Sequence[str],
+                     vectors: Sequence[Sequence[float]]) -> Optional[Any]:
+        """
+        由文档向量构建归一化矩阵并缓存
+
+        Returns:
+            np.ndarray: 归一化矩阵；numpy 不可用时返回 None
+        """
+        if np is None or not documents:
+            return None
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+        # 只读，防止调用方意外修改共享的缓存矩阵
+        matrix.setflags(write=False)
+
+        key = self._corpus_key(model, documents)
+        with self._lock:
+            self._matrices[key] = matrix
+            self._matrices.move_to_end(key)
+            while len(self._matrices) > self.max_matrices:
+                self._matrices.popitem(last=False)
+            self.stats["matrix_builds"] += 1
+        return matrix
+
+    def clear(self) -> None:
+        """清空内存和磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._matrices.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "matrices": len(self._matrices),
+                **self.stats
+            }
+
+
+# 全局缓存实例
+_embedding_store: Optional[EmbeddingStore] = None
+_embedding_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """获取嵌入缓存单例（路径与容量来自配置）"""
+    global _embedding_store
+    if _embedding_store is None:
+        with _embedding_store_lock:
+            if _embedding_store is None:
+                try:
+                    from src.app.core.config import settings
+                    db_path = settings.embedding_cache_path
+                    max_entries = settings.embedding_cache_max_entries
+                except Exception:
+                    db_path = os.environ.get("EMBEDDING_CACHE_PATH")
+                    max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "5000"))
+                _embedding_store = EmbeddingStore(db_path=db_path, max_entries=max_entries)
+    return _embedding_store
@@ -22,6 +22,7 @@
 - **bool**: 操作成功/失败（create_bucket, upload_file, delete_file）
 - **bool**: 连接状态（check_connection）
 - **Optional[bytes]**: 文件二进制数据（download_file）
+- **Optional[dict]**: 对象元数据 name/size/last_modified/etag（stat_file）
 - **list**: 文件元数据列表（list_files）
   - name: str - 文件名
   - size: int - 文件大小
@@ -159,6 +160,22 @@ class MinIOService:
             logger.error(f"Failed to download file '{object_name}': {e}")
             return None
 
+    def stat_file(self, bucket_name: str, object_name: str) -> Optional[dict]:
+        """
+        获取对象元数据（不下载内容）
+        """
+        try:
+            stat = self.client.stat_object(bucket_name=bucket_name, object_name=object_name)
+            return {
+                "name": stat.object_name,
+                "size": stat.size,
+                "last_modified": stat.last_modified,
+                "etag": stat.etag
+            }
+        except S3Error as e:
+            logger.debug(f"Failed to stat file '{object_name}': {e}")
+            return None
+
     def delete_file(self, bucket_name: str, object_name: str) -> bool:
         """
         从MinIO删除文件
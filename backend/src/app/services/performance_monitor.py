@@ -5,9 +5,10 @@
 **文件名**: query_performance_monitor.py (命名实际为performance_monitor.py)
 **职责**: 为RAG-SQL链提供详细的性能分析、监控、优化建议和性能统计
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 查询性能监控服务
+- v1.1.0 (2026-10-16): 汇总统计与慢查询改由统一指标引擎（core/metrics.py）提供，不再线性扫描历史记录
 
 ## [INPUT]
 - **tenant_id: str** - 租户ID
@@ -39,7 +40,8 @@
 - **PerformanceMonitor**: 性能监控器实例（initialize_performance_monitor）
 
 **上游依赖** (已读取源码):
-- Python标准库: asyncio, collections（defaultdict, deque）, dataclasses（asdict）, datetime, enum, json, logging, statistics, time, uuid
+- [../core/metrics.py](../core/metrics.py) - 时间分桶聚合、分位数草图、慢查询样本
+- Python标准库: asyncio, collections（defaultdict, deque）, dataclasses（asdict）, datetime, enum, json, logging, time, uuid
 
 **下游依赖** (需要反向索引分析):
 - [llm_service.py](./llm_service.py) - LLM服务使用性能监控
@@ -63,7 +65,8 @@
   - calculate_query_complexity(): 分析SQL复杂度（JOIN, 子查询, 聚合函数, 窗口函数, CTE, UNION）
   - analyze_sql_pattern(): 分析SQL模式（has_join, has_subquery, has_aggregation等）
   - generate_optimization_suggestions(): 生成性能优化建议
-- **统计缓存**: _summary_cache字典缓存汇总统计（5分钟TTL）
+- **指标注册表**: self.metrics（MetricsRegistry），按 tenant_id/status/performance_level/error_type 分序列记录耗时，
+  每个时间桶保留最慢的20条查询作为样本；汇总统计复杂度为 O(序列数 × 桶数)
 - **性能等级阈值**:
   - EXCELLENT: <0.5s, GOOD: <1s, AVERAGE: <3s, POOR: <10s, CRITICAL: >=10s
 - **SQL复杂度计算**: 基础关键词(0.1) + JOIN(0.3*count) + 子查询(0.5*count) + 聚合函数(0.2*count) + 窗口函数(0.5) + CTE(0.4*count) + UNION(0.3*count)，最大值10.0
@@ -79,11 +82,10 @@
 - **性能等级计算**: calculate_performance_level(total_duration, query_complexity_score)
 - **deque操作**: metrics_history.append(metrics)添加到历史记录
 - **字典删除**: del self.active_queries[query_id]从活跃查询中移除
-- **统计计算**: statistics.mean/median/quantiles计算执行时间统计
+- **指标记录**: complete_query/fail_query 写入 query_duration_seconds、query_result_rows、query_memory_usage_mb
 - **列表推导式过滤**: [m for m in self.metrics_history if conditions]过滤指标
 - **排序**: sorted(queries, key=lambda x: x.total_duration, reverse=True)按时间排序
-- **缓存操作**: _summary_cache[cache_key] = summary缓存结果
-- **清理操作**: clear_history()清理历史数据，metrics_history.clear()
+- **清理操作**: clear_history()清理历史数据，metrics_history.clear()，全部清理时同时清空指标注册表
 - **全局单例**: _performance_monitor全局实例
 - **异常处理**: 所有方法都有try-except捕获异常，记录日志
 
@@ -102,9 +104,10 @@ from collections import defaultdict, deque
 import json
 import logging
 from enum import Enum
-import statistics
 import uuid
 
+from src.app.core.metrics import MetricAggregate, MetricsRegistry
+
 logger = logging.getLogger(__name__)
 
 
@@ -375,18 +378,55 @@ class PerformanceAnalyzer:
         return suggestions
 
 
+# 时间范围 -> 秒数
+TIME_RANGE_SECONDS = {
+    "1h": 3600,
+    "24h": 86400,
+    "7d": 7 * 86400,
+    "30d": 30 * 86400
+}
+
+
 class PerformanceMonitor:
     """性能监控服务"""
 
+    # 每个时间桶保留的最慢查询数
+    SLOW_QUERY_SAMPLES = 20
+
     def __init__(self, max_history_size: int = 10000):
         self.max_history_size = max_history_size
+        # 原始记录仅用于按ID查找、错误样本和优化建议；统计全部来自指标注册表
         self.metrics_history: deque = deque(maxlen=max_history_size)
         self.active_queries: Dict[str, QueryMetrics] = {}
         self.analyzer = PerformanceAnalyzer()
 
-        # 统计缓存
-        self._summary_cache: Dict[str, PerformanceSummary] = {}
-        self._cache_ttl = 300  # 5分钟缓存
+        self.metrics = MetricsRegistry()
+        self.metrics.describe("query_duration_seconds", "RAG-SQL查询总耗时（秒）", keep_top=self.SLOW_QUERY_SAMPLES)
+        self.metrics.describe("query_result_rows", "成功查询的结果行数")
+        self.metrics.describe("query_memory_usage_mb", "成功查询的内存使用（MB）")
+        # clear_history(before_date) 之后，早于该时间的样本不再返回
+        self._history_floor: Optional[datetime] = None
+
+    def _record_metrics(self, metrics: QueryMetrics):
+        """将结束的查询写入历史记录和指标注册表"""
+        self.metrics_history.append(metrics)
+        if metrics.total_duration is None:
+            return
+
+        timestamp = metrics.start_time.timestamp()
+        labels = {
+            "tenant_id": metrics.tenant_id,
+            "status": metrics.status.value,
+            "performance_level": metrics.performance_level.value if metrics.performance_level else "",
+            "error_type": metrics.error_type or ""
+        }
+        self.metrics.observe("query_duration_seconds", metrics.total_duration, labels,
+                             exemplar=metrics, timestamp=timestamp)
+        if metrics.status == QueryStatus.COMPLETED:
+            tenant_labels = {"tenant_id": metrics.tenant_id}
+            self.metrics.observe("query_result_rows", metrics.result_rows or 0, tenant_labels, timestamp=timestamp)
+            self.metrics.observe("query_memory_usage_mb", metrics.memory_usage_mb or 0, tenant_labels,
+                                 timestamp=timestamp)
 
     def start_query_monitoring(self, tenant_id: str, user_query: str,
                              generated_sql: str, database_type: str) -> str:
@@ -488,7 +528,7 @@ class PerformanceMonitor:
             )
 
         # 移动到历史记录
-        self.metrics_history.append(metrics)
+        self._record_metrics(metrics)
         del self.active_queries[query_id]
 
         logger.info(f"查询完成: {query_id} - 耗时: {metrics.total_duration:.2f}s")
@@ -515,7 +555,7 @@ class PerformanceMonitor:
         metrics.error_type = error_type
 
         # 移动到历史记录
-        self.metrics_history.append(metrics)
+        self._record_metrics(metrics)
         del self.active_queries[query_id]
 
         logger.error(f"查询失败: {query_id} - 错误: {error_message}")
@@ -553,33 +593,11 @@ class PerformanceMonitor:
         Returns:
             PerformanceSummary: 性能汇总统计
         """
-        cache_key = f"{tenant_id or 'all'}_{time_range}"
-
-        # 检查缓存
-        if cache_key in self._summary_cache:
-            cached_time = self._summary_cache[cache_key]
-            if (datetime.now() - cached_time.time_range.replace(tzinfo=None)).seconds < self._cache_ttl:
-                return cached_time
+        window = TIME_RANGE_SECONDS.get(time_range, 3600)
+        tenant_filter = {"tenant_id": tenant_id} if tenant_id else None
 
-        # 过滤指标
-        now = datetime.now()
-        if time_range == "1h":
-            start_time = now - timedelta(hours=1)
-        elif time_range == "24h":
-            start_time = now - timedelta(days=1)
-        elif time_range == "7d":
-            start_time = now - timedelta(days=7)
-        elif time_range == "30d":
-            start_time = now - timedelta(days=30)
-        else:
-            start_time = now - timedelta(hours=1)
-
-        filtered_metrics = [
-            m for m in self.metrics_history
-            if m.start_time >= start_time and (tenant_id is None or m.tenant_id == tenant_id)
-        ]
-
-        if not filtered_metrics:
+        series = self.metrics.collect("query_duration_seconds", tenant_filter, window=window)
+        if not series:
             return PerformanceSummary(
                 time_range=time_range,
                 total_queries=0,
@@ -599,67 +617,49 @@ class PerformanceMonitor:
                 error_types={}
             )
 
-        # 计算统计数据
-        execution_times = [m.total_duration for m in filtered_metrics if m.total_duration is not None]
-
-        # 状态统计
+        # 按标签汇总各序列
         status_counts = defaultdict(int)
         performance_distribution = defaultdict(int)
         error_types = defaultdict(int)
-
         successful_queries = 0
         failed_queries = 0
-        total_result_rows = 0
-        total_memory_usage = 0
-
-        for metrics in filtered_metrics:
-            status_counts[metrics.status.value] += 1
-            if metrics.performance_level:
-                performance_distribution[metrics.performance_level.value] += 1
-
-            if metrics.status == QueryStatus.COMPLETED:
-                successful_queries += 1
-                total_result_rows += metrics.result_rows or 0
-                total_memory_usage += metrics.memory_usage_mb or 0
+
+        for labels, aggregate in series:
+            status_counts[labels["status"]] += aggregate.count
+            if labels["performance_level"]:
+                performance_distribution[labels["performance_level"]] += aggregate.count
+
+            if labels["status"] == QueryStatus.COMPLETED.value:
+                successful_queries += aggregate.count
             else:
-                failed_queries += 1
-                if metrics.error_type:
-                    error_types[metrics.error_type] += 1
-
-        # 最慢查询
-        slowest_queries = [
-            m.to_dict() for m in sorted(
-                [m for m in filtered_metrics if m.total_duration is not None],
-                key=lambda x: x.total_duration,
-                reverse=True
-            )[:5]
-        ]
+                failed_queries += aggregate.count
+                if labels["error_type"]:
+                    error_types[labels["error_type"]] += aggregate.count
+
+        durations = MetricAggregate.merged(aggregate for _, aggregate in series)
+        result_rows = self.metrics.aggregate("query_result_rows", tenant_filter, window=window)
+        memory_usage = self.metrics.aggregate("query_memory_usage_mb", tenant_filter, window=window)
+        total_result_rows = int(result_rows.total)
 
-        # 构建汇总统计
-        summary = PerformanceSummary(
+        return PerformanceSummary(
             time_range=time_range,
-            total_queries=len(filtered_metrics),
+            total_queries=durations.count,
             successful_queries=successful_queries,
             failed_queries=failed_queries,
-            avg_execution_time=statistics.mean(execution_times) if execution_times else 0,
-            median_execution_time=statistics.median(execution_times) if execution_times else 0,
-            p95_execution_time=statistics.quantiles(execution_times, n=20)[18] if len(execution_times) > 20 else (execution_times[-1] if execution_times else 0),
-            max_execution_time=max(execution_times) if execution_times else 0,
-            min_execution_time=min(execution_times) if execution_times else 0,
+            avg_execution_time=durations.avg,
+            median_execution_time=durations.quantile(0.5),
+            p95_execution_time=durations.quantile(0.95),
+            max_execution_time=durations.max,
+            min_execution_time=durations.min,
             status_counts=dict(status_counts),
             performance_distribution=dict(performance_distribution),
             total_result_rows=total_result_rows,
             avg_result_rows=total_result_rows / successful_queries if successful_queries > 0 else 0,
-            total_memory_usage=total_memory_usage,
-            slowest_queries=slowest_queries,
+            total_memory_usage=memory_usage.total,
+            slowest_queries=[m.to_dict() for m in durations.top_exemplars(5)],
             error_types=dict(error_types)
         )
 
-        # 缓存结果
-        self._summary_cache[cache_key] = summary
-
-        return summary
-
     def get_slow_queries(self, limit: int = 10, tenant_id: Optional[str] = None) -> List[QueryMetrics]:
         """
         获取最慢查询
@@ -671,6 +671,16 @@ class PerformanceMonitor:
         Returns:
             List[QueryMetrics]: 最慢查询列表
         """
+        if limit <= self.SLOW_QUERY_SAMPLES:
+            tenant_filter = {"tenant_id": tenant_id} if tenant_id else None
+            durations = self.metrics.aggregate("query_duration_seconds", tenant_filter)
+            queries = durations.top_exemplars(self.SLOW_QUERY_SAMPLES)
+            if self._history_floor is not None:
+                queries = [m for m in queries if m.start_time >= self._history_floor]
+            # 样本被 clear_history 过滤掉一部分时，退回扫描历史记录
+            if len(queries) >= limit or self._history_floor is None:
+                return queries[:limit]
+
         queries = [
             m for m in self.metrics_history
             if m.total_duration is not None and (tenant_id is None or m.tenant_id == tenant_id)
@@ -785,6 +795,8 @@ class PerformanceMonitor:
         if before_date is None:
             # 清理所有数据
             self.metrics_history.clear()
+            self.metrics.clear()
+            self._history_floor = None
             logger.info("已清理所有性能监控历史数据")
         else:
             # 清理指定日期之前的数据
@@ -794,11 +806,10 @@ class PerformanceMonitor:
                 maxlen=self.max_history_size
             )
             cleared_count = original_size - len(self.metrics_history)
+            # 时间分桶按保留期自然过期，这里只屏蔽旧的慢查询样本
+            self._history_floor = max(before_date, self._history_floor or before_date)
             logger.info(f"已清理 {cleared_count} 条性能监控历史数据")
 
-        # 清理缓存
-        self._summary_cache.clear()
-
     def get_monitoring_stats(self) -> Dict[str, Any]:
         """
         获取监控统计信息
@@ -810,8 +821,7 @@ class PerformanceMonitor:
             "active_queries": len(self.active_queries),
             "history_size": len(self.metrics_history),
             "max_history_size": self.max_history_size,
-            "cache_entries": len(self._summary_cache),
-            "cache_ttl": self._cache_ttl
+            "metric_series": self.metrics.series_count()
         }
 
 
@@ -5,9 +5,11 @@
 **文件名**: query_context.py
 **职责**: Story 3.1租户隔离 - 查询上下文管理、事务管理、频率限制、查询日志和缓存
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.2.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 查询上下文服务（Story 3.1）
+- v1.1.0 (2026-10-16): check_rate_limits 改为异步并使用共享滑动窗口限流器，不再COUNT QueryLog；并发限制移至 middleware/rate_limit.py
+- v1.2.0 (2026-10-16): 删除无调用方的 check_rate_limits，查询限流统一由 middleware/rate_limit.py 的依赖负责
 
 ## [INPUT]
 - **db: Session** - SQLAlchemy数据库会话
@@ -24,7 +26,6 @@
 ## [OUTPUT]
 - **List[DataSourceConnection]**: 租户的数据源列表（get_tenant_data_sources）
 - **List[KnowledgeDocument]**: 租户的文档列表（get_tenant_documents）
-- **tuple[bool, Optional[str]]**: (是否允许, 错误信息)（check_rate_limits）
 - **QueryLog**: 查询日志记录（log_query_request）
 - **bool**: 更新成功（update_query_status）
 - **Optional[QueryLog]**: 缓存的查询（get_cached_query）
@@ -82,8 +83,6 @@
 - **上下文管理器**: with self.transaction_manager.transaction() as db自动事务管理
 - **异常处理**: try-except捕获异常，回滚事务，抛出RuntimeError
 - **字典获取**: tenant.settings.get('key', default)获取租户配置
-- **时间计算**: datetime.utcnow() - timedelta(hours=1)计算1小时前
-- **计数器**: recent_queries/active_queries查询数量
 - **对象创建**: QueryLog(...)创建查询日志对象
 - **数据库操作**: db.add(query_log), db.commit(), db.rollback(), db.delete().delete()
 - **列表推导式**: [log for log in query_logs]转换查询日志为字典
@@ -337,49 +336,6 @@ class QueryContext:
             logger.error(f"Failed to get documents for tenant {self.tenant_id}: {e}")
             return []
 
-    def check_rate_limits(self) -> tuple[bool, Optional[str]]:
-        """
-        检查查询频率限制
-        Story要求：实现租户级别的查询限流
-
-        Returns:
-            tuple[bool, Optional[str]]: (是否允许查询, 错误信息)
-        """
-        try:
-            # 检查每小时查询限制
-            one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-            recent_queries = self.db.query(QueryLog).filter(
-                and_(
-                    QueryLog.tenant_id == self.tenant_id,
-                    QueryLog.created_at >= one_hour_ago
-                )
-            ).count()
-
-            if recent_queries >= self.limits.max_queries_per_hour:
-                error_msg = f"Query rate limit exceeded. Maximum {self.limits.max_queries_per_hour} queries per hour allowed."
-                logger.warning(f"Rate limit exceeded for tenant {self.tenant_id}: {recent_queries}/{self.limits.max_queries_per_hour}")
-                return False, error_msg
-
-            # 检查并发查询限制
-            active_queries = self.db.query(QueryLog).filter(
-                and_(
-                    QueryLog.tenant_id == self.tenant_id,
-                    QueryLog.status == QueryStatus.PROCESSING
-                )
-            ).count()
-
-            if active_queries >= self.limits.max_concurrent_queries:
-                error_msg = f"Too many concurrent queries. Maximum {self.limits.max_concurrent_queries} concurrent queries allowed."
-                logger.warning(f"Concurrent query limit exceeded for tenant {self.tenant_id}: {active_queries}/{self.limits.max_concurrent_queries}")
-                return False, error_msg
-
-            logger.info(f"Rate limit check passed for tenant {self.tenant_id}: {recent_queries}/{self.limits.max_queries_per_hour} hourly, {active_queries}/{self.limits.max_concurrent_queries} concurrent")
-            return True, None
-
-        except Exception as e:
-            logger.error(f"Failed to check rate limits for tenant {self.tenant_id}: {e}")
-            return False, "Failed to check rate limits"
-
     def log_query_request(self, query_id: str, question: str, context: Optional[Dict[str, Any]] = None,
                          options: Optional[Dict[str, Any]] = None, query_hash: Optional[str] = None) -> QueryLog:
         """
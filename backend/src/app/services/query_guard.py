@@ -0,0 +1,113 @@
+"""
+# [QUERY_GUARD] LLM生成SQL的执行保护
+
+## [HEADER]
+**文件名**: query_guard.py
+**职责**: 执行LLM生成的SQL前按租户预算改写与检查：缺少LIMIT时自动补上、EXPLAIN估算成本超出预算时拒绝执行，执行时按行数上限有界读取并标记截断
+**作者**: Data Agent Team
+**版本**: 1.1.0
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 替代 adapter.execute_query 的无上限 fetch
+- v1.1.0 (2026-10-16): LIMIT改写、QueryBudget、租户预算解析与预算表移到 core/query_budget.py（与AgentV2共用），本模块只保留适配器上的执行
+
+## [INPUT]
+- **adapter: DatabaseInterface** - 已连接的数据库适配器（PostgreSQL / MySQL / SQLite）
+- **query: str** - 待执行的SQL
+- **tenant_id: Optional[str]** - 租户ID，用于选择预算
+- **settings.query_max_rows / query_max_cost / query_tenant_budgets** - 默认预算与按租户覆盖（JSON）
+
+## [OUTPUT]
+- **QueryResult** - 与 adapter.execute_query 相同；超出行数上限时 has_more=True，data 只含前 max_rows 行
+- **QueryBudgetExceeded** - 估算成本超出预算（查询未执行）
+
+## [LINK]
+**上游依赖**:
+- [../core/query_budget.py](../core/query_budget.py) - QueryGuardBase / QueryBudget / inject_limit / parse_tenant_budgets
+- [./database_interface.py](./database_interface.py) - explain_query(analyze=False) / execute_query(max_rows=...)
+- [../core/config.py](../core/config.py) - 预算配置
+
+**下游依赖**:
+- 无
+
+**调用方**:
+- [../api/v1/endpoints/llm.py](../api/v1/endpoints/llm.py) - 对话中执行LLM生成的SQL
+
+## [STATE]
+- **LIMIT改写**: 见 core/query_budget.inject_limit，上限为 max_rows + 1（多一行用于判断截断）
+- **成本检查**: 对改写后的SQL执行 EXPLAIN（不加 ANALYZE，不执行查询），PostgreSQL / MySQL 估算成本超出
+  max_cost 时抛出 QueryBudgetExceeded；SQLite 无成本估算，不检查；EXPLAIN 本身失败时照常执行，由执行阶段报错
+- **有界读取**: execute_query(max_rows=...) 使用游标 / fetchmany，超出部分不读入内存
+
+## [POS]
+**路径**: backend/src/app/services/query_guard.py
+**模块层级**: Level 1 (服务层)
+**依赖深度**: 1 层（database_interface, core.query_budget）
+"""
+
+import logging
+from typing import Optional
+
+from src.app.core.query_budget import QueryBudget, QueryGuardBase, inject_limit, parse_tenant_budgets
+from .database_interface import DatabaseInterface, QueryResult
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["QueryBudget", "QueryBudgetExceeded", "QueryGuard", "get_query_guard", "inject_limit"]
+
+
+class QueryBudgetExceeded(Exception):
+    """查询的估算成本超出租户预算，未执行"""
+
+    def __init__(self, message: str, estimated_cost: Optional[float] = None):
+        super().__init__(message)
+        self.estimated_cost = estimated_cost
+
+
+class QueryGuard(QueryGuardBase):
+    """LLM生成SQL的执行保护（数据库适配器）"""
+
+    async def execute(self, adapter: DatabaseInterface, query: str,
+                      tenant_id: Optional[str] = None) -> QueryResult:
+        """
+        按租户预算执行查询
+
+        Raises:
+            QueryBudgetExceeded: 估算成本超出预算（查询未执行）
+        """
+        guarded, budget, _ = self.rewrite(query, tenant_id)
+
+        if self.should_check_cost(budget, guarded):
+            try:
+                plan = await adapter.explain_query(guarded, analyze=False)
+            except Exception as e:
+                # EXPLAIN 失败多为SQL错误，照常执行，由执行阶段返回错误信息
+                self._count("explain_failures")
+                logger.info(f"[QUERY_GUARD] EXPLAIN失败，跳过成本检查: {e}")
+            else:
+                cost = plan.estimated_cost
+                if cost is not None and cost > budget.max_cost:
+                    self._count("rejected")
+                    raise QueryBudgetExceeded(
+                        f"查询估算成本 {cost:.0f} 超出预算 {budget.max_cost:.0f}，未执行。"
+                        "请增加过滤条件（如时间范围）或先在更小的数据范围上聚合。",
+                        cost
+                    )
+
+        result = await adapter.execute_query(guarded, max_rows=budget.max_rows)
+        if result.has_more:
+            self._count("truncated")
+        return result
+
+
+_query_guard: Optional[QueryGuard] = None
+
+
+def get_query_guard() -> QueryGuard:
+    """获取全局查询保护实例（按 settings 初始化）"""
+    global _query_guard
+    if _query_guard is None:
+        from src.app.core.config import settings
+
+        default = QueryBudget(max_rows=settings.query_max_rows, max_cost=settings.query_max_cost)
+        _query_guard = QueryGuard(default, parse_tenant_budgets(settings.query_tenant_budgets, default))
+    return _query_guard
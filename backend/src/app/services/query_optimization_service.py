@@ -5,7 +5,10 @@
 **文件名**: query_optimization_service.py
 **职责**: Story 2.4性能优化 - 提供高效的数据库查询方法、LRU缓存策略和性能监控
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
+**变更记录**:
+- v1.0.0 (2026-01-01): 初始版本
+- v1.1.0 (2026-10-16): 内存缓存改用 core.lru_cache.LRUCache（条目数 + 字节预算上限，按查询类型分命名空间统计）
 
 ## [INPUT]
 - **db: AsyncSession** - 异步数据库会话
@@ -31,6 +34,7 @@
 
 **上游依赖** (已读取源码):
 - [./data/models.py](./data/models.py) - 数据模型
+- [../core/lru_cache.py](../core/lru_cache.py) - 有界LRU缓存
 
 **下游依赖** (需要反向索引分析):
 - [./document_service.py](./document_service.py) - 文档服务（优化查询）
@@ -48,22 +52,22 @@
   - TENANT_SUMMARY: 1800秒（30分钟）
   - SEARCH: 120秒（2分钟）
   - TREND_ANALYSIS: 3600秒（1小时）
-- **内存缓存**: Dict[str, CacheEntry]（生产环境应使用Redis）
-- **缓存统计**: hits, misses, evictions计数器
+- **内存缓存**: LRUCache（最多2000条、64MB估算字节，超出按LRU淘汰），命名空间为查询类型
+- **缓存统计**: hits, misses, evictions（含过期清理）由LRUCache统计，另提供按查询类型的明细
 - **查询性能监控**: query_stats记录每个查询的性能指标
 - **缓存键生成**: f"{query_type}:{tenant_id}:{params_hash}"
-- **数据类**: QueryResult, CacheEntry使用@dataclass
+- **数据类**: QueryResult使用@dataclass
 
 ## [SIDE-EFFECTS]
 - **缓存读写**: _get_from_cache, _set_cache操作
-- **缓存过期**: datetime.utcnow() - created_at < ttl检查
-- **缓存淘汰**: 超时项自动删除并记录evictions
+- **缓存过期**: 各查询类型的TTL在写入时传给LRUCache，读取时惰性删除并周期性批量清理
+- **缓存淘汰**: 超出条目数或字节预算时淘汰最久未使用的条目
 - **聚合查询**: func.count(), func.sum(), func.avg(), func.max()
 - **异步查询**: AsyncSession.execute, scalars().all()
 - **性能统计**: _record_query_stats记录count/time_ms/min/max
 - **相关性计算**: _calculate_relevance_score字符串匹配分数
 - **JSON序列化**: json.dumps(params, sort_keys=True)生成缓存键
-- **缓存清理**: clear_cache支持按query_type清理或全部清理
+- **缓存清理**: clear_cache支持按query_type（命名空间）清理或全部清理
 
 ## [POS]
 **路径**: backend/src/app/services/query_optimization_service.py
@@ -73,7 +77,7 @@
 
 import asyncio
 from typing import List, Dict, Any, Optional, Tuple, Union
-from datetime import datetime, timedelta
+from datetime import datetime
 from dataclasses import dataclass
 from enum import Enum
 import json
@@ -84,6 +88,7 @@ from sqlalchemy.orm import selectinload, joinedload
 
 from src.app.data.models import KnowledgeDocument, Tenant, DocumentStatus
 from src.app.core.logging import get_logger
+from src.app.core.lru_cache import LRUCache
 
 logger = get_logger(__name__)
 
@@ -108,16 +113,6 @@ class QueryResult:
     error: Optional[str] = None
 
 
-@dataclass
-class CacheEntry:
-    """缓存条目"""
-    key: str
-    data: Any
-    created_at: datetime
-    ttl_seconds: int
-    query_type: QueryType
-
-
 class QueryOptimizationService:
     """查询优化服务"""
 
@@ -132,13 +127,12 @@ class QueryOptimizationService:
             QueryType.TREND_ANALYSIS: 3600     # 1小时
         }
 
-        # 内存缓存（生产环境应使用Redis）
-        self.cache: Dict[str, CacheEntry] = {}
-        self.cache_stats = {
-            "hits": 0,
-            "misses": 0,
-            "evictions": 0
-        }
+        # 内存缓存（有界LRU，按查询类型分命名空间）
+        self.cache = LRUCache(
+            name="query_optimization",
+            max_entries=2000,
+            max_bytes=64 * 1024 * 1024,
+        )
 
         # 查询性能监控
         self.query_stats: Dict[str, Dict] = {}
@@ -158,19 +152,7 @@ class QueryOptimizationService:
         if not self.cache_enabled:
             return None
 
-        entry = self.cache.get(cache_key)
-        if entry:
-            # 检查是否过期
-            if datetime.utcnow() - entry.created_at < timedelta(seconds=entry.ttl_seconds):
-                self.cache_stats["hits"] += 1
-                return entry.data
-            else:
-                # 过期，删除
-                del self.cache[cache_key]
-                self.cache_stats["evictions"] += 1
-
-        self.cache_stats["misses"] += 1
-        return None
+        return self.cache.get(cache_key, namespace=cache_key.split(":", 1)[0])
 
     def _set_cache(
         self,
@@ -182,16 +164,13 @@ class QueryOptimizationService:
         if not self.cache_enabled:
             return
 
-        entry = CacheEntry(
-            key=cache_key,
-            data=data,
-            created_at=datetime.utcnow(),
-            ttl_seconds=self.cache_ttl_seconds[query_type],
-            query_type=query_type
+        self.cache.set(
+            cache_key,
+            data,
+            ttl=self.cache_ttl_seconds[query_type],
+            namespace=query_type.value
         )
 
-        self.cache[cache_key] = entry
-
     async def get_documents_optimized(
         self,
         db: AsyncSession,
@@ -662,14 +641,19 @@ class QueryOptimizationService:
 
     def get_cache_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        total_requests = self.cache_stats["hits"] + self.cache_stats["misses"]
-        hit_rate = (self.cache_stats["hits"] / total_requests * 100) if total_requests > 0 else 0
+        stats = self.cache.get_stats()
+        total_requests = stats["hits"] + stats["misses"]
+        hit_rate = (stats["hits"] / total_requests * 100) if total_requests > 0 else 0
 
         return {
-            **self.cache_stats,
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"] + stats["expirations"],
             "total_requests": total_requests,
             "hit_rate_percent": hit_rate,
-            "cached_items": len(self.cache)
+            "cached_items": stats["entries"],
+            "cached_bytes": stats["bytes"],
+            "by_query_type": stats["namespaces"]
         }
 
     def get_query_stats(self) -> Dict[str, Dict]:
@@ -680,22 +664,16 @@ class QueryOptimizationService:
         """清理缓存"""
         if query_type:
             # 只清理特定类型的缓存
-            keys_to_remove = [
-                key for key, entry in self.cache.items()
-                if entry.query_type == query_type
-            ]
-            for key in keys_to_remove:
-                del self.cache[key]
+            cleared_count = self.cache.clear_namespace(query_type.value)
 
             return {
                 "success": True,
                 "message": f"已清理 {query_type.value} 类型的缓存",
-                "cleared_count": len(keys_to_remove)
+                "cleared_count": cleared_count
             }
         else:
             # 清理所有缓存
-            cleared_count = len(self.cache)
-            self.cache.clear()
+            cleared_count = self.cache.clear()
 
             return {
                 "success": True,
@@ -5,9 +5,10 @@
 **文件名**: query_performance_monitor.py
 **职责**: 提供查询性能监控的统一接口，收集查询指标、系统资源、告警管理
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 查询性能监控服务
+- v1.1.0 (2026-10-16): 租户/慢查询/查询类型统计改由统一指标引擎（core/metrics.py）提供，读取不再持有全局锁
 
 ## [INPUT]
 - **query_id: str** - 查询ID
@@ -42,7 +43,7 @@
   - issues: 问题列表
 
 **上游依赖** (已读取源码):
-- 无（独立监控服务）
+- [../core/metrics.py](../core/metrics.py) - 时间分桶聚合、分位数草图、慢查询样本
 
 **下游依赖** (需要反向索引分析):
 - [llm_service.py](./llm_service.py) - LLM服务记录查询性能
@@ -77,8 +78,8 @@
   - _monitor_task: 后台监控任务
 - **查询性能监控器**: QueryPerformanceMonitor
   - query_history: deque（最多10000条）
-  - tenant_history: 字典（租户历史）
-  - query_type_stats: 字典（查询类型统计）
+  - metrics: MetricsRegistry，query_total_seconds 按 tenant_id/query_type/error/cache_hit 分序列，
+    每个时间桶保留最慢的 SLOW_QUERY_SAMPLES 条慢查询样本
   - stats: 实时统计字典（total_queries, cache_hits, errors, slow_queries, start_time）
   - alert_manager: 告警管理器
   - resource_monitor: 资源监控器
@@ -106,9 +107,7 @@
 - **异常处理**: try-except捕获异常，设置metrics.error = True
 - **try-finally**: 确保记录查询指标
 - **deque操作**: query_history.append(metrics)添加历史
-- **列表推导式**: [m for m in tenant_queries if m.timestamp >= cutoff_time]过滤历史
-- **排序**: slow.sort(key=lambda x: x.total_time, reverse=True)排序慢查询
-- **百分位数**: sorted(times)[int(len(times) * 0.95)]计算P95
+- **指标聚合**: metrics.collect/aggregate 合并时间桶，分位数来自可合并草图（O(桶数)）
 - **JSON序列化**: json.dumps(data, indent=2, ensure_ascii=False)导出JSON
 - **健康评分**: health_score -= 20/15/5根据问题扣分
 - **字典操作**: stats['total_queries'] += 1更新统计
@@ -132,12 +131,16 @@ import threading
 import hashlib
 import json
 import statistics
+import calendar
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
-from collections import defaultdict, deque
+from collections import deque
 from contextlib import asynccontextmanager
 from enum import Enum
+from itertools import islice
+
+from src.app.core.metrics import MetricAggregate, MetricsRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -457,17 +460,28 @@ class SystemResourceMonitor:
 
 
 
+def _utc_epoch(value: datetime) -> float:
+    """naive UTC 时间转时间戳"""
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
 class QueryPerformanceMonitor:
     """查询性能监控器 - 核心类"""
 
+    # 每个时间桶保留的慢查询样本数（与 /queries/slow 的 limit 上限一致）
+    SLOW_QUERY_SAMPLES = 200
+
     def __init__(self, max_history: int = 10000, slow_query_threshold: float = 5.0):
         self.max_history = max_history
         self.slow_query_threshold = slow_query_threshold
 
         # 查询历史存储
         self.query_history: deque = deque(maxlen=max_history)
-        self.tenant_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
-        self.query_type_stats: Dict[str, List[float]] = defaultdict(list)
+
+        # 聚合指标（租户、查询类型、慢查询统计均来自这里）
+        self.metrics = MetricsRegistry()
+        self.metrics.describe("query_total_seconds", "查询总耗时（秒）", keep_top=self.SLOW_QUERY_SAMPLES)
+        self._history_floor: Optional[datetime] = None
 
         # 实时统计
         self.stats = {
@@ -595,16 +609,29 @@ class QueryPerformanceMonitor:
 
     def _record_query_metrics(self, metrics: QueryMetrics):
         """记录查询指标"""
+        is_slow = metrics.total_time > self.slow_query_threshold
+        self.metrics.observe(
+            "query_total_seconds",
+            metrics.total_time,
+            {
+                "tenant_id": metrics.tenant_id,
+                "query_type": metrics.query_type,
+                "error": str(bool(metrics.error)).lower(),
+                "cache_hit": str(bool(metrics.cache_hit)).lower()
+            },
+            exemplar=metrics if is_slow else None,
+            timestamp=_utc_epoch(metrics.timestamp)
+        )
+
         with self._lock:
             self.query_history.append(metrics)
-            self.tenant_history[metrics.tenant_id].append(metrics)
 
             self.stats['total_queries'] += 1
             if metrics.cache_hit:
                 self.stats['cache_hits'] += 1
             if metrics.error:
                 self.stats['errors'] += 1
-            if metrics.total_time > self.slow_query_threshold:
+            if is_slow:
                 self.stats['slow_queries'] += 1
                 self.alert_manager.create_alert(
                     AlertType.SLOW_QUERY,
@@ -613,8 +640,6 @@ class QueryPerformanceMonitor:
                     metrics.tenant_id
                 )
 
-            self.query_type_stats[metrics.query_type].append(metrics.total_time)
-
     def get_real_time_stats(self) -> Dict[str, Any]:
         """获取实时统计"""
         with self._lock:
@@ -626,8 +651,8 @@ class QueryPerformanceMonitor:
             cache_rate = (self.stats['cache_hits'] / total * 100) if total > 0 else 0
             error_rate = (self.stats['errors'] / total * 100) if total > 0 else 0
 
-            recent_times = [m.total_time for m in list(self.query_history)[-100:]]
-            avg_time = statistics.mean(recent_times) if recent_times else 0
+            recent_times = [m.total_time for m in islice(reversed(self.query_history), 100)]
+            avg_time = sum(recent_times) / len(recent_times) if recent_times else 0
 
             system_metrics = self.resource_monitor.get_current_metrics()
 
@@ -647,64 +672,64 @@ class QueryPerformanceMonitor:
 
     def get_tenant_performance(self, tenant_id: str, hours: int = 24) -> Dict[str, Any]:
         """获取租户性能报告"""
-        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-
-        with self._lock:
-            tenant_queries = [
-                m for m in self.tenant_history.get(tenant_id, [])
-                if m.timestamp >= cutoff_time
-            ]
-
-            if not tenant_queries:
-                return {
-                    'tenant_id': tenant_id,
-                    'total_queries': 0,
-                    'message': '该时间段内无查询记录'
-                }
-
-            times = [m.total_time for m in tenant_queries]
-            errors = sum(1 for m in tenant_queries if m.error)
-            cache_hits = sum(1 for m in tenant_queries if m.cache_hit)
-
+        series = self.metrics.collect("query_total_seconds", {"tenant_id": tenant_id}, window=hours * 3600)
+        if not series:
             return {
                 'tenant_id': tenant_id,
-                'time_range_hours': hours,
-                'total_queries': len(tenant_queries),
-                'avg_execution_time': round(statistics.mean(times), 3),
-                'max_execution_time': round(max(times), 3),
-                'min_execution_time': round(min(times), 3),
-                'p95_execution_time': round(sorted(times)[int(len(times) * 0.95)] if times else 0, 3),
-                'error_count': errors,
-                'error_rate': round(errors / len(tenant_queries) * 100, 2),
-                'cache_hit_rate': round(cache_hits / len(tenant_queries) * 100, 2),
-                'slow_query_count': sum(1 for t in times if t > self.slow_query_threshold)
+                'total_queries': 0,
+                'message': '该时间段内无查询记录'
             }
 
+        times = MetricAggregate.merged(aggregate for _, aggregate in series)
+        errors = sum(aggregate.count for labels, aggregate in series if labels["error"] == "true")
+        cache_hits = sum(aggregate.count for labels, aggregate in series if labels["cache_hit"] == "true")
+
+        return {
+            'tenant_id': tenant_id,
+            'time_range_hours': hours,
+            'total_queries': times.count,
+            'avg_execution_time': round(times.avg, 3),
+            'max_execution_time': round(times.max, 3),
+            'min_execution_time': round(times.min, 3),
+            'p95_execution_time': round(times.quantile(0.95), 3),
+            'error_count': errors,
+            'error_rate': round(errors / times.count * 100, 2),
+            'cache_hit_rate': round(cache_hits / times.count * 100, 2),
+            'slow_query_count': times.count_above(self.slow_query_threshold)
+        }
+
     def get_slow_queries(self, hours: int = 24, limit: int = 50) -> List[Dict[str, Any]]:
         """获取慢查询列表"""
         cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+        if self._history_floor is not None:
+            cutoff_time = max(cutoff_time, self._history_floor)
+
+        if limit <= self.SLOW_QUERY_SAMPLES:
+            # 样本按时间桶保留，桶与窗口边界相交时再按时间精确过滤
+            slowest = self.metrics.aggregate("query_total_seconds", window=hours * 3600)
+            slow = [m for m in slowest.top_exemplars(limit * 2 + 10) if m.timestamp >= cutoff_time]
+            return [m.to_dict() for m in slow[:limit]]
 
         with self._lock:
             slow = [
                 m for m in self.query_history
                 if m.timestamp >= cutoff_time and m.total_time > self.slow_query_threshold
             ]
-            slow.sort(key=lambda x: x.total_time, reverse=True)
-            return [m.to_dict() for m in slow[:limit]]
+        slow.sort(key=lambda x: x.total_time, reverse=True)
+        return [m.to_dict() for m in slow[:limit]]
 
     def get_query_type_performance(self) -> Dict[str, Any]:
         """获取查询类型性能统计"""
-        with self._lock:
-            result = {}
-            for query_type, times in self.query_type_stats.items():
-                if times:
-                    result[query_type] = {
-                        'count': len(times),
-                        'avg_time': round(statistics.mean(times), 3),
-                        'max_time': round(max(times), 3),
-                        'min_time': round(min(times), 3)
-                    }
-            return result
+        result = {}
+        for query_type, times in self.metrics.aggregate("query_total_seconds", group_by="query_type").items():
+            result[query_type] = {
+                'count': times.count,
+                'avg_time': round(times.avg, 3),
+                'max_time': round(times.max, 3),
+                'min_time': round(times.min, 3),
+                'p95_time': round(times.quantile(0.95), 3)
+            }
+        return result
 
     def get_warnings(self, hours: int = 24) -> List[Dict[str, Any]]:
         """获取性能警告"""
@@ -742,8 +767,8 @@ class QueryPerformanceMonitor:
         with self._lock:
             if hours is None:
                 self.query_history.clear()
-                self.tenant_history.clear()
-                self.query_type_stats.clear()
+                self.metrics.clear()
+                self._history_floor = None
                 self.stats = {
                     'total_queries': 0,
                     'cache_hits': 0,
@@ -757,6 +782,7 @@ class QueryPerformanceMonitor:
                     [m for m in self.query_history if m.timestamp >= cutoff_time],
                     maxlen=self.max_history
                 )
+                self._history_floor = cutoff_time
         logger.info(f"已清除历史数据: hours={hours}")
 
     def get_health_status(self) -> Dict[str, Any]:
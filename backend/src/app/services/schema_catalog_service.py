@@ -0,0 +1,261 @@
+"""
+# [SCHEMA_CATALOG_SERVICE] 数据源Schema目录缓存
+
+## [HEADER]
+**文件名**: schema_catalog_service.py
+**职责**: 按数据源缓存内省得到的schema信息和预渲染的提示词片段，通过廉价指纹判断缓存是否失效
+**作者**: Data Agent Team
+**版本**: 1.0.0
+**变更记录**:
+- v1.0.0: 初始版本 - 版本化schema目录缓存
+
+## [INPUT]
+- **tenant_id: str** - 租户ID
+- **data_source_id: str** - 数据源ID
+- **fingerprint: Callable[[], Awaitable[Optional[str]]]** - 计算当前schema指纹的协程工厂
+- **builder: Callable[[], Awaitable[Dict[str, Any]]]** - 完整内省schema的协程工厂
+- **renderer: Callable[[Dict[str, Any]], str]** - 将schema渲染为提示词片段
+
+## [OUTPUT]
+- **SchemaCatalogEntry**: schema目录条目
+  - fingerprint: 构建时的schema指纹
+  - schema_info: schema信息字典
+  - prompt_fragment: 可直接注入系统提示词的文本
+  - version: 条目版本号（指纹变化重建时递增）
+
+**上游依赖** (已读取源码):
+- [cache_service.py](./cache_service.py) - CacheManager.get_tenant_schema / set_tenant_schema
+
+**下游依赖** (需要反向索引分析):
+- [../api/v1/endpoints/llm.py](../api/v1/endpoints/llm.py) - _get_data_sources_context 获取数据源上下文
+- [data_source_service.py](./data_source_service.py) - 数据源更新/删除时失效缓存
+
+## [STATE]
+- **缓存后端**: 优先使用全局CacheManager（Redis时多worker共享），未初始化时使用进程内MemoryCache
+- **校验间隔**: check_interval内直接返回缓存条目，不计算指纹
+- **单飞构建**: 同一数据源的并发请求只触发一次指纹校验/重建
+- **统计**: hits, misses, rebuilds, fingerprint_checks, invalidations
+
+## [SIDE-EFFECTS]
+- 读写缓存（schema键 tenant:{tenant_id}:schema:{data_source_id}）
+- 调用方提供的fingerprint/builder可能访问外部数据库或对象存储
+
+## [POS]
+**路径**: backend/src/app/services/schema_catalog_service.py
+**模块层级**: Level 1 (服务层)
+**依赖深度**: 依赖 cache_service
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .cache_service import CacheManager, MemoryCache, get_cache_manager
+
+logger = logging.getLogger(__name__)
+
+# 缓存条目格式版本，格式变化时递增使旧条目失效
+CATALOG_FORMAT_VERSION = 1
+
+
+@dataclass
+class SchemaCatalogEntry:
+    """数据源schema目录条目"""
+    data_source_id: str
+    fingerprint: Optional[str]
+    schema_info: Dict[str, Any]
+    prompt_fragment: str
+    version: int = 1
+    built_at: float = 0.0
+    checked_at: float = 0.0
+    build_seconds: float = 0.0
+    format_version: int = CATALOG_FORMAT_VERSION
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional["SchemaCatalogEntry"]:
+        if not isinstance(data, dict) or data.get("format_version") != CATALOG_FORMAT_VERSION:
+            return None
+        try:
+            return cls(**data)
+        except TypeError:
+            return None
+
+
+class SchemaCatalogService:
+    """数据源schema目录缓存服务"""
+
+    def __init__(
+        self,
+        cache_manager: Optional[CacheManager] = None,
+        ttl: int = 86400,
+        check_interval: float = 60
+    ):
+        """
+        初始化schema目录缓存
+
+        Args:
+            cache_manager: 缓存管理器（默认使用全局CacheManager）
+            ttl: 条目最长保留时间（秒）
+            check_interval: 指纹校验最小间隔（秒）
+        """
+        self._cache_manager = cache_manager
+        self._fallback_manager: Optional[CacheManager] = None
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "rebuilds": 0,
+            "fingerprint_checks": 0,
+            "invalidations": 0
+        }
+
+    @property
+    def cache_manager(self) -> CacheManager:
+        if self._cache_manager is not None:
+            return self._cache_manager
+        global_manager = get_cache_manager()
+        if global_manager is not None:
+            return global_manager
+        if self._fallback_manager is None:
+            self._fallback_manager = CacheManager(MemoryCache(max_size=1000, default_ttl=self.ttl))
+        return self._fallback_manager
+
+    def _lock_for(self, tenant_id: str, data_source_id: str) -> asyncio.Lock:
+        key = f"{tenant_id}:{data_source_id}"
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    async def get_entry(self, tenant_id: str, data_source_id: str) -> Optional[SchemaCatalogEntry]:
+        """读取缓存条目（不做任何校验）"""
+        try:
+            data = await self.cache_manager.get_tenant_schema(tenant_id, data_source_id)
+        except Exception as e:
+            logger.warning(f"读取schema目录缓存失败: {e}")
+            return None
+        return SchemaCatalogEntry.from_dict(data) if data else None
+
+    async def _store(self, tenant_id: str, entry: SchemaCatalogEntry) -> None:
+        try:
+            await self.cache_manager.set_tenant_schema(
+                tenant_id, entry.data_source_id, entry.to_dict(), ttl=self.ttl
+            )
+        except Exception as e:
+            logger.warning(f"写入schema目录缓存失败: {e}")
+
+    async def get_or_build(
+        self,
+        tenant_id: str,
+        data_source_id: str,
+        fingerprint: Callable[[], Awaitable[Optional[str]]],
+        builder: Callable[[], Awaitable[Dict[str, Any]]],
+        renderer: Callable[[Dict[str, Any]], str]
+    ) -> SchemaCatalogEntry:
+        """
+        获取数据源的schema目录条目，必要时重建
+
+        - 距上次校验不足check_interval：直接返回缓存
+        - 指纹未变化：刷新校验时间后返回缓存
+        - 指纹变化或无缓存：调用builder内省并用renderer预渲染提示词片段
+
+        空schema（内省失败）不写入缓存，下次请求会重试。
+
+        Returns:
+            SchemaCatalogEntry
+        """
+        entry = await self.get_entry(tenant_id, data_source_id)
+        if entry and time.time() - entry.checked_at < self.check_interval:
+            self.stats["hits"] += 1
+            return entry
+
+        async with self._lock_for(tenant_id, data_source_id):
+            # 等锁期间其他请求可能已完成校验
+            entry = await self.get_entry(tenant_id, data_source_id)
+            now = time.time()
+            if entry and now - entry.checked_at < self.check_interval:
+                self.stats["hits"] += 1
+                return entry
+
+            current_fingerprint = None
+            try:
+                self.stats["fingerprint_checks"] += 1
+                current_fingerprint = await fingerprint()
+            except Exception as e:
+                logger.warning(f"计算数据源 {data_source_id} 的schema指纹失败: {e}")
+
+            if entry and current_fingerprint is not None and current_fingerprint == entry.fingerprint:
+                self.stats["hits"] += 1
+                entry.checked_at = now
+                await self._store(tenant_id, entry)
+                return entry
+
+            self.stats["misses"] += 1
+            build_start = time.time()
+            schema_info = await builder()
+            fragment = renderer(schema_info or {})
+            built_at = time.time()
+
+            new_entry = SchemaCatalogEntry(
+                data_source_id=data_source_id,
+                fingerprint=current_fingerprint,
+                schema_info=schema_info or {},
+                prompt_fragment=fragment,
+                version=(entry.version + 1) if entry else 1,
+                built_at=built_at,
+                checked_at=built_at,
+                build_seconds=built_at - build_start
+            )
+
+            if schema_info and schema_info.get("tables"):
+                if entry:
+                    self.stats["rebuilds"] += 1
+                    logger.info(
+                        f"数据源 {data_source_id} schema已变化，重建目录 v{new_entry.version}"
+                    )
+                await self._store(tenant_id, new_entry)
+
+            return new_entry
+
+    async def invalidate(self, tenant_id: str, data_source_id: str) -> None:
+        """使数据源的schema目录失效（数据源更新或删除时调用）"""
+        self.stats["invalidations"] += 1
+        try:
+            await self.cache_manager.delete_tenant_schema(tenant_id, data_source_id)
+        except Exception as e:
+            logger.warning(f"删除schema目录缓存失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / total if total else 0,
+            "ttl": self.ttl,
+            "check_interval": self.check_interval
+        }
+
+
+# 全局schema目录服务实例
+_schema_catalog_service: Optional[SchemaCatalogService] = None
+
+
+def get_schema_catalog_service() -> SchemaCatalogService:
+    """获取全局schema目录服务"""
+    global _schema_catalog_service
+    if _schema_catalog_service is None:
+        try:
+            from ..core.config import settings
+            ttl = settings.schema_catalog_ttl
+            check_interval = settings.schema_catalog_check_interval
+        except Exception:
+            ttl, check_interval = 86400, 60
+        _schema_catalog_service = SchemaCatalogService(ttl=ttl, check_interval=check_interval)
+    return _schema_catalog_service
@@ -0,0 +1,414 @@
+"""
+# [SEMANTIC_QUERY_CACHE] 自然语言查询语义缓存
+
+## [HEADER]
+**文件名**: semantic_query_cache.py
+**职责**: 按租户+数据源维护历史问题的向量索引，对表述不同但语义相同的问题复用已缓存的回答
+**作者**: Data Agent Team
+**版本**: 1.0.0
+**变更记录**:
+- v1.0.0 (2026-10-16): 初始版本 - 精确文本缓存之外的可选语义层
+
+## [INPUT]
+- **tenant_id: str** - 租户ID
+- **connection_id: Optional[str]** - 数据源ID（索引按 租户+数据源 隔离）
+- **query: str** - 自然语言问题
+- **schema_version: Optional[str]** - 当前数据源schema版本（来自schema目录缓存的指纹）
+- **payload: Dict[str, Any]** - 要缓存的回答（answer、processing_steps 等）
+
+## [OUTPUT]
+- **SemanticCacheHit** - 命中结果（条目 + 相似度）
+- **get_stats()** - 命中率、守卫拦截数、误命中数
+
+## [LINK]
+**上游依赖**:
+- [zhipu_client.py](./zhipu_client.py) - embed_texts（向量经 embedding_store 缓存）
+- [schema_catalog_service.py](./schema_catalog_service.py) - 读取数据源schema指纹
+- [../core/metrics.py](../core/metrics.py) - 命中/误命中指标
+
+**调用方**:
+- [../api/v2/endpoints/query_stream_v2.py](../api/v2/endpoints/query_stream_v2.py) - 精确缓存未命中后查语义缓存，命中走缓存回放路径
+- [data_source_service.py](./data_source_service.py) - 数据源更新/删除时失效
+
+## [STATE]
+- **索引**: 进程内，每个 租户+数据源 一份（条目按最近使用排序，超出 max_entries 淘汰最久未用）
+- **命中条件**: 余弦相似度 ≥ similarity_threshold，且
+  1) 数字与时间/排序等关键词一致（"上月" 与 "本月"、"最高" 与 "最低" 不互相命中）
+  2) schema版本与写入时一致（不一致的条目直接删除）
+- **指标**: semantic_cache_lookups（标签 outcome=hit/miss/guard_rejected/stale/error，值为最高相似度）、
+  semantic_cache_false_hits
+
+## [POS]
+**路径**: backend/src/app/services/semantic_query_cache.py
+**模块层级**: Level 1 (服务层)
+**依赖深度**: 依赖 zhipu_client、schema_catalog_service、core.metrics
+"""
+
+import logging
+import math
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy 为可选依赖
+    np = None
+
+from src.app.core.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+EmbedFunc = Callable[[List[str]], Awaitable[Optional[List[List[float]]]]]
+
+# 语义相近但答案不同的关键词（同义写法映射到同一规范形式）
+_GUARD_TERMS = {
+    "今天": "今天", "今日": "今天", "昨天": "昨天", "昨日": "昨天", "前天": "前天", "明天": "明天",
+    "本周": "本周", "这周": "本周", "上周": "上周", "下周": "下周",
+    "本月": "本月", "这个月": "本月", "当月": "本月", "上月": "上月", "上个月": "上月",
+    "下月": "下月", "下个月": "下月",
+    "本季度": "本季度", "上季度": "上季度", "上个季度": "上季度",
+    "今年": "今年", "本年": "今年", "去年": "去年", "上年": "去年", "前年": "前年", "明年": "明年",
+    "同比": "同比", "环比": "环比",
+    "最高": "最高", "最多": "最高", "最大": "最高", "最低": "最低", "最少": "最低", "最小": "最低",
+    "升序": "升序", "降序": "降序", "增长": "增长", "上升": "增长", "下降": "下降", "减少": "下降",
+}
+_GUARD_PATTERN = re.compile(
+    r"\d+(?:\.\d+)?|" + "|".join(sorted(map(re.escape, _GUARD_TERMS), key=len, reverse=True))
+)
+
+
+def normalize_query(query: str) -> str:
+    """标准化问题文本（小写、合并空白）"""
+    return " ".join(query.lower().strip().split())
+
+
+def literal_signature(query: str) -> Tuple[str, ...]:
+    """提取问题中的数字和关键词，作为语义命中的守卫条件"""
+    return tuple(sorted({_GUARD_TERMS.get(token, token) for token in _GUARD_PATTERN.findall(query)}))
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+@dataclass
+class SemanticCacheEntry:
+    """语义缓存条目"""
+    entry_id: str
+    query: str
+    signature: Tuple[str, ...]
+    vector: List[float]
+    payload: Dict[str, Any]
+    schema_version: Optional[str] = None
+    sql: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+@dataclass
+class SemanticCacheHit:
+    """语义缓存命中结果"""
+    entry: SemanticCacheEntry
+    similarity: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "entry_id": self.entry.entry_id,
+            "matched_query": self.entry.query,
+            "similarity": round(self.similarity, 4)
+        }
+
+
+class _ScopeIndex:
+    """单个 租户+数据源 的向量索引"""
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, SemanticCacheEntry]" = OrderedDict()
+        self._matrix = None
+        self._ids: List[str] = []
+
+    def add(self, entry: SemanticCacheEntry) -> None:
+        self.entries[entry.entry_id] = entry
+        self._matrix = None
+
+    def remove(self, entry_id: str) -> Optional[SemanticCacheEntry]:
+        entry = self.entries.pop(entry_id, None)
+        if entry is not None:
+            self._matrix = None
+        return entry
+
+    def rank(self, vector: List[float]) -> List[Tuple[float, SemanticCacheEntry]]:
+        """返回 (相似度, 条目) 列表，按相似度降序（向量均已归一化）"""
+        if np is not None:
+            if self._matrix is None:
+                self._ids = list(self.entries)
+                self._matrix = np.asarray([self.entries[i].vector for i in self._ids], dtype=np.float32)
+            scores = self._matrix @ np.asarray(vector, dtype=np.float32)
+            scored = [(float(score), self.entries[self._ids[i]]) for i, score in enumerate(scores)]
+        else:
+            scored = [
+                (sum(a * b for a, b in zip(entry.vector, vector)), entry)
+                for entry in self.entries.values()
+            ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+
+class SemanticQueryCache:
+    """
+    自然语言查询语义缓存
+
+    只在精确缓存未命中后使用；索引为空时不调用嵌入API。
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.92,
+        ttl: float = 600,
+        max_entries: int = 500,
+        embed: Optional[EmbedFunc] = None
+    ):
+        """
+        Args:
+            similarity_threshold: 命中所需的最低余弦相似度
+            ttl: 条目有效期（秒）
+            max_entries: 每个 租户+数据源 最多保留的条目数
+            embed: 文本嵌入协程（默认 zhipu_service.embed_texts）
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._embed = embed
+        self._scopes: Dict[str, _ScopeIndex] = {}
+        self.metrics = MetricsRegistry()
+        self.metrics.describe("semantic_cache_lookups", "语义缓存查找（值为最高相似度）")
+        self.metrics.describe("semantic_cache_false_hits", "被反馈为答非所问的语义命中")
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "guard_rejections": 0,
+            "stale_evictions": 0,
+            "false_hits": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+    @staticmethod
+    def _scope_key(tenant_id: str, connection_id: Optional[str]) -> str:
+        return f"{tenant_id}:{connection_id or ''}"
+
+    async def _embed_query(self, query: str) -> Optional[List[float]]:
+        embed = self._embed
+        if embed is None:
+            from .zhipu_client import zhipu_service
+            embed = zhipu_service.embed_texts
+        vectors = await embed([normalize_query(query)])
+        if not vectors or not vectors[0]:
+            return None
+        return _unit(list(vectors[0]))
+
+    async def current_schema_version(self, tenant_id: str, connection_id: Optional[str]) -> Optional[str]:
+        """数据源当前的schema版本（schema目录缓存中的指纹，没有时为 None）"""
+        if not connection_id:
+            return None
+        try:
+            from .schema_catalog_service import get_schema_catalog_service
+            entry = await get_schema_catalog_service().get_entry(tenant_id, connection_id)
+        except Exception as e:
+            logger.warning(f"读取数据源 {connection_id} 的schema版本失败: {e}")
+            return None
+        if entry is None:
+            return None
+        return entry.fingerprint or f"v{entry.version}"
+
+    def _record(self, outcome: str, tenant_id: str, similarity: float = 0.0) -> None:
+        self.metrics.observe(
+            "semantic_cache_lookups", max(similarity, 0.0), {"tenant_id": tenant_id, "outcome": outcome}
+        )
+
+    def _prune(self, index: _ScopeIndex, now: float) -> None:
+        for entry_id in [i for i, e in index.entries.items() if now - e.created_at >= self.ttl]:
+            index.remove(entry_id)
+
+    async def lookup(
+        self,
+        tenant_id: str,
+        connection_id: Optional[str],
+        query: str,
+        schema_version: Optional[str] = None
+    ) -> Optional[SemanticCacheHit]:
+        """
+        查找语义相近的已缓存问题
+
+        Returns:
+            SemanticCacheHit；没有满足阈值和守卫条件的条目时返回 None
+        """
+        index = self._scopes.get(self._scope_key(tenant_id, connection_id))
+        if index is not None:
+            self._prune(index, time.time())
+        if index is None or not index.entries:
+            self.stats["misses"] += 1
+            self._record("miss", tenant_id)
+            return None
+
+        try:
+            vector = await self._embed_query(query)
+        except Exception as e:
+            logger.warning(f"语义缓存嵌入失败: {e}")
+            vector = None
+        if vector is None:
+            self.stats["misses"] += 1
+            self._record("error", tenant_id)
+            return None
+
+        signature = literal_signature(query)
+        ranked = index.rank(vector)
+        best = ranked[0][0] if ranked else 0.0
+        outcome = "miss"
+
+        for similarity, entry in ranked:
+            if similarity < self.similarity_threshold:
+                break
+            if entry.signature != signature:
+                outcome = "guard_rejected"
+                self.stats["guard_rejections"] += 1
+                continue
+            if entry.schema_version != schema_version:
+                # 数据源结构已变化，缓存的回答和SQL都不再可信
+                index.remove(entry.entry_id)
+                outcome = "stale"
+                self.stats["stale_evictions"] += 1
+                continue
+
+            entry.hits += 1
+            index.entries.move_to_end(entry.entry_id)
+            self.stats["hits"] += 1
+            self._record("hit", tenant_id, similarity)
+            logger.info(
+                f"语义缓存命中: '{query[:30]}' ≈ '{entry.query[:30]}' "
+                f"(相似度 {similarity:.3f}, tenant={tenant_id})"
+            )
+            return SemanticCacheHit(entry, similarity)
+
+        self.stats["misses"] += 1
+        self._record(outcome, tenant_id, best)
+        return None
+
+    async def store(
+        self,
+        tenant_id: str,
+        connection_id: Optional[str],
+        query: str,
+        payload: Dict[str, Any],
+        schema_version: Optional[str] = None,
+        sql: Optional[str] = None
+    ) -> Optional[SemanticCacheEntry]:
+        """
+        写入回答（同一问题的旧条目被替换）
+
+        Returns:
+            SemanticCacheEntry；嵌入失败时返回 None
+        """
+        try:
+            vector = await self._embed_query(query)
+        except Exception as e:
+            logger.warning(f"语义缓存嵌入失败: {e}")
+            vector = None
+        if vector is None:
+            return None
+
+        scope = self._scope_key(tenant_id, connection_id)
+        index = self._scopes.setdefault(scope, _ScopeIndex())
+        normalized = normalize_query(query)
+        for entry_id in [i for i, e in index.entries.items() if normalize_query(e.query) == normalized]:
+            index.remove(entry_id)
+
+        entry = SemanticCacheEntry(
+            entry_id=uuid.uuid4().hex,
+            query=query,
+            signature=literal_signature(query),
+            vector=vector,
+            payload=payload,
+            schema_version=schema_version,
+            sql=sql
+        )
+        index.add(entry)
+        self.stats["stores"] += 1
+
+        while len(index.entries) > self.max_entries:
+            index.remove(next(iter(index.entries)))
+            self.stats["evictions"] += 1
+        return entry
+
+    def report_false_hit(self, tenant_id: str, connection_id: Optional[str], entry_id: str) -> bool:
+        """
+        记录一次误命中（用户反馈答非所问）并删除该条目
+
+        Returns:
+            bool: 条目是否存在
+        """
+        index = self._scopes.get(self._scope_key(tenant_id, connection_id))
+        entry = index.remove(entry_id) if index is not None else None
+        self.stats["false_hits"] += 1
+        self.metrics.observe("semantic_cache_false_hits", 1, {"tenant_id": tenant_id})
+        if entry is not None:
+            logger.warning(f"语义缓存误命中: '{entry.query[:50]}' (tenant={tenant_id})")
+        return entry is not None
+
+    def invalidate(self, tenant_id: str, connection_id: Optional[str] = None) -> int:
+        """
+        使 租户+数据源 的语义缓存失效；不指定数据源时失效该租户全部索引
+
+        Returns:
+            删除的条目数
+        """
+        if connection_id is not None:
+            scopes = [self._scope_key(tenant_id, connection_id)]
+        else:
+            scopes = [key for key in self._scopes if key.startswith(f"{tenant_id}:")]
+        removed = 0
+        for scope in scopes:
+            index = self._scopes.pop(scope, None)
+            if index is not None:
+                removed += len(index.entries)
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": sum(len(index.entries) for index in self._scopes.values()),
+            "scopes": len(self._scopes),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0,
+            "false_hit_rate": self.stats["false_hits"] / self.stats["hits"] if self.stats["hits"] else 0,
+            "similarity_threshold": self.similarity_threshold
+        }
+
+
+# 全局语义缓存实例（未启用时为 None）
+_semantic_query_cache: Optional[SemanticQueryCache] = None
+
+
+def get_semantic_query_cache() -> Optional[SemanticQueryCache]:
+    """获取语义缓存（配置 semantic_cache_enabled=False 时返回 None）"""
+    global _semantic_query_cache
+    if _semantic_query_cache is None:
+        try:
+            from src.app.core.config import settings
+            if not settings.semantic_cache_enabled:
+                return None
+            _semantic_query_cache = SemanticQueryCache(
+                similarity_threshold=settings.semantic_cache_threshold,
+                ttl=settings.semantic_cache_ttl,
+                max_entries=settings.semantic_cache_max_entries
+            )
+        except Exception as e:
+            logger.warning(f"语义缓存初始化失败: {e}")
+            return None
+    return _semantic_query_cache
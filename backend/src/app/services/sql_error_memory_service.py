@@ -51,14 +51,15 @@
 import hashlib
 import re
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select
 from fastapi import Depends
 
 from src.app.data.models import SQLErrorMemory, SQLErrorType
-from src.app.data.database import get_db
+from src.app.data.database import get_db, maybe_await
 
 logger = logging.getLogger(__name__)
 
@@ -66,7 +67,9 @@ logger = logging.getLogger(__name__)
 class SQLErrorMemoryService:
     """SQL错误记忆服务 - 让AI从错误中学习"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Union[Session, AsyncSession]):
+        # 对话链路（record_error / get_relevant_errors）同时支持异步会话，
+        # 管理接口的其余方法仍使用同步会话
         self.db = db
 
     # ========================================================================
@@ -233,12 +236,15 @@ class SQLErrorMemoryService:
         error_hash = self.generate_error_pattern_hash(error_type, table_name, error_message)
 
         # 4. 检查是否已存在相同错误模式
-        existing = self.db.query(SQLErrorMemory).filter(
-            and_(
-                SQLErrorMemory.tenant_id == tenant_id,
-                SQLErrorMemory.error_pattern_hash == error_hash
-            )
-        ).first()
+        result = await maybe_await(self.db.execute(
+            select(SQLErrorMemory).where(
+                and_(
+                    SQLErrorMemory.tenant_id == tenant_id,
+                    SQLErrorMemory.error_pattern_hash == error_hash
+                )
+            ).limit(1)
+        ))
+        existing = result.scalars().first()
 
         if existing:
             # 更新现有记录
@@ -251,8 +257,8 @@ class SQLErrorMemoryService:
                 if schema_context:
                     existing.schema_context = schema_context
 
-            self.db.commit()
-            self.db.refresh(existing)
+            await maybe_await(self.db.commit())
+            await maybe_await(self.db.refresh(existing))
             logger.info(f"Updated existing error memory: {error_hash[:8]}... (occurrence: {existing.occurrence_count})")
             return existing
 
@@ -272,8 +278,8 @@ class SQLErrorMemoryService:
         )
 
         self.db.add(error_memory)
-        self.db.commit()
-        self.db.refresh(error_memory)
+        await maybe_await(self.db.commit())
+        await maybe_await(self.db.refresh(error_memory))
 
         logger.info(f"Created new error memory: {error_hash[:8]}... for tenant {tenant_id}")
         return error_memory
@@ -320,13 +326,13 @@ class SQLErrorMemoryService:
         Returns:
             List[SQLErrorMemory]: 相关错误记忆列表
         """
-        query = self.db.query(SQLErrorMemory).filter(
+        stmt = select(SQLErrorMemory).where(
             SQLErrorMemory.tenant_id == tenant_id
         )
 
         # 如果指定表名，优先检索该表相关错误
         if table_name:
-            query = query.filter(
+            stmt = stmt.where(
                 or_(
                     SQLErrorMemory.table_name == table_name,
                     SQLErrorMemory.table_name.is_(None)  # 也包含通用错误
@@ -334,12 +340,13 @@ class SQLErrorMemoryService:
             )
 
         # 按出现次数和有效性排序
-        query = query.order_by(
+        stmt = stmt.order_by(
             SQLErrorMemory.occurrence_count.desc(),
             SQLErrorMemory.success_count.desc()
         )
 
-        results = query.limit(limit).all()
+        result = await maybe_await(self.db.execute(stmt.limit(limit)))
+        results = list(result.scalars().all())
         logger.info(f"Found {len(results)} relevant errors for tenant {tenant_id}, table {table_name}")
         return results
 
@@ -5,9 +5,10 @@
 **文件名**: usage_monitoring_service.py
 **职责**: 监控Token使用量、API调用次数、成本计算，提供使用量限制检查和统计功能
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.0
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 使用量监控服务
+- v1.1.0 (2026-10-16): 当前用量与周期统计改由统一指标引擎（core/metrics.py）按时间桶聚合
 
 ## [INPUT]
 - **tenant_id: str** - 租户ID
@@ -44,6 +45,7 @@
 **上游依赖** (已读取源码):
 - Python标准库: asyncio, collections（defaultdict, deque）, dataclasses, datetime, enum, json, logging, time
 - 项目配置: src.app.core.config.settings
+- [../core/metrics.py](../core/metrics.py) - Token/成本按 tenant_id/provider/model 时间分桶聚合
 
 **下游依赖** (需要反向索引分析):
 - [llm_service.py](./llm_service.py) - LLM服务记录使用量
@@ -77,10 +79,9 @@
 - **实时统计更新**: real_time_usage[tenant_id][key] += amount
 - **小时统计更新**: hourly_usage[tenant_id][-1] += amount
 - **成本计算**: _calculate_cost根据模型和Token数计算成本
-- **时间过滤**: datetime.utcnow()替换、today_start、month_start计算
-- **列表推导式过滤**: [record for record in self.cost_records if conditions]
-- **聚合计算**: sum(record.total_tokens for record in filtered_costs)
-- **分组统计**: defaultdict(lambda: {"tokens": 0, "calls": 0, "cost": 0.0})按提供商/模型分组
+- **时间过滤**: datetime.utcnow()替换、today_start、month_start计算（均为整点，与小时桶对齐）
+- **指标记录**: record_cost 写入 llm_tokens、llm_cost_usd（标签 tenant_id/provider/model）
+- **聚合计算**: metrics.collect 合并时间桶，按 provider/model 标签分组
 - **JSON序列化**: json.dumps(data, indent=2, ensure_ascii=False)导出JSON
 - **CSV格式化**: "\n".join(lines)生成CSV字符串
 - **内存估算**: (len(records)*200 + len(cost_records)*300 + ...) / (1024*1024)
@@ -102,9 +103,11 @@ from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 from enum import Enum
 import asyncio
+import calendar
 from collections import defaultdict, deque
 
 from src.app.core.config import settings
+from src.app.core.metrics import MetricsRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -177,6 +180,11 @@ class UsageStatistics:
     timestamp: datetime = field(default_factory=datetime.utcnow)
 
 
+def _utc_epoch(value: datetime) -> float:
+    """naive UTC 时间转时间戳"""
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
 class UsageTracker:
     """使用量跟踪器"""
 
@@ -186,6 +194,11 @@ class UsageTracker:
         self.real_time_usage: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
         self.hourly_usage: Dict[str, List[int]] = defaultdict(list)  # 最近24小时的每小时使用量
 
+        # Token/成本聚合（当前用量、周期统计从这里读取，不再遍历 cost_records）
+        self.metrics = MetricsRegistry()
+        self.metrics.describe("llm_tokens", "LLM调用消耗的Token数")
+        self.metrics.describe("llm_cost_usd", "LLM调用预估成本（美元）")
+
         # Token定价配置（示例价格，实际应根据API提供商定价调整）
         self.pricing_config = {
             ProviderType.ZHIPU: {
@@ -295,6 +308,15 @@ class UsageTracker:
             # 添加到内存记录
             self.cost_records.append(cost_record)
 
+            labels = {
+                "tenant_id": tenant_id,
+                "provider": provider.value,
+                "model": model
+            }
+            timestamp = _utc_epoch(cost_record.timestamp)
+            self.metrics.observe("llm_tokens", total_tokens, labels, timestamp=timestamp)
+            self.metrics.observe("llm_cost_usd", estimated_cost, labels, timestamp=timestamp)
+
             logger.debug(f"记录成本: {tenant_id} {provider.value} {model} ${estimated_cost:.6f}")
             return True
 
@@ -409,30 +431,8 @@ class UsageTracker:
             today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
             month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-            # 过滤记录
-            filtered_costs = [
-                record for record in self.cost_records
-                if record.tenant_id == tenant_id
-                and (provider is None or record.provider == provider)
-            ]
-
-            # 计算每日使用量
-            daily_costs = [
-                record for record in filtered_costs
-                if record.timestamp >= today_start
-            ]
-            daily_tokens = sum(record.total_tokens for record in daily_costs)
-            daily_api_calls = len(daily_costs)
-            daily_cost = sum(record.estimated_cost for record in daily_costs)
-
-            # 计算每月使用量
-            monthly_costs = [
-                record for record in filtered_costs
-                if record.timestamp >= month_start
-            ]
-            monthly_tokens = sum(record.total_tokens for record in monthly_costs)
-            monthly_api_calls = len(monthly_costs)
-            monthly_cost = sum(record.estimated_cost for record in monthly_costs)
+            daily_tokens, daily_api_calls, daily_cost = self._usage_totals(tenant_id, provider, today_start)
+            monthly_tokens, monthly_api_calls, monthly_cost = self._usage_totals(tenant_id, provider, month_start)
 
             return {
                 "daily_tokens": daily_tokens,
@@ -479,34 +479,30 @@ class UsageTracker:
             else:
                 start_time = now - timedelta(days=1)
 
-            # 过滤记录
-            filtered_costs = [
-                record for record in self.cost_records
-                if (record.tenant_id == tenant_id and
-                    record.timestamp >= start_time and
-                    (provider is None or record.provider == provider))
-            ]
-
-            # 计算总体统计
-            total_tokens = sum(record.total_tokens for record in filtered_costs)
-            total_api_calls = len(filtered_costs)
-            total_cost = sum(record.estimated_cost for record in filtered_costs)
+            since = _utc_epoch(start_time)
+            labels = self._usage_labels(tenant_id, provider)
+            tokens = self.metrics.collect("llm_tokens", labels, since=since)
+            costs = {
+                (series["provider"], series["model"]): aggregate.total
+                for series, aggregate in self.metrics.collect("llm_cost_usd", labels, since=since)
+            }
 
-            # 按提供商分组
+            # 按提供商/模型分组
             provider_breakdown = defaultdict(lambda: {"tokens": 0, "calls": 0, "cost": 0.0})
-            for record in filtered_costs:
-                key = record.provider.value
-                provider_breakdown[key]["tokens"] += record.total_tokens
-                provider_breakdown[key]["calls"] += 1
-                provider_breakdown[key]["cost"] += record.estimated_cost
-
-            # 按模型分组
             model_breakdown = defaultdict(lambda: {"tokens": 0, "calls": 0, "cost": 0.0})
-            for record in filtered_costs:
-                key = f"{record.provider.value}:{record.model}"
-                model_breakdown[key]["tokens"] += record.total_tokens
-                model_breakdown[key]["calls"] += 1
-                model_breakdown[key]["cost"] += record.estimated_cost
+            for series, aggregate in tokens:
+                cost = costs.get((series["provider"], series["model"]), 0.0)
+                for breakdown, key in (
+                    (provider_breakdown, series["provider"]),
+                    (model_breakdown, f"{series['provider']}:{series['model']}")
+                ):
+                    breakdown[key]["tokens"] += int(aggregate.total)
+                    breakdown[key]["calls"] += aggregate.count
+                    breakdown[key]["cost"] += cost
+
+            total_tokens = sum(item["tokens"] for item in provider_breakdown.values())
+            total_api_calls = sum(item["calls"] for item in provider_breakdown.values())
+            total_cost = sum(item["cost"] for item in provider_breakdown.values())
 
             return UsageStatistics(
                 tenant_id=tenant_id,
@@ -523,6 +519,31 @@ class UsageTracker:
             logger.error(f"获取使用量统计失败: {e}")
             return UsageStatistics(tenant_id=tenant_id, period=period)
 
+    @staticmethod
+    def _usage_labels(tenant_id: str, provider: Optional[ProviderType]) -> Dict[str, str]:
+        labels = {"tenant_id": tenant_id}
+        if provider is not None:
+            labels["provider"] = provider.value
+        return labels
+
+    def _usage_totals(
+        self,
+        tenant_id: str,
+        provider: Optional[ProviderType],
+        start_time: datetime
+    ) -> Tuple[int, int, float]:
+        """
+        统计 start_time（UTC）以来的用量
+
+        Returns:
+            (Token数, API调用次数, 成本)
+        """
+        labels = self._usage_labels(tenant_id, provider)
+        since = _utc_epoch(start_time)
+        tokens = self.metrics.aggregate("llm_tokens", labels, since=since)
+        cost = self.metrics.aggregate("llm_cost_usd", labels, since=since)
+        return int(tokens.total), tokens.count, cost.total
+
     async def get_real_time_usage(self, tenant_id: str) -> Dict[str, Any]:
         """
         获取实时使用量
@@ -5,9 +5,11 @@
 **文件名**: zhipu_client.py
 **职责**: 封装智谱AI API调用，提供重试机制、熔断器、缓存、性能监控、安全检查和智能参数调整
 **作者**: Data Agent Team
-**版本**: 1.0.0
+**版本**: 1.1.1
 **变更记录**:
 - v1.0.0 (2026-01-01): 初始版本 - 增强型智谱AI服务
+- v1.1.0 (2026-10-16): 响应缓存改用 core.lru_cache.LRUCache，淘汰由 O(n) 遍历改为 O(1)
+- v1.1.1 (2026-10-16): 流式泵改为每个流一个专用线程，不再占用 _run_blocking 的请求线程池
 
 ## [INPUT]
 - **messages: List[Dict[str, str]]** - 对话消息列表
@@ -30,7 +32,8 @@
   - model: str - 使用的模型
   - created_at: str - 创建时间
   - finish_reason: str - 结束原因
-- **AsyncGenerator[Dict[str, Any]]**: 流式响应
+- **AsyncIterator[Any]**: chat_completion(stream=True) 的流式响应（SDK原始块，请求与逐块读取在后台线程中进行）
+- **AsyncGenerator[Dict[str, Any]]**: 流式响应（stream_chat_completion）
   - type: str - 块类型 ("thinking", "content", "error")
   - content: str - 内容
   - model: str - 模型名称
@@ -43,6 +46,8 @@
 - [./core/config.py](./core/config.py) - 配置管理（API keys、模型配置）
 - [./core/performance_optimizer.py](./core/performance_optimizer.py) - 性能监控装饰器
 - [./core/security_monitor.py](./core/security_monitor.py) - 安全监控和敏感数据过滤
+- [./core/lru_cache.py](./core/lru_cache.py) - 有界LRU响应缓存
+- [embedding_store.py](./embedding_store.py) - 嵌入向量缓存和文档矩阵缓存
 
 **下游依赖** (需要反向索引分析):
 - [llm_service.py](./llm_service.py) - LLM服务（使用ZhipuProvider）
@@ -54,7 +59,7 @@
 
 ## [STATE]
 - **缓存系统**:
-  - 内存字典缓存（LRU淘汰策略）
+  - 有界LRU响应缓存（core.lru_cache.LRUCache，100条，5分钟过期）
   - 最大100条记录
   - TTL 5分钟
   - 基于MD5的缓存键
@@ -73,8 +78,8 @@
 
 ## [SIDE-EFFECTS]
 - **HTTP请求**: 调用智谱AI REST API
-- **异步操作**: async/await模式
-- **缓存读写**: 内存字典操作
+- **异步操作**: async/await模式，同步SDK调用在专用线程池中执行，流式响应由每个流独立的后台线程泵入有界asyncio.Queue（长时间的流不占用请求线程池）
+- **缓存读写**: LRUCache读写；嵌入向量读写 embedding_store（SQLite文件）
 - **性能日志**: 定时记录统计信息
 - **安全检查**: security_monitor.check_request_security（可跳过）
 - **敏感信息过滤**: API key、token、password等敏感词过滤
@@ -93,19 +98,24 @@ GLM API 调用封装
 
 import zhipuai
 from zhipuai import ZhipuAI
-from typing import Dict, Any, Optional, List, AsyncGenerator
+from typing import Dict, Any, Optional, List, AsyncGenerator, AsyncIterator, Callable, Iterable, Union
 import logging
 import json
 import time
 import asyncio
 import hashlib
+import inspect
 import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import wraps
 
 from src.app.core.config import settings
+from src.app.core.lru_cache import LRUCache
 from src.app.core.performance_optimizer import performance_monitor, resource_monitor
 from src.app.core.security_monitor import security_monitor, SensitiveDataFilter
+from src.app.services.embedding_store import EmbeddingStore, get_embedding_store
 
 logger = logging.getLogger(__name__)
 
@@ -126,11 +136,9 @@ def retry_on_failure(max_retries: int = 3, delay: float = 1.0, backoff: float =
         circuit_open = False
         reset_timeout = 60  # 熔断器重置时间(秒)
 
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            nonlocal failure_count, last_failure_time, circuit_open
+        def check_circuit():
+            nonlocal failure_count, circuit_open
 
-            # 检查熔断器状态
             if circuit_open:
                 if time.time() - last_failure_time > reset_timeout:
                     circuit_open = False
@@ -139,6 +147,24 @@ def retry_on_failure(max_retries: int = 3, delay: float = 1.0, backoff: float =
                 else:
                     raise Exception(f"熔断器开启: {func.__name__} 服务暂时不可用")
 
+        if inspect.isasyncgenfunction(func):
+            # 异步生成器（流式接口）：已产出的数据无法重放，只做熔断检查，
+            # 错误由生成器自身转换为 error 块
+            @wraps(func)
+            async def gen_wrapper(*args, **kwargs):
+                check_circuit()
+                async for item in func(*args, **kwargs):
+                    yield item
+
+            return gen_wrapper
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            nonlocal failure_count, last_failure_time, circuit_open
+
+            # 检查熔断器状态
+            check_circuit()
+
             try:
                 # 如果是协程函数，需要 await
                 if asyncio.iscoroutinefunction(func):
@@ -209,6 +235,13 @@ class ZhipuAIService:
         self.temperature = 0.7
         self.rate_limit_delay = 0.1  # 速率限制延迟(秒)
 
+        # 同步SDK调用的专用线程池（首次使用时创建），避免阻塞事件循环
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        # 嵌入向量缓存（首次使用时取全局实例）
+        self.embedding_store: Optional[EmbeddingStore] = None
+
         # 性能监控
         self.request_count = 0
         self.success_count = 0
@@ -216,10 +249,10 @@ class ZhipuAIService:
         self.total_response_time = 0
         self.last_performance_log = time.time()
 
-        # 简单内存缓存
-        self.cache = {}
+        # 响应缓存（有界LRU，5分钟过期）
         self.cache_max_size = 100
         self.cache_ttl = 300  # 5分钟
+        self.cache = LRUCache(name="zhipu_responses", max_entries=self.cache_max_size, default_ttl=self.cache_ttl)
 
         # 思考模式指示词
         self.thinking_indicators = [
@@ -228,6 +261,94 @@ class ZhipuAIService:
             "原理", "机制", "策略", "方案", "优缺点", "详细说明"
         ]
 
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取执行同步SDK调用的线程池"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=getattr(settings, "zhipuai_max_concurrency", 32),
+                        thread_name_prefix="zhipu-io"
+                    )
+        return self._executor
+
+    async def _run_blocking(self, func: Callable[[], Any]) -> Any:
+        """在线程池中执行同步调用，等待期间事件循环可继续处理其他请求"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func)
+
+    async def _iterate_in_thread(
+        self,
+        iterable_factory: Callable[[], Iterable[Any]],
+        buffer_size: Optional[int] = None
+    ) -> AsyncIterator[Any]:
+        """
+        在后台线程中消费同步迭代器，逐块交给事件循环
+
+        iterable_factory 在该流专用的后台线程中调用（发起HTTP请求本身也不占用事件循环）；
+        流可能持续数分钟，不放入 _run_blocking 的线程池，以免长流占满请求线程。
+        后台线程最多领先消费端 buffer_size 个块，消费端变慢时线程等待而不是
+        无限缓冲；消费端提前退出时线程在下一个块处停止并关闭底层响应。
+
+        Args:
+            iterable_factory: 返回同步迭代器的函数
+            buffer_size: 最多缓冲的块数，默认取配置 zhipuai_stream_buffer_size
+
+        Yields:
+            迭代器产出的原始块
+        """
+        loop = asyncio.get_running_loop()
+        buffer_size = buffer_size or getattr(settings, "zhipuai_stream_buffer_size", 64)
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = threading.BoundedSemaphore(buffer_size)
+        stopped = threading.Event()
+
+        def emit(kind: str, payload: Any):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (kind, payload))
+            except RuntimeError:
+                # 事件循环已关闭，消费端不复存在
+                stopped.set()
+
+        def pump():
+            iterable = None
+            try:
+                iterable = iterable_factory()
+                for item in iterable:
+                    # 背压：等待消费端腾出缓冲位，期间响应停止信号
+                    while not slots.acquire(timeout=0.1):
+                        if stopped.is_set():
+                            return
+                    if stopped.is_set():
+                        return
+                    emit("item", item)
+            except Exception as e:
+                emit("error", e)
+            else:
+                emit("done", None)
+            finally:
+                close = getattr(iterable, "close", None)
+                if callable(close):
+                    try:
+                        close()
+                    except Exception as e:
+                        logger.debug(f"关闭流式响应失败: {e}")
+
+        threading.Thread(target=pump, name="zhipu-stream", daemon=True).start()
+
+        try:
+            while True:
+                kind, payload = await queue.get()
+                if kind == "item":
+                    slots.release()
+                    yield payload
+                elif kind == "error":
+                    raise payload
+                else:
+                    break
+        finally:
+            stopped.set()
+
     def _get_cache_key(self, model: str, messages: List[Dict[str, str]],
                       max_tokens: int, temperature: float) -> str:
         """生成缓存键"""
@@ -236,26 +357,14 @@ class ZhipuAIService:
 
     def _get_cached_response(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """获取缓存响应"""
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            if time.time() - cached_data['timestamp'] < self.cache_ttl:
-                logger.debug(f"缓存命中: {cache_key[:8]}...")
-                return cached_data['response']
-            else:
-                del self.cache[cache_key]  # 过期删除
-        return None
+        response = self.cache.get(cache_key)
+        if response is not None:
+            logger.debug(f"缓存命中: {cache_key[:8]}...")
+        return response
 
     def _cache_response(self, cache_key: str, response: Dict[str, Any]):
-        """缓存响应"""
-        # LRU淘汰策略
-        if len(self.cache) >= self.cache_max_size:
-            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k]['timestamp'])
-            del self.cache[oldest_key]
-
-        self.cache[cache_key] = {
-            'response': response,
-            'timestamp': time.time()
-        }
+        """缓存响应（超出容量时由LRUCache淘汰最久未使用的条目）"""
+        self.cache.set(cache_key, response)
 
     def _log_performance_metrics(self, operation: str, duration: float, success: bool):
         """记录性能指标"""
@@ -401,14 +510,16 @@ class ZhipuAIService:
 
             logger.info(f"开始智谱AI流式调用: {model}, 思考模式: {enable_thinking}")
 
-            # 发起流式请求
-            response = self.client.chat.completions.create(**params)
+            # 发起流式请求（在后台线程中执行，逐块泵回事件循环）
+            response = self._iterate_in_thread(
+                lambda: self.client.chat.completions.create(**params)
+            )
 
             thinking_started = False
             content_started = False
 
             # 处理流式响应
-            for chunk in response:
+            async for chunk in response:
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
 
@@ -469,7 +580,7 @@ class ZhipuAIService:
                 if attempt > 0:
                     await asyncio.sleep(self.rate_limit_delay * (2 ** attempt))
 
-                result = api_call_func()
+                result = await self._run_blocking(api_call_func)
                 return result
 
             except Exception as e:
@@ -495,12 +606,13 @@ class ZhipuAIService:
         stream: bool = False,
         enable_cache: bool = True,
         skip_security_check: bool = False
-    ) -> Optional[Dict[str, Any]]:
+    ) -> Union[Dict[str, Any], AsyncIterator[Any], None]:
         """
         调用智谱AI聊天完成API
         增强版本，支持缓存和性能监控
 
         Args:
+            stream: 为True时返回异步迭代器（逐个产出SDK原始块），需用 async for 消费
             skip_security_check: 跳过安全检查（仅用于内部调用如SQL修复）
         """
         start_time = time.time()
@@ -531,21 +643,23 @@ class ZhipuAIService:
 
             logger.info(f"调用智谱AI API - Model: {model}, Messages: {len(messages)}, Stream: {stream}, Cache: {enable_cache}")
 
-            response = await self._call_api_with_retry(
-                lambda: self.client.chat.completions.create(
+            def create_completion():
+                return self.client.chat.completions.create(
                     model=model,
                     messages=messages,
                     max_tokens=max_tokens,
                     temperature=temperature,
                     stream=stream
                 )
-            )
 
             if stream:
                 duration = time.time() - start_time
                 self._log_performance_metrics(operation + "_stream", duration, True)
-                return response  # 流式响应
+                # 流式响应：返回异步迭代器，请求与逐块读取均在后台线程中进行
+                return self._iterate_in_thread(create_completion)
             else:
+                response = await self._call_api_with_retry(create_completion)
+
                 # 非流式响应，返回结构化数据
                 result = {
                     "content": response.choices[0].message.content or "",
@@ -607,14 +721,60 @@ class ZhipuAIService:
             logger.error(f"嵌入向量生成失败: {e}")
             return None
 
+    def _get_embedding_store(self) -> EmbeddingStore:
+        """获取嵌入向量缓存（未显式指定时使用全局实例）"""
+        if self.embedding_store is None:
+            self.embedding_store = get_embedding_store()
+        return self.embedding_store
+
+    async def embed_texts(
+        self,
+        texts: List[str],
+        model: str = "embedding-2"
+    ) -> Optional[List[List[float]]]:
+        """
+        带缓存的文本嵌入
+
+        已缓存的文本不再请求API；未命中的文本去重后按
+        zhipuai_embedding_batch_size 分批请求并写回缓存。
+
+        Returns:
+            与 texts 一一对应的向量列表，任一批次失败时返回 None
+        """
+        if not texts:
+            return []
+
+        store = self._get_embedding_store()
+        vectors = await self._run_blocking(lambda: store.get_many(model, texts))
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+
+        batch_size = getattr(settings, "zhipuai_embedding_batch_size", 64)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            embeddings = await self.embedding(batch, model=model)
+            if not embeddings or len(embeddings) != len(batch):
+                return None
+
+            fresh = dict(zip(batch, embeddings))
+            vectors.update(fresh)
+            await self._run_blocking(lambda: store.put_many(model, fresh))
+
+        if missing:
+            logger.info(f"嵌入缓存 - 命中: {len(set(texts)) - len(missing)}, 新生成: {len(missing)}")
+        return [vectors[text] for text in texts]
+
     async def semantic_search(
         self,
         query: str,
         documents: List[str],
-        top_k: int = 5
+        top_k: int = 5,
+        model: str = "embedding-2"
     ) -> Optional[Dict[str, Any]]:
         """
         语义搜索
+
+        文档向量按内容缓存，并按文档集合缓存归一化矩阵；
+        对同一批文档的重复检索只需一次查询嵌入和一次矩阵-向量乘法。
         """
         try:
             if not documents:
@@ -622,9 +782,12 @@ class ZhipuAIService:
 
             logger.info(f"语义搜索 - 查询: {query[:50]}..., 文档数: {len(documents)}")
 
-            # 为查询和文档生成嵌入
-            all_texts = [query] + documents
-            embeddings = await self.embedding(all_texts)
+            store = self._get_embedding_store()
+            doc_matrix = store.get_matrix(model, documents)
+
+            # 文档矩阵命中时只需嵌入查询
+            texts = [query] if doc_matrix is not None else [query] + documents
+            embeddings = await self.embed_texts(texts, model=model)
 
             if not embeddings:
                 return None
@@ -632,18 +795,23 @@ class ZhipuAIService:
             query_embedding = embeddings[0]
             doc_embeddings = embeddings[1:]
 
-            # 计算余弦相似度
-            try:
-                from sklearn.metrics.pairwise import cosine_similarity
+            if doc_matrix is None:
+                doc_matrix = store.build_matrix(model, documents, doc_embeddings)
+
+            if doc_matrix is not None:
                 import numpy as np
 
-                similarities = cosine_similarity(
-                    [query_embedding],
-                    doc_embeddings
-                )[0]
+                # 文档行已归一化，余弦相似度 = 矩阵 · 归一化查询向量
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                query_norm = np.linalg.norm(query_vector)
+                if query_norm > 0:
+                    query_vector = query_vector / query_norm
+                similarities = doc_matrix @ query_vector
 
                 # 获取top_k结果
-                top_indices = np.argsort(similarities)[::-1][:top_k]
+                top_k = max(0, min(top_k, len(documents)))
+                top_indices = np.argpartition(-similarities, top_k - 1)[:top_k] if top_k else []
+                top_indices = sorted(top_indices, key=lambda i: similarities[i], reverse=True)
 
                 results = []
                 for idx in top_indices:
@@ -652,24 +820,17 @@ class ZhipuAIService:
                         "similarity": float(similarities[idx]),
                         "index": int(idx)
                     })
-
-                return {
-                    "query": query,
-                    "results": results,
-                    "total_documents": len(documents)
-                }
-            except ImportError:
-                logger.warning("sklearn 和 numpy 不可用，使用简化的相似度计算")
-                # 简化的点积相似度计算
+            else:
+                logger.warning("numpy 不可用，使用简化的相似度计算")
                 import math
 
+                query_norm = math.sqrt(sum(q * q for q in query_embedding)) or 1.0
                 results = []
                 for i, doc_embedding in enumerate(doc_embeddings):
-                    # 计算点积相似度
+                    # 计算余弦相似度
                     similarity = sum(q * d for q, d in zip(query_embedding, doc_embedding))
                     similarity = similarity / (
-                        math.sqrt(sum(q * q for q in query_embedding)) *
-                        math.sqrt(sum(d * d for d in doc_embedding))
+                        query_norm * (math.sqrt(sum(d * d for d in doc_embedding)) or 1.0)
                     )
                     results.append({
                         "document": documents[i],
@@ -681,11 +842,11 @@ class ZhipuAIService:
                 results.sort(key=lambda x: x["similarity"], reverse=True)
                 results = results[:top_k]
 
-                return {
-                    "query": query,
-                    "results": results,
-                    "total_documents": len(documents)
-                }
+            return {
+                "query": query,
+                "results": results,
+                "total_documents": len(documents)
+            }
 
         except Exception as e:
             logger.error(f"语义搜索失败: {e}")
@@ -3,6 +3,8 @@
 测试所有数据源管理相关的API端点功能
 """
 
+import hashlib
+
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
@@ -393,6 +395,81 @@ class TestDataSourcesEndpoints:
 
         assert response.status_code == 404
 
+    # ==================== POST /data-sources/upload 测试 ====================
+
+    @pytest.fixture
+    def upload_client(self, mock_db, tmp_path, monkeypatch):
+        """上传目录指向临时目录的测试客户端"""
+        from src.app.core.config import settings
+
+        monkeypatch.setattr(settings, "data_source_upload_dir", str(tmp_path))
+        monkeypatch.setattr(settings, "data_source_upload_chunk_size", 64)
+
+        def mock_refresh(obj):
+            obj.id = "ds_upload_123"
+            obj.created_at = datetime(2025, 1, 1)
+            obj.updated_at = datetime(2025, 1, 1)
+
+        mock_db.refresh = MagicMock(side_effect=mock_refresh)
+
+        def override_get_db():
+            yield mock_db
+
+        app.dependency_overrides[get_db] = override_get_db
+        yield TestClient(app)
+        app.dependency_overrides.clear()
+
+    @patch('src.app.api.v1.endpoints.data_sources.get_columnar_cache_service')
+    @patch('src.app.api.v1.endpoints.data_sources.minio_service')
+    def test_upload_data_source_streams_to_disk(self, mock_minio, mock_columnar, upload_client, tmp_path):
+        """测试上传文件流式落盘，并在后台镜像到MinIO、预热列式缓存"""
+        content = b"region,amount\n" + b"".join(f"r{i},{i}\n".encode() for i in range(200))
+        uploaded = {}
+
+        def upload_file(bucket_name, object_name, file_data, file_size, content_type=None):
+            uploaded["data"] = file_data.read()
+            return True
+
+        mock_minio.upload_file.side_effect = upload_file
+
+        response = upload_client.post(
+            "/api/v1/data-sources/upload?tenant_id=tenant_test_123",
+            files={"file": ("sales.csv", content, "text/csv")},
+            data={"name": "Sales"}
+        )
+
+        assert response.status_code == 201
+        file_info = response.json()["file_info"]
+        assert file_info["file_size"] == len(content)
+        assert file_info["checksum"] == hashlib.sha256(content).hexdigest()
+
+        saved = list((tmp_path / "tenant_test_123").iterdir())
+        assert len(saved) == 1 and saved[0].suffix == ".csv"
+        assert saved[0].read_bytes() == content
+
+        assert uploaded["data"] == content
+        mock_columnar.return_value.materialize_file.assert_called_once_with(
+            str(saved[0]), "csv", content_hash=file_info["checksum"]
+        )
+
+    @patch('src.app.api.v1.endpoints.data_sources.minio_service')
+    def test_upload_data_source_too_large(self, mock_minio, upload_client, tmp_path, monkeypatch):
+        """测试超过大小限制时中止写入且不留下临时文件"""
+        from src.app.api.v1.endpoints.data_sources import SUPPORTED_FILE_TYPES
+
+        monkeypatch.setitem(SUPPORTED_FILE_TYPES["csv"], "max_size_mb", 1)
+
+        response = upload_client.post(
+            "/api/v1/data-sources/upload?tenant_id=tenant_test_123",
+            files={"file": ("big.csv", b"x" * (1024 * 1024 + 1), "text/csv")},
+            data={"name": "Big"}
+        )
+
+        assert response.status_code == 400
+        assert "文件大小超过限制" in response.json()["detail"]
+        assert [path for path in tmp_path.rglob("*") if path.is_file()] == []
+        mock_minio.upload_file.assert_not_called()
+
     # ==================== GET /data-sources/overview 测试 ====================
 
     def test_get_overview_missing_tenant_id(self, client):
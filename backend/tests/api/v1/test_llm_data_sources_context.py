@@ -0,0 +1,96 @@
+"""
+数据源上下文并发构建测试
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.app.api.v1.endpoints import llm
+
+
+def _source(name):
+    return SimpleNamespace(id=f"id-{name}", name=name, db_type="postgresql", database_name=name)
+
+
+class TestDataSourcesContext:
+    """_get_data_sources_context 并发构建测试类"""
+
+    @pytest.fixture
+    def sources(self):
+        return [_source("a"), _source("b"), _source("c")]
+
+    @pytest.mark.asyncio
+    async def test_sources_built_concurrently_in_order(self, sources):
+        """测试各数据源并发获取且输出保持原有顺序"""
+        async def fake_context(tenant_id, ds, db):
+            await asyncio.sleep(0.2 if ds.name == "a" else 0.05)
+            return f"ctx-{ds.name}"
+
+        with patch.object(llm.data_source_service, "get_data_sources", AsyncMock(return_value=sources)), \
+                patch.object(llm, "_get_data_source_context", side_effect=fake_context), \
+                patch.object(llm.settings, "data_source_context_concurrency", 3):
+            start = time.time()
+            context = await llm._get_data_sources_context("tenant1", db=None)
+            elapsed = time.time() - start
+
+        assert elapsed < 0.3
+        assert context.index("ctx-a") < context.index("ctx-b") < context.index("ctx-c")
+
+    @pytest.mark.asyncio
+    async def test_slow_source_degrades_to_stub(self, sources):
+        """测试超时数据源降级为占位说明，其他数据源正常返回"""
+        async def fake_context(tenant_id, ds, db):
+            if ds.name == "b":
+                await asyncio.sleep(5)
+            return f"ctx-{ds.name}"
+
+        with patch.object(llm.data_source_service, "get_data_sources", AsyncMock(return_value=sources)), \
+                patch.object(llm, "_get_data_source_context", side_effect=fake_context), \
+                patch.object(llm.settings, "data_source_context_timeout", 0.1):
+            start = time.time()
+            context = await llm._get_data_sources_context("tenant1", db=None)
+
+        assert time.time() - start < 1
+        assert "ctx-a" in context and "ctx-c" in context
+        assert "### 数据源: b" in context
+        assert "获取超时" in context
+
+    @pytest.mark.asyncio
+    async def test_failing_source_degrades_to_stub(self, sources):
+        """测试出错数据源降级为占位说明"""
+        async def fake_context(tenant_id, ds, db):
+            if ds.name == "c":
+                raise ConnectionError("connection refused")
+            return f"ctx-{ds.name}"
+
+        with patch.object(llm.data_source_service, "get_data_sources", AsyncMock(return_value=sources)), \
+                patch.object(llm, "_get_data_source_context", side_effect=fake_context):
+            context = await llm._get_data_sources_context("tenant1", db=None)
+
+        assert "ctx-a" in context and "ctx-b" in context
+        assert "无法获取schema信息 (connection refused)" in context
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self, sources):
+        """测试同时构建的数据源数量不超过配置上限"""
+        running = 0
+        peak = 0
+
+        async def fake_context(tenant_id, ds, db):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return f"ctx-{ds.name}"
+
+        with patch.object(llm.data_source_service, "get_data_sources", AsyncMock(return_value=sources)), \
+                patch.object(llm, "_get_data_source_context", side_effect=fake_context), \
+                patch.object(llm.settings, "data_source_context_concurrency", 2):
+            await llm._get_data_sources_context("tenant1", db=None)
+
+        assert peak == 2
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+V2 结果集端点测试
+================
+
+测试 /api/v2/results/{result_id} 分页、元数据与流式读取。
+
+作者: BMad Master
+版本: 1.0.1
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from backend.src.app.main import app
+from src.app.middleware.tenant_context import get_current_tenant_from_request
+
+result_store = pytest.importorskip("AgentV2.tools.result_store")
+
+
+class TestResultsV2:
+    """V2 结果集端点测试类"""
+
+    @pytest.fixture
+    async def client(self) -> AsyncClient:
+        """创建测试客户端（认证租户为 tenant_a）"""
+        app.dependency_overrides[get_current_tenant_from_request] = lambda: SimpleNamespace(id="tenant_a")
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            yield ac
+        app.dependency_overrides.clear()
+
+    @pytest.fixture
+    def result_id(self) -> str:
+        rows = [[i, f"产品{i}"] for i in range(250)]
+        meta = result_store.get_result_store().put(["id", "name"], rows, tenant_id="tenant_a")
+        return meta.result_id
+
+    @pytest.mark.asyncio
+    async def test_page(self, client: AsyncClient, result_id: str):
+        """测试分页读取"""
+        response = await client.get(f"/api/v2/results/{result_id}", params={"offset": 200, "limit": 100})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["row_count"] == 250
+        assert len(data["rows"]) == 50
+        assert data["rows"][0] == [200, "产品200"]
+
+    @pytest.mark.asyncio
+    async def test_meta(self, client: AsyncClient, result_id: str):
+        """测试元数据包含列统计且不暴露租户"""
+        response = await client.get(f"/api/v2/results/{result_id}/meta")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["columns"] == ["id", "name"]
+        assert data["column_stats"][0]["max"] == 249
+        assert "tenant_id" not in data
+
+    @pytest.mark.asyncio
+    async def test_stream(self, client: AsyncClient, result_id: str):
+        """测试 NDJSON 流式读取全部行"""
+        response = await client.get(f"/api/v2/results/{result_id}/stream", params={"batch_size": 100})
+
+        assert response.status_code == 200
+        lines = response.text.strip().split("\n")
+        assert json.loads(lines[0]) == {"columns": ["id", "name"], "row_count": 250}
+        assert len(lines) == 251
+
+    @pytest.mark.asyncio
+    async def test_other_tenant_not_found(self, client: AsyncClient, result_id: str):
+        """测试其他租户无法读取，且不能通过查询参数指定租户"""
+        app.dependency_overrides[get_current_tenant_from_request] = lambda: SimpleNamespace(id="other")
+
+        response = await client.get(f"/api/v2/results/{result_id}", params={"tenant_id": "tenant_a"})
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_unknown_result(self, client: AsyncClient):
+        """测试不存在的结果集"""
+        response = await client.get("/api/v2/results/rs_missing")
+
+        assert response.status_code == 404
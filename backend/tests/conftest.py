@@ -112,8 +112,9 @@ import pytest
 import asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
 # 设置测试环境变量（符合安全标准）
 os.environ.setdefault('ENVIRONMENT', 'testing')
@@ -127,7 +128,7 @@ MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEA0Z3VS5JJcds3xfn/ygWc
 os.environ.setdefault('CLERK_API_URL', 'https://test.clerk.dev')
 
 from src.app.main import app
-from src.app.data.database import get_db, Base
+from src.app.data.database import get_db, get_async_db, Base
 from src.app.core.config import settings
 
 # 创建测试数据库（内存SQLite）
@@ -139,6 +140,10 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步会话指向同一个测试数据库文件（NullPool：每个事件循环使用独立连接）
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -169,7 +174,12 @@ def client(db_session):
         finally:
             pass
 
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
 
     with TestClient(app) as test_client:
         yield test_client
@@ -0,0 +1,83 @@
+"""
+数据库会话层测试
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.app.data.database import Base, maybe_await, to_async_database_url
+from src.app.data.models import DataSourceConnection, DataSourceConnectionStatus, Tenant
+from src.app.services.data_source_service import data_source_service
+
+
+class TestAsyncDatabaseUrl:
+    """异步驱动URL转换测试类"""
+
+    @pytest.mark.parametrize("url, expected", [
+        ("postgresql://u:p@db:5432/app", "postgresql+asyncpg://u:p@db:5432/app"),
+        ("postgresql+psycopg2://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+        ("postgres://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+        ("postgresql+asyncpg://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+        ("sqlite:///./test.db", "sqlite+aiosqlite:///./test.db"),
+        ("sqlite+aiosqlite:///./test.db", "sqlite+aiosqlite:///./test.db"),
+        ("mysql://u:p@db/app", "mysql://u:p@db/app"),
+    ])
+    def test_to_async_database_url(self, url, expected):
+        """测试同步URL转换为对应的异步驱动URL"""
+        assert to_async_database_url(url) == expected
+
+    @pytest.mark.asyncio
+    async def test_maybe_await(self):
+        """测试同步返回值原样返回，协程被等待"""
+        async def coro():
+            return "async"
+
+        assert await maybe_await("sync") == "sync"
+        assert await maybe_await(coro()) == "async"
+
+
+class TestSessionAgnosticQueries:
+    """服务层同时支持同步/异步会话测试类"""
+
+    @pytest.fixture
+    def db_file(self, tmp_path):
+        path = tmp_path / "app.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        session.add(Tenant(id="t1", email="t1@example.com"))
+        for name, state in [("active", DataSourceConnectionStatus.ACTIVE),
+                            ("deleted", DataSourceConnectionStatus.INACTIVE)]:
+            connection = DataSourceConnection(
+                id=f"ds-{name}", tenant_id="t1", name=name, db_type="postgresql", status=state
+            )
+            connection._connection_string = "encrypted"
+            session.add(connection)
+        session.commit()
+        session.close()
+        engine.dispose()
+        return path
+
+    @pytest.mark.asyncio
+    async def test_get_data_sources_sync_and_async(self, db_file):
+        """测试同一查询在同步会话和异步会话上结果一致"""
+        sync_engine = create_engine(f"sqlite:///{db_file}")
+        sync_session = sessionmaker(bind=sync_engine)()
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+        try:
+            sync_result = await data_source_service.get_data_sources("t1", db=sync_session)
+            async with async_sessionmaker(bind=async_engine)() as async_session:
+                async_result = await data_source_service.get_data_sources("t1", db=async_session)
+                found = await data_source_service.get_data_source_by_id("ds-deleted", "t1", db=async_session)
+                missing = await data_source_service.get_data_source_by_id("ds-active", "other", db=async_session)
+        finally:
+            sync_session.close()
+            sync_engine.dispose()
+            await async_engine.dispose()
+
+        assert [ds.id for ds in sync_result] == ["ds-active"]
+        assert [ds.id for ds in async_result] == ["ds-active"]
+        assert found is not None and found.name == "deleted"
+        assert missing is None
@@ -0,0 +1,130 @@
+"""
+旧版Agent池测试 - 按数据库URL池化、并发构建去重、LRU淘汰与MCP客户端关闭
+"""
+
+import asyncio
+
+import pytest
+
+from src.app.services.agent import agent_service
+from src.app.services.agent.tools import get_mcp_client
+
+
+class FakeMCPClient:
+    """记录关闭状态的假MCP客户端"""
+
+    def __init__(self, database_url):
+        self.database_url = database_url
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class TestAgentPool:
+    """build_agent 池化测试类"""
+
+    @pytest.fixture
+    def builds(self, monkeypatch):
+        built = []
+
+        async def fake_build(database_url, enable_echarts=False, model=None):
+            built.append(database_url)
+            await asyncio.sleep(0.01)
+            if database_url == "postgresql://broken":
+                raise RuntimeError("MCP initialization failed")
+            client = FakeMCPClient(database_url)
+            return agent_service._AgentSlot(
+                agent=f"agent:{database_url}",
+                mcp_client=client,
+                mcp_wrapper=f"wrapper:{database_url}",
+                tools=[],
+                checkpointer=None,
+                database_url=database_url,
+            )
+
+        monkeypatch.setattr(agent_service, "_build_agent_slot", fake_build)
+        monkeypatch.setattr(agent_service, "AGENT_POOL_SIZE", 2)
+        monkeypatch.setattr(agent_service, "AGENT_EVICTION_GRACE_SECONDS", 0)
+        agent_service._agent_pool.clear()
+        agent_service._agent_builds.clear()
+        yield built
+        agent_service._agent_pool.clear()
+
+    @pytest.mark.asyncio
+    async def test_alternating_databases_do_not_rebuild(self, builds):
+        """测试两个数据库交替请求时不再反复重建"""
+        for _ in range(3):
+            agent_a, _ = await agent_service.build_agent("postgresql://a")
+            agent_b, _ = await agent_service.build_agent("postgresql://b")
+
+        assert agent_a == "agent:postgresql://a"
+        assert agent_b == "agent:postgresql://b"
+        assert builds == ["postgresql://a", "postgresql://b"]
+
+    @pytest.mark.asyncio
+    async def test_echarts_flag_is_part_of_key(self, builds):
+        """测试ECharts开关不同的请求使用不同的Agent"""
+        await agent_service.build_agent("postgresql://a", enable_echarts=False)
+        await agent_service.build_agent("postgresql://a", enable_echarts=True)
+
+        assert len(builds) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_build_once(self, builds):
+        """测试同一数据库的并发请求只构建一次"""
+        results = await asyncio.gather(*[
+            agent_service.build_agent("postgresql://a") for _ in range(5)
+        ])
+
+        assert builds == ["postgresql://a"]
+        assert {agent for agent, _ in results} == {"agent:postgresql://a"}
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_closes_mcp_client(self, builds):
+        """测试超过池容量时淘汰最久未使用的Agent并关闭其MCP客户端"""
+        _, client_a = await agent_service.build_agent("postgresql://a")
+        await agent_service.build_agent("postgresql://b")
+        await agent_service.build_agent("postgresql://a")  # a 变为最近使用
+        _, client_b = await agent_service.build_agent("postgresql://b")
+        await agent_service.build_agent("postgresql://c")
+        await asyncio.gather(*list(agent_service._pending_closes))
+
+        keys = [key[0] for key in agent_service._agent_pool]
+        assert keys == ["postgresql://b", "postgresql://c"]
+        assert client_a.closed
+        assert not client_b.closed
+
+    @pytest.mark.asyncio
+    async def test_failed_build_is_not_cached(self, builds):
+        """测试构建失败时向所有等待者抛出异常且不写入池"""
+        results = await asyncio.gather(
+            agent_service.build_agent("postgresql://broken"),
+            agent_service.build_agent("postgresql://broken"),
+            return_exceptions=True
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert builds == ["postgresql://broken"]
+        assert not agent_service._agent_pool
+        assert not agent_service._agent_builds
+
+    @pytest.mark.asyncio
+    async def test_tools_route_to_slot_mcp_client(self, builds):
+        """测试工具使用当前请求对应数据库的MCP客户端"""
+        await agent_service.build_agent("postgresql://a")
+        await agent_service.build_agent("postgresql://b")
+        await agent_service.build_agent("postgresql://a")
+
+        assert get_mcp_client() == "wrapper:postgresql://a"
+
+    @pytest.mark.asyncio
+    async def test_reset_agent_closes_all_clients(self, builds):
+        """测试重置时关闭所有MCP客户端"""
+        _, client_a = await agent_service.build_agent("postgresql://a")
+        _, client_b = await agent_service.build_agent("postgresql://b")
+
+        await agent_service.reset_agent()
+
+        assert client_a.closed and client_b.closed
+        assert agent_service.get_agent_status()["pooled_agents"] == 0
@@ -0,0 +1,82 @@
+"""
+缓存值编解码测试 - 序列化方式 / zstd 压缩 / 旧格式兼容
+"""
+
+import json
+
+import pytest
+
+from src.app.services import cache_codec
+from src.app.services.cache_codec import MSGPACK_PREFIX, ZSTD_MAGIC, CacheCodec
+
+requires_orjson = pytest.mark.skipif(cache_codec.orjson is None, reason="orjson 未安装")
+requires_msgpack = pytest.mark.skipif(cache_codec.msgpack is None, reason="msgpack 未安装")
+requires_zstd = pytest.mark.skipif(cache_codec.zstandard is None, reason="zstandard 未安装")
+
+PAYLOAD = {"answer": "按区域汇总", "rows": [{"id": i, "amount": i * 1.5} for i in range(50)]}
+
+
+class TestCacheCodec:
+    """CacheCodec测试类"""
+
+    def test_json_matches_legacy_format(self):
+        """测试json不压缩时与旧版 json.dumps 写入格式一致"""
+        codec = CacheCodec(serializer="json", compression="none")
+        encoded = codec.encode(PAYLOAD)
+
+        assert encoded == json.dumps(PAYLOAD, ensure_ascii=False).encode("utf-8")
+        assert codec.decode(encoded) == PAYLOAD
+
+    def test_legacy_values_readable(self):
+        """测试旧版写入的JSON文本与原始字符串均可读取"""
+        codec = CacheCodec()
+
+        assert codec.decode(json.dumps(PAYLOAD).encode()) == PAYLOAD
+        assert codec.decode(b"plain text") == "plain text"
+        assert codec.decode("中文") == "中文"
+        assert codec.decode(None) is None
+
+    def test_str_and_bytes_stored_as_is(self):
+        """测试str/bytes值与旧版一致原样存储"""
+        assert CacheCodec().encode(b"\x01\x02") == b"\x01\x02"
+        assert CacheCodec().encode("ctx") == "ctx"
+
+    @requires_orjson
+    def test_orjson_readable_by_json(self):
+        """测试orjson输出为标准JSON，未安装orjson的worker也可读取"""
+        encoded = CacheCodec(serializer="orjson", compression="none").encode(PAYLOAD)
+
+        assert json.loads(encoded) == PAYLOAD
+
+    @requires_msgpack
+    def test_msgpack_prefixed(self):
+        """测试msgpack带前缀，任意编解码器可识别"""
+        encoded = CacheCodec(serializer="msgpack", compression="none").encode(PAYLOAD)
+
+        assert encoded.startswith(MSGPACK_PREFIX)
+        assert CacheCodec(serializer="json").decode(encoded) == PAYLOAD
+
+    @requires_zstd
+    def test_compress_only_above_threshold(self):
+        """测试只有超过阈值的值才压缩"""
+        codec = CacheCodec(compression="zstd", compress_min_bytes=256)
+        small = codec.encode({"a": 1})
+        large = codec.encode(PAYLOAD)
+
+        assert not small.startswith(ZSTD_MAGIC)
+        assert large.startswith(ZSTD_MAGIC)
+        assert codec.decode(large) == PAYLOAD
+
+    def test_missing_library_falls_back(self, monkeypatch):
+        """测试可选库未安装时退回json/不压缩"""
+        monkeypatch.setattr(cache_codec, "orjson", None)
+        monkeypatch.setattr(cache_codec, "msgpack", None)
+        monkeypatch.setattr(cache_codec, "zstandard", None)
+
+        codec = CacheCodec(serializer="msgpack", compression="zstd")
+        assert codec.describe()["serializer"] == "json"
+        assert codec.describe()["compression"] == "none"
+        assert CacheCodec().describe()["serializer"] == "json"
+
+        with pytest.raises(ValueError):
+            CacheCodec(serializer="pickle")
@@ -0,0 +1,294 @@
+"""
+缓存服务测试 - 租户命名空间失效（Redis代数 + 键登记ZSET，MemoryCache命名空间索引）
+"""
+
+import asyncio
+import fnmatch
+
+import pytest
+
+from src.app.services import cache_service
+from src.app.services.cache_codec import CacheCodec
+from src.app.services.cache_service import CacheManager, MemoryCache, RedisCache, key_namespace
+
+
+class FakePipeline:
+    """记录命令，execute 时按顺序执行（一次往返）"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append(getattr(self.client, name)(*args, **kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        self.client.round_trips += 1
+        return [await command for command in self.commands]
+
+
+class FakeRedis:
+    """按 Lua 脚本语义模拟 redis.asyncio 客户端，并记录是否调用了 KEYS"""
+
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+        self.script_keys = []
+        self.keys_called = False
+        self.round_trips = 0
+
+    def register_script(self, source):
+        if "INCR" in source:
+            return self._flush
+        return self._script
+
+    async def _script(self, keys, args, client=None):
+        if client is not None:
+            client.commands.append(self._access(keys, args))
+            return client
+        return await self._access(keys, args)
+
+    async def _access(self, keys, args):
+        self.script_keys.append(keys)
+        gen = self.values.get(keys[0], "0")
+        if gen != str(args[1]):
+            return [gen.encode()]
+        key = keys[2]
+        op = args[0]
+        if op == "get":
+            return self.values.get(key)
+        if op == "set":
+            now, ttl = args[2], args[4]
+            self.values[key] = args[3]
+            registry = self.zsets.setdefault(keys[1], {})
+            registry[key] = now + ttl
+            for member, expires in list(registry.items()):
+                if expires <= now:
+                    del registry[member]
+            return 1
+        if op == "del":
+            self.zsets.get(keys[1], {}).pop(key, None)
+            return 1 if self.values.pop(key, None) is not None else 0
+        return 1 if key in self.values else 0
+
+    async def _flush(self, keys, args):
+        gen = int(self.values.get(keys[0], 0)) + 1
+        self.values[keys[0]] = str(gen)
+        members = self.zsets.pop(keys[1], {})
+        if members:
+            self.zsets[keys[2]] = members
+        return [gen, len(members)]
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    async def delete(self, key):
+        return 1 if self.values.pop(key, None) is not None else 0
+
+    async def exists(self, key):
+        return 1 if key in self.values else 0
+
+    async def unlink(self, key):
+        removed = self.values.pop(key, None) is not None or self.zsets.pop(key, None) is not None
+        return 1 if removed else 0
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    async def keys(self, pattern):
+        self.keys_called = True
+        return [key for key in self.values if fnmatch.fnmatchcase(key, pattern)]
+
+    async def scan_iter(self, match=None, count=None):
+        for key in list(self.values):
+            if match is None or fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def zscan_iter(self, key, match=None, count=None):
+        for member, score in list(self.zsets.get(key, {}).items()):
+            if match is None or fnmatch.fnmatchcase(member, match):
+                yield member, score
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class TestRedisCacheNamespaces:
+    """RedisCache 租户命名空间测试类"""
+
+    @pytest.fixture
+    def redis(self):
+        return FakeRedis()
+
+    @pytest.fixture
+    def cache(self, redis):
+        return RedisCache(redis, key_prefix="t:", scan_batch_size=2)
+
+    def test_key_namespace(self):
+        """测试租户命名空间提取"""
+        assert key_namespace("tenant:abc:query:1") == "tenant:abc"
+        assert key_namespace("v2:session:abc:1") is None
+        assert key_namespace("tenant:abc") is None
+
+    @pytest.mark.asyncio
+    async def test_tenant_keys_are_versioned(self, cache, redis):
+        """测试租户键带hash tag与代数存储，并登记到租户键集合"""
+        await cache.set("tenant:a:query:1", {"rows": [1]})
+        await cache.set("v2:session:a:s1", "ctx")
+
+        assert await cache.get("tenant:a:query:1") == {"rows": [1]}
+        assert "t:{tenant:a}:g0:query:1" in redis.values
+        assert list(redis.zsets["t:{tenant:a}:keys"]) == ["t:{tenant:a}:g0:query:1"]
+        assert await cache.get("v2:session:a:s1") == "ctx"
+        assert await cache.exists("tenant:a:query:1")
+
+        # 脚本访问的键全部声明在 KEYS 中，且共用同一 hash tag
+        assert redis.script_keys[0] == ["t:{tenant:a}:gen", "t:{tenant:a}:keys", "t:{tenant:a}:g0:query:1"]
+        assert all("{tenant:a}" in key for keys in redis.script_keys for key in keys)
+
+        assert await cache.delete("tenant:a:query:1")
+        assert redis.zsets["t:{tenant:a}:keys"] == {}
+
+    @pytest.mark.asyncio
+    async def test_registry_prunes_expired_members(self, cache, redis, monkeypatch):
+        """测试登记集合按过期时间打分，写入时剪除已过期的成员"""
+        now = [1000]
+        monkeypatch.setattr(cache_service.time, "time", lambda: now[0])
+
+        await cache.set("tenant:a:query:1", 1, ttl=10)
+        await cache.set("tenant:a:query:2", 2, ttl=100)
+        assert redis.zsets["t:{tenant:a}:keys"] == {"t:{tenant:a}:g0:query:1": 1010, "t:{tenant:a}:g0:query:2": 1100}
+
+        now[0] = 1050
+        await cache.set("tenant:a:query:3", 3, ttl=10)
+        assert sorted(redis.zsets["t:{tenant:a}:keys"]) == ["t:{tenant:a}:g0:query:2", "t:{tenant:a}:g0:query:3"]
+
+    @pytest.mark.asyncio
+    async def test_stale_generation_retried(self, cache, redis):
+        """测试其他进程使租户失效后，本地代数过期的实例重试并读写新一代键"""
+        other = RedisCache(redis, key_prefix="t:")
+        await cache.set("tenant:a:query:1", "old")
+        assert await other.clear_namespace("tenant:a") == 1
+
+        assert await cache.get("tenant:a:query:1") is None
+        await cache.set("tenant:a:query:1", "new")
+        assert redis.values["t:{tenant:a}:g1:query:1"] == "new"
+        assert await other.get("tenant:a:query:1") == "new"
+
+        await other.clear_namespace("tenant:a")
+        assert await cache.set_many({"tenant:a:query:2": 2})
+        assert await cache.get_many(["tenant:a:query:2"]) == {"tenant:a:query:2": 2}
+        assert "t:{tenant:a}:g2:query:2" in redis.values
+        await asyncio.gather(*other._cleanup_tasks)
+
+    @pytest.mark.asyncio
+    async def test_clear_tenant_is_generation_bump(self, cache, redis):
+        """测试租户失效递增代数、只影响该租户，旧键在后台回收"""
+        for i in range(5):
+            await cache.set(f"tenant:a:query:{i}", i)
+        await cache.set("tenant:b:query:0", "b")
+
+        manager = CacheManager(cache)
+        assert await manager.clear_tenant_cache("a") == 5
+
+        # 代数递增后旧键立即不可达
+        assert await cache.get("tenant:a:query:0") is None
+        assert await cache.get("tenant:b:query:0") == "b"
+
+        await asyncio.gather(*cache._cleanup_tasks)
+        assert not any(key.startswith("t:{tenant:a}:g0") for key in redis.values)
+        assert not any(":gc:" in key for key in redis.zsets)
+        assert not redis.keys_called
+
+        # 新一代键正常读写
+        await cache.set("tenant:a:query:0", "new")
+        assert redis.values["t:{tenant:a}:g1:query:0"] == "new"
+        assert await cache.get("tenant:a:query:0") == "new"
+
+    @pytest.mark.asyncio
+    async def test_clear_patterns_without_keys(self, cache, redis):
+        """测试租户内子模式走登记集合，其他模式走SCAN，均不使用KEYS"""
+        await cache.set("tenant:a:query:1", 1)
+        await cache.set("tenant:a:schema:1", 2)
+        await cache.set("v2:session:a:s1", 3)
+        await cache.set("v2:session:b:s1", 4)
+
+        assert await cache.clear("tenant:a:query:*") == 1
+        assert await cache.get("tenant:a:schema:1") == 2
+        assert list(redis.zsets["t:{tenant:a}:keys"]) == ["t:{tenant:a}:g0:schema:1"]
+
+        assert await cache.clear("v2:session:a:*") == 1
+        assert await cache.get("v2:session:b:s1") == 4
+
+        assert await cache.clear("tenant:*:schema:*") == 1
+        assert await cache.clear() == 1
+        assert not redis.keys_called
+
+
+class TestRedisCacheBatch:
+    """RedisCache 批量管道操作测试类"""
+
+    @pytest.fixture
+    def redis(self):
+        return FakeRedis()
+
+    @pytest.mark.asyncio
+    async def test_many_in_one_round_trip(self, redis):
+        """测试 set_many/get_many/delete_many 各只有一次往返，租户键与普通键混合"""
+        cache = RedisCache(redis, key_prefix="t:")
+        items = {"tenant:a:query:1": {"rows": [1]}, "v2:session:a:s1": "ctx", "tenant:b:query:1": [2]}
+
+        assert await cache.set_many(items, ttl=60)
+        assert redis.round_trips == 1
+        assert "t:{tenant:a}:g0:query:1" in redis.values
+
+        assert await cache.get_many([*items, "tenant:a:missing"]) == items
+        assert redis.round_trips == 2
+
+        assert await cache.delete_many(["tenant:a:query:1", "v2:session:a:s1", "nope"]) == 2
+        assert redis.round_trips == 3
+        assert await cache.get_many(list(items)) == {"tenant:b:query:1": [2]}
+
+    @pytest.mark.asyncio
+    async def test_codec_round_trip(self, redis):
+        """测试编解码器写入的值可读回，且旧版直接存储的字符串仍可读取"""
+        cache = RedisCache(redis, key_prefix="t:", codec=CacheCodec(compress_min_bytes=16))
+        value = {"answer": "销售额" * 100}
+
+        await cache.set("v2:query:1", value)
+        assert await cache.get("v2:query:1") == value
+
+        redis.values["t:legacy"] = b"plain text"
+        assert await cache.get("legacy") == "plain text"
+
+    @pytest.mark.asyncio
+    async def test_memory_cache_default_batch(self):
+        """测试接口默认的批量实现（MemoryCache逐键执行）"""
+        cache = MemoryCache(max_size=10, default_ttl=60)
+
+        assert await cache.set_many({"a": 1, "b": 2})
+        assert await cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+        assert await cache.delete_many(["a", "c"]) == 1
+
+
+class TestMemoryCacheNamespaces:
+    """MemoryCache 租户命名空间测试类"""
+
+    @pytest.mark.asyncio
+    async def test_clear_tenant_uses_namespace_index(self):
+        """测试租户失效按命名空间删除"""
+        cache = MemoryCache(max_size=10, default_ttl=60)
+        await cache.set("tenant:a:query:1", 1)
+        await cache.set("tenant:a:schema:1", 2)
+        await cache.set("tenant:b:query:1", 3)
+
+        assert await CacheManager(cache).clear_tenant_cache("a") == 2
+        assert await cache.get("tenant:b:query:1") == 3
+        assert cache.cache.keys("tenant:a") == []
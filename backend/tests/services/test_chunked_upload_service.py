@@ -0,0 +1,187 @@
+"""
+分块上传服务测试
+"""
+
+import asyncio
+import hashlib
+import threading
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+from src.app.services import chunked_upload_service as module
+from src.app.services.chunked_upload_service import (
+    ChunkedUploadService,
+    UploadSessionStatus,
+)
+
+
+class FakeMinIO:
+    """内存版MinIO（行为与 minio_service 的同名方法一致）"""
+
+    def __init__(self):
+        self.objects = {}
+        self.largest_download = 0
+        self._lock = threading.Lock()
+
+    def upload_file(self, bucket_name, object_name, file_data, file_size, content_type=None):
+        data = file_data.read(file_size)
+        with self._lock:
+            self.objects[(bucket_name, object_name)] = data
+        return True
+
+    def download_file(self, bucket_name, object_name):
+        with self._lock:
+            data = self.objects.get((bucket_name, object_name))
+            if data is not None:
+                self.largest_download = max(self.largest_download, len(data))
+            return data
+
+    def delete_file(self, bucket_name, object_name):
+        with self._lock:
+            return self.objects.pop((bucket_name, object_name), None) is not None
+
+    def list_files(self, bucket_name, prefix=None):
+        # 非递归列举：prefix之后还有"/"的对象折叠为目录项
+        prefix = prefix or ""
+        entries = {}
+        with self._lock:
+            for (bucket, name), data in self.objects.items():
+                if bucket != bucket_name or not name.startswith(prefix):
+                    continue
+                rest = name[len(prefix):]
+                if "/" in rest:
+                    directory = prefix + rest.split("/", 1)[0] + "/"
+                    entries[directory] = {"name": directory, "size": None, "last_modified": None, "etag": None}
+                else:
+                    entries[name] = {"name": name, "size": len(data), "last_modified": datetime.utcnow(), "etag": ""}
+        return list(entries.values())
+
+
+class TestChunkedUploadService:
+    """分块上传服务测试类"""
+
+    @pytest.fixture
+    def minio(self, monkeypatch):
+        fake = FakeMinIO()
+        monkeypatch.setattr(module, "minio_service", fake)
+        return fake
+
+    @pytest.fixture
+    def file_data(self):
+        return bytes(range(256)) * 40 + b"tail"
+
+    def make_service(self):
+        service = ChunkedUploadService()
+        service.calculate_chunk_size = lambda file_size: 1000
+        return service
+
+    async def start_session(self, service, file_data):
+        result = await service.initialize_upload_session(
+            tenant_id="tenant-1",
+            file_name="report.pdf",
+            file_size=len(file_data),
+            mime_type="application/pdf",
+            file_data=file_data
+        )
+        assert result["success"] is True
+        return result
+
+    @pytest.mark.asyncio
+    async def test_parallel_chunk_uploads(self, minio, file_data):
+        """测试分块乱序并发上传，重复上传不重复计数"""
+        service = self.make_service()
+        result = await self.start_session(service, file_data)
+        session_id = result["session_id"]
+        total = result["total_chunks"]
+        assert total == 11
+
+        numbers = list(reversed(range(total))) + [0, 1]
+        results = await asyncio.gather(*[
+            service.upload_chunk(session_id, n, file_data[n * 1000:(n + 1) * 1000])
+            for n in numbers
+        ])
+
+        assert all(r["success"] for r in results)
+        session = await service.get_upload_session(session_id)
+        assert session.completed_chunks == total
+        assert session.status == UploadSessionStatus.COMPLETED
+
+    @pytest.mark.asyncio
+    async def test_session_survives_restart(self, minio, file_data):
+        """测试新的服务实例（重启/其他worker）能看到同一会话和已上传分块"""
+        first = self.make_service()
+        session_id = (await self.start_session(first, file_data))["session_id"]
+        await first.upload_chunk(session_id, 0, file_data[:1000])
+
+        second = self.make_service()
+        await second.upload_chunk(session_id, 1, file_data[1000:2000])
+
+        status = await ChunkedUploadService().get_upload_status(session_id)
+        assert status["success"] is True
+        assert status["completed_chunks"] == 2
+        assert status["status"] == UploadSessionStatus.UPLOADING.value
+
+        sessions = await ChunkedUploadService().get_active_sessions("tenant-1")
+        assert [s["session_id"] for s in sessions] == [session_id]
+
+    @pytest.mark.asyncio
+    async def test_complete_upload_streams_merge(self, minio, file_data):
+        """测试合并结果正确，且逐块读取而非整体拼接"""
+        service = self.make_service()
+        result = await self.start_session(service, file_data)
+        session_id = result["session_id"]
+        for n in range(result["total_chunks"]):
+            await service.upload_chunk(session_id, n, file_data[n * 1000:(n + 1) * 1000])
+
+        received = {}
+
+        def upload_document(**kwargs):
+            received["data"] = kwargs["file_data"].read()
+            received["size"] = kwargs["file_size"]
+            return {"success": True, "document": {"id": "doc-1"}}
+
+        document_service = Mock()
+        document_service.upload_document = upload_document
+
+        completed = await service.complete_upload(session_id, db=Mock(), document_service=document_service)
+
+        assert completed["success"] is True
+        assert received["data"] == file_data
+        assert received["size"] == len(file_data)
+        assert minio.largest_download <= 1000
+        # 分块和清单已清理
+        assert minio.objects == {}
+        assert await service.get_upload_session(session_id) is None
+
+    @pytest.mark.asyncio
+    async def test_complete_upload_checksum_mismatch(self, minio, file_data):
+        """测试分块对象被篡改时拒绝合并"""
+        service = self.make_service()
+        result = await self.start_session(service, file_data)
+        session_id = result["session_id"]
+        for n in range(result["total_chunks"]):
+            await service.upload_chunk(session_id, n, file_data[n * 1000:(n + 1) * 1000])
+
+        object_name = service.store.chunk_object_name(session_id, 3)
+        minio.objects[(service.store.bucket_name, object_name)] = b"x" * 1000
+
+        document_service = Mock()
+        completed = await service.complete_upload(session_id, db=Mock(), document_service=document_service)
+
+        assert completed["success"] is False
+        assert completed["error"] == "FILE_CHECKSUM_MISMATCH"
+        document_service.upload_document.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upload_chunk_rejects_bad_checksum(self, minio, file_data):
+        """测试分块校验和不匹配时不写入MinIO"""
+        service = self.make_service()
+        session_id = (await self.start_session(service, file_data))["session_id"]
+
+        result = await service.upload_chunk(session_id, 0, b"\0" * 1000)
+
+        assert result["error"] == "CHUNK_CHECKSUM_MISMATCH"
+        assert not any("chunk_" in name for _, name in minio.objects)
+        assert hashlib.sha256(file_data).hexdigest() == (await service.get_upload_session(session_id)).file_checksum
@@ -0,0 +1,112 @@
+"""
+列式物化缓存服务测试
+"""
+
+import io
+import os
+
+import duckdb
+import pandas as pd
+import pytest
+
+from src.app.services.columnar_cache_service import ColumnarCacheService, sanitize_table_name
+
+
+def _excel_bytes(sheets):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+class TestColumnarCacheService:
+    """列式物化缓存测试类"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        return ColumnarCacheService(cache_dir=tmp_path / "cache", max_bytes=50 * 1024 * 1024)
+
+    @pytest.fixture
+    def excel_file(self, tmp_path):
+        path = tmp_path / "sales.xlsx"
+        path.write_bytes(_excel_bytes({
+            "订单": pd.DataFrame({"region": ["east", "west", "east"], "amount": [10, 20, 30]}),
+            "Empty": pd.DataFrame(),
+            "2024 Users": pd.DataFrame({"id": [1, 2], "name": ["a", None]}),
+        }))
+        return path
+
+    def test_materialize_file_skips_empty_sheets(self, cache, excel_file):
+        """测试物化时跳过空工作表并记录列信息"""
+        cached = cache.materialize_file(str(excel_file), "xlsx")
+
+        assert [s.name for s in cached.sheets] == ["订单", "2024 Users"]
+        orders = cached.get_sheet("订单")
+        assert orders.row_count == 3
+        assert {c["name"]: c["type"] for c in orders.columns} == {"region": "text", "amount": "integer"}
+        assert cached.get_sheet("sheet_2024_Users") is not None
+        assert os.path.exists(orders.parquet_path)
+
+    def test_second_call_hits_cache(self, cache, excel_file):
+        """测试相同内容第二次访问命中缓存"""
+        first = cache.materialize_file(str(excel_file), "xlsx")
+        second = cache.materialize_file(str(excel_file), "xlsx")
+
+        assert first.content_hash == second.content_hash
+        assert cache.stats["materializations"] == 1
+        assert cache.stats["hits"] == 1
+
+    def test_changed_file_invalidates(self, cache, excel_file):
+        """测试文件内容变化后重新物化"""
+        first = cache.materialize_file(str(excel_file), "xlsx")
+        excel_file.write_bytes(_excel_bytes({"订单": pd.DataFrame({"amount": [1]})}))
+        os.utime(excel_file, ns=(0, os.stat(excel_file).st_mtime_ns + 1_000_000))
+
+        second = cache.materialize_file(str(excel_file), "xlsx")
+
+        assert first.content_hash != second.content_hash
+        assert second.get_sheet("订单").row_count == 1
+
+    def test_register_views_and_aggregate(self, cache, excel_file):
+        """测试注册视图后由duckdb直接聚合"""
+        cached = cache.materialize_file(str(excel_file), "xlsx")
+        conn = duckdb.connect(":memory:")
+        try:
+            registered = cache.register_views(conn, cached, {"sales": "订单"})
+            rows = conn.execute(
+                'SELECT region, SUM(amount) FROM "订单" GROUP BY region ORDER BY region'
+            ).fetchall()
+            alias_count = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+        finally:
+            conn.close()
+
+        assert "sales" in registered
+        assert rows == [("east", 40), ("west", 20)]
+        assert alias_count == 3
+
+    def test_csv_and_ref_lookup(self, cache):
+        """测试CSV物化以及按ETag引用查找"""
+        data = "city,count\n北京,3\n上海,5\n".encode("utf-8")
+
+        cached = cache.materialize_bytes(data, "csv", ref="data-sources/t/a.csv", ref_version="etag-1")
+
+        assert cached.sheets[0].name == "data"
+        assert cache.get_by_ref("data-sources/t/a.csv", "etag-1").content_hash == cached.content_hash
+        assert cache.get_by_ref("data-sources/t/a.csv", "etag-2") is None
+
+    def test_enforce_budget_evicts_oldest(self, tmp_path):
+        """测试超出磁盘预算时淘汰最久未访问的条目"""
+        cache = ColumnarCacheService(cache_dir=tmp_path / "cache", max_bytes=1)
+        first = cache.materialize_bytes(b"a\n1\n", "csv")
+        second = cache.materialize_bytes(b"a\n2\n", "csv")
+
+        assert cache.get(first.content_hash) is None
+        assert cache.get(second.content_hash) is not None
+        assert cache.stats["evictions"] >= 1
+
+    def test_sanitize_table_name(self):
+        """测试表名清理"""
+        assert sanitize_table_name("销售 数据") == "销售_数据"
+        assert sanitize_table_name("2024") == "sheet_2024"
+        assert sanitize_table_name("1st", "data") == "data_1st"
@@ -0,0 +1,67 @@
+"""
+嵌入向量缓存测试
+"""
+
+import numpy as np
+import pytest
+
+from src.app.services.embedding_store import EmbeddingStore
+
+
+class TestEmbeddingStore:
+    """嵌入向量缓存测试类"""
+
+    @pytest.fixture
+    def db_path(self, tmp_path):
+        return tmp_path / "embeddings.sqlite3"
+
+    @pytest.fixture
+    def store(self, db_path):
+        return EmbeddingStore(db_path=db_path, max_entries=2)
+
+    def test_get_many_returns_only_cached_texts(self, store):
+        """测试批量读取只返回已缓存的文本"""
+        store.put_many("embedding-2", {"a": [1.0, 2.0], "b": [3.0, 4.0]})
+
+        found = store.get_many("embedding-2", ["a", "c", "a"])
+
+        assert found == {"a": [1.0, 2.0]}
+        assert store.stats["memory_hits"] == 1
+        assert store.stats["misses"] == 1
+
+    def test_model_is_part_of_key(self, store):
+        """测试不同模型的向量互不命中"""
+        store.put_many("embedding-2", {"a": [1.0]})
+
+        assert store.get_many("embedding-3", ["a"]) == {}
+
+    def test_vectors_survive_restart(self, store, db_path):
+        """测试向量持久化到SQLite，新实例可直接读取"""
+        store.put_many("embedding-2", {"a": [0.5, 0.25]})
+
+        reopened = EmbeddingStore(db_path=db_path)
+        found = reopened.get_many("embedding-2", ["a"])
+
+        assert found == {"a": [0.5, 0.25]}
+        assert reopened.stats["disk_hits"] == 1
+
+    def test_memory_lru_falls_back_to_disk(self, store):
+        """测试超出内存容量后淘汰最久未用的条目，仍可从磁盘读取"""
+        store.put_many("embedding-2", {"a": [1.0], "b": [2.0], "c": [3.0]})
+
+        assert store.get_stats()["memory_entries"] == 2
+        assert store.get_many("embedding-2", ["a"]) == {"a": [1.0]}
+        assert store.stats["disk_hits"] == 1
+
+    def test_matrix_is_normalized_and_cached_per_corpus(self, store):
+        """测试文档矩阵按行归一化，并按文档集合缓存"""
+        documents = ["x", "y"]
+        assert store.get_matrix("embedding-2", documents) is None
+
+        built = store.build_matrix("embedding-2", documents, [[3.0, 4.0], [0.0, 0.0]])
+
+        np.testing.assert_allclose(built[0], [0.6, 0.8], rtol=1e-6)
+        np.testing.assert_allclose(built[1], [0.0, 0.0])
+        assert store.get_matrix("embedding-2", documents) is built
+        assert store.get_matrix("embedding-2", ["y", "x"]) is None
+        assert not built.flags.writeable
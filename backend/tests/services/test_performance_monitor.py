@@ -0,0 +1,129 @@
+"""
+查询性能监控器测试（统计来自统一指标引擎）
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.app.services.performance_monitor import PerformanceMonitor
+from src.app.services.query_performance_monitor import QueryMetrics, QueryPerformanceMonitor
+
+
+class TestPerformanceMonitor:
+    """RAG-SQL性能监控器测试类"""
+
+    @pytest.fixture
+    def monitor(self):
+        monitor = PerformanceMonitor()
+        durations = [0.2, 0.4, 2.0, 12.0, 0.3]
+        for i, duration in enumerate(durations):
+            query_id = monitor.start_query_monitoring(
+                f"tenant-{i % 2}", f"query {i}", "SELECT * FROM orders", "postgresql"
+            )
+            metrics = monitor.active_queries[query_id]
+            # 固定开始时间，使耗时可预测
+            metrics.start_time = datetime.now() - timedelta(seconds=duration)
+            if i == 4:
+                monitor.fail_query(query_id, "timeout", "timeout")
+            else:
+                monitor.complete_query(query_id, result_rows=10)
+        return monitor
+
+    def test_performance_summary(self, monitor):
+        """测试汇总统计"""
+        summary = monitor.get_performance_summary()
+
+        assert summary.total_queries == 5
+        assert summary.successful_queries == 4
+        assert summary.failed_queries == 1
+        assert summary.status_counts == {"completed": 4, "failed": 1}
+        assert summary.error_types == {"timeout": 1}
+        assert summary.total_result_rows == 40
+        assert summary.max_execution_time == pytest.approx(12.0, abs=0.1)
+        assert summary.min_execution_time == pytest.approx(0.2, abs=0.1)
+        assert summary.median_execution_time == pytest.approx(0.4, rel=0.1)
+        assert summary.slowest_queries[0]["user_query"] == "query 3"
+
+        tenant_summary = monitor.get_performance_summary(tenant_id="tenant-1")
+        assert tenant_summary.total_queries == 2
+
+    def test_slow_queries(self, monitor):
+        """测试慢查询按耗时降序，并支持租户过滤"""
+        slow = monitor.get_slow_queries(limit=2)
+        assert [m.user_query for m in slow] == ["query 3", "query 2"]
+
+        tenant_slow = monitor.get_slow_queries(limit=10, tenant_id="tenant-0")
+        assert [m.user_query for m in tenant_slow] == ["query 2", "query 4", "query 0"]
+
+    def test_clear_history(self, monitor):
+        """测试清理后统计归零"""
+        monitor.clear_history()
+
+        assert monitor.get_performance_summary().total_queries == 0
+        assert monitor.get_slow_queries() == []
+        assert monitor.get_monitoring_stats()["metric_series"] == 0
+
+
+class TestQueryPerformanceMonitor:
+    """查询性能监控器测试类"""
+
+    @pytest.fixture
+    def monitor(self):
+        monitor = QueryPerformanceMonitor(slow_query_threshold=5.0)
+        samples = [
+            ("tenant-1", "nl2sql", 1.0, False, True),
+            ("tenant-1", "nl2sql", 6.0, False, False),
+            ("tenant-1", "rag", 9.0, True, False),
+            ("tenant-2", "nl2sql", 2.0, False, False),
+        ]
+        for i, (tenant_id, query_type, total_time, error, cache_hit) in enumerate(samples):
+            monitor._record_query_metrics(QueryMetrics(
+                query_id=f"q{i}",
+                tenant_id=tenant_id,
+                query_type=query_type,
+                query_hash="",
+                execution_time=total_time,
+                sql_generation_time=0.0,
+                sql_validation_time=0.0,
+                result_processing_time=0.0,
+                total_time=total_time,
+                row_count=1,
+                cache_hit=cache_hit,
+                error=error
+            ))
+        return monitor
+
+    def test_tenant_performance(self, monitor):
+        """测试租户性能报告"""
+        report = monitor.get_tenant_performance("tenant-1", hours=1)
+
+        assert report["total_queries"] == 3
+        assert report["max_execution_time"] == 9.0
+        assert report["min_execution_time"] == 1.0
+        assert report["error_count"] == 1
+        assert report["cache_hit_rate"] == pytest.approx(33.33)
+        assert report["slow_query_count"] == 2
+        assert monitor.get_tenant_performance("unknown")["total_queries"] == 0
+
+    def test_slow_queries(self, monitor):
+        """测试慢查询只包含超过阈值的查询"""
+        slow = monitor.get_slow_queries(hours=1)
+
+        assert [q["query_id"] for q in slow] == ["q2", "q1"]
+        assert [q["query_id"] for q in monitor.get_slow_queries(hours=1, limit=500)] == ["q2", "q1"]
+
+    def test_query_type_performance(self, monitor):
+        """测试按查询类型统计"""
+        stats = monitor.get_query_type_performance()
+
+        assert stats["nl2sql"]["count"] == 3
+        assert stats["nl2sql"]["avg_time"] == 3.0
+        assert stats["rag"]["max_time"] == 9.0
+
+    def test_clear_history(self, monitor):
+        """测试清除全部历史"""
+        monitor.clear_history()
+
+        assert monitor.get_query_type_performance() == {}
+        assert monitor.get_slow_queries() == []
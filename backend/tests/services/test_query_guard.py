@@ -0,0 +1,81 @@
+"""
+LLM生成SQL执行保护测试
+"""
+
+import pytest
+
+from src.app.core.query_budget import parse_tenant_budgets
+from src.app.services.database_interface import QueryPlan, QueryResult, _bound_rows
+from src.app.services.query_guard import QueryBudget, QueryBudgetExceeded, QueryGuard
+
+
+class FakeAdapter:
+    """记录 explain / execute 调用的适配器"""
+
+    def __init__(self, cost=None, rows=10, explain_error=None):
+        self.cost = cost
+        self.rows = rows
+        self.explain_error = explain_error
+        self.explained = []
+        self.executed = []
+
+    async def explain_query(self, query, analyze=True):
+        self.explained.append((query, analyze))
+        if self.explain_error:
+            raise self.explain_error
+        return QueryPlan(plan_id="p", query=query, execution_plan={}, estimated_cost=self.cost)
+
+    async def execute_query(self, query, params=None, timeout=30, max_rows=None):
+        self.executed.append((query, max_rows))
+        data, has_more = _bound_rows([{"id": i} for i in range(self.rows)], max_rows)
+        return QueryResult(data=data, columns=["id"], row_count=len(data), execution_time=0.0, has_more=has_more)
+
+
+class TestQueryGuard:
+    """QueryGuard 测试"""
+
+    @pytest.mark.asyncio
+    async def test_truncates_and_marks_has_more(self):
+        guard = QueryGuard(QueryBudget(max_rows=3, max_cost=100))
+        adapter = FakeAdapter(cost=10, rows=10)
+
+        result = await guard.execute(adapter, "SELECT id FROM t", "tenant_a")
+
+        assert adapter.explained == [("SELECT id FROM t\nLIMIT 4", False)]
+        assert adapter.executed == [("SELECT id FROM t\nLIMIT 4", 3)]
+        assert result.row_count == 3 and result.has_more
+        assert guard.get_stats()["truncated"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rejects_over_budget(self):
+        guard = QueryGuard(QueryBudget(max_rows=3, max_cost=100))
+        adapter = FakeAdapter(cost=5000)
+
+        with pytest.raises(QueryBudgetExceeded) as exc_info:
+            await guard.execute(adapter, "SELECT id FROM t ORDER BY id")
+
+        assert exc_info.value.estimated_cost == 5000
+        assert adapter.executed == []
+
+    @pytest.mark.asyncio
+    async def test_explain_failure_and_missing_cost_still_execute(self):
+        guard = QueryGuard(QueryBudget(max_rows=100, max_cost=100))
+
+        result = await guard.execute(FakeAdapter(explain_error=RuntimeError("syntax")), "SELECT id FROM t")
+        assert result.row_count == 10 and not result.has_more
+
+        # SQLite 没有成本估算
+        result = await guard.execute(FakeAdapter(cost=None), "SELECT id FROM t")
+        assert result.row_count == 10
+        assert guard.get_stats()["explain_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_tenant_budget_override(self):
+        default = QueryBudget(max_rows=100, max_cost=0)
+        guard = QueryGuard(default, parse_tenant_budgets('{"small": {"max_rows": 2}}', default))
+        adapter = FakeAdapter(rows=10)
+
+        assert (await guard.execute(adapter, "SELECT id FROM t", "small")).row_count == 2
+        assert (await guard.execute(adapter, "SELECT id FROM t", "other")).row_count == 10
+        # max_cost 为 0 时不执行 EXPLAIN
+        assert adapter.explained == []
@@ -0,0 +1,157 @@
+"""
+Schema目录缓存服务测试
+"""
+
+import asyncio
+
+import pytest
+
+from src.app.services.cache_service import CacheManager, MemoryCache
+from src.app.services.schema_catalog_service import SchemaCatalogService
+
+
+SCHEMA = {"tables": [{"name": "orders", "columns": [{"name": "id", "type": "integer"}]}]}
+
+
+class FakeSource:
+    """可控指纹和内省次数的假数据源"""
+
+    def __init__(self, fingerprint="v1", schema=None):
+        self.fingerprint_value = fingerprint
+        self.schema = schema if schema is not None else SCHEMA
+        self.fingerprint_calls = 0
+        self.build_calls = 0
+
+    async def fingerprint(self):
+        self.fingerprint_calls += 1
+        return self.fingerprint_value
+
+    async def builder(self):
+        self.build_calls += 1
+        await asyncio.sleep(0)
+        return self.schema
+
+    @staticmethod
+    def renderer(schema_info):
+        return ",".join(t["name"] for t in schema_info.get("tables", []))
+
+
+class TestSchemaCatalogService:
+    """Schema目录缓存测试类"""
+
+    @pytest.fixture
+    def catalog(self):
+        return SchemaCatalogService(CacheManager(MemoryCache()), check_interval=60)
+
+    async def _get(self, catalog, source, data_source_id="ds1"):
+        return await catalog.get_or_build(
+            "tenant1", data_source_id,
+            fingerprint=source.fingerprint,
+            builder=source.builder,
+            renderer=source.renderer
+        )
+
+    @pytest.mark.asyncio
+    async def test_first_call_builds_and_renders(self, catalog):
+        """测试首次访问内省并预渲染提示词片段"""
+        source = FakeSource()
+
+        entry = await self._get(catalog, source)
+
+        assert entry.prompt_fragment == "orders"
+        assert entry.fingerprint == "v1"
+        assert entry.version == 1
+        assert source.build_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_within_check_interval_skips_fingerprint(self, catalog):
+        """测试校验间隔内直接命中缓存，不计算指纹"""
+        source = FakeSource()
+        await self._get(catalog, source)
+
+        entry = await self._get(catalog, source)
+
+        assert entry.prompt_fragment == "orders"
+        assert source.fingerprint_calls == 1
+        assert source.build_calls == 1
+        assert catalog.stats["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unchanged_fingerprint_reuses_entry(self):
+        """测试指纹未变化时复用缓存条目"""
+        catalog = SchemaCatalogService(CacheManager(MemoryCache()), check_interval=0)
+        source = FakeSource()
+        await self._get(catalog, source)
+
+        entry = await self._get(catalog, source)
+
+        assert source.fingerprint_calls == 2
+        assert source.build_calls == 1
+        assert entry.version == 1
+
+    @pytest.mark.asyncio
+    async def test_changed_fingerprint_rebuilds(self):
+        """测试指纹变化时重建并递增版本"""
+        catalog = SchemaCatalogService(CacheManager(MemoryCache()), check_interval=0)
+        source = FakeSource()
+        await self._get(catalog, source)
+
+        source.fingerprint_value = "v2"
+        source.schema = {"tables": [{"name": "orders"}, {"name": "users"}]}
+        entry = await self._get(catalog, source)
+
+        assert source.build_calls == 2
+        assert entry.version == 2
+        assert entry.prompt_fragment == "orders,users"
+        assert catalog.stats["rebuilds"] == 1
+
+    @pytest.mark.asyncio
+    async def test_empty_schema_not_cached(self, catalog):
+        """测试内省失败（空schema）时不写入缓存"""
+        source = FakeSource(schema={})
+
+        await self._get(catalog, source)
+        await self._get(catalog, source)
+
+        assert source.build_calls == 2
+        assert await catalog.get_entry("tenant1", "ds1") is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_build_once(self, catalog):
+        """测试同一数据源的并发请求只内省一次"""
+        source = FakeSource()
+
+        entries = await asyncio.gather(*[self._get(catalog, source) for _ in range(5)])
+
+        assert source.build_calls == 1
+        assert {e.prompt_fragment for e in entries} == {"orders"}
+
+    @pytest.mark.asyncio
+    async def test_invalidate(self, catalog):
+        """测试失效后重新内省"""
+        source = FakeSource()
+        await self._get(catalog, source)
+
+        await catalog.invalidate("tenant1", "ds1")
+        await self._get(catalog, source)
+
+        assert source.build_calls == 2
+        assert catalog.stats["invalidations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fingerprint_error_still_builds(self, catalog):
+        """测试指纹计算失败时仍然内省"""
+        source = FakeSource()
+
+        async def broken_fingerprint():
+            raise ConnectionError("db down")
+
+        entry = await catalog.get_or_build(
+            "tenant1", "ds1",
+            fingerprint=broken_fingerprint,
+            builder=source.builder,
+            renderer=source.renderer
+        )
+
+        assert entry.fingerprint is None
+        assert entry.prompt_fragment == "orders"
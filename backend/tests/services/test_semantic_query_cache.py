@@ -0,0 +1,101 @@
+"""
+语义查询缓存测试
+"""
+
+import pytest
+
+from src.app.services.semantic_query_cache import SemanticQueryCache, literal_signature
+
+# 固定的"语义"向量：同一主题的问题向量接近
+VECTORS = {
+    "上个月销售额": [1.0, 0.0, 0.0],
+    "上月的销售额是多少": [0.98, 0.2, 0.0],
+    "本月的销售额是多少": [0.97, 0.22, 0.0],
+    "各地区客户数": [0.0, 1.0, 0.0],
+}
+
+
+class FakeEmbedder:
+    """按预设向量返回嵌入，并记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, texts):
+        self.calls += 1
+        return [VECTORS[text] for text in texts]
+
+
+class TestSemanticQueryCache:
+    """语义查询缓存测试类"""
+
+    @pytest.fixture
+    def embedder(self):
+        return FakeEmbedder()
+
+    @pytest.fixture
+    def cache(self, embedder):
+        return SemanticQueryCache(similarity_threshold=0.9, ttl=600, max_entries=2, embed=embedder)
+
+    @pytest.mark.asyncio
+    async def test_similar_question_hits(self, cache):
+        """测试表述不同的同义问题命中"""
+        await cache.store("t1", "ds1", "上个月销售额", {"answer": "100万"}, schema_version="fp1")
+
+        hit = await cache.lookup("t1", "ds1", "上月的销售额是多少", schema_version="fp1")
+
+        assert hit is not None
+        assert hit.entry.payload == {"answer": "100万"}
+        assert hit.similarity > 0.9
+        assert hit.to_dict()["matched_query"] == "上个月销售额"
+        assert cache.get_stats()["hit_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_scope_isolation(self, cache, embedder):
+        """测试按 租户+数据源 隔离，空索引不调用嵌入"""
+        await cache.store("t1", "ds1", "上个月销售额", {"answer": "100万"})
+        calls = embedder.calls
+
+        assert await cache.lookup("t2", "ds1", "上个月销售额") is None
+        assert await cache.lookup("t1", "ds2", "上个月销售额") is None
+        assert embedder.calls == calls
+
+    @pytest.mark.asyncio
+    async def test_literal_guard_rejects_different_period(self, cache):
+        """测试时间关键词不同的相似问题不命中"""
+        await cache.store("t1", "ds1", "上个月销售额", {"answer": "100万"})
+
+        assert await cache.lookup("t1", "ds1", "本月的销售额是多少") is None
+        assert cache.stats["guard_rejections"] == 1
+        assert literal_signature("上个月前10名") == literal_signature("上月前 10 名")
+
+    @pytest.mark.asyncio
+    async def test_schema_change_evicts_entry(self, cache):
+        """测试schema版本变化后条目被删除"""
+        await cache.store("t1", "ds1", "上个月销售额", {"answer": "100万"}, schema_version="fp1")
+
+        assert await cache.lookup("t1", "ds1", "上月的销售额是多少", schema_version="fp2") is None
+        assert cache.stats["stale_evictions"] == 1
+        assert cache.get_stats()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_false_hit_feedback(self, cache):
+        """测试误命中反馈删除条目并计入指标"""
+        entry = await cache.store("t1", "ds1", "上个月销售额", {"answer": "100万"})
+
+        assert cache.report_false_hit("t1", "ds1", entry.entry_id)
+        assert await cache.lookup("t1", "ds1", "上月的销售额是多少") is None
+        assert cache.metrics.aggregate("semantic_cache_false_hits").count == 1
+        assert cache.metrics.aggregate("semantic_cache_lookups", {"outcome": "miss"}).count == 1
+
+    @pytest.mark.asyncio
+    async def test_capacity_and_invalidate(self, cache):
+        """测试超出容量淘汰最久未用条目，以及按数据源失效"""
+        await cache.store("t1", "ds1", "上个月销售额", {"answer": "a"})
+        await cache.store("t1", "ds1", "各地区客户数", {"answer": "b"})
+        await cache.store("t1", "ds1", "本月的销售额是多少", {"answer": "c"})
+
+        assert await cache.lookup("t1", "ds1", "上个月销售额") is None
+        assert cache.stats["evictions"] == 1
+        assert cache.invalidate("t1", "ds1") == 2
+        assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,127 @@
+"""
+进程内有界LRU缓存测试
+"""
+
+import time
+
+import pytest
+
+from src.app.core.lru_cache import LRUCache, estimate_size, get_all_cache_stats
+
+
+class TestLRUCache:
+    """LRUCache测试类"""
+
+    def test_evicts_least_recently_used(self):
+        """测试超出条目数时淘汰最久未使用的条目"""
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # a 变为最近使用
+        cache.set("c", 3)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_byte_budget(self):
+        """测试字节预算与单条上限"""
+        cache = LRUCache(max_entries=None, max_bytes=100, max_entry_bytes=60, sizeof=len)
+        cache.set("a", "x" * 40)
+        cache.set("b", "y" * 40)
+        cache.set("c", "z" * 40)
+
+        assert cache.keys() == ["b", "c"]
+        assert cache.bytes == 80
+
+        assert not cache.set("b", "w" * 61)
+        assert "b" not in cache  # 旧值不保留
+        assert cache.get_stats()["skipped_oversize"] == 1
+
+    def test_ttl_lazy_and_sweep(self):
+        """测试过期条目在访问时删除，未访问的由周期清理删除"""
+        cache = LRUCache(default_ttl=0.05, sweep_interval=3600)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("forever", 3, ttl=0)
+        time.sleep(0.1)
+
+        assert cache.get("a") is None
+        assert cache.sweep() == 1
+        assert cache.keys() == ["forever"]
+        assert cache.get_stats()["expirations"] == 2
+
+    def test_overwrite_keeps_heap_bounded(self):
+        """测试反复覆盖写入时过期堆不会无限增长"""
+        cache = LRUCache(default_ttl=60, sweep_interval=0)
+        for i in range(1000):
+            cache.set("k", i)
+
+        assert cache.get("k") == 999
+        assert len(cache._expiry) <= 2 * len(cache) + 64
+        assert cache.bytes == 0  # 未设置字节预算时不估算大小
+
+    def test_namespaces(self):
+        """测试命名空间统计与按命名空间清理"""
+        cache = LRUCache(max_entries=10)
+        cache.set("t1:q1", "a", namespace="t1")
+        cache.set("t1:q2", "b", namespace="t1")
+        cache.set("t2:q1", "c", namespace="t2")
+        cache.get("t1:q1")
+        cache.get("t2:missing", namespace="t2")
+
+        stats = cache.get_stats()
+        assert stats["namespaces"]["t1"]["entries"] == 2
+        assert stats["namespaces"]["t1"]["hits"] == 1
+        assert stats["namespaces"]["t2"]["misses"] == 1
+
+        assert cache.clear_namespace("t1") == 2
+        assert cache.keys() == ["t2:q1"]
+        assert cache.keys("t1") == []
+
+    def test_on_remove_callback(self):
+        """测试淘汰/删除/覆盖都会回调，回调中可再访问缓存"""
+        removed = []
+        cache = LRUCache(max_entries=1, on_remove=lambda k, v, reason: removed.append((k, reason, len(cache))))
+        cache.set("a", 1)
+        cache.set("a", 2)
+        cache.set("b", 3)
+        cache.delete("b")
+
+        assert removed == [("a", "replaced", 1), ("a", "evicted", 1), ("b", "deleted", 0)]
+
+    def test_estimate_size(self):
+        """测试大小估算随内容增长，大容器按采样外推"""
+        small = estimate_size({"rows": [[1, "a"]] * 10})
+        large = estimate_size({"rows": [[1, "a"]] * 1000})
+
+        assert large > small * 50
+        assert estimate_size("x" * 1000) > 1000
+
+    def test_registry(self):
+        """测试具名缓存出现在全局统计中"""
+        cache = LRUCache(name="registry_test")
+        cache.set("k", "v")
+
+        assert get_all_cache_stats()["registry_test"]["entries"] == 1
+
+
+class TestMemoryCache:
+    """MemoryCache 使用 LRUCache 后的行为"""
+
+    @pytest.mark.asyncio
+    async def test_bounded_with_stats(self):
+        from src.app.services.cache_service import MemoryCache
+
+        cache = MemoryCache(max_size=2, default_ttl=60)
+        await cache.set("tenant:1:a", 1)
+        await cache.set("tenant:1:b", 2)
+        await cache.get("tenant:1:a")
+        await cache.set("tenant:2:c", 3)
+
+        assert not await cache.exists("tenant:1:b")
+        assert await cache.clear("tenant:1:*") == 1
+        stats = await cache.get_stats()
+        assert stats["size"] == 1
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 1
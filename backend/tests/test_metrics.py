@@ -0,0 +1,142 @@
+"""
+统一指标引擎测试
+"""
+
+import random
+
+import pytest
+
+from src.app.core.metrics import (
+    MetricAggregate,
+    MetricsRegistry,
+    QuantileSketch,
+    export_prometheus,
+)
+
+NOW = 1_800_000_000.0
+
+
+class TestQuantileSketch:
+    """分位数草图测试类"""
+
+    def test_relative_error(self):
+        """测试分位数估计的相对误差不超过 alpha"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(0, 1.5) for _ in range(20000)]
+        sketch = QuantileSketch(alpha=0.01)
+        for value in values:
+            sketch.add(value)
+
+        ordered = sorted(values)
+        for q in (0.5, 0.9, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+
+    def test_merge_equals_combined(self):
+        """测试合并两个草图与整体构建结果一致"""
+        left, right, combined = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in range(1, 1001):
+            (left if value % 2 else right).add(value)
+            combined.add(value)
+        left.merge(right)
+
+        assert left.count == combined.count
+        assert left.bins == combined.bins
+        assert left.quantile(0.95) == combined.quantile(0.95)
+
+    def test_zero_values(self):
+        """测试零值计入零桶"""
+        sketch = QuantileSketch()
+        for value in (0, 0, 0, 5):
+            sketch.add(value)
+
+        assert sketch.quantile(0.5) == 0.0
+        assert sketch.count_above(1) == 1
+
+
+class TestMetricsRegistry:
+    """指标注册表测试类"""
+
+    @pytest.fixture
+    def registry(self):
+        registry = MetricsRegistry(namespace="test")
+        registry.describe("latency_seconds", "请求耗时", keep_top=3)
+        return registry
+
+    def test_window_selects_buckets(self, registry):
+        """测试按时间窗口只合并窗口内的桶"""
+        for minute in range(180):
+            registry.observe("latency_seconds", 1.0, {"tenant_id": "t1"}, timestamp=NOW - minute * 60)
+
+        # 起点与桶边界对齐时精确：包含第0~10分钟的观测
+        assert registry.aggregate("latency_seconds", window=600, now=NOW).count == 11
+        # 超出分钟级保留范围时使用小时桶
+        assert registry.aggregate("latency_seconds", window=4 * 3600, now=NOW).count == 180
+        # 不指定窗口时为累计值
+        assert registry.aggregate("latency_seconds").count == 180
+
+    def test_label_filter_and_group_by(self, registry):
+        """测试标签子集过滤与分组"""
+        for tenant, value in [("t1", 1.0), ("t1", 3.0), ("t2", 10.0)]:
+            registry.observe("latency_seconds", value, {"tenant_id": tenant, "status": "ok"}, timestamp=NOW)
+
+        t1 = registry.aggregate("latency_seconds", {"tenant_id": "t1"}, window=60, now=NOW)
+        assert (t1.count, t1.total, t1.min, t1.max, t1.avg) == (2, 4.0, 1.0, 3.0, 2.0)
+
+        groups = registry.aggregate("latency_seconds", group_by="tenant_id")
+        assert {k: v.count for k, v in groups.items()} == {"t1": 2, "t2": 1}
+        assert registry.aggregate("latency_seconds", {"tenant_id": "t3"}).count == 0
+
+    def test_top_exemplars(self, registry):
+        """测试每个桶保留最慢样本，合并后按耗时降序返回"""
+        for i, value in enumerate([0.5, 9.0, 2.0, 7.0, 1.0, 8.0]):
+            registry.observe("latency_seconds", value, {"tenant_id": f"t{i % 2}"},
+                             exemplar=f"q{i}", timestamp=NOW)
+
+        merged = registry.aggregate("latency_seconds", window=60, now=NOW)
+        assert merged.top_exemplars(3) == ["q1", "q5", "q3"]
+
+    def test_late_observation_does_not_evict_newer_bucket(self, registry):
+        """测试迟到的旧观测不会覆盖同一槽位的新桶"""
+        registry.observe("latency_seconds", 1.0, timestamp=NOW)
+        # 与 NOW 落在同一分钟槽位，但早了整整一个环形周期
+        registry.observe("latency_seconds", 2.0, timestamp=NOW - 120 * 60)
+
+        recent = registry.aggregate("latency_seconds", window=60, now=NOW)
+        assert (recent.count, recent.total) == (1, 1.0)
+
+    def test_export_prometheus(self, registry):
+        """测试Prometheus文本格式"""
+        registry.observe("latency_seconds", 2.0, {"tenant_id": 't"1'})
+        registry.observe("unnamed", 1.0)
+
+        text = registry.export_prometheus()
+
+        assert "# HELP test_latency_seconds 请求耗时" in text
+        assert "# TYPE test_latency_seconds summary" in text
+        assert 'test_latency_seconds{tenant_id="t\\"1",quantile="0.95"} 2.0' in text
+        assert 'test_latency_seconds_count{tenant_id="t\\"1"} 1' in text
+        assert "test_unnamed_sum 1.0" in text
+        assert text in export_prometheus()
+
+    def test_clear(self, registry):
+        """测试清空序列"""
+        registry.observe("latency_seconds", 1.0)
+        registry.clear()
+
+        assert registry.series_count() == 0
+        assert registry.aggregate("latency_seconds").count == 0
+
+
+class TestMetricAggregate:
+    """聚合结果测试类"""
+
+    def test_quantile_clamped_to_range(self):
+        """测试分位数限制在精确的最小/最大值之间"""
+        aggregate = MetricAggregate()
+        for value in (3.0, 3.0, 3.0):
+            aggregate.add(value, NOW)
+
+        assert aggregate.quantile(0.99) == 3.0
+        assert aggregate.to_dict()["p50"] == 3.0
+        assert MetricAggregate().to_dict() == {"count": 0}
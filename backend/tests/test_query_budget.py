@@ -0,0 +1,91 @@
+"""
+查询预算与LIMIT改写测试
+"""
+
+from src.app.core.query_budget import QueryBudget, QueryGuardBase, inject_limit, parse_tenant_budgets
+
+
+class TestInjectLimit:
+    """LIMIT 改写测试类"""
+
+    def test_append_and_tighten(self):
+        """测试追加与收紧顶层LIMIT"""
+        assert inject_limit("SELECT * FROM t;", 11) == ("SELECT * FROM t\nLIMIT 11", True)
+        assert inject_limit("SELECT * FROM t LIMIT 5", 11) == ("SELECT * FROM t LIMIT 5", False)
+        assert inject_limit("SELECT * FROM t LIMIT 500 OFFSET 3", 11) == ("SELECT * FROM t LIMIT 11 OFFSET 3", True)
+
+    def test_subquery_limit_is_not_top_level(self):
+        """测试子查询与字符串中的LIMIT不算顶层LIMIT"""
+        sql = "SELECT * FROM (SELECT * FROM t LIMIT 5) s WHERE note = 'limit'"
+        assert inject_limit(sql, 11) == (sql + "\nLIMIT 11", True)
+
+    def test_offset_only_is_wrapped(self):
+        """测试只有OFFSET时包装为子查询"""
+        sql, changed = inject_limit("SELECT * FROM t OFFSET 5", 11)
+        assert changed and sql.endswith(") AS _guarded_query\nLIMIT 11")
+
+    def test_limit_goes_before_locking_clause(self):
+        """测试LIMIT插在顶层锁定子句之前，已有LIMIT照常收紧"""
+        assert inject_limit("SELECT * FROM t FOR UPDATE", 11) == ("SELECT * FROM t LIMIT 11\nFOR UPDATE", True)
+        assert inject_limit("SELECT * FROM t WHERE id > 1 FOR SHARE NOWAIT;", 11) == (
+            "SELECT * FROM t WHERE id > 1 LIMIT 11\nFOR SHARE NOWAIT", True
+        )
+        assert inject_limit("SELECT * FROM t LOCK IN SHARE MODE", 11) == ("SELECT * FROM t LIMIT 11\nLOCK IN SHARE MODE", True)
+        assert inject_limit("SELECT * FROM t LIMIT 500 FOR UPDATE", 11) == ("SELECT * FROM t LIMIT 11 FOR UPDATE", True)
+        # 括号内的 FOR（如 SUBSTRING ... FOR）不是锁定子句
+        sql = "SELECT SUBSTRING(name FROM 1 FOR 3) FROM t"
+        assert inject_limit(sql, 11) == (sql + "\nLIMIT 11", True)
+
+    def test_lock_and_for_identifiers_are_not_locking_clauses(self):
+        """测试名为 lock / for 的列或表不被当作锁定子句"""
+        for sql in (
+            "SELECT lock, id FROM t",
+            "SELECT * FROM lock",
+            'SELECT "for", id FROM t',
+            'SELECT * FROM "for"',
+            "SELECT * FROM t WHERE lock = 1",
+        ):
+            assert inject_limit(sql, 11) == (sql + "\nLIMIT 11", True)
+        assert inject_limit("SELECT lock FROM lock FOR UPDATE OF lock SKIP LOCKED", 11) == (
+            "SELECT lock FROM lock LIMIT 11\nFOR UPDATE OF lock SKIP LOCKED", True
+        )
+        assert inject_limit("SELECT * FROM a JOIN b ON a.id = b.id FOR UPDATE OF a, b NOWAIT FOR SHARE OF c", 11)[0] == (
+            "SELECT * FROM a JOIN b ON a.id = b.id LIMIT 11\nFOR UPDATE OF a, b NOWAIT FOR SHARE OF c"
+        )
+
+    def test_locking_clause_is_never_wrapped(self):
+        """测试需要包装为子查询但带锁定子句时不改写"""
+        sql = "SELECT * FROM t OFFSET 5 FOR UPDATE"
+        assert inject_limit(sql, 11) == (sql, False)
+
+    def test_non_select_untouched(self):
+        """测试非SELECT与多语句不改写"""
+        assert inject_limit("SHOW TABLES", 11) == ("SHOW TABLES", False)
+        assert inject_limit("SELECT 1; SELECT 2", 11) == ("SELECT 1; SELECT 2", False)
+
+
+class TestQueryGuardBase:
+    """预算表测试类"""
+
+    def test_parse_tenant_budgets(self):
+        """测试租户预算解析，未指定字段沿用默认值，无效配置忽略"""
+        default = QueryBudget(max_rows=100, max_cost=5)
+        budgets = parse_tenant_budgets('{"small": {"max_rows": 2}}', default)
+
+        assert budgets == {"small": QueryBudget(max_rows=2, max_cost=5)}
+        assert parse_tenant_budgets("[1]", default) == {}
+        assert parse_tenant_budgets("not json", default) == {}
+
+    def test_rewrite_uses_tenant_budget(self):
+        """测试按租户预算改写并计数"""
+        default = QueryBudget(max_rows=100, max_cost=0)
+        guard = QueryGuardBase(default, {"small": QueryBudget(max_rows=2)})
+
+        assert guard.rewrite("SELECT 1", "small") == ("SELECT 1\nLIMIT 3", QueryBudget(max_rows=2), True)
+        assert guard.rewrite("SELECT 1 LIMIT 5", "other") == ("SELECT 1 LIMIT 5", default, False)
+        assert not guard.should_check_cost(default, "SELECT 1")
+
+        guard.set_budget("small", None)
+        assert guard.budget_for("small") is default
+        stats = guard.get_stats()
+        assert (stats["queries"], stats["limits_injected"], stats["tenant_budgets"]) == (2, 1, 0)
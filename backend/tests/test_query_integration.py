@@ -260,14 +260,9 @@ class TestQueryIntegration:
             query_id = str(uuid4())
             query_ids.append(query_id)
 
-        # 模拟查询服务检测到并发限制
-        with patch('src.app.api.v1.endpoints.query.get_query_context') as mock_context:
-            mock_query_context = Mock()
-            mock_query_context.check_rate_limits.return_value = (
-                False,  # 频率检查通过
-                "Too many concurrent queries"  # 并发限制
-            )
-            mock_context.return_value = mock_query_context
+        # 模拟并发闸门已满（并发槽位由 middleware.rate_limit 依赖获取）
+        with patch('src.app.middleware.rate_limit.get_concurrency_gate') as mock_gate:
+            mock_gate.return_value.acquire = AsyncMock(return_value=None)
 
             response = client.post(
                 "/api/v1/query",
@@ -402,7 +397,6 @@ class TestQueryIntegration:
 
             with patch('src.app.api.v1.endpoints.query.get_query_context') as mock_context:
                 mock_query_context = Mock()
-                mock_query_context.check_rate_limits.return_value = (True, None)
                 mock_query_context.get_cached_query.return_value = None
                 mock_query_context.log_query_request.return_value = Mock()
                 mock_context.return_value = mock_query_context
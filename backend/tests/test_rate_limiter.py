@@ -0,0 +1,187 @@
+"""
+分布式限流器测试（进程内实现 + 模拟Redis脚本）
+"""
+
+import asyncio
+
+import pytest
+
+from src.app.core.rate_limiter import ConcurrencyGate, RateLimiter, RateLimitResult
+
+NOW = 1_800_000_000.0  # 与3600秒窗口边界对齐
+
+
+class FakeRedis:
+    """按 Lua 脚本语义模拟 redis.asyncio 客户端"""
+
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+
+    def register_script(self, source):
+        if "INCRBY" in source:
+            return self._sliding_window
+        return self._acquire_slot
+
+    async def _sliding_window(self, keys, args):
+        current = self.values.get(keys[0], 0)
+        previous = self.values.get(keys[1], 0)
+        limit, cost, weight = int(args[0]), int(args[1]), float(args[2])
+        if previous * weight + current + cost > limit:
+            return [0, current, previous]
+        self.values[keys[0]] = current + cost
+        return [1, current + cost, previous]
+
+    async def _acquire_slot(self, keys, args):
+        now, limit, lease_id, expires = float(args[0]), int(args[1]), args[2], float(args[3])
+        leases = self.zsets.setdefault(keys[0], {})
+        for member in [m for m, score in leases.items() if score <= now]:
+            del leases[member]
+        if len(leases) >= limit:
+            return 0
+        leases[lease_id] = expires
+        return 1
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zremrangebyscore(self, key, low, high):
+        leases = self.zsets.get(key, {})
+        for member in [m for m, score in leases.items() if score <= high]:
+            del leases[member]
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+
+class BrokenRedis:
+    """所有调用都失败的Redis客户端"""
+
+    def register_script(self, source):
+        async def run(keys, args):
+            raise ConnectionError("redis down")
+        return run
+
+
+class TestRateLimiter:
+    """滑动窗口限流器测试类"""
+
+    def test_local_window_limit(self):
+        """测试窗口内超限后拒绝，且拒绝的请求不计数"""
+        limiter = RateLimiter()
+        results = [limiter.hit_local("tenant:t1:queries", 3, 3600, now=NOW + i) for i in range(5)]
+
+        assert [r.allowed for r in results] == [True, True, True, False, False]
+        assert results[2].remaining == 0
+        # 当前窗口已满，需等到下一窗口
+        assert results[3].retry_after == pytest.approx(3600 - 3)
+        assert results[3].retry_after_seconds == 3597
+        # 其他键不受影响
+        assert limiter.hit_local("tenant:t2:queries", 3, 3600, now=NOW).allowed
+
+    def test_local_window_slides(self):
+        """测试上一窗口的计数按剩余比例计入"""
+        limiter = RateLimiter()
+        for i in range(4):
+            limiter.hit_local("k", 4, 3600, now=NOW + i)
+
+        # 下一窗口过去1/4时，上一窗口仍计入 4 × 0.75 = 3
+        assert limiter.hit_local("k", 4, 3600, now=NOW + 4500).allowed
+        blocked = limiter.hit_local("k", 4, 3600, now=NOW + 4500)
+        assert not blocked.allowed
+        assert 0 < blocked.retry_after < 2700
+        # 两个窗口之后全部过期
+        assert limiter.hit_local("k", 4, 3600, now=NOW + 7200 * 2).remaining == 3
+
+    @pytest.mark.asyncio
+    async def test_redis_script(self):
+        """测试使用Redis脚本计数，多个限流器实例共享同一计数"""
+        redis = FakeRedis()
+        first, second = RateLimiter(redis), RateLimiter(redis)
+
+        assert (await first.hit("ip:1.2.3.4", 2, 60)).allowed
+        assert (await second.hit("ip:1.2.3.4", 2, 60)).allowed
+        result = await first.hit("ip:1.2.3.4", 2, 60)
+
+        assert not result.allowed
+        assert result.retry_after_seconds >= 1
+        assert first._local == {}
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_falls_back_to_local(self):
+        """测试Redis失败时退回进程内计数"""
+        limiter = RateLimiter(BrokenRedis())
+
+        assert (await limiter.hit("k", 1, 60)).allowed
+        assert not (await limiter.hit("k", 1, 60)).allowed
+
+    def test_retry_after_seconds_minimum(self):
+        """测试Retry-After至少为1秒"""
+        assert RateLimitResult(False, 1, 0, 0.2).retry_after_seconds == 1
+
+
+class TestConcurrencyGate:
+    """并发闸门测试类"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("redis", [None, FakeRedis()], ids=["local", "redis"])
+    async def test_acquire_and_release(self, redis):
+        """测试达到上限后拒绝，释放后可再次获取"""
+        gate = ConcurrencyGate(redis)
+        gate._redis = lambda: redis
+
+        first = await gate.acquire("tenant:t1:queries", 2)
+        second = await gate.acquire("tenant:t1:queries", 2)
+        assert first is not None and second is not None
+        assert await gate.acquire("tenant:t1:queries", 2) is None
+        assert await gate.active("tenant:t1:queries") == 2
+
+        await first.release()
+        await first.release()  # 幂等
+        assert await gate.active("tenant:t1:queries") == 1
+        assert await gate.acquire("tenant:t1:queries", 2) is not None
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_reclaimed(self):
+        """测试未释放的租约过期后自动回收"""
+        gate = ConcurrencyGate(FakeRedis(), lease_seconds=0.05)
+
+        assert await gate.acquire("k", 1) is not None
+        assert await gate.acquire("k", 1) is None
+        await asyncio.sleep(0.1)
+        assert await gate.acquire("k", 1) is not None
+
+    @pytest.mark.asyncio
+    async def test_wrap_stream_releases_on_completion(self):
+        """测试流正常结束后释放槽位"""
+        gate = ConcurrencyGate()
+        gate._redis = lambda: None
+        slot = await gate.acquire("k", 1)
+
+        async def events():
+            yield "a"
+            yield "b"
+
+        stream = slot.wrap_stream(events())
+        assert slot.detached
+        assert [chunk async for chunk in stream] == ["a", "b"]
+        assert slot.released
+        assert await gate.active("k") == 0
+
+    @pytest.mark.asyncio
+    async def test_wrap_stream_releases_on_disconnect(self):
+        """测试客户端断开（生成器被关闭）时释放槽位"""
+        gate = ConcurrencyGate()
+        gate._redis = lambda: None
+        slot = await gate.acquire("k", 1)
+
+        async def events():
+            while True:
+                yield "tick"
+
+        stream = slot.wrap_stream(events())
+        assert await stream.__anext__() == "tick"
+        assert await gate.active("k") == 1
+
+        await stream.aclose()
+        assert await gate.active("k") == 0
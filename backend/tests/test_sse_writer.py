@@ -0,0 +1,108 @@
+"""
+SSE写出器测试
+"""
+
+import json
+import zlib
+
+import pytest
+
+from src.app.core.sse_writer import SSEWriter, negotiate_encoding
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def parse_events(raw: bytes):
+    """解析SSE字节为 (事件类型, 数据) 列表"""
+    events = []
+    for block in raw.decode("utf-8").split("\n\n"):
+        if not block:
+            continue
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+class TestSSEWriter:
+    """SSEWriter测试类"""
+
+    def test_coalesces_by_size(self):
+        """测试token合并到字节上限才写出"""
+        writer = SSEWriter(flush_interval=10, flush_bytes=12, clock=FakeClock())
+
+        assert writer.token("销售", 30) == b""
+        frame = writer.token("额统计", 31)  # 累计 15 字节
+
+        assert parse_events(frame) == [("data", {"chunk": "销售额统计", "progress": 31})]
+        assert writer.get_stats()["tokens"] == 2
+        assert writer.get_stats()["writes"] == 1
+
+    def test_coalesces_by_time(self):
+        """测试最早的token超过合并窗口时写出，并按间隔附带progress事件"""
+        clock = FakeClock()
+        writer = SSEWriter(flush_interval=0.03, flush_bytes=1024, progress_interval=0.5, clock=clock)
+
+        assert writer.token("a", 30) == b""
+        clock.now = 0.02
+        assert writer.token("b", 31) == b""
+        clock.now = 0.6
+        frame = writer.token("c", 32)
+
+        assert parse_events(frame) == [
+            ("data", {"chunk": "abc", "progress": 32}),
+            ("progress", {"value": 32}),
+        ]
+
+    def test_event_flushes_pending_tokens_first(self):
+        """测试其他事件写出前先写出缓冲的token，顺序不变"""
+        writer = SSEWriter(flush_interval=10, flush_bytes=1024, clock=FakeClock())
+        writer.token("部分回答", 40)
+
+        events = parse_events(writer.event("step", {"step": 2}))
+
+        assert [e[0] for e in events] == ["data", "step"]
+        assert events[0][1]["chunk"] == "部分回答"
+        assert writer.flush() == b""
+
+    def test_replay_matches_live_format(self):
+        """测试缓存回放按大小合并，拼接后还原完整文本"""
+        writer = SSEWriter(flush_interval=10, flush_bytes=100, clock=FakeClock())
+        text = "x" * 450
+
+        frames = list(writer.replay(text, 80, 95))
+        events = [e for frame in frames for e in parse_events(frame)]
+
+        assert "".join(data["chunk"] for _, data in events) == text
+        assert len(frames) == 4  # 64字符一片，每两片达到上限，剩余部分结尾写出
+        assert all(80 <= data["progress"] <= 95 for _, data in events)
+
+    @pytest.mark.parametrize("encoding,wbits", [("gzip", 16 + zlib.MAX_WBITS), ("deflate", zlib.MAX_WBITS)])
+    def test_compressed_stream_decodes_incrementally(self, encoding, wbits):
+        """测试压缩后每次写出都能立即解出完整事件"""
+        writer = SSEWriter(flush_interval=10, flush_bytes=4, encoding=encoding, clock=FakeClock())
+        decoder = zlib.decompressobj(wbits)
+
+        first = decoder.decompress(writer.event("start", {"query": "q"}))
+        assert parse_events(first) == [("start", {"query": "q"})]
+
+        raw = writer.token("hello", 50) + writer.event("done", {"success": True}) + writer.close()
+        rest = decoder.decompress(raw)
+        assert [e[0] for e in parse_events(rest)] == ["data", "done"]
+        assert writer.close() == b""
+        assert decoder.eof
+        assert writer.headers["Content-Encoding"] == encoding
+
+    def test_negotiate_encoding(self):
+        """测试Accept-Encoding协商"""
+        assert negotiate_encoding("gzip, deflate, br") == "gzip"
+        assert negotiate_encoding("deflate;q=0.5, gzip;q=0") == "deflate"
+        assert negotiate_encoding("br") is None
+        assert negotiate_encoding("*") == "gzip"
+        assert negotiate_encoding(None) is None
+        assert negotiate_encoding("gzip", allowed=[]) is None
@@ -4,6 +4,9 @@
 
 import pytest
 import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch, AsyncMock
 import sys
 import os
@@ -12,6 +15,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
 
 from src.app.services.zhipu_client import ZhipuAIService, zhipu_service, retry_on_failure
+from src.app.services.embedding_store import EmbeddingStore
 
 
 class TestRetryDecorator:
@@ -64,7 +68,10 @@ class TestZhipuAIService:
         with patch('src.app.services.zhipu_client.settings') as mock_settings:
             mock_settings.zhipuai_api_key = "test_api_key"
             mock_settings.zhipuai_default_model = "glm-4"
-            return ZhipuAIService()
+            service = ZhipuAIService()
+        # 嵌入缓存不落盘，避免用例之间共享向量
+        service.embedding_store = EmbeddingStore(db_path=":memory:")
+        return service
 
     @pytest.mark.asyncio
     async def test_check_connection_success(self, service):
@@ -275,6 +282,49 @@ class TestZhipuAIService:
 
             assert result is None
 
+    @pytest.mark.asyncio
+    async def test_semantic_search_reuses_cached_vectors(self, service):
+        """测试语义搜索 - 重复检索同一批文档只嵌入新的查询"""
+        vectors = {
+            "query a": [1.0, 0.0],
+            "query b": [0.0, 1.0],
+            "Document 1": [0.9, 0.1],
+            "Document 2": [0.1, 0.9],
+        }
+
+        async def fake_embedding(texts, model="embedding-2"):
+            return [vectors[text] for text in texts]
+
+        with patch.object(service, 'embedding', side_effect=fake_embedding) as mock_embedding:
+            documents = ["Document 1", "Document 2"]
+            first = await service.semantic_search("query a", documents, top_k=1)
+            second = await service.semantic_search("query b", documents, top_k=1)
+            third = await service.semantic_search("query b", documents, top_k=1)
+
+        assert first["results"][0]["document"] == "Document 1"
+        assert second["results"][0]["document"] == "Document 2"
+        assert third == second
+        # 第一次嵌入查询+文档，第二次只嵌入新查询，第三次全部命中缓存
+        assert [call.args[0] for call in mock_embedding.call_args_list] == [
+            ["query a", "Document 1", "Document 2"],
+            ["query b"],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_embed_texts_batches_and_dedupes(self, service):
+        """测试带缓存的嵌入 - 去重后按批次请求"""
+        async def fake_embedding(texts, model="embedding-2"):
+            return [[float(len(text))] for text in texts]
+
+        with patch('src.app.services.zhipu_client.settings') as mock_settings, \
+                patch.object(service, 'embedding', side_effect=fake_embedding) as mock_embedding:
+            mock_settings.zhipuai_embedding_batch_size = 2
+            mock_settings.zhipuai_max_concurrency = 4
+            result = await service.embed_texts(["a", "bb", "a", "ccc", "dddd"])
+
+        assert result == [[1.0], [2.0], [1.0], [3.0], [4.0]]
+        assert [call.args[0] for call in mock_embedding.call_args_list] == [["a", "bb"], ["ccc", "dddd"]]
+
     @pytest.mark.asyncio
     async def test_text_analysis_success(self, service):
         """测试文本分析成功"""
@@ -558,6 +608,135 @@ class TestStreamChatCompletion:
             assert error_received
 
 
+class TestNonBlockingStreaming:
+    """流式调用不阻塞事件循环测试"""
+
+    @pytest.fixture
+    def service(self):
+        """创建 ZhipuAIService 实例"""
+        with patch('src.app.services.zhipu_client.settings') as mock_settings:
+            mock_settings.zhipuai_api_key = "test_api_key"
+            mock_settings.zhipuai_default_model = "glm-4-flash"
+            return ZhipuAIService()
+
+    @staticmethod
+    def _slow_stream(tag, count, delay=0.05):
+        """模拟同步SDK的流式响应：每个块之间阻塞 delay 秒"""
+        for i in range(count):
+            time.sleep(delay)
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta = Mock()
+            chunk.choices[0].delta.reasoning_content = None
+            chunk.choices[0].delta.content = f"{tag}-{i}"
+            yield chunk
+
+    @pytest.mark.asyncio
+    async def test_parallel_streams_interleave(self, service):
+        """测试多个并发流交错输出，且总耗时接近单个流而非累加"""
+        streams, chunks_per_stream, delay = 4, 5, 0.05
+        arrivals = []
+
+        with patch.object(service, 'client') as mock_client:
+            mock_client.chat.completions.create.side_effect = (
+                lambda **params: self._slow_stream(
+                    params["messages"][0]["content"], chunks_per_stream, delay
+                )
+            )
+
+            async def consume(tag):
+                messages = [{"role": "user", "content": tag}]
+                async for chunk in service.stream_chat_completion(
+                    messages=messages, enable_thinking=False
+                ):
+                    if chunk['type'] == 'content' and chunk['content']:
+                        arrivals.append(tag)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(consume(f"s{i}") for i in range(streams)))
+            elapsed = time.perf_counter() - started
+
+        assert len(arrivals) == streams * chunks_per_stream
+        # 前 streams 个块来自不同的流，说明没有一个流独占事件循环
+        assert len(set(arrivals[:streams])) == streams
+        assert elapsed < streams * chunks_per_stream * delay * 0.6
+
+    @pytest.mark.asyncio
+    async def test_event_loop_responsive_during_stream(self, service):
+        """测试流式调用期间事件循环仍可调度其他任务"""
+        ticks = 0
+        done = asyncio.Event()
+
+        async def heartbeat():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        with patch.object(service, 'client') as mock_client:
+            mock_client.chat.completions.create.side_effect = (
+                lambda **params: self._slow_stream("s", 4, 0.05)
+            )
+
+            beat = asyncio.create_task(heartbeat())
+            async for _ in service.stream_chat_completion(
+                messages=[{"role": "user", "content": "你好"}], enable_thinking=False
+            ):
+                pass
+            done.set()
+            await beat
+
+        assert ticks >= 10
+
+    @pytest.mark.asyncio
+    async def test_iterate_in_thread_backpressure_and_early_exit(self, service):
+        """测试后台线程最多领先 buffer_size 个块，消费端退出后停止读取"""
+        produced = []
+
+        def source():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        stream = service._iterate_in_thread(source, buffer_size=3)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.1)
+        assert first == 0
+        # 已消费1个 + 缓冲3个 + 生产者手中等待缓冲位的1个
+        assert len(produced) <= 5
+
+        await stream.aclose()
+        await asyncio.sleep(0.3)
+        stopped_at = len(produced)
+        await asyncio.sleep(0.1)
+        assert len(produced) == stopped_at < 100
+
+    @pytest.mark.asyncio
+    async def test_stream_pump_does_not_use_request_pool(self, service):
+        """测试请求线程池占满时流式响应仍能推进"""
+        service._executor = ThreadPoolExecutor(max_workers=1)
+        release = threading.Event()
+        blocked = asyncio.ensure_future(service._run_blocking(lambda: release.wait(2)))
+        await asyncio.sleep(0.05)
+
+        async def drain():
+            return [item async for item in service._iterate_in_thread(lambda: iter(range(3)))]
+
+        try:
+            assert await asyncio.wait_for(drain(), timeout=1) == [0, 1, 2]
+        finally:
+            release.set()
+            await blocked
+            service._executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_call_api_with_retry_runs_off_loop(self, service):
+        """测试同步API调用在工作线程中执行"""
+        loop_thread = threading.get_ident()
+        result = await service._call_api_with_retry(lambda: threading.get_ident())
+        assert result != loop_thread
+
+
 class TestThinkingModeIntegration:
     """思考模式集成测试"""
 